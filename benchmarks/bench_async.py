@@ -0,0 +1,107 @@
+"""Requests per second of many concurrent asyncio clients, async API vs. the sync API on a thread pool.
+
+    python -m benchmarks.bench_async [--clients 1000] [--rounds 3]
+
+Every client has its own user and book and borrows, returns and pays ``rounds`` times.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.persistence.async_storage import AsyncLibraryRepository
+from library.persistence.memory import InMemoryBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+
+def populate(clients: int) -> list[tuple[User, Book]]:
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    pairs = []
+    for i in range(clients):
+        book = Book(f"Title {i}", [author], publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        user = User(f"user{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_book(book)
+        LibraryRepository.create_user(user)
+        pairs.append((user, book))
+    return pairs
+
+
+async def async_client(user: User, book: Book, rounds: int, latencies: list[float]):
+    card = CreditCard("247912434", datetime.now() + timedelta(days=100), "111")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await AsyncLibraryRepository.borrow_book(user, book)
+        borrowed = time.perf_counter()
+        invoice = await AsyncLibraryRepository.return_books(user, [book])
+        returned = time.perf_counter()
+        await AsyncLibraryRepository.process_invoice(invoice, card)
+        latencies.extend((borrowed - start, returned - borrowed, time.perf_counter() - returned))
+
+
+async def thread_pool_client(pool: ThreadPoolExecutor, user: User, book: Book, rounds: int, latencies: list[float]):
+    loop = asyncio.get_running_loop()
+    card = CreditCard("247912434", datetime.now() + timedelta(days=100), "111")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await loop.run_in_executor(pool, user.borrow_book, book)
+        borrowed = time.perf_counter()
+        invoice = await loop.run_in_executor(pool, user.return_books, [book])
+        returned = time.perf_counter()
+        await loop.run_in_executor(pool, invoice.process_invoice, card)
+        latencies.extend((borrowed - start, returned - borrowed, time.perf_counter() - returned))
+
+
+def measure(pairs: list[tuple[User, Book]], rounds: int, use_async: bool) -> tuple[float, float]:
+    latencies: list[float] = []
+
+    async def main():
+        if use_async:
+            await asyncio.gather(*(async_client(user, book, rounds, latencies) for user, book in pairs))
+        else:
+            # what an asyncio server does with a blocking library: the default pool size of asyncio
+            with ThreadPoolExecutor(min(32, (os.cpu_count() or 1) + 4)) as pool:
+                await asyncio.gather(*(thread_pool_client(pool, user, book, rounds, latencies) for user, book in pairs))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    seconds = time.perf_counter() - start
+    return len(latencies) / seconds, statistics.quantiles(latencies, n=100)[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'api':<12} {'requests/s':>11} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("memory", "sqlite"):
+            for api in ("async", "thread pool"):
+                if name == "memory":
+                    backend = InMemoryBackend()
+                else:
+                    backend = SQLiteBackend(os.path.join(tmp, f"library-{api}.db"))
+                LibraryRepository.use_backend(backend)
+                pairs = populate(args.clients)
+                throughput, p99 = measure(pairs, args.rounds, api == "async")
+                print(f"{name:<8} {api:<12} {throughput:>11.0f} {p99:>8.1f}")
+                backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Large checkouts: ``User.borrow_books`` against a loop over ``User.borrow_book``.
+
+    python -m benchmarks.bench_borrow_books [--books 200] [--checkouts 20]
+
+Every checkout lends ``--books`` paper books to a new user, first one book at a time and
+then as one batch, on fresh catalogues of the same size. The books are returned in one go
+between checkouts, which is not timed.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.persistence.memory import InMemoryBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+
+def populate(books: int, checkouts: int) -> tuple[list[Book], list[User]]:
+    catalogue = []
+    for i in range(books):
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        LibraryRepository.create_book(book)
+        catalogue.append(book)
+    users = []
+    for i in range(checkouts):
+        user = User(f"class{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        users.append(user)
+    return catalogue, users
+
+
+def run(catalogue: list[Book], users: list[User], batch: bool) -> float:
+    """Books lent per second."""
+    seconds = 0.0
+    for user in users:
+        start = time.perf_counter()
+        if batch:
+            outcomes = user.borrow_books(catalogue)
+            assert all(outcome.loan is not None for outcome in outcomes)
+        else:
+            for book in catalogue:
+                assert user.borrow_book(book) is not None
+        seconds += time.perf_counter() - start
+        user.return_books(list(user.borrowed_books))
+    return len(users) * len(catalogue) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--checkouts", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'backend':<8} {'per book':>12} {'batch':>12}  (books/s)")
+        for name in ("memory", "sqlite"):
+            result = {}
+            for batch in (False, True):
+                if name == "memory":
+                    backend = InMemoryBackend()
+                else:
+                    backend = SQLiteBackend(os.path.join(tmp, f"library-{batch}.db"))
+                LibraryRepository.use_backend(backend)
+                catalogue, users = populate(args.books, args.checkouts)
+                result[batch] = run(catalogue, users, batch)
+                backend.close()
+            print(f"{name:<8} {result[False]:>12.0f} {result[True]:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
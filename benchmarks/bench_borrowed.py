@@ -0,0 +1,65 @@
+"""Cost of returning a book by the number of books a user has borrowed.
+
+    python -m benchmarks.bench_borrowed [--borrowed 100 1000 10000] [--returns 100]
+
+"list" is the plain list ``User.borrowed_books`` used to be, "keyed" the ISBN-keyed
+``BorrowedBooks``; both run the membership test and the removal ``return_books`` does for
+every returned book. "return_books" times the whole return against the in-memory backend.
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.borrowed_books import BorrowedBooks
+from library.model.genre import Genre
+from library.model.user import User
+from library.persistence.memory import InMemoryBackend
+from library.persistence.storage import LibraryRepository
+
+
+def create_books(count: int) -> list[Book]:
+    return [Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+            for i in range(count)]
+
+
+def remove_all(borrowed, returned: list[Book]) -> float:
+    start = time.perf_counter()
+    for book in returned:
+        if book in borrowed:
+            borrowed.remove(book)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--borrowed", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--returns", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'borrowed':>8} {'list us/book':>13} {'keyed us/book':>14} {'return_books us/book':>21}")
+    for count in args.borrowed:
+        books = create_books(count)
+        returned = random.Random(42).sample(books, min(args.returns, count))
+        list_seconds = remove_all(list(books), returned)
+        keyed_seconds = remove_all(BorrowedBooks(books), returned)
+
+        LibraryRepository.use_backend(InMemoryBackend())
+        user = User("library@test.org", "City", "Library", "", "", "", "", "")
+        LibraryRepository.create_user(user)
+        for book in books:
+            LibraryRepository.create_book(book)
+        with LibraryRepository.transaction():
+            for book in books:
+                user.borrow_book(book)
+        start = time.perf_counter()
+        for book in returned:
+            user.return_books([book])
+        return_seconds = time.perf_counter() - start
+        per_book = 1e6 / len(returned)
+        print(f"{count:>8} {list_seconds * per_book:>13.2f} {keyed_seconds * per_book:>14.2f} {return_seconds * per_book:>21.1f}")
+
+
+if __name__ == "__main__":
+    main()
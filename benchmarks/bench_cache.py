@@ -0,0 +1,79 @@
+"""Point reads per second from SQLite with and without the read cache.
+
+    python -m benchmarks.bench_cache [--books 10000] [--reads 100000] [--cache-size 1000] [--write-every 10]
+
+ISBNs are drawn from a Zipf-like distribution, so a small set of hot books gets most reads.
+Each workload runs read-only and with a borrow+return of every ``--write-every``-th book
+read, which invalidates its entry.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.cache import CachedBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+
+def populate(books: int) -> list[str]:
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    isbns = []
+    for i in range(books):
+        book = Book(f"Title {i}", [author], publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        LibraryRepository.create_book(book)
+        isbns.append(book.isbn)
+    return isbns
+
+
+def run(isbns: list[str], reads: int, write_every: int) -> float:
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(len(isbns))]
+    keys = rng.choices(isbns, weights, k=reads)
+    start = time.perf_counter()
+    for i, isbn in enumerate(keys):
+        book = LibraryRepository.read_book(isbn)
+        if write_every and i % write_every == 0:
+            book.borrow_book()
+            book.return_book()
+    return reads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=100000)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    parser.add_argument("--write-every", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'writes':>7} {'reads/s':>10} {'hit rate':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for write_every in (0, args.write_every):
+            for name in ("sqlite", "cached"):
+                backend = SQLiteBackend(os.path.join(tmp, f"{name}-{write_every}.db"))
+                if name == "cached":
+                    backend = CachedBackend(backend, max_size=args.cache_size)
+                LibraryRepository.use_backend(backend)
+                isbns = populate(args.books)
+                # start cold: the books created above are not referenced any more
+                if name == "cached":
+                    backend.cache.clear()
+                throughput = run(isbns, args.reads, write_every)
+                hit_rate = f"{backend.stats().hit_rate:.1%}" if name == "cached" else "-"
+                writes = f"1/{write_every}" if write_every else "none"
+                print(f"{name:<8} {writes:>7} {throughput:>10.0f} {hit_rate:>9}")
+                backend.close()
+
+
+if __name__ == "__main__":
+    main()
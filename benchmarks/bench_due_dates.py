@@ -0,0 +1,75 @@
+"""Overdue detection over many active loans: the due date heap against a scan of all loans.
+
+    python -m benchmarks.bench_due_dates [--loans 1000000] [--days 30] [--overdue 1000]
+
+The due dates are spread evenly over ``--days`` days from now. The queries ask for the
+loans overdue at a moment just late enough to catch about ``--overdue`` of them, and for
+those due within the hour after it; "scan" is the same overdue query as a list comprehension
+over all loans. "renew" moves a sample of loans to a new due date, as ``update_loan`` does.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from library.model.book import Book
+from library.model.due_dates import DueDateScheduler
+from library.model.genre import Genre
+from library.model.loan import Loan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--overdue", type=int, default=1000)
+    args = parser.parse_args()
+
+    book = Book("Title", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, "1541644638", "Electronic")
+    now = datetime.now()
+    step = timedelta(days=args.days) / args.loans
+    loans = [Loan(book, f"user{i}@test.org", now + i * step, 1.0) for i in range(args.loans)]
+    random.Random(1).shuffle(loans)
+
+    start = time.perf_counter()
+    scheduler = DueDateScheduler(loans)
+    build_seconds = time.perf_counter() - start
+
+    moment = now + args.overdue * step
+    rounds = 20
+    start = time.perf_counter()
+    for _ in range(rounds):
+        overdue = scheduler.overdue(moment)
+    overdue_seconds = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        soon = scheduler.due_within(timedelta(hours=1), moment)
+    soon_seconds = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        scheduler.next_due()
+    next_seconds = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    scanned = sorted((loan for loan in loans if loan.due_date <= moment), key=lambda loan: loan.due_date)
+    scan_seconds = time.perf_counter() - start
+    assert [loan.id for loan in scanned] == [loan.id for loan in overdue]
+
+    renewals = loans[:100000]
+    start = time.perf_counter()
+    for loan in renewals:
+        loan.due_date += timedelta(days=7)
+        scheduler.schedule(loan)
+    renew_seconds = time.perf_counter() - start
+
+    print(f"loans           {args.loans:>12}")
+    print(f"build           {build_seconds * 1e3:>12.1f} ms")
+    print(f"overdue         {overdue_seconds * 1e3:>12.3f} ms ({len(overdue)} loans)")
+    print(f"due in 1h       {soon_seconds * 1e3:>12.3f} ms ({len(soon)} loans)")
+    print(f"next_due        {next_seconds * 1e6:>12.1f} us")
+    print(f"scan            {scan_seconds * 1e3:>12.1f} ms")
+    print(f"renew           {renew_seconds / len(renewals) * 1e6:>12.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Books per second and peak memory of exporting the catalogue, streaming vs. joining ``Book.serialize``.
+
+    python -m benchmarks.bench_export [--books 1000000] [--backend memory|sqlite]
+
+"serialize" builds the whole document from ``Book.serialize`` strings and writes it at
+once, which is what exporting looked like before ``library.persistence.exporter``.
+The peak is what the export allocates on top of the stored catalogue, measured with
+tracemalloc in a second run.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.exporter import export_books
+from library.persistence.memory import InMemoryBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+
+def populate(books: int):
+    authors = [Author("Eric", "Topol"), Author("Kai-Fu", "Lee")]
+    publisher = Publisher("Basic Books")
+    for author in authors:
+        LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    with LibraryRepository.transaction():
+        for i in range(books):
+            book = Book(f"Title {i} & more", authors, publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+            LibraryRepository.create_book(book)
+
+
+def serialize_export(path: str, format: str):
+    books = LibraryRepository.read_books()
+    with open(path, "w", encoding="utf-8") as file:
+        if format == "json":
+            file.write("[" + ", ".join([book.serialize("JSON") for book in books]) + "]")
+        elif format == "jsonl":
+            file.write("".join([book.serialize("JSON") + "\n" for book in books]))
+        else:
+            file.write("<books>" + "".join([book.serialize("XML") for book in books]) + "</books>")
+
+
+def stream_export(path: str, format: str):
+    export_books(path, format=format)
+
+
+def measure(export, path: str, format: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    export(path, format)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    export(path, format)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.backend == "memory":
+            backend = InMemoryBackend()
+        else:
+            backend = SQLiteBackend(os.path.join(tmp, "library.db"))
+        LibraryRepository.use_backend(backend)
+        populate(args.books)
+        print(f"{'format':<6} {'export':<10} {'books/s':>9} {'peak MB':>8} {'file MB':>8}")
+        for format in ("json", "jsonl", "xml"):
+            path = os.path.join(tmp, f"catalogue.{format}")
+            for name, export in (("serialize", serialize_export), ("streaming", stream_export)):
+                seconds, peak = measure(export, path, format)
+                size = os.path.getsize(path) / 2**20
+                print(f"{format:<6} {name:<10} {args.books / seconds:>9.0f} {peak:>8.1f} {size:>8.1f}")
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Hold queue operations on long queues: join, position, leave and hand over.
+
+    python -m benchmarks.bench_holds [--users 100000] [--cancel 0.1]
+
+All users wait for one ISBN and every ``1 / --cancel``-th of them leaves again, so the
+positions have cancelled tickets to skip. The copies are then handed over one by one
+until the queue is empty.
+"""
+import argparse
+import random
+import time
+
+from library.model.holds import HoldQueues
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--cancel", type=float, default=0.1)
+    args = parser.parse_args()
+
+    queues = HoldQueues()
+    isbn = "1541644638"
+    emails = [f"user{i}@test.org" for i in range(args.users)]
+
+    start = time.perf_counter()
+    for email in emails:
+        queues.join(isbn, email)
+    join_seconds = time.perf_counter() - start
+
+    leaving = emails[1::round(1 / args.cancel)]
+    start = time.perf_counter()
+    for email in leaving:
+        queues.leave(isbn, email)
+    leave_seconds = time.perf_counter() - start
+
+    waiting = [email for email in emails if queues.position(isbn, email) is not None]
+    sample = random.Random(1).sample(waiting, min(10000, len(waiting)))
+    start = time.perf_counter()
+    for email in sample:
+        queues.position(isbn, email)
+    position_seconds = time.perf_counter() - start
+    assert queues.position(isbn, waiting[-1]) == len(waiting)
+
+    start = time.perf_counter()
+    while queues.hand_over(isbn) is not None:
+        pass
+    hand_over_seconds = time.perf_counter() - start
+
+    print(f"users           {args.users:>12}")
+    print(f"join            {join_seconds / args.users * 1e6:>12.2f} us")
+    print(f"leave           {leave_seconds / len(leaving) * 1e6:>12.2f} us ({len(leaving)} users)")
+    print(f"position        {position_seconds / len(sample) * 1e6:>12.2f} us")
+    print(f"hand over       {hand_over_seconds / len(waiting) * 1e6:>12.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Rows per second of the catalogue importer for CSV and JSON Lines, with and without parsing workers.
+
+    python -m benchmarks.bench_import [--rows 100000] [--workers 2] [--backend memory|sqlite]
+
+A synthetic catalogue with 1% broken rows, 1000 authors and 100 publishers is written to a
+temporary file first. The peak resident memory is printed at the end; it should not grow
+with ``--rows`` for the SQLite backend.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+
+from library.model.genre import Genre
+from library.persistence.importer import CatalogueImporter
+from library.persistence.memory import InMemoryBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+COLUMNS = ["isbn", "title", "authors", "publisher", "publication_date", "genres", "pages", "type", "existing_items"]
+
+
+def records(rows: int):
+    rng = random.Random(42)
+    genres = [genre.value for genre in Genre]
+    for i in range(rows):
+        yield {
+            "isbn": f"{i:013d}",
+            "title": f"Title {i}",
+            "authors": [f"Firstname{rng.randrange(1000)} Lastname"],
+            "publisher": f"Publisher {rng.randrange(100)}",
+            "publication_date": "2019-03-12",
+            "genres": rng.sample(genres, 2),
+            "pages": rng.randrange(50, 900),
+            # every 100th row is rejected
+            "type": "Scroll" if i % 100 == 99 else rng.choice(("Paper", "Electronic", "Audio")),
+            "existing_items": rng.randrange(1, 5),
+        }
+
+
+def write_catalogue(path: str, format: str, rows: int):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS)
+            for record in records(rows):
+                record["authors"] = ";".join(record["authors"])
+                record["genres"] = ";".join(record["genres"])
+                writer.writerow([record[column] for column in COLUMNS])
+        else:
+            for record in records(rows):
+                file.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    args = parser.parse_args()
+
+    print(f"{'format':<6} {'workers':>7} {'rows/s':>8} {'imported':>9} {'rejected':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for format in ("csv", "jsonl"):
+            path = os.path.join(tmp, f"catalogue.{format}")
+            write_catalogue(path, format, args.rows)
+            for workers in (0, args.workers):
+                if args.backend == "memory":
+                    backend = InMemoryBackend()
+                else:
+                    backend = SQLiteBackend(os.path.join(tmp, f"library-{format}-{workers}.db"))
+                LibraryRepository.use_backend(backend)
+                stats = CatalogueImporter(workers=workers).import_file(path)
+                print(f"{format:<6} {workers:>7} {stats.rows_per_second:>8.0f} {stats.imported:>9} {stats.rejected:>9}")
+                backend.close()
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB")
+
+
+if __name__ == "__main__":
+    main()
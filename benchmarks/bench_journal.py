@@ -0,0 +1,63 @@
+"""Write throughput of the journaled in-memory backend and its recovery time.
+
+    python -m benchmarks.bench_journal [--books 100000]
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.journal import JournaledBackend
+from library.persistence.memory import InMemoryBackend
+from library.persistence.storage import LibraryRepository
+
+
+def write(books: int) -> float:
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    start = time.perf_counter()
+    for i in range(books):
+        book = Book(f"Title {i}", [author], publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        LibraryRepository.create_book(book)
+        book.borrowed_items += 1
+        LibraryRepository.update_book(book)
+    return 2 * books / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=100000)
+    args = parser.parse_args()
+
+    LibraryRepository.use_backend(InMemoryBackend())
+    print(f"memory          {write(args.books):>10.0f} writes/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = JournaledBackend(tmp)
+        LibraryRepository.use_backend(backend)
+        print(f"journal         {write(args.books):>10.0f} writes/s")
+        start = time.perf_counter()
+        LibraryRepository.sync()
+        print(f"sync            {time.perf_counter() - start:>10.3f} s")
+        backend.close()
+
+        backend = JournaledBackend(tmp)
+        print(f"recovery (log)  {backend.recovery.seconds:>10.3f} s for {backend.recovery.replayed_records} records")
+        start = time.perf_counter()
+        backend.snapshot()
+        print(f"snapshot        {time.perf_counter() - start:>10.3f} s")
+        backend.close()
+
+        backend = JournaledBackend(tmp)
+        print(f"recovery (snap) {backend.recovery.seconds:>10.3f} s up to LSN {backend.recovery.snapshot_lsn}")
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Debits per second of threads paying from shared accounts, with striped and with one global lock.
+
+    python -m benchmarks.bench_ledger [--accounts 1 1000] [--threads 1 2 4 8] [--debits 20000]
+
+Every thread debits random accounts until each of them has made ``--debits`` attempts.
+The accounts start with less money than is asked of them, so some debits are refused;
+at the end every account must hold its start balance minus the debits that succeeded,
+and none may be overdrawn. ``unsafe`` is the read-check-write the payments did before,
+shown for the overdrafts it lets through.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from library.payment.ledger import BalanceLedger
+
+AMOUNT = 1.0
+
+
+class UnsafeLedger(BalanceLedger):
+    def debit(self, account, amount):
+        balance = self._balances[account]
+        if balance < amount:
+            return False
+        self._balances[account] = balance - amount
+        return True
+
+
+def run(ledger: BalanceLedger, accounts: int, threads: int, debits: int) -> tuple[float, int]:
+    barrier = threading.Barrier(threads + 1)
+    succeeded = [0] * threads
+
+    def work(index: int):
+        rng = random.Random(index)
+        barrier.wait()
+        count = 0
+        for _ in range(debits):
+            if ledger.debit(rng.randrange(accounts), AMOUNT):
+                count += 1
+        succeeded[index] = count
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, sum(succeeded)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 1000])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--debits", type=int, default=20000)
+    args = parser.parse_args()
+    # switch threads often, as under real contention
+    sys.setswitchinterval(1e-5)
+
+    print(f"{'ledger':<8} {'accounts':>8} {'threads':>7} {'debits/s':>10} {'overdrafts':>10}")
+    for accounts in args.accounts:
+        for threads in args.threads:
+            for name, factory in (("striped", BalanceLedger), ("global", lambda b: BalanceLedger(b, stripes=1)),
+                                  ("unsafe", UnsafeLedger)):
+                # three quarters of the debits can be paid
+                start_balance = threads * args.debits * AMOUNT * 3 / 4 / accounts
+                balances = {account: start_balance for account in range(accounts)}
+                ledger = factory(balances)
+                seconds, succeeded = run(ledger, accounts, threads, args.debits)
+                paid = start_balance * accounts - sum(balances.values())
+                overdrafts = round(succeeded - paid / AMOUNT) + sum(balance < 0 for balance in balances.values())
+                if name != "unsafe":
+                    assert overdrafts == 0
+                print(f"{name:<8} {accounts:>8} {threads:>7} {threads * args.debits / seconds:>10.0f} {overdrafts:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Active loans held by the in-memory backend: bytes per loan and the cost of the lookups.
+
+    python -m benchmarks.bench_loans [--loans 1000000] [--users 100000] [--books 1000]
+
+The loans are spread evenly over the users and over a catalogue of e-books, so every
+book has many readers at once. "bytes/loan" counts the ``Loan`` with its id, due date and
+its entries in the indexes by id, user and book, measured on a separate backend with the
+first ``--sample`` loans; books and emails are created up front.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.persistence.memory import InMemoryBackend
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=100000)
+    args = parser.parse_args()
+
+    books = [Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, f"{i:010d}", "Electronic")
+             for i in range(args.books)]
+    emails = [f"user{i}@test.org" for i in range(args.users)]
+
+    def create(backend: InMemoryBackend, count: int):
+        for i in range(count):
+            backend.create_loan(Loan.start(books[i % args.books], emails[i % args.users]))
+
+    sample = min(args.sample, args.loans)
+    tracemalloc.start()
+    sampled = InMemoryBackend()
+    create(sampled, sample)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sampled
+
+    backend = InMemoryBackend()
+    start = time.perf_counter()
+    create(backend, args.loans)
+    create_seconds = time.perf_counter() - start
+
+    rounds = 1000
+    start = time.perf_counter()
+    for i in range(rounds):
+        backend.loans_of_user(emails[i % args.users])
+    user_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(rounds):
+        backend.loans_of_book(books[i % args.books].isbn)
+    book_seconds = time.perf_counter() - start
+
+    loans = list(backend.loans.values())[:rounds]
+    start = time.perf_counter()
+    for loan in loans:
+        backend.delete_loan(loan)
+    delete_seconds = time.perf_counter() - start
+
+    print(f"loans           {args.loans:>12}")
+    print(f"create          {args.loans / create_seconds:>12.0f} loans/s")
+    print(f"bytes/loan      {size / sample:>12.0f}")
+    print(f"loans_of_user   {user_seconds / rounds * 1e6:>12.1f} us ({args.loans // args.users} loans)")
+    print(f"loans_of_book   {book_seconds / rounds * 1e6:>12.1f} us ({args.loans // args.books} loans)")
+    print(f"delete          {delete_seconds / len(loans) * 1e6:>12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Bytes per book, user and invoice of the slotted models vs. the previous ``__dict__`` layout.
+
+    python -m benchmarks.bench_memory [--count 100000]
+
+The previous layout is reproduced by ``DictBook``/``DictUser``/``DictInvoice``, which set
+the same attributes as the models did before they got ``__slots__``: genres as a list of
+``Genre`` members and the book type as a string. Strings, authors and publishers are
+created up front and shared, so only what every object costs by itself is counted.
+"""
+import argparse
+import tracemalloc
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.model.user import User
+from library.payment.invoice import Invoice
+
+
+class DictBook:
+    def __init__(self, title, authors, publisher, pub_date, genres, pages, isbn, type, duration=0, existing_items=1, borrowed_items=0):
+        self.title = title
+        self.authors = authors
+        self.publisher = publisher
+        self.publication_date = pub_date
+        self.genres = genres
+        self.pages = pages
+        self.isbn = isbn
+        self._book_type = type
+        self.duration = duration
+        self.existing_items = existing_items
+        self.borrowed_items = borrowed_items
+        self.version = 0
+        self._serialized = {}
+
+
+class DictUser:
+    reading_credits = 0
+
+    def __init__(self, email, firstname, lastname, mob1, mob2, area_code, landline, country_code):
+        self.email = email
+        self.firstname = firstname
+        self.lastname = lastname
+        self.mobile_number1 = mob1
+        self.mobile_number2 = mob2
+        self.area_code = area_code
+        self.landline_number = landline
+        self.country_calling_code = country_code
+        self.borrowed_books = []
+        self.read_books = []
+        self.invoices = []
+        self.version = 0
+
+
+class DictInvoice:
+    is_closed = False
+
+    def __init__(self, user, id):
+        self.id = id
+        self.customer = user
+        self.books = []
+        self.version = 0
+
+
+def measure(create, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create(i) for i in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # the list that holds the objects is not part of them
+    allocated -= len(objects) * 8
+    return allocated / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    published = datetime(2019, 3, 12)
+    titles = [f"Title {i}" for i in range(args.count)]
+    isbns = [f"{i:010d}" for i in range(args.count)]
+    emails = [f"user{i}@test.org" for i in range(args.count)]
+    ids = [f"invoice-{i}" for i in range(args.count)]
+
+    def book(cls):
+        return lambda i: cls(titles[i], [author], publisher, published, [Genre.MEDICINE, Genre.COMPUTER_SCIENCE], 400, isbns[i], "Paper")
+
+    def user(cls):
+        return lambda i: cls(emails[i], "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+
+    customer = User("max@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+
+    def invoice_before(i):
+        return DictInvoice(customer, ids[i])
+
+    def invoice_after(i):
+        invoice = Invoice(customer)
+        invoice.id = ids[i]
+        return invoice
+
+    print(f"{'model':<8} {'before B':>9} {'after B':>8} {'saved':>6}")
+    for name, before, after in (
+        ("book", book(DictBook), book(Book)),
+        ("user", user(DictUser), user(User)),
+        ("invoice", invoice_before, invoice_after),
+    ):
+        before_bytes = measure(before, args.count)
+        after_bytes = measure(after, args.count)
+        print(f"{name:<8} {before_bytes:>9.0f} {after_bytes:>8.0f} {1 - after_bytes / before_bytes:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
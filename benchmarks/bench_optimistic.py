@@ -0,0 +1,96 @@
+"""Conflict rate of worker processes borrowing and returning the same few books in one SQLite file.
+
+    python -m benchmarks.bench_optimistic [--books 8] [--operations 500] [--workers 1 2 4 8] [--attempts 5]
+
+Every worker borrows and returns random books of a small, hot catalogue; a borrow that
+runs out of attempts is skipped. At the end all copies must be back: a lost update would
+leave a book with borrowed items.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+from library.persistence.versioning import ConflictError
+
+
+def populate(path: str, books: int) -> list[str]:
+    backend = SQLiteBackend(path)
+    LibraryRepository.use_backend(backend)
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    isbns = []
+    for i in range(books):
+        book = Book(f"Title {i}", [author], publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper",
+                    existing_items=1000)
+        LibraryRepository.create_book(book)
+        isbns.append(book.isbn)
+    backend.close()
+    return isbns
+
+
+def work(path: str, isbns: list[str], operations: int, attempts: int) -> tuple:
+    backend = SQLiteBackend(path, pool_size=1)
+    LibraryRepository.use_backend(backend)
+    LibraryRepository.use_retry_policy(attempts)
+    books = [LibraryRepository.read_book(isbn) for isbn in isbns]
+    for _ in range(operations):
+        book = random.choice(books)
+        try:
+            book.borrow_book()
+        except ConflictError:
+            continue
+        while True:
+            try:
+                book.return_book()
+                break
+            except ConflictError:
+                pass
+    backend.close()
+    return LibraryRepository.conflict_stats()
+
+
+def run(path: str, isbns: list[str], workers: int, operations: int, attempts: int) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        stats = pool.starmap(work, [(path, isbns, operations, attempts)] * workers)
+    seconds = time.perf_counter() - start
+    attempted = sum(s.operations for s in stats)
+    conflicts = sum(s.conflicts for s in stats)
+    failures = sum(s.failures for s in stats)
+    return attempted / seconds, conflicts / attempted, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'updates/s':>10} {'conflicts':>10} {'failures':>9} {'lost':>5}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "library.db")
+            isbns = populate(path, args.books)
+            throughput, conflict_rate, failures = run(path, isbns, workers, args.operations, args.attempts)
+            backend = SQLiteBackend(path)
+            lost = sum(backend.read_book(isbn).borrowed_items for isbn in isbns)
+            backend.close()
+        print(f"{workers:>7} {throughput:>10.0f} {conflict_rate:>10.1%} {failures:>9} {lost:>5}")
+
+
+if __name__ == "__main__":
+    main()
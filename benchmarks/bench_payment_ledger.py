@@ -0,0 +1,96 @@
+"""Payment ledger throughput: recording payments, settling them and reconciling the day.
+
+    python -m benchmarks.bench_payment_ledger [--payments 20000] [--backend sqlite]
+
+Settling closes every paid invoice; it is timed once as one batch through the ledger and
+once as one transaction per invoice, as the payments did before. Reconciliation streams
+through the segment files written by the run.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.invoice import Invoice
+from library.payment.payment_ledger import PAID, PaymentLedger, reconcile
+from library.persistence.memory import InMemoryBackend
+from library.persistence.storage import LibraryRepository
+
+
+def create_invoices(count: int, prefix: str) -> list[Invoice]:
+    invoices = []
+    for i in range(count):
+        user = User(f"{prefix}{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{prefix}{i:09d}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        invoices.append(user.return_books([book]))
+    return invoices
+
+
+def record(ledger: PaymentLedger, invoices: list[Invoice], flush_every: int) -> float:
+    start = time.perf_counter()
+    for i, invoice in enumerate(invoices, 1):
+        fee, reading_credits = invoice.calculate_fee(invoice.customer)
+        key = ledger.record_attempt(invoice.id, fee, "credit_card")
+        ledger.record_result(key, PAID, reading_credits, invoice)
+        if i % flush_every == 0:
+            ledger.flush()
+    ledger.flush()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=20000)
+    parser.add_argument("--flush-every", type=int, default=1000)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="sqlite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.backend == "sqlite":
+            from library.persistence.sqlite_backend import SQLiteBackend
+
+            backend = SQLiteBackend(os.path.join(directory, "library.db"))
+        else:
+            backend = InMemoryBackend()
+        LibraryRepository.use_backend(backend)
+        batched = create_invoices(args.payments, "batched")
+        one_by_one = create_invoices(args.payments, "single")
+
+        ledger = PaymentLedger(os.path.join(directory, "payments"))
+        seconds = record(ledger, batched, args.flush_every)
+        print(f"record          {2 * args.payments / seconds:>10.0f} events/s")
+        start = time.perf_counter()
+        ledger.settle()
+        seconds = time.perf_counter() - start
+        print(f"settle batched  {args.payments / seconds:>10.0f} invoices/s")
+        start = time.perf_counter()
+        for invoice in one_by_one:
+            invoice._close(invoice.calculate_fee(invoice.customer)[1])
+        seconds = time.perf_counter() - start
+        print(f"settle single   {args.payments / seconds:>10.0f} invoices/s")
+        start = time.perf_counter()
+        for invoice in batched:
+            assert ledger.is_paid(invoice.id)
+        seconds = time.perf_counter() - start
+        print(f"is_paid         {args.payments / seconds:>10.0f} lookups/s")
+        ledger.close()
+
+        start = time.perf_counter()
+        report = reconcile(os.path.join(directory, "payments"))
+        seconds = time.perf_counter() - start
+        events = report.attempts + report.paid + report.settled
+        size = sum(entry.stat().st_size for entry in os.scandir(os.path.join(directory, "payments")))
+        print(f"reconcile       {events / seconds:>10.0f} events/s  ({size / events:.0f} bytes/event)")
+        assert report.paid == report.settled == args.payments and report.unsettled == []
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
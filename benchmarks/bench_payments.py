@@ -0,0 +1,71 @@
+"""Invoices paid per second through a simulated gateway, by number of payments in flight.
+
+    python -m benchmarks.bench_payments [--invoices 2000] [--latency 0.05] [--error-rate 0.02]
+
+Each run pays fresh invoices against a gateway with the given latency, failing and losing
+answers at ``--error-rate``; it reports the throughput, retries, the p50/p99 latency of a
+payment and that no card was charged twice.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.payment.gateway import SimulatedGateway
+from library.payment.invoice import Invoice
+from library.payment.processor import PaymentProcessor
+from library.persistence.storage import LibraryRepository
+from library.persistence.versioning import RetryPolicy
+
+CARD_LIMIT = 100000.0
+
+
+def create_jobs(count: int, run: int) -> list[tuple[Invoice, CreditCard]]:
+    jobs = []
+    for i in range(count):
+        user = User(f"user{run}-{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{run:03d}{i:07d}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        card = CreditCard("4111111111111111", datetime(2030, 1, 1), "123")
+        jobs.append((user.return_books([book]), card))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128, 512])
+    args = parser.parse_args()
+
+    print(f"{'in flight':>9} {'invoices/s':>11} {'retries':>8} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8} {'double':>7}")
+    for run, concurrency in enumerate(args.concurrency):
+        # a sequential run of all invoices would take minutes
+        count = min(args.invoices, max(50, concurrency * 20))
+        jobs = create_jobs(count, run)
+        gateway = SimulatedGateway(
+            args.latency, args.jitter, error_rate=args.error_rate, lost_response_rate=args.error_rate, seed=run
+        )
+        processor = PaymentProcessor(
+            gateway, max_concurrency=concurrency, retry=RetryPolicy(attempts=8, base_delay=0.01, max_delay=0.5)
+        )
+        start = time.perf_counter()
+        processor.run_sync(jobs)
+        seconds = time.perf_counter() - start
+        stats = processor.stats()
+        double = sum(card.amount < CARD_LIMIT - invoice.calculate_fee(invoice.customer)[0] for invoice, card in jobs)
+        print(
+            f"{concurrency:>9} {count / seconds:>11.0f} {stats.retries:>8} {stats.failed:>7}"
+            f" {stats.p50 * 1000:>8.1f} {stats.p99 * 1000:>8.1f} {double:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
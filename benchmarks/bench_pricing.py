@@ -0,0 +1,71 @@
+"""Invoices priced per second: ``Invoice.calculate_fee`` per invoice vs. ``price_batch``.
+
+    python -m benchmarks.bench_pricing [--invoices 200000] [--max-books 6]
+
+The batch engines are timed on columns built up front, as a billing run would read them
+from the database; building the columns from the invoice objects is timed separately.
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.user import User
+from library.payment.invoice import Invoice
+from library.payment.pricing import invoice_columns, np, price_batch
+
+
+def create_invoices(count: int, max_books: int) -> list[Invoice]:
+    rng = random.Random(42)
+    author = Author("Eric", "Topol")
+    genres = list(Genre)
+    books = [
+        Book(f"Title {i}", [author], None, datetime(2019, 3, 12), rng.sample(genres, 2), 400, f"{i:010d}", "Paper")
+        for i in range(1000)
+    ]
+    invoices = []
+    for i in range(count):
+        user = User(f"user{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        user.reading_credits = rng.randrange(10)
+        invoice = Invoice(user)
+        invoice.loans = [
+            Loan(book, user.email, None, rng.choice((2, 5, 7, 10)))
+            for book in rng.sample(books, rng.randint(1, max_books))
+        ]
+        invoices.append(invoice)
+    return invoices
+
+
+def timed(function) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--max-books", type=int, default=6)
+    args = parser.parse_args()
+
+    invoices = create_invoices(args.invoices, args.max_books)
+    seconds, expected = timed(lambda: [invoice.calculate_fee(invoice.customer) for invoice in invoices])
+    print(f"{'path':<16} {'invoices/s':>11}")
+    print(f"{'calculate_fee':<16} {args.invoices / seconds:>11.0f}")
+    seconds, columns = timed(lambda: invoice_columns(invoices))
+    print(f"{'build columns':<16} {args.invoices / seconds:>11.0f}")
+    engines = [("batch loops", False)]
+    if np is not None:
+        engines.append(("batch numpy", True))
+    for name, use_numpy in engines:
+        seconds, priced = timed(lambda: price_batch(columns, use_numpy))
+        assert [(float(total), int(credits)) for total, credits in zip(*priced)] == expected
+        print(f"{name:<16} {args.invoices / seconds:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Readers-also-read recommendations over a long reading history: update cost, memory and query latency.
+
+    python -m benchmarks.bench_recommendations [--events 10000000] [--users 1000000] [--books 100000]
+
+The books fall into 1000 topics, each book with one of the genres. Every user has a
+favourite topic and reads from it four times out of five, otherwise from any topic; within
+a topic a few books are read far more often than the rest. The reads are fed to
+``Recommender.record`` one by one, as the returns would. "memory" is the growth of the
+resident set while recording, "update" the cost of a single read, timed for one read in
+100. The queries ask ``also_read`` for books drawn like the reads and ``recommend`` for
+random users.
+"""
+import argparse
+import itertools
+import random
+import resource
+import time
+from array import array
+from datetime import datetime
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.recommendations import Recommender
+
+_TOPICS = 1000
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def percentiles(seconds: list[float]) -> str:
+    seconds = sorted(seconds)
+    p50 = seconds[len(seconds) // 2] * 1e6
+    p99 = seconds[int(len(seconds) * 0.99)] * 1e6
+    return f"p50 {p50:>8.1f} us  p99 {p99:>8.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000000)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    genres = list(Genre)
+    books = [Book(f"Title {i}", [], None, datetime(2019, 3, 12), [genres[i % _TOPICS % len(genres)]], 400,
+                  f"{i:010d}", "Paper") for i in range(args.books)]
+    emails = [f"user{i}@test.org" for i in range(args.users)]
+    per_topic = args.books // _TOPICS
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(per_topic)))
+
+    # the book of read i is books[topic * per_topic + rank]
+    readers = array("i", rng.choices(range(args.users), k=args.events))
+    ranks = array("i", rng.choices(range(per_topic), cum_weights=weights, k=args.events))
+    read = array("i", (
+        (reader % _TOPICS if rng.random() < 0.8 else rng.randrange(_TOPICS)) * per_topic + rank
+        for reader, rank in zip(readers, ranks)
+    ))
+    del ranks
+
+    recommender = Recommender()
+    record = recommender.record
+    updates = []
+    before = rss_mb()
+    start = time.perf_counter()
+    for i, (reader, book) in enumerate(zip(readers, read)):
+        if i % 100:
+            record(emails[reader], books[book])
+        else:
+            begin = time.perf_counter()
+            record(emails[reader], books[book])
+            updates.append(time.perf_counter() - begin)
+    record_seconds = time.perf_counter() - start
+    memory = rss_mb() - before
+    entries = sum(len(row) for row in recommender._rows)
+
+    sample = [books[rng.choice(read)].isbn for _ in range(args.queries)]
+    also_read = []
+    for isbn in sample:
+        begin = time.perf_counter()
+        recommender.also_read(isbn)
+        also_read.append(time.perf_counter() - begin)
+    recommend = []
+    for _ in range(args.queries):
+        email = emails[rng.choice(readers)]
+        begin = time.perf_counter()
+        recommender.recommend(email)
+        recommend.append(time.perf_counter() - begin)
+
+    print(f"events          {args.events:>12}")
+    print(f"users / books   {len(recommender._histories):>12} / {len(recommender._items)}")
+    print(f"record          {record_seconds:>12.1f} s ({args.events / record_seconds:,.0f} reads/s)")
+    print(f"update          {percentiles(updates)}")
+    print(f"memory          {memory:>12.0f} MB ({entries:,} row entries)")
+    print(f"also_read       {percentiles(also_read)}")
+    print(f"recommend       {percentiles(recommend)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Full-text search on a large synthetic catalogue: build, query latency, save and load.
+
+    python -m benchmarks.bench_search [--books 1000000] [--words 50000] [--queries 2000]
+
+Titles have 2 to 6 words drawn from a vocabulary of ``--words`` made-up words with Zipf-like
+frequencies, so a few words are in many titles and most in few. Each book has one of 20000
+authors and 500 publishers. The queries take two words of a random title, typed in full
+("words") or with the second one cut to three letters ("type-ahead"), and single words
+drawn like the titles ("one word"), which includes the most frequent ones.
+"""
+import argparse
+import itertools
+import os
+import random
+import string
+import tempfile
+import time
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.search import SearchIndex
+
+
+def made_up_words(count: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def percentiles(seconds: list[float]) -> str:
+    seconds = sorted(seconds)
+    p50 = seconds[len(seconds) // 2] * 1e3
+    p99 = seconds[int(len(seconds) * 0.99)] * 1e3
+    return f"p50 {p50:>7.3f} ms  p99 {p99:>7.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = made_up_words(args.words, rng)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    authors = [Author(first.capitalize(), last.capitalize())
+               for first, last in zip(made_up_words(20000, rng), reversed(made_up_words(20000, rng)))]
+    publishers = [Publisher(f"{name.capitalize()} Press") for name in made_up_words(500, rng)]
+    titles = []
+    books = []
+    for i in range(args.books):
+        title = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(2, 6))
+        titles.append(title)
+        books.append(Book(" ".join(title).capitalize(), [authors[i % len(authors)]], publishers[i % len(publishers)],
+                          datetime(2019, 3, 12), [Genre.FICTION], 400, f"{i:010d}", "Paper"))
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for book in books:
+        index.add(book)
+    build_seconds = time.perf_counter() - start
+
+    def timed(queries: list[str]) -> list[float]:
+        seconds = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query)
+            seconds.append(time.perf_counter() - start)
+        return seconds
+
+    sample = [rng.choice(titles) for _ in range(args.queries)]
+    full = timed([f"{title[0]} {title[1]}" for title in sample])
+    typed = timed([f"{title[0]} {title[1][:3]}" for title in sample])
+    single = timed(rng.choices(vocabulary, cum_weights=weights, k=args.queries))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.json")
+        start = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        SearchIndex.load(path)
+        load_seconds = time.perf_counter() - start
+
+    print(f"books           {args.books:>12}")
+    print(f"build           {build_seconds:>12.1f} s")
+    print(f"words           {percentiles(full)}")
+    print(f"type-ahead      {percentiles(typed)}")
+    print(f"one word        {percentiles(single)}")
+    print(f"save            {save_seconds:>12.1f} s ({size / 1e6:.0f} MB)")
+    print(f"load            {load_seconds:>12.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Serialized books per second: the original ``Book.serialize``, the new encoders, and memoized ``serialize``.
+
+    python -m benchmarks.bench_serialize [--books 1000] [--renders 100]
+
+"original" is ``json.dumps`` of a dict and ``ElementTree.tostring`` per call, as ``serialize``
+used to be. "memoized" serializes the books of a user's ``read_books`` again and again,
+like rendering an account page, with one borrow per render so a book is re-encoded.
+"""
+import argparse
+import json
+import time
+import xml.etree.ElementTree as et
+from datetime import datetime
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.serialization import book_json, book_xml, fast_json_encoder, use_json_encoder
+
+
+def original(book: Book, format: str) -> str:
+    if format == "JSON":
+        book_info = {
+            "id": book.isbn,
+            "title": book.title,
+            "authors": [author.get_fullname() for author in book.authors],
+            "available_items": book.existing_items - book.borrowed_items,
+            "borrowed_items": book.borrowed_items,
+        }
+        return json.dumps(book_info)
+    book_info = et.Element("book", attrib={"id": book.isbn})
+    et.SubElement(book_info, "title").text = book.title
+    et.SubElement(book_info, "authors").text = ", ".join([author.get_fullname() for author in book.authors])
+    et.SubElement(book_info, "available").text = str(book.existing_items - book.borrowed_items)
+    et.SubElement(book_info, "borrowed").text = str(book.borrowed_items)
+    return et.tostring(book_info, encoding="unicode")
+
+
+def measure(books: list[Book], renders: int, serialize) -> float:
+    start = time.perf_counter()
+    for render in range(renders):
+        # what a borrow or return does to one of the books between two renders
+        books[render % len(books)].borrowed_items ^= 1
+        for book in books:
+            serialize(book)
+    return renders * len(books) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--renders", type=int, default=100)
+    args = parser.parse_args()
+
+    authors = [Author("Eric", "Topol"), Author("Kai-Fu", "Lee")]
+    books = [
+        Book(f"Title {i} & more", authors, None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper", 0, 2)
+        for i in range(args.books)
+    ]
+    encoders = [("built-in", None)]
+    if fast_json_encoder() is not None:
+        encoders.append(("orjson", fast_json_encoder()))
+
+    print(f"{'format':<6} {'encoder':<9} {'serialize':<9} {'books/s':>10}")
+    for format, encode in (("JSON", book_json), ("XML", book_xml)):
+        for encoder_name, encoder in encoders if format == "JSON" else encoders[:1]:
+            use_json_encoder(encoder)
+            runs = [("uncached", encode), ("memoized", lambda book: book.serialize(format))]
+            if encoder is None:
+                runs.insert(0, ("original", lambda book: original(book, format)))
+            for name, serialize in runs:
+                throughput = measure(books, args.renders, serialize)
+                print(f"{format:<6} {encoder_name:<9} {name:<9} {throughput:>10.0f}")
+    use_json_encoder(None)
+
+
+if __name__ == "__main__":
+    main()
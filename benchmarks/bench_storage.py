@@ -0,0 +1,78 @@
+"""Borrow/return/pay throughput of the storage backends.
+
+    python -m benchmarks.bench_storage [--books 10000] [--rounds 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.persistence.memory import InMemoryBackend
+from library.persistence.sqlite_backend import SQLiteBackend
+from library.persistence.storage import LibraryRepository
+
+
+def populate(books: int) -> tuple[list[Book], User]:
+    author = Author("Eric", "Topol")
+    publisher = Publisher("Basic Books")
+    LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    catalogue = []
+    for i in range(books):
+        book = Book(f"Title {i}", [author], publisher, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        LibraryRepository.create_book(book)
+        catalogue.append(book)
+    user = User("max@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+    LibraryRepository.create_user(user)
+    return catalogue, user
+
+
+def run(rounds: int, catalogue: list[Book], user: User) -> dict[str, float]:
+    card = CreditCard("247912434", datetime.now() + timedelta(days=100), "111")
+    timings = {"borrow": 0.0, "return": 0.0, "pay": 0.0}
+    for i in range(rounds):
+        book = LibraryRepository.read_book(catalogue[i % len(catalogue)].isbn)
+        start = time.perf_counter()
+        user.borrow_book(book)
+        borrowed = time.perf_counter()
+        invoice = user.return_books([book])
+        returned = time.perf_counter()
+        user.reading_credits = 0
+        card.amount = 100000.0
+        invoice.process_invoice(card)
+        paid = time.perf_counter()
+        timings["borrow"] += borrowed - start
+        timings["return"] += returned - borrowed
+        timings["pay"] += paid - returned
+    return {flow: rounds / seconds for flow, seconds in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": InMemoryBackend(),
+            "sqlite": SQLiteBackend(os.path.join(tmp, "library.db")),
+        }
+        print(f"{'backend':<8} {'borrow/s':>10} {'return/s':>10} {'pay/s':>10}")
+        for name, backend in backends.items():
+            LibraryRepository.use_backend(backend)
+            catalogue, user = populate(args.books)
+            result = run(args.rounds, catalogue, user)
+            print(f"{name:<8} {result['borrow']:>10.0f} {result['return']:>10.0f} {result['pay']:>10.0f}")
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
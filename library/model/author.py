@@ -1,11 +1,34 @@
+from library.model.serialization import author_renamed
+
+
 class Author:
 
     firstname: str
     lastname: str
+    __slots__ = ("_firstname", "_lastname", "__weakref__")
 
     def __init__(self, firstname: str, lastname: str):
-        self.firstname = firstname
-        self.lastname = lastname
+        self._firstname = firstname
+        self._lastname = lastname
+
+    # a new name shows in the serialized books, see library.model.serialization
+    @property
+    def firstname(self) -> str:
+        return self._firstname
+
+    @firstname.setter
+    def firstname(self, firstname: str):
+        self._firstname = firstname
+        author_renamed()
+
+    @property
+    def lastname(self) -> str:
+        return self._lastname
+
+    @lastname.setter
+    def lastname(self, lastname: str):
+        self._lastname = lastname
+        author_renamed()
 
     def get_firstname(self) -> str:
         return self.firstname
@@ -21,3 +44,6 @@ class Author:
         if isinstance(other, Author):
             return self.get_fullname() == other.get_fullname()
         return NotImplemented
+
+    def __hash__(self):
+        return hash(self.get_fullname())
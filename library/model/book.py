@@ -1,16 +1,58 @@
-from datetime import datetime, timedelta
-import json
+from operator import attrgetter
+from typing import Iterable, Optional
+
 from library.model.author import Author
-from library.model.genre import Genre
+from library.model.genre import Genre, GenreFlag, Genres, genre_flags, shared_genres
+from library.model.holds import hold_queues
 from library.model.publisher import Publisher
-import xml.etree.ElementTree as et
+from library.model.serialization import new_stamp, serialize_book
 
 from library.persistence.storage import LibraryRepository
 
+# books store their type as an index into BOOK_TYPES
+BOOK_TYPES = ("Paper", "Electronic", "Audio")
+PAPER, ELECTRONIC, AUDIO = range(len(BOOK_TYPES))
+_TYPE_CODES = {name: code for code, name in enumerate(BOOK_TYPES)}
+
+
+def _serialized_field(slot: str) -> property:
+    """A field that shows in ``serialize``, kept in ``slot``; setting it gives the book a new stamp."""
+
+    def set_field(book, value):
+        setattr(book, slot, value)
+        book._stamp = new_stamp()
+
+    return property(attrgetter(slot), set_field)
+
 
 class Book:
-    due_date: datetime
-    weekly_fee: float
+    # slots instead of a __dict__ per book; the due date and fee of a loan are kept by its Loan
+    __slots__ = (
+        "_title",
+        "_authors",
+        "publisher",
+        "publication_date",
+        "_genres",
+        "_genre_flags",
+        "pages",
+        "_isbn",
+        "_type",
+        "duration",
+        "_existing_items",
+        "_borrowed_items",
+        "set_aside",
+        "version",
+        "_stamp",
+        "_serialized",
+        "__weakref__",
+    )
+
+    title = _serialized_field("_title")
+    authors = _serialized_field("_authors")
+    isbn = _serialized_field("_isbn")
+    existing_items = _serialized_field("_existing_items")
+    borrowed_items = _serialized_field("_borrowed_items")
+
     def __init__(self, title, authors, publisher, pub_date, genres, pages, isbn, type, duration: int = 0,
                  existing_items: int = 1, borrowed_items: int = 0):
         self.title = title
@@ -24,95 +66,236 @@ class Book:
         self.duration = duration
         self.existing_items = existing_items
         self.borrowed_items = borrowed_items
+        # ((email, claim deadline in seconds since the epoch), ...) of the copies set aside for
+        # holds, counted in borrowed_items; see library.model.holds
+        self.set_aside: tuple[tuple[str, float], ...] = ()
+        # incremented by every stored update, see LibraryRepository.retry_on_conflict
+        self.version = 0
+        # format -> ((stamp, author stamp, encoder), text) once serialized, see serialize_book()
+        self._serialized = None
         # self.isBorrowable = self.can_borrow()
 
-    @classmethod
+    @property
+    def genres(self) -> Genres:
+        """The genres in the order they were given; equal to the list they were given as. Shared
+        with the books of the same genres and also kept as flags, so it is read-only: assign a
+        new list to change them."""
+        return self._genres
+
+    @genres.setter
+    def genres(self, genres: Iterable[Genre]):
+        self._genres = shared_genres(tuple(genres))
+        self._genre_flags = genre_flags(self._genres)
+
+    @property
+    def genre_flags(self) -> GenreFlag:
+        return self._genre_flags
+
+    @property
+    def _book_type(self) -> str:
+        return BOOK_TYPES[self._type] if type(self._type) is int else self._type
+
+    @_book_type.setter
+    def _book_type(self, book_type: str):
+        # an unknown type is kept as it is, so the methods below still reject it
+        self._type = _TYPE_CODES.get(book_type, book_type)
+
     def can_borrow(self) -> bool:
-        if self._book_type == "Paper":
+        if self._type == PAPER:
             return self.existing_items - self.borrowed_items > 0
-        elif self._book_type == "Electronic":
+        elif self._type == ELECTRONIC:
             return True
-        elif self._book_type == "Audio":
+        elif self._type == AUDIO:
             return True
         else:
             raise AttributeError("No such book type...")
 
     def get_approximate_duration(self) -> int:
-        if self._book_type == "Paper":
+        if self._type == PAPER:
             return self.pages * 3 * 60
-        elif self._book_type == "Electronic":
+        elif self._type == ELECTRONIC:
             return self.pages * 5 * 60
-        elif self._book_type == "Audio":
+        elif self._type == AUDIO:
             return self.duration
         else:
             raise AttributeError("No such book type...")
 
     def get_weekly_fee(self) -> int:
-        if self._book_type == "Paper":
+        if self._type == PAPER:
             return 5
-        elif self._book_type == "Electronic":
+        elif self._type == ELECTRONIC:
             return 2
-        elif self._book_type == "Audio":
+        elif self._type == AUDIO:
             return 2
         else:
             raise AttributeError("No such book type...")
 
     def borrow_book(self):
-        if self.can_borrow():
-            if self._book_type == "Paper":
-                self.borrowed_items += 1
-            LibraryRepository.update_book(self)
-            self.due_date = datetime.now() + timedelta(days=7)
-            self.current_fee = self.get_weekly_fee()
-            return self
+        # another process may have lent a copy since this book was read, then it is re-read and tried again
+        with LibraryRepository.locked(self.isbn):
+            return LibraryRepository.retry_on_conflict(self._borrow_book, lambda: LibraryRepository.refresh_book(self))
+
+    def _borrow_book(self):
+        # a conflicting write restores the old count, so a retry does not count the loan twice
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "borrowed_items")
+            if self.can_borrow():
+                # e-books and audio books are lent without limit, their loans leave the book as it is
+                if self._type == PAPER:
+                    self.borrowed_items += 1
+                    LibraryRepository.update_book(self)
+                return self
         raise ValueError("Book cannot be borrowed")
 
-    def renew_rental(self):
-        self.due_date += timedelta(days=7)
-        self.current_fee += self.get_weekly_fee()
+    def return_book(self):
+        with LibraryRepository.locked(self.isbn):
+            return LibraryRepository.retry_on_conflict(self._return_book, lambda: LibraryRepository.refresh_book(self))
+
+    def _return_book(self):
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "borrowed_items", "set_aside")
+            if self._type == PAPER:
+                self._release_expired(unit_of_work)
+                self._pass_on(unit_of_work)
+                LibraryRepository.update_book(self)
         return self
 
-    def return_book(self):
-        if self._book_type == "Paper":
+    def is_set_aside_for(self, email: str) -> bool:
+        now = hold_queues.clock()
+        return any(holder == email and deadline > now for holder, deadline in self.set_aside)
+
+    def collect(self, email: str) -> bool:
+        """Takes the copy set aside for ``email`` within a transaction that tracks ``set_aside``;
+        false if there is none or it was not collected in time."""
+        if not self.is_set_aside_for(email):
+            return False
+        self.set_aside = tuple(entry for entry in self.set_aside if entry[0] != email)
+        return True
+
+    def pass_on(self, email: str) -> bool:
+        """Passes the copy set aside for ``email`` on to the next in line or back to the shelf;
+        false if there is none."""
+        with LibraryRepository.locked(self.isbn), LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "borrowed_items", "set_aside")
+            if not self.collect(email):
+                return False
+            self._pass_on(unit_of_work)
+            LibraryRepository.update_book(self)
+            return True
+
+    def release_expired(self) -> bool:
+        """Passes on the copies not collected in time; false if there were none."""
+        with LibraryRepository.locked(self.isbn), LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "borrowed_items", "set_aside")
+            if not self._release_expired(unit_of_work):
+                return False
+            LibraryRepository.update_book(self)
+            return True
+
+    def _release_expired(self, unit_of_work) -> bool:
+        now = hold_queues.clock()
+        kept = tuple(entry for entry in self.set_aside if entry[1] > now)
+        expired = len(self.set_aside) - len(kept)
+        if not expired:
+            return False
+        self.set_aside = kept
+        for _ in range(expired):
+            self._pass_on(unit_of_work)
+        return True
+
+    def _pass_on(self, unit_of_work):
+        # a copy in hand goes to the next in line if anyone waits, else back to the shelf
+        email = hold_queues.hand_over(self.isbn)
+        if email is None:
             self.borrowed_items -= 1
-        LibraryRepository.update_book(self)
-        return self
+            return
+        # the copy stays lent, set aside
+        self.set_aside += ((email, hold_queues.claim_deadline()),)
+        unit_of_work.on_rollback(lambda: hold_queues.put_back(self.isbn, email))
+        # listeners may borrow, so they only hear of it once the locks are released
+        unit_of_work.on_commit(lambda: LibraryRepository.when_unlocked(lambda: hold_queues.notify(self, email)))
 
     def serialize(self, format: str):
-        if format == "JSON":
-            book_info = {
-                "id": self.isbn,
-                "title": self.title,
-                "authors": [author.get_fullname() for author in self.authors],
-                "available_items": self.existing_items - self.borrowed_items,
-                "borrowed_items": self.borrowed_items,
-            }
-            return json.dumps(book_info)
-        elif format == "XML":
-            book_info = et.Element("book", attrib={"id": self.isbn})
-            title = et.SubElement(book_info, "title")
-            title.text = self.title
-            authors = et.SubElement(book_info, "authors")
-            authors.text = ", ".join([author.get_fullname() for author in self.authors])
-            avail = et.SubElement(book_info, "available")
-            avail.text = str(self.existing_items - self.borrowed_items)
-            authors = et.SubElement(book_info, "borrowed")
-            authors.text = str(self.borrowed_items)
-            return et.tostring(book_info, encoding="Unicode")
-        else:
-            raise ValueError(format)
-
+        # memoized until a serialized field changes, see library.model.serialization
+        return serialize_book(self, format)
 
     def __eq__(self, other):
         """Overrides the default implementation"""
         if isinstance(other, Book):
-            return self.isbn == other.isbn and self._book_type == other._book_type
+            return self.isbn == other.isbn and self._type == other._type
         return NotImplemented
 
+    def __hash__(self):
+        # equal books have the same ISBN; the type is left out so the hash never changes
+        return hash(self.isbn)
+
     def __str__(self):
         return self.serialize("JSON")
 
 
+def reserve_books(books: list[Book], partial: bool = False, email: Optional[str] = None) -> list[bool]:
+    """Takes a copy of each of ``books`` in one transaction and returns, per book, whether one was free.
+
+    A book listed twice needs two copies. Every paper book is checked first and then
+    written once, with all its copies counted. Unless ``partial``, no copy is taken if
+    any book has none left. As in ``User.borrow_book``, copies not collected in time are
+    passed on first, and a copy set aside for ``email`` is collected before a free one is taken.
+    """
+    unique = list({id(book): book for book in books}.values())
+    with LibraryRepository.locked(*{book.isbn for book in unique}):
+        return LibraryRepository.retry_on_conflict(
+            lambda: _reserve_books(books, partial, email),
+            lambda: [LibraryRepository.refresh_book(book) for book in unique],
+        )
+
+
+def release_expired_holds() -> int:
+    """Passes on the copies of all books that were set aside but not collected in time, and
+    returns how many books had some. The next borrow, return or hold of a book does it for that
+    book anyway; this is for a periodic sweep."""
+    return sum(1 for book in LibraryRepository.read_books() if book.set_aside and book.release_expired())
+
+
+def _reserve_books(books: list[Book], partial: bool, email: Optional[str]) -> list[bool]:
+    with LibraryRepository.transaction() as unit_of_work:
+        for book in {id(book): book for book in books}.values():
+            if book.set_aside:
+                # copies not collected in time go to the next in line or back to the shelf first
+                book.release_expired()
+        # id(book) -> book whose copy set aside for ``email`` is collected
+        collected: dict[int, Book] = {}
+        # id(book) -> [book, copies taken]
+        taken: dict[int, list] = {}
+        available = []
+        for book in books:
+            if email is not None and id(book) not in collected and book.is_set_aside_for(email):
+                # the copy set aside is still counted as lent
+                collected[id(book)] = book
+                available.append(True)
+                continue
+            try:
+                free = book.can_borrow()
+            except AttributeError:
+                free = False
+            if free and book._type == PAPER:
+                copies = taken.setdefault(id(book), [book, 0])
+                free = book.existing_items - book.borrowed_items > copies[1]
+                if free:
+                    copies[1] += 1
+            available.append(free)
+        if partial or all(available):
+            for book in collected.values():
+                unit_of_work.track(book, "set_aside")
+                book.collect(email)
+                LibraryRepository.update_book(book)
+            for book, copies in taken.values():
+                if copies:
+                    unit_of_work.track(book, "borrowed_items")
+                    book.borrowed_items += copies
+                    LibraryRepository.update_book(book)
+    return available
+
+
 # class BorrowedBook(Book):
 #     due_date: datetime
 #     current_fee: float
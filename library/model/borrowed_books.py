@@ -0,0 +1,112 @@
+from __future__ import annotations
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from library.model.loan import Loan
+
+
+class BorrowedBooks(Sequence):
+    """The loans of a user, keyed by ISBN.
+
+    It reads like the list it replaces, but ``in``, ``count`` and ``remove`` only look at
+    the loans with the ISBN of the book, so returning a book costs the same however many
+    books are borrowed. They take a ``Loan``, or a ``Book`` for any loan of that book: a
+    user who borrowed two copies has two loans of the book. Iteration yields the loans
+    grouped by title, in the order the titles were first borrowed.
+    """
+
+    __slots__ = ("_by_isbn", "_length")
+
+    def __init__(self, loans: Iterable[Loan] = ()):
+        # the copies are tuples, so that copy() (done by every transaction that tracks the
+        # borrowed books) is a plain dict copy
+        self._by_isbn: dict[str, tuple[Loan, ...]] = {}
+        self._length = 0
+        for loan in loans:
+            self.append(loan)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Loan]:
+        for copies in self._by_isbn.values():
+            yield from copies
+
+    def __getitem__(self, index: int) -> Loan:
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("borrowed book index out of range")
+        for copies in self._by_isbn.values():
+            if index < len(copies):
+                return copies[index]
+            index -= len(copies)
+        raise IndexError("borrowed book index out of range")
+
+    def __contains__(self, book) -> bool:
+        return self.count(book) > 0
+
+    def count(self, item) -> int:
+        copies = self._by_isbn.get(getattr(item, "isbn", None), ())
+        return sum(1 for loan in copies if _matches(loan, item))
+
+    def copies(self, isbn: str) -> list[Loan]:
+        return list(self._by_isbn.get(isbn, ()))
+
+    def isbns(self) -> list[str]:
+        return list(self._by_isbn)
+
+    def loan_of(self, item) -> Optional[Loan]:
+        """``item`` if it is one of the loans, the first loan of ``item`` if it is a book, or None."""
+        for loan in self._by_isbn.get(getattr(item, "isbn", None), ()):
+            if _matches(loan, item):
+                return loan
+        return None
+
+    def append(self, loan: Loan):
+        self._by_isbn[loan.isbn] = self._by_isbn.get(loan.isbn, ()) + (loan,)
+        self._length += 1
+
+    def remove(self, item):
+        """Removes ``item`` or one loan of the book ``item``; raises ``ValueError`` like ``list.remove`` if there is none."""
+        copies: Optional[tuple[Loan, ...]] = self._by_isbn.get(getattr(item, "isbn", None))
+        if copies is not None:
+            for i, loan in enumerate(copies):
+                if _matches(loan, item):
+                    if len(copies) == 1:
+                        del self._by_isbn[loan.isbn]
+                    else:
+                        self._by_isbn[loan.isbn] = copies[:i] + copies[i + 1:]
+                    self._length -= 1
+                    return
+        raise ValueError(f"{item!r} is not borrowed")
+
+    def clear(self):
+        self._by_isbn.clear()
+        self._length = 0
+
+    def copy(self) -> BorrowedBooks:
+        copied = BorrowedBooks()
+        copied._by_isbn = self._by_isbn.copy()
+        copied._length = self._length
+        return copied
+
+    __copy__ = copy
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (BorrowedBooks, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"BorrowedBooks({list(self)!r})"
+
+
+def _matches(loan: Loan, item) -> bool:
+    # a loan is only ever equal to itself, a book matches every loan of it
+    return loan is item or loan.book == item
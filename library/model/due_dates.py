@@ -0,0 +1,161 @@
+"""Due dates of the active loans, ordered for overdue detection, reminders and auto-renewal.
+
+    scheduler = DueDateScheduler.from_repository()
+    scheduler.overdue()                        # all loans past their due date
+    scheduler.due_within(timedelta(days=1))    # the reminders for tomorrow
+    scheduler.renew_due(timedelta(days=1))     # renews them instead
+
+The scheduler is a binary min-heap on the due date. It listens to the repository's writes,
+so borrowing, renewing and returning keep it up to date. A renewal or return does not
+search the heap: the loan's old entry is only marked stale (the loan id maps to the
+sequence number of its live entry) and skipped or dropped when it comes up.
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+
+from library.model.loan import Loan
+from library.persistence.storage import LibraryRepository
+
+# the heap is rebuilt without stale entries once they outnumber the live ones and this
+_COMPACT_MIN = 1024
+
+
+class DueDateScheduler:
+    def __init__(self, loans: Iterable[Loan] = ()):
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        # (due date, sequence number, loan)
+        self._heap: list[tuple[datetime, int, Loan]] = []
+        # loan id -> sequence number of its live entry
+        self._due: dict[str, int] = {}
+        self._attached = False
+        self._fill(loans)
+
+    @classmethod
+    def from_repository(cls) -> DueDateScheduler:
+        """A scheduler for the stored loans that follows all later writes, e.g. after a restart."""
+        scheduler = cls()
+        with scheduler._lock:
+            # attached under the lock, so that a write seen by the listener in the meantime
+            # waits for the fill and is applied after it
+            scheduler.attach()
+            scheduler._fill(LibraryRepository.read_loans())
+        return scheduler
+
+    def _fill(self, loans: Iterable[Loan]):
+        entries = []
+        for loan in loans:
+            if loan.due_date is not None:
+                sequence = next(self._sequence)
+                self._due[loan.id] = sequence
+                entries.append((loan.due_date, sequence, loan))
+        self._heap = entries
+        heapq.heapify(self._heap)
+
+    def attach(self):
+        """Follows the loans created, renewed and deleted through the repository."""
+        if not self._attached:
+            LibraryRepository.add_write_listener(self._written)
+            self._attached = True
+
+    def detach(self):
+        if self._attached:
+            LibraryRepository.remove_write_listener(self._written)
+            self._attached = False
+
+    def _written(self, operations: list[tuple[str, Any]]):
+        for operation, entity in operations:
+            if operation == "create_loan" or operation == "update_loan":
+                self.schedule(entity)
+            elif operation == "delete_loan":
+                self.unschedule(entity)
+            elif operation == "delete_user":
+                # a user is deleted with their loans
+                for loan in entity.borrowed_books:
+                    self.unschedule(loan)
+
+    def schedule(self, loan: Loan):
+        """Adds ``loan``, or moves it to its current due date."""
+        if loan.due_date is None:
+            return
+        with self._lock:
+            sequence = next(self._sequence)
+            rescheduled = self._due.get(loan.id) is not None
+            self._due[loan.id] = sequence
+            heapq.heappush(self._heap, (loan.due_date, sequence, loan))
+            if rescheduled:
+                # the old entry is stale now, as after a return
+                self._compact()
+
+    def unschedule(self, loan: Loan):
+        with self._lock:
+            if self._due.pop(loan.id, None) is not None:
+                self._compact()
+
+    def _compact(self):
+        if len(self._heap) > _COMPACT_MIN and len(self._heap) > 2 * len(self._due):
+            self._heap = [entry for entry in self._heap if self._live(entry)]
+            heapq.heapify(self._heap)
+
+    def _live(self, entry: tuple[datetime, int, Loan]) -> bool:
+        return self._due.get(entry[2].id) == entry[1]
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, loan: Loan) -> bool:
+        return loan.id in self._due
+
+    def next_due(self) -> Optional[Loan]:
+        """The loan that is due first, or ``None``."""
+        with self._lock:
+            while self._heap and not self._live(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][2] if self._heap else None
+
+    def due_by(self, moment: datetime) -> list[Loan]:
+        """The loans due at or before ``moment``, the earliest first.
+
+        Only the entries due by then and their children are visited, so the cost grows
+        with the number of loans found, not with all loans.
+        """
+        with self._lock:
+            heap = self._heap
+            found = []
+            pending = [0] if heap and heap[0][0] <= moment else []
+            while pending:
+                index = pending.pop()
+                entry = heap[index]
+                if self._live(entry):
+                    found.append(entry)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap) and heap[child][0] <= moment:
+                        pending.append(child)
+        found.sort(key=lambda entry: (entry[0], entry[1]))
+        return [loan for _, _, loan in found]
+
+    def overdue(self, now: Optional[datetime] = None) -> list[Loan]:
+        return self.due_by(now if now is not None else datetime.now())
+
+    def due_within(self, period: timedelta, now: Optional[datetime] = None) -> list[Loan]:
+        """The loans that are not overdue yet but will be within ``period``."""
+        now = now if now is not None else datetime.now()
+        return [loan for loan in self.due_by(now + period) if loan.due_date > now]
+
+    def renew_due(self, period: timedelta = timedelta(days=1), now: Optional[datetime] = None) -> list[Loan]:
+        """Renews the loans of ``due_within(period)`` and returns them; overdue loans are left alone."""
+        renewed = []
+        for loan in self.due_within(period, now):
+            with LibraryRepository.locked(loan.email):
+                # returned since it was found
+                if loan not in self:
+                    continue
+                try:
+                    renewed.append(loan.renew_rental())
+                except ValueError:
+                    continue
+        return renewed
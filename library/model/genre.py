@@ -1,4 +1,7 @@
-from enum import Enum
+from __future__ import annotations
+from enum import Enum, IntFlag
+from functools import lru_cache
+from typing import Iterable, Iterator, Sequence
 
 
 class Genre(Enum):
@@ -34,3 +37,62 @@ class Genre(Enum):
     COOKING = "Cooking"
     MEMOIR = "Memoir"
     POETRY = "Poetry"
+
+
+# one bit per Genre, in the order of Genre, so a book's genres fit into one shared int
+GenreFlag = IntFlag("GenreFlag", [genre.name for genre in Genre])
+_FLAGS = [(GenreFlag[genre.name], genre) for genre in Genre]
+
+
+def genre_flags(genres: Iterable[Genre]) -> GenreFlag:
+    flags = GenreFlag(0)
+    for genre in genres:
+        flags |= GenreFlag[genre.name]
+    return flags
+
+
+class Genres(Sequence):
+    """The genres of a book, in the order they were given: a read-only sequence that compares
+    equal to a list or tuple of the same genres."""
+
+    __slots__ = ("_genres",)
+
+    def __init__(self, genres: tuple[Genre, ...]):
+        self._genres = genres
+
+    def __getitem__(self, index):
+        return self._genres[index]
+
+    def __len__(self) -> int:
+        return len(self._genres)
+
+    def __iter__(self) -> Iterator[Genre]:
+        return iter(self._genres)
+
+    def __contains__(self, genre) -> bool:
+        return genre in self._genres
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Genres):
+            return self._genres == other._genres
+        if isinstance(other, (list, tuple)):
+            return self._genres == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._genres)
+
+    def __repr__(self) -> str:
+        return repr(list(self._genres))
+
+
+@lru_cache(maxsize=4096)
+def shared_genres(genres: tuple[Genre, ...]) -> Genres:
+    """The ``Genres`` of ``genres``, the same object for equal tuples, so that books with the same genres share one."""
+    return Genres(genres)
+
+
+@lru_cache(maxsize=4096)
+def genres_of(flags: GenreFlag) -> tuple[Genre, ...]:
+    """The genres set in ``flags``, in the order of ``Genre``."""
+    return tuple(genre for flag, genre in _FLAGS if flags & flag)
@@ -0,0 +1,155 @@
+"""Hold queues for paper books that have no copy left.
+
+    position = user.place_hold(book)            # 1 when next in line
+    hold_queues.add_listener(lambda book, email: notify(email, book.title))
+
+Users wait per ISBN, first come first served, instead of polling ``can_borrow``. A returned
+copy does not go back to the shelf while someone waits: ``Book.return_book`` sets it aside
+for the head of the queue, and the listeners hear of it once the return is written and
+every lock is released. That user's next ``borrow_book`` takes the copy set aside.
+
+A copy set aside is stored with the book, in ``Book.set_aside``, so it survives a restart.
+It stays counted as lent for ``claim_period`` seconds; after that the next borrow, return
+or hold of the book passes it on to the next in line or puts it back on the shelf, and
+``library.model.book.release_expired_holds()`` does so for every book.
+
+A queue position is the user's ticket minus the ticket of the head, less the tickets given
+up in between, so it is found without walking the queue. The queues themselves live in the
+memory of the process, like the locks of ``LibraryRepository.locked``: after a restart
+users have to place their holds again.
+"""
+from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+
+
+class _HoldQueue:
+    __slots__ = ("tickets", "next_ticket", "cancelled")
+
+    def __init__(self):
+        # email -> ticket, the head first
+        self.tickets: OrderedDict[str, int] = OrderedDict()
+        self.next_ticket = 0
+        # sorted tickets of the users who left from behind the head, all after the head
+        self.cancelled: list[int] = []
+
+    def head(self) -> int:
+        return next(iter(self.tickets.values()))
+
+    def pruned(self):
+        """Called after the head left: forgets the tickets given up before the new head."""
+        if self.cancelled and self.tickets and self.cancelled[0] < self.head():
+            del self.cancelled[:bisect_left(self.cancelled, self.head())]
+
+    def position(self, ticket: int) -> int:
+        head = self.head()
+        return ticket - head - bisect_right(self.cancelled, ticket) + 1
+
+
+class HoldQueues:
+    def __init__(self, claim_period: float = 3 * 24 * 3600, clock: Callable[[], float] = time.time):
+        # seconds a copy stays set aside
+        self.claim_period = claim_period
+        # seconds since the epoch, as the deadlines are stored
+        self.clock = clock
+        self._lock = threading.Lock()
+        # isbn -> users waiting for a copy
+        self._queues: dict[str, _HoldQueue] = {}
+        self._listeners: list[Callable[[Book, str], None]] = []
+
+    def add_listener(self, listener: Callable[[Book, str], None]):
+        """Calls ``listener(book, email)`` whenever a copy of ``book`` has been set aside for ``email``."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Book, str], None]):
+        self._listeners.remove(listener)
+
+    def clear(self):
+        with self._lock:
+            self._queues.clear()
+
+    def claim_deadline(self) -> float:
+        """Until when a copy set aside now can be collected."""
+        return self.clock() + self.claim_period
+
+    def join(self, isbn: str, email: str) -> int:
+        """Queues ``email`` for the book and returns the position, or the current one if already queued."""
+        with self._lock:
+            position = self._position(isbn, email)
+            if position is not None:
+                return position
+            queue = self._queues.get(isbn)
+            if queue is None:
+                queue = self._queues[isbn] = _HoldQueue()
+            queue.tickets[email] = queue.next_ticket
+            queue.next_ticket += 1
+            return queue.position(queue.next_ticket - 1)
+
+    def leave(self, isbn: str, email: str) -> bool:
+        """Takes ``email`` out of the queue; false if not queued. A copy set aside is left to ``cancel_hold``."""
+        with self._lock:
+            queue = self._queues.get(isbn)
+            if queue is None or email not in queue.tickets:
+                return False
+            head = queue.head()
+            ticket = queue.tickets.pop(email)
+            if not queue.tickets:
+                del self._queues[isbn]
+            elif ticket == head:
+                queue.pruned()
+            else:
+                insort(queue.cancelled, ticket)
+            return True
+
+    def position(self, isbn: str, email: str) -> Optional[int]:
+        """1 for the head of the queue, None if not waiting."""
+        with self._lock:
+            return self._position(isbn, email)
+
+    def _position(self, isbn: str, email: str) -> Optional[int]:
+        queue = self._queues.get(isbn)
+        if queue is None or email not in queue.tickets:
+            return None
+        return queue.position(queue.tickets[email])
+
+    def waiting(self, isbn: str) -> int:
+        queue = self._queues.get(isbn)
+        return len(queue.tickets) if queue is not None else 0
+
+    def hand_over(self, isbn: str) -> Optional[str]:
+        """Takes the head of the queue out for a copy set aside and returns its email, or None if nobody waits."""
+        with self._lock:
+            queue = self._queues.get(isbn)
+            if queue is None:
+                return None
+            email, _ = queue.tickets.popitem(last=False)
+            if not queue.tickets:
+                del self._queues[isbn]
+            else:
+                queue.pruned()
+            return email
+
+    def put_back(self, isbn: str, email: str):
+        """Undoes ``hand_over``: the user is the head of the queue again."""
+        with self._lock:
+            queue = self._queues.get(isbn)
+            if queue is None:
+                queue = self._queues[isbn] = _HoldQueue()
+                queue.next_ticket = 1
+                queue.tickets[email] = 0
+            else:
+                queue.tickets[email] = queue.head() - 1
+                queue.tickets.move_to_end(email, last=False)
+
+    def notify(self, book: Book, email: str):
+        for listener in list(self._listeners):
+            listener(book, email)
+
+
+hold_queues = HoldQueues()
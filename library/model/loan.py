@@ -0,0 +1,49 @@
+from __future__ import annotations
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+
+from library.persistence.storage import LibraryRepository
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+
+LOAN_PERIOD = timedelta(days=7)
+
+
+class Loan:
+    """One copy of a book lent to one user, stored on its own and indexed by user and by book.
+
+    The due date and the fee belong to the loan, not to the catalogue ``Book``, which many
+    users can borrow at the same time. The user is referred to by email only.
+    """
+
+    __slots__ = ("id", "book", "email", "due_date", "current_fee", "__weakref__")
+
+    def __init__(self, book: Book, email: str, due_date: Optional[datetime], current_fee: float,
+                 id: Optional[str] = None):
+        self.id = id if id is not None else str(uuid.uuid4())
+        self.book = book
+        self.email = email
+        self.due_date = due_date
+        self.current_fee = current_fee
+
+    @classmethod
+    def start(cls, book: Book, email: str) -> Loan:
+        """A loan of ``book`` for one week, starting now."""
+        return cls(book, email, datetime.now() + LOAN_PERIOD, book.get_weekly_fee())
+
+    @property
+    def isbn(self) -> str:
+        return self.book.isbn
+
+    def renew_rental(self) -> Loan:
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "due_date", "current_fee")
+            self.due_date += LOAN_PERIOD
+            self.current_fee += self.book.get_weekly_fee()
+            LibraryRepository.update_loan(self)
+        return self
+
+    def __repr__(self):
+        return f"Loan({self.isbn!r}, {self.email!r}, {self.due_date!r}, {self.current_fee!r})"
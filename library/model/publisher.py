@@ -1,5 +1,6 @@
 class Publisher:
     name: str
+    __slots__ = ("name", "__weakref__")
 
     def __init__(self, name):
         self.name = name
@@ -9,3 +10,6 @@ class Publisher:
         if isinstance(other, Publisher):
             return self.name == other.name
         return NotImplemented
+
+    def __hash__(self):
+        return hash(self.name)
@@ -0,0 +1,241 @@
+"""Recommendations of the "readers also read" kind, from the users' reading history.
+
+    recommender = Recommender.from_repository()
+    recommender.also_read("0465050654")        # the books read most often with it
+    recommender.recommend("reader@test.org")     # for a user, from the books they read last
+
+Every returned book is one read. The recommender listens to the repository's writes, so
+``User.return_books`` updates it as it happens: each book a user update adds to the user's
+``read_books`` is counted as read together with each of the last ``history`` books that
+user read before it. A re-read of one of them counts once. A loan deleted without a return
+is not a read.
+
+Each book keeps a bounded row of the books read with it and how often. A row may grow to
+twice ``neighbours`` before it is cut back to the ``neighbours`` books read with it most
+often, so memory and the cost of a read do not grow with the reading history. Counts of
+the pairs cut away start over; those that are common keep their counts.
+
+Rows are ranked by the cosine of the two books' readers, ``together / sqrt(readers_a *
+readers_b)``, raised by up to ``genre_weight`` for shared genres: for ``also_read`` the
+share of the two books' genres they have in common, for ``recommend`` the largest share of
+the user's recent reads in one of the book's genres.
+"""
+from __future__ import annotations
+import heapq
+import math
+import threading
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, NamedTuple, Optional
+
+from library.model.book import Book
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+
+
+class Recommendation(NamedTuple):
+    isbn: str
+    score: float
+
+
+class Recommender:
+    def __init__(self, neighbours: int = 50, history: int = 50, genre_weight: float = 0.25):
+        if neighbours < 1 or history < 1:
+            raise ValueError("Rows and histories need room for at least one book")
+        self.neighbours = neighbours
+        self.history = history
+        self.genre_weight = genre_weight
+        self._lock = threading.Lock()
+        # isbn -> item; the items index the lists below
+        self._items: dict[str, int] = {}
+        # None once the book has been deleted
+        self._isbns: list[Optional[str]] = []
+        self._readers: list[int] = []
+        self._genres: list[int] = []
+        # item -> {other item: times read together}
+        self._rows: list[dict[int, int]] = []
+        # email -> the items read last, the latest last
+        self._histories: dict[str, list[int]] = {}
+        # email -> how many of the user's read_books have been counted
+        self._counted: dict[str, int] = {}
+        self._attached = False
+
+    @classmethod
+    def from_repository(cls, **options) -> Recommender:
+        """A recommender for the stored reading histories that follows all later returns."""
+        recommender = cls(**options)
+        with recommender._lock:
+            # a return seen by the listener in the meantime waits for the histories
+            recommender.attach()
+            for user in LibraryRepository.read_users():
+                recommender._record_read(user)
+        return recommender
+
+    def attach(self):
+        """Follows the returns and the catalogue through the repository."""
+        if not self._attached:
+            LibraryRepository.add_write_listener(self._written)
+            self._attached = True
+
+    def detach(self):
+        if self._attached:
+            LibraryRepository.remove_write_listener(self._written)
+            self._attached = False
+
+    def _written(self, operations: list[tuple[str, Any]]):
+        for operation, entity in operations:
+            if operation == "update_user":
+                with self._lock:
+                    self._record_read(entity)
+            elif operation == "delete_user":
+                with self._lock:
+                    self._counted.pop(entity.email, None)
+            elif operation == "update_book":
+                self._regenre(entity)
+            elif operation == "delete_book":
+                self.forget(entity.isbn)
+
+    def record(self, email: str, book: Book):
+        """Counts one read of ``book`` by ``email``."""
+        with self._lock:
+            self._record(email, book)
+
+    def _record_read(self, user: User):
+        # a return grows read_books; the update of a user first seen counts the whole history
+        counted = self._counted.get(user.email, 0)
+        for book in user.read_books[counted:]:
+            self._record(user.email, book)
+        self._counted[user.email] = len(user.read_books)
+
+    def _record(self, email: str, book: Book):
+        item = self._item(book)
+        recent = self._histories.get(email)
+        if recent is None:
+            recent = self._histories[email] = []
+        elif item in recent:
+            return
+        self._readers[item] += 1
+        rows, isbns = self._rows, self._isbns
+        row = rows[item]
+        limit = 2 * self.neighbours
+        for other in recent:
+            if isbns[other] is None:
+                continue
+            row[other] = row.get(other, 0) + 1
+            other_row = rows[other]
+            other_row[item] = other_row.get(item, 0) + 1
+            if len(other_row) > limit:
+                self._cut(other_row)
+        if len(row) > limit:
+            self._cut(row)
+        recent.append(item)
+        if len(recent) > self.history:
+            del recent[0]
+
+    def _item(self, book: Book) -> int:
+        item = self._items.get(book.isbn)
+        if item is None:
+            item = self._items[book.isbn] = len(self._isbns)
+            self._isbns.append(book.isbn)
+            self._readers.append(0)
+            self._genres.append(int(book.genre_flags))
+            self._rows.append({})
+        return item
+
+    def _cut(self, row: dict[int, int]):
+        kept = heapq.nlargest(self.neighbours, row.items(), key=itemgetter(1))
+        row.clear()
+        row.update(kept)
+
+    def _regenre(self, book: Book):
+        with self._lock:
+            item = self._items.get(book.isbn)
+            if item is not None:
+                self._genres[item] = int(book.genre_flags)
+
+    def forget(self, isbn: str):
+        """Leaves a book deleted from the catalogue out of all recommendations."""
+        with self._lock:
+            item = self._items.pop(isbn, None)
+            if item is not None:
+                self._isbns[item] = None
+                self._rows[item] = {}
+
+    def readers(self, isbn: str) -> int:
+        """How many reads of the book have been counted."""
+        item = self._items.get(isbn)
+        return self._readers[item] if item is not None else 0
+
+    def also_read(self, isbn: str, k: int = 10) -> list[Recommendation]:
+        """The ``k`` books best ranked among those read together with ``isbn``, the best first."""
+        with self._lock:
+            item = self._items.get(isbn)
+            if item is None:
+                return []
+            readers, genres, isbns = self._readers, self._genres, self._isbns
+            genre, weight = genres[item], self.genre_weight
+            norm = math.sqrt(readers[item])
+            scored = []
+            for other, together in self._rows[item].items():
+                if isbns[other] is None:
+                    continue
+                score = together / (norm * math.sqrt(readers[other]))
+                if genre != genres[other]:
+                    score *= 1 + weight * _overlap(genre, genres[other])
+                elif genre:
+                    score *= 1 + weight
+                scored.append((-score, isbns[other]))
+        return _best(scored, k)
+
+    def recommend(self, email: str, k: int = 10) -> list[Recommendation]:
+        """The ``k`` books best ranked for the user's recent reads that the user has not read
+        lately, the best first."""
+        with self._lock:
+            recent = self._histories.get(email)
+            if not recent:
+                return []
+            readers, genres, isbns = self._readers, self._genres, self._isbns
+            seen = set(recent)
+            totals: dict[int, float] = {}
+            for item in recent:
+                if isbns[item] is None:
+                    continue
+                norm = math.sqrt(readers[item])
+                for other, together in self._rows[item].items():
+                    if other not in seen and isbns[other] is not None:
+                        totals[other] = totals.get(other, 0.0) + together / (norm * math.sqrt(readers[other]))
+            # bit -> the share of the recent reads that have that genre, times genre_weight
+            affinity: dict[int, float] = {}
+            for item in recent:
+                genre = genres[item]
+                while genre:
+                    bit = genre & -genre
+                    affinity[bit] = affinity.get(bit, 0.0) + self.genre_weight / len(recent)
+                    genre ^= bit
+            # genres -> the raise of a book with those genres
+            raises: dict[int, float] = {}
+            scored = []
+            for other, total in totals.items():
+                genre = genres[other]
+                factor = raises.get(genre)
+                if factor is None:
+                    factor, rest = 0.0, genre
+                    while rest:
+                        bit = rest & -rest
+                        factor = max(factor, affinity.get(bit, 0.0))
+                        rest ^= bit
+                    factor = raises[genre] = 1 + factor
+                scored.append((-total * factor, isbns[other]))
+        return _best(scored, k)
+
+
+@lru_cache(maxsize=4096)
+def _overlap(genres: int, other: int) -> float:
+    """The share of the genres of two books that both have."""
+    either = genres | other
+    return bin(genres & other).count("1") / bin(either).count("1") if either else 0.0
+
+
+def _best(scored: list[tuple[float, str]], k: int) -> list[Recommendation]:
+    # (-score, isbn): ties go to the smaller ISBN, so the order does not depend on the order of the reads
+    return [Recommendation(isbn, -score) for score, isbn in heapq.nsmallest(k, scored)]
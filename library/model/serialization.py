@@ -0,0 +1,129 @@
+"""Text forms of a book as returned by ``Book.serialize``.
+
+``serialize_book`` keeps the last JSON and XML form of a book together with the stamp
+of the book and the author stamp it was made at. Setting a field that shows in the
+output (ISBN, title, authors, item counts) gives the book a new stamp, renaming any
+author a new author stamp, and the book is encoded again on the next call, however the
+change was made: ``borrow_book``/``return_book``, a rollback, a refresh from the backend
+or a renamed author. Other changes do not. A stamp is never handed out twice, so a
+rollback that restores an older stamp never matches a form made in between. The
+``authors`` list has to be assigned again for a change in place to show.
+"""
+from __future__ import annotations
+import itertools
+import json
+from json.encoder import encode_basestring_ascii
+from xml.sax.saxutils import escape
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+
+JsonEncoder = Callable[[dict], Union[str, bytes]]
+
+# what ElementTree escapes in attribute values besides &, < and >
+_ATTRIBUTE_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}
+
+_json_encoder: Optional[JsonEncoder] = None
+
+_stamps = itertools.count(1)
+# the stamp of the last renamed author, if any
+_author_stamp = 0
+
+
+def new_stamp() -> int:
+    """A stamp for a book whose serialized fields changed."""
+    return next(_stamps)
+
+
+def author_renamed():
+    """Called for every new first or last name of an author, which any book may show."""
+    global _author_stamp
+    _author_stamp = next(_stamps)
+
+
+def use_json_encoder(encoder: Optional[JsonEncoder]):
+    """Encodes ``serialize("JSON")`` with ``encoder(book_info)``; ``None`` restores the built-in encoder.
+
+    The built-in encoder writes exactly what ``json.dumps`` writes. The encoder returned by
+    ``fast_json_encoder`` is faster but writes compact JSON with unescaped non-ASCII characters.
+    """
+    global _json_encoder
+    _json_encoder = encoder
+
+
+def fast_json_encoder() -> Optional[JsonEncoder]:
+    """``orjson.dumps`` if orjson is installed, else ``None``."""
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson.dumps
+
+
+def _json(value) -> str:
+    # what json.dumps() writes for the value, without its generic dispatch
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+def book_json(book: Book) -> str:
+    """``book.serialize("JSON")`` without the cache."""
+    if _json_encoder is not None:
+        text = _json_encoder(
+            {
+                "id": book.isbn,
+                "title": book.title,
+                "authors": [author.get_fullname() for author in book.authors],
+                "available_items": book.existing_items - book.borrowed_items,
+                "borrowed_items": book.borrowed_items,
+            }
+        )
+        return text.decode() if isinstance(text, bytes) else text
+    return (
+        f'{{"id": {_json(book.isbn)}, "title": {_json(book.title)}, '
+        f'"authors": [{", ".join([_json(author.get_fullname()) for author in book.authors])}], '
+        f'"available_items": {_json(book.existing_items - book.borrowed_items)}, '
+        f'"borrowed_items": {_json(book.borrowed_items)}}}'
+    )
+
+
+def _xml_element(tag: str, text) -> str:
+    # ElementTree writes elements without text as empty-element tags
+    if not text:
+        return f"<{tag} />"
+    return f"<{tag}>{escape(text)}</{tag}>"
+
+
+def book_xml(book: Book) -> str:
+    """``book.serialize("XML")`` without the cache; what ``et.tostring`` writes for the ``<book>`` element."""
+    return (
+        f'<book id="{escape(book.isbn, _ATTRIBUTE_ENTITIES)}">'
+        f"{_xml_element('title', book.title)}"
+        f"{_xml_element('authors', ', '.join([author.get_fullname() for author in book.authors]))}"
+        f"{_xml_element('available', str(book.existing_items - book.borrowed_items))}"
+        f"{_xml_element('borrowed', str(book.borrowed_items))}"
+        "</book>"
+    )
+
+
+def serialize_book(book: Book, format: str) -> str:
+    if format == "JSON":
+        encode = book_json
+    elif format == "XML":
+        encode = book_xml
+    else:
+        raise ValueError(format)
+    key = (book._stamp, _author_stamp, _json_encoder if format == "JSON" else None)
+    serialized = book._serialized
+    if serialized is None:
+        serialized = book._serialized = {}
+    cached = serialized.get(format)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    text = encode(book)
+    serialized[format] = (key, text)
+    return text
@@ -1,8 +1,22 @@
-from typing import Optional
-from library.model.book import Book
+from typing import Iterable, NamedTuple, Optional, Union
+from library.model.book import Book, reserve_books
+from library.model.borrowed_books import BorrowedBooks
 from library.model.genre import Genre
+from library.model.holds import hold_queues
+from library.model.loan import Loan
 from library.persistence.storage import LibraryRepository
 
+# reading credits per genre of a returned book, see also library.payment.pricing
+READING_CREDITS = {Genre.HISTORY: 1, Genre.MEDICINE: 2, Genre.SOCIOLOGY: 2}
+
+
+class BorrowOutcome(NamedTuple):
+    book: Book
+    # None if the book was not lent
+    loan: Optional[Loan]
+    # whether a copy was free; false for the books that kept an all-or-nothing borrow from happening
+    available: bool
+
 
 class User:
     # email: str
@@ -16,7 +30,22 @@ class User:
     # area_code: str
     # landline_number: str
     # mobile_number2: str
-    reading_credits: int = 0
+    __slots__ = (
+        "email",
+        "firstname",
+        "lastname",
+        "mobile_number1",
+        "mobile_number2",
+        "area_code",
+        "landline_number",
+        "country_calling_code",
+        "_borrowed_books",
+        "read_books",
+        "invoices",
+        "reading_credits",
+        "version",
+        "__weakref__",
+    )
 
     def __init__(self, email: str, firstname: str, lastname: str, mob1: str, mob2: str, area_code: str,
                  landline: str, country_code: str):
@@ -28,54 +57,166 @@ class User:
         self.area_code = area_code
         self.landline_number = landline
         self.country_calling_code = country_code
-        self.borrowed_books = []
+        self.borrowed_books = BorrowedBooks()
         self.read_books = []
         self.invoices = []
+        self.reading_credits = 0
+        self.version = 0
+
+    @property
+    def borrowed_books(self) -> BorrowedBooks:
+        return self._borrowed_books
+
+    @borrowed_books.setter
+    def borrowed_books(self, loans: Iterable[Loan]):
+        # kept keyed by ISBN, whatever is assigned
+        self._borrowed_books = loans if isinstance(loans, BorrowedBooks) else BorrowedBooks(loans)
 
-    def borrow_book(self, book: Book) -> Optional[Book]:
+    def _refresh(self, books: list[Book]):
+        LibraryRepository.refresh_user(self)
+        for book in books:
+            LibraryRepository.refresh_book(book)
+
+    def borrow_book(self, book: Book) -> Optional[Loan]:
         try:
-            if book.can_borrow():
-                borrowed_book = book.borrow_book()
-                self.borrowed_books.append(borrowed_book)
-                LibraryRepository.update_user(self)
-                return borrowed_book
-            return None
+            # the locks are held until the transaction has been written
+            with LibraryRepository.locked(book.isbn, self.email):
+                return LibraryRepository.retry_on_conflict(lambda: self._borrow_book(book), lambda: self._refresh([book]))
         except AttributeError:
             return None
         except ValueError:
             return None
 
-    def return_books(self, books: list[Book]):
-        from library.payment.invoice import Invoice
-
-        invoice: Invoice = Invoice(self)
-        for borrowed_book in books:
-            if borrowed_book in self.borrowed_books:
-                invoice.add_book(borrowed_book)
-                self.borrowed_books.remove(borrowed_book)
-                book = borrowed_book.return_book()
-                self.read_books.append(book)
+    def _borrow_book(self, book: Book) -> Optional[Loan]:
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(book, "borrowed_items", "set_aside")
+            if book.set_aside:
+                # copies not collected in time go to the next in line or back to the shelf first
+                book.release_expired()
+            if book.collect(self.email):
+                # the copy set aside for the user is still counted as lent
                 LibraryRepository.update_book(book)
-        if len(invoice.books) > 0:
-            LibraryRepository.create_invoice(invoice)
-            self.invoices.append(invoice)
+            elif book.can_borrow():
+                book.borrow_book()
+            else:
+                return None
+            loan = Loan.start(book, self.email)
+            LibraryRepository.create_loan(loan)
+            self.borrowed_books.append(loan)
+            # undone instead of tracked, which would copy all loans of the user on every borrow
+            unit_of_work.on_rollback(lambda: self.borrowed_books.remove(loan))
             LibraryRepository.update_user(self)
-            return invoice
-        else:
-            return None
+            return loan
+
+    def place_hold(self, book: Book) -> int:
+        """Queues the user for a copy of ``book`` and returns the position, 1 being next in line
+        and 0 if a copy is set aside for the user already.
+
+        Raises ValueError if the book can be borrowed right away.
+        """
+        with LibraryRepository.locked(book.isbn):
+            if book.set_aside:
+                book.release_expired()
+            if book.is_set_aside_for(self.email):
+                return 0
+            if book.can_borrow():
+                raise ValueError("Book can be borrowed")
+            return hold_queues.join(book.isbn, self.email)
 
-    def get_reading_credits(self, books: list[Book]) -> int:
+    def hold_position(self, book: Book) -> Optional[int]:
+        """The position in the queue for ``book``, 0 if a copy is set aside for the user, None if not waiting."""
+        if book.is_set_aside_for(self.email):
+            return 0
+        return hold_queues.position(book.isbn, self.email)
+
+    def cancel_hold(self, book: Book) -> bool:
+        """Leaves the queue for ``book``; a copy set aside goes to the next in line or back to the shelf."""
+        with LibraryRepository.locked(book.isbn):
+            if hold_queues.leave(book.isbn, self.email):
+                return True
+            return book.pass_on(self.email)
+
+    def borrow_books(self, books: list[Book], partial: bool = False) -> list[BorrowOutcome]:
+        """Borrows all ``books`` in one transaction that writes every book and the user once.
+
+        Unless ``partial``, either every book is lent or none is. The outcomes come in the
+        order of ``books``; a book listed twice is lent twice.
+        """
+        unique = list({id(book): book for book in books}.values())
+        with LibraryRepository.locked(self.email, *{book.isbn for book in unique}):
+            return LibraryRepository.retry_on_conflict(
+                lambda: self._borrow_books(books, partial), lambda: self._refresh(unique)
+            )
+
+    def _borrow_books(self, books: list[Book], partial: bool) -> list[BorrowOutcome]:
+        with LibraryRepository.transaction() as unit_of_work:
+            available = reserve_books(books, partial, self.email)
+            lend = partial or all(available)
+            lent: list[Loan] = []
+            unit_of_work.on_rollback(lambda: self._undo_borrow(lent))
+            outcomes = []
+            for book, free in zip(books, available):
+                loan = None
+                if free and lend:
+                    loan = Loan.start(book, self.email)
+                    LibraryRepository.create_loan(loan)
+                    self.borrowed_books.append(loan)
+                    lent.append(loan)
+                outcomes.append(BorrowOutcome(book, loan, free))
+            if any(outcome.loan is not None for outcome in outcomes):
+                LibraryRepository.update_user(self)
+            return outcomes
+
+    def _undo_borrow(self, loans: list[Loan]):
+        for loan in loans:
+            self.borrowed_books.remove(loan)
+
+    def return_books(self, books: list[Union[Loan, Book]]):
+        """Returns the given loans, or for a book one loan of it, and invoices them."""
+        returned = [_book_of(item) for item in books if item is not None]
+        with LibraryRepository.locked(self.email, *[book.isbn for book in returned]):
+            return LibraryRepository.retry_on_conflict(
+                lambda: self._return_books(books),
+                lambda: self._refresh(returned),
+            )
+
+    def _return_books(self, items: list[Union[Loan, Book]]):
+        from library.payment.invoice import Invoice
+
+        with LibraryRepository.transaction() as unit_of_work:
+            invoice: Invoice = Invoice(self)
+            # undone loan by loan instead of tracked: copying the user's lists would make
+            # every return cost as much as all loans and the whole reading history
+            read = len(self.read_books)
+            unit_of_work.on_rollback(lambda: self._undo_return(invoice, read))
+            for item in items:
+                loan = self.borrowed_books.loan_of(item)
+                if loan is not None:
+                    invoice.add_loan(loan)
+                    self.borrowed_books.remove(loan)
+                    LibraryRepository.delete_loan(loan)
+                    unit_of_work.track(loan.book, "borrowed_items")
+                    self.read_books.append(loan.book.return_book())
+            if len(invoice.loans) > 0:
+                LibraryRepository.create_invoice(invoice)
+                self.invoices.append(invoice)
+                LibraryRepository.update_user(self)
+                return invoice
+            else:
+                return None
+
+    def _undo_return(self, invoice, read: int):
+        if self.invoices and self.invoices[-1] is invoice:
+            self.invoices.pop()
+        for loan in invoice.loans:
+            self.borrowed_books.append(loan)
+        del self.read_books[read:]
+
+    def get_reading_credits(self, books: Iterable[Book]) -> int:
         reading_credits: int = 0
         for book in books:
             for genre in book.genres:
-                if genre == Genre.HISTORY:
-                    reading_credits += 1
-                elif genre == Genre.MEDICINE:
-                    reading_credits += 2
-                elif genre == Genre.SOCIOLOGY:
-                    reading_credits += 2
-                else:
-                    reading_credits += 0
+                reading_credits += READING_CREDITS.get(genre, 0)
         return reading_credits
 
     def __eq__(self, other):
@@ -84,8 +225,11 @@ class User:
             return self.email == other.email
         return NotImplemented
 
+    def __hash__(self):
+        return hash(self.email)
+
     def __str__(self):
-        borrowed_books = "\n".join(str(book) for book in self.borrowed_books)
+        borrowed_books = "\n".join(str(loan.book) for loan in self.borrowed_books)
         read_books = "\n".join(str(book) for book in self.read_books)
         return f"""{self.firstname}, {self.lastname} ({self.email}): {self.country_calling_code}{self.area_code}/{self.landline_number}
             _______BORROWED BOOKS________
@@ -95,3 +239,7 @@ class User:
 
             Open invoices: {[x.id for x in self.invoices]}
         """
+
+
+def _book_of(item: Union[Loan, Book]) -> Book:
+    return item.book if isinstance(item, Loan) else item
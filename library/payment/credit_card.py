@@ -1,4 +1,5 @@
 from datetime import datetime
+import threading
 
 
 class CreditCard:
@@ -14,10 +15,19 @@ class CreditCard:
         self._valid_date = date
         self._cvv = cvv
         self._valid = self.check_validity()
+        self._lock = threading.Lock()
 
     def is_valid(self) -> bool:
         return self._valid
 
+    def debit(self, amount: float) -> bool:
+        """Takes ``amount`` from the limit if it is high enough; the check and the debit are one step."""
+        with self._lock:
+            if self.amount < amount:
+                return False
+            self.amount -= amount
+            return True
+
     def check_validity(self) -> bool:
         # Dummy validation
         return (
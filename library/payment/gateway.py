@@ -0,0 +1,83 @@
+"""Local stand-in for a remote payment gateway, to run and benchmark payments offline.
+
+    gateway = SimulatedGateway(latency=0.05, jitter=0.02, error_rate=0.01, lost_response_rate=0.01)
+
+Every charge waits ``latency`` plus up to ``jitter`` seconds, half of it before the money
+moves and half after. ``error_rate`` of the requests fail before anything is charged;
+``lost_response_rate`` of them are charged, but the answer never arrives, just like a
+request that times out on its way back. Charges are idempotent by key: a key that was
+charged before returns the earlier result without charging again, which is what makes
+retries safe. Declines are not remembered, so an invoice can be paid with another method.
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import random
+from typing import Awaitable, Callable, NamedTuple, Optional, Union
+
+
+class GatewayError(Exception):
+    """A transient failure; the request may be retried with the same idempotency key."""
+
+
+class GatewayStats(NamedTuple):
+    requests: int
+    charges: int
+    declines: int
+    errors: int
+    lost_responses: int
+    # requests answered from the idempotency keys
+    replays: int
+
+
+class SimulatedGateway:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        lost_response_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lost_response_rate = lost_response_rate
+        self._random = random.Random(seed)
+        self._charged: set[str] = set()
+        self._requests = self._charges = self._declines = self._errors = self._lost_responses = self._replays = 0
+
+    def _half_latency(self) -> float:
+        return (self.latency + self._random.uniform(0, self.jitter)) / 2
+
+    async def charge(self, idempotency_key: str, settle: Callable[[], Union[bool, Awaitable[bool]]]) -> bool:
+        """Charges once per key; ``settle()`` moves the money at the provider and returns, or is awaited
+        for, whether it was approved."""
+        self._requests += 1
+        await asyncio.sleep(self._half_latency())
+        if idempotency_key in self._charged:
+            self._replays += 1
+        else:
+            if self._random.random() < self.error_rate:
+                self._errors += 1
+                raise GatewayError("503 Service Unavailable")
+            approved = settle()
+            if inspect.isawaitable(approved):
+                approved = await approved
+            if not approved:
+                self._declines += 1
+                await asyncio.sleep(self._half_latency())
+                return False
+            self._charged.add(idempotency_key)
+            self._charges += 1
+            if self._random.random() < self.lost_response_rate:
+                self._lost_responses += 1
+                await asyncio.sleep(self._half_latency())
+                raise GatewayError("connection reset after the charge")
+        await asyncio.sleep(self._half_latency())
+        return True
+
+    def stats(self) -> GatewayStats:
+        return GatewayStats(
+            self._requests, self._charges, self._declines, self._errors, self._lost_responses, self._replays
+        )
@@ -1,85 +1,167 @@
 from datetime import datetime
+import logging
 import uuid
 
-from typing import Optional
+from typing import NamedTuple, Optional, Union
 
 from library.model.user import User
 from library.model.book import Book
+from library.model.loan import Loan
+from library.payment import payment_ledger
 from library.payment.credit_card import CreditCard
-from library.payment.paypal import PAYPAL_ACCOUNT_BALANCE, PAYPAL_DATA_BASE, Paypal
+from library.payment.paypal import PAYPAL_DATA_BASE, PAYPAL_LEDGER, Paypal
+from library.persistence.locking import LockStripes
 from library.persistence.storage import LibraryRepository
 
+logger = logging.getLogger(__name__)
+
+# see also library.payment.pricing, which prices many invoices at once
+PRICE_PER_BOOK: float = 3.55
+MIN_BOOKS_FOR_DISCOUNT: int = 3
+DISCOUNT_PER_BOOK: float = 0.5
+DISCOUNT_PER_READING_CREDIT: float = 0.5
+
+# held by invoice id across a charge, which may wait for a slow gateway. Apart from the
+# repository locks, so that borrows and returns never wait for a payment; always taken first.
+_charge_locks = LockStripes()
+
+
+class InvoiceTotals(NamedTuple):
+    price: float
+    discount: float
+    # rounded and never below zero
+    total: float
+    reading_credits: int
+
 
 class Invoice:
 
     id: str
-    books: list[Book]
+    loans: list[Loan]
     customer: User
-    is_closed: bool = False
+    is_closed: bool
+    __slots__ = ("id", "customer", "loans", "is_closed", "version", "_totals", "__weakref__")
 
     def __init__(self, user: User):
         self.id = str(uuid.uuid4())
         self.customer = user
-        self.books = []
+        # the returned loans, each with the fee it accrued
+        self.loans = []
+        self.is_closed = False
+        self.version = 0
+        # ((user, its reading credits, loans, number of loans), totals) of the last totals()
+        self._totals = None
 
-    def add_book(self, book: Book):
-        self.books.append(book)
+    @property
+    def books(self) -> tuple[Book, ...]:
+        return tuple(loan.book for loan in self.loans)
+
+    def add_loan(self, loan: Loan):
+        self.loans.append(loan)
+        self._totals = None
 
     def __str__(self):
-        invoice_books = "\n".join(str(book) + ": " + str(book.current_fee) for book in self.books)
+        invoice_books = "\n".join(str(loan.book) + ": " + str(loan.current_fee) for loan in self.loans)
+        totals = self.totals()
         return f"""-- Invoice (id: {self.id}) --
             This is the invoice for customer '{self.customer.firstname} {self.customer.lastname}' ({self.customer.email})
-            Returned books: {len(self.books)}
+            Returned books: {len(self.loans)}
 
             {invoice_books}
 
             -----------------------------------------
 
-            Total amount after discount: {self.calculate_fee(self.customer)[0]} €
-            Gained reading credits for your next purchase: {self.calculate_fee(self.customer)[1]}
+            Total amount after discount: {totals.total} €
+            Gained reading credits for your next purchase: {totals.reading_credits}
             The invoice is {'' if self.is_closed else 'not'} paid."""
 
     def calculate_fee(self, user: User) -> tuple[float, int]:
-        price_per_book: float = 3.55
-        min_books_for_discount: int = 3
-        discount_per_book: float = 0.5
-        discount_per_reading_credit: float = 0.5
+        totals = self.totals(user)
+        return totals.total, totals.reading_credits
+
+    def totals(self, user: Optional[User] = None) -> InvoiceTotals:
+        """The totals for ``user`` (default: the customer), computed once per state of the invoice.
+
+        They are computed again after ``add_loan``, a new ``loans`` list or a change of the
+        user's reading credits. Once the invoice is closed, it keeps the totals it was paid with.
+        """
+        if user is None:
+            user = self.customer
+        cached = self._totals
+        if cached is not None:
+            (cached_user, reading_credits, loans, count), totals = cached
+            if cached_user is user and (
+                self.is_closed
+                or (reading_credits == user.reading_credits and loans is self.loans and count == len(self.loans))
+            ):
+                return totals
+            if self.is_closed:
+                # the totals of another user are not kept in place of those the invoice was paid with
+                return self._calculate_totals(user)
+        totals = self._calculate_totals(user)
+        self._totals = ((user, user.reading_credits, self.loans, len(self.loans)), totals)
+        return totals
+
+    def _calculate_totals(self, user: User) -> InvoiceTotals:
         current_reading_credits = user.reading_credits
         reading_credits: int = user.get_reading_credits(self.books)
 
-        price: float = len(self.books) * price_per_book
-        for book in self.books:
-            price += book.current_fee
-        discount_count: int = max(0, len(self.books) - min_books_for_discount)
-        discount: float = discount_count * discount_per_book
-        discount += current_reading_credits * discount_per_reading_credit
-        return (
+        price: float = len(self.loans) * PRICE_PER_BOOK
+        for loan in self.loans:
+            price += loan.current_fee
+        discount_count: int = max(0, len(self.loans) - MIN_BOOKS_FOR_DISCOUNT)
+        discount: float = discount_count * DISCOUNT_PER_BOOK
+        discount += current_reading_credits * DISCOUNT_PER_READING_CREDIT
+        return InvoiceTotals(
+            price,
+            discount,
             round(price - discount if price - discount > 0.0 else 0.0, 2),
             reading_credits,
         )
 
-    def process_invoice(self, pay_method: Optional[CreditCard, Paypal]):
-        if self.is_closed:
-            # payment is already processed
+    def process_invoice(self, pay_method: Union[CreditCard, Paypal]):
+        # the charge lock makes sure that an invoice is never paid twice. A conflicting update
+        # of the invoice is not retried: the payment has already been taken by then.
+        with self._charging():
+            return self._process_invoice(pay_method)
+
+    def _charging(self):
+        """Serialises the block with every other charge of this invoice."""
+        return _charge_locks.locked(self.id)
+
+    def _process_invoice(self, pay_method: Union[CreditCard, Paypal]):
+        if self.is_closed or payment_ledger.is_paid(self.id):
+            # payment is already processed, or paid through a ledger and not settled yet
             return True
         # validate card information
         fee, reading_credits = self.calculate_fee(self.customer)
-        if isinstance(pay_method, CreditCard):
-            is_paid: bool = self._pay_with_credit_card(pay_method, fee)
+        is_paid: bool = self._pay(pay_method, fee)
+        if is_paid:
+            self._close(reading_credits)
+        return is_paid
 
+    def _pay(self, pay_method: Union[CreditCard, Paypal], fee: float) -> bool:
+        if isinstance(pay_method, CreditCard):
+            return self._pay_with_credit_card(pay_method, fee)
         elif isinstance(pay_method, Paypal):
-            is_paid: bool = self._pay_with_paypal(pay_method.email, pay_method.password, fee)
-
+            return self._pay_with_paypal(pay_method.email, pay_method.password, fee)
         else:
             raise ValueError("Payment information is not set or not valid")
 
-        if is_paid:
+    def _close(self, reading_credits: int):
+        with LibraryRepository.locked(self.id, self.customer.email), LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(self, "is_closed")
+            unit_of_work.track(self.customer, "reading_credits")
             self.is_closed = True
             LibraryRepository.update_invoice(self)
             self.customer.reading_credits = reading_credits
             LibraryRepository.update_user(self.customer)
 
-        return is_paid
+    def process_invoice_with_credit_card(self, card: CreditCard) -> bool:
+        """Raises ValueError for an invalid card; a card whose limit is too low returns False."""
+        if not self._card_is_present_and_valid(card):
+            raise ValueError("Credit card is not valid")
+        return self.process_invoice(pay_method=card)
 
     def process_invoice_with_credit_card_detail(
         self, number: str, cvv: str, expiration: datetime
@@ -91,6 +173,9 @@ class Invoice:
         return card is not None and card.check_validity()
 
     def process_invoice_with_paypal(self, email: str, password: str) -> bool:
+        """Raises ValueError for unknown account information; a balance too low returns False."""
+        if email is None or password is None or password != PAYPAL_DATA_BASE.get(email, None):
+            raise ValueError("PayPal account information is not valid")
         return self.process_invoice(pay_method=Paypal(email, password))
 
     def _pay_with_paypal(self, email: str, password: str, fee: float) -> bool:
@@ -100,17 +185,17 @@ class Invoice:
             or password != PAYPAL_DATA_BASE.get(email, None)
         ):
             return False
-        if PAYPAL_ACCOUNT_BALANCE[email] >= fee:
-            PAYPAL_ACCOUNT_BALANCE[email] = PAYPAL_ACCOUNT_BALANCE[email] - fee
-            print(f"Paying {fee} using PayPal")
+        if not PAYPAL_LEDGER.debit(email, fee):
+            logger.info("PayPal balance too low to pay %s", fee)
+            return False
+        logger.info("Paying %s using PayPal", fee)
         return True
 
     def _pay_with_credit_card(self, card: CreditCard, fee: float) -> bool:
         if not self._card_is_present_and_valid(card):
             return False
-        remaining_amount: float = card.amount - fee
-        if remaining_amount < 0:
-            print(f"Card limit reached - Balance: {remaining_amount}")
+        if not card.debit(fee):
+            logger.info("Card limit reached - Balance: %s", card.amount - fee)
             return False
-        card.amount = remaining_amount
+        logger.info("Paying %s using credit card", fee)
         return True
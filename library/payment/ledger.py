@@ -0,0 +1,69 @@
+"""Account balances that many threads can debit at once without overdrawing them.
+
+    ledger = BalanceLedger({"amanda1985": 100.0})
+    if ledger.debit("amanda1985", fee):
+        ...
+
+``debit`` checks the balance and takes the amount in one step under the lock of the
+account, so two payments from one account can never both pass the check. The locks are
+striped over the accounts (see ``LockStripes``): payments from different accounts mostly
+take different locks and run side by side, and there is no lock for the whole ledger.
+"""
+from __future__ import annotations
+from typing import Hashable, Optional
+
+from library.persistence.locking import LockStripes
+
+
+class BalanceLedger:
+    def __init__(self, balances: Optional[dict[Hashable, float]] = None, stripes: int = 64):
+        # the dict is kept, not copied, so that its owner keeps seeing the balances
+        self._balances = balances if balances is not None else {}
+        self._locks = LockStripes(stripes)
+
+    def __contains__(self, account: Hashable) -> bool:
+        return account in self._balances
+
+    def balance(self, account: Hashable) -> float:
+        """The balance of ``account``; raises ``KeyError`` for an unknown account."""
+        return self._balances[account]
+
+    def open(self, account: Hashable, balance: float = 0.0):
+        with self._locks.lock_for(account):
+            if account in self._balances:
+                raise ValueError(f"Account {account} already exists")
+            self._balances[account] = balance
+
+    def credit(self, account: Hashable, amount: float) -> float:
+        """Adds ``amount`` to ``account`` and returns the new balance."""
+        _check_amount(amount)
+        with self._locks.lock_for(account):
+            balance = self._balances[account] + amount
+            self._balances[account] = balance
+            return balance
+
+    def debit(self, account: Hashable, amount: float) -> bool:
+        """Takes ``amount`` from ``account`` if it has that much; returns whether it did."""
+        _check_amount(amount)
+        with self._locks.lock_for(account):
+            balance = self._balances.get(account)
+            if balance is None or balance < amount:
+                return False
+            self._balances[account] = balance - amount
+            return True
+
+    def transfer(self, source: Hashable, target: Hashable, amount: float) -> bool:
+        """Moves ``amount`` from ``source`` to ``target`` if ``source`` has that much."""
+        _check_amount(amount)
+        with self._locks.locked(source, target):
+            if target not in self._balances:
+                raise KeyError(target)
+            if not self.debit(source, amount):
+                return False
+            self._balances[target] += amount
+            return True
+
+
+def _check_amount(amount: float):
+    if not amount >= 0:
+        raise ValueError(f"The amount must not be negative: {amount}")
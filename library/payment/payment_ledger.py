@@ -0,0 +1,356 @@
+"""Append-only record of every payment attempt, its result and its settlement.
+
+    ledger = PaymentLedger("payments", interval=1.0)
+    key = ledger.record_attempt(invoice.id, fee, "credit_card")   # "<invoice id>:<attempt>"
+    ledger.record_result(key, PAID, reading_credits, invoice)
+    ...
+    ledger.close()
+
+Every event is one JSON line ``{"seq": ..., "key": ..., "event": ..., ...}`` in a segment
+file ``payments-<day>-<n>.jsonl``; a new segment starts every day and after
+``segment_records`` events. The events are buffered and written with one ``fsync`` per
+batch; ``PaymentProcessor`` flushes every attempt before it charges. The latest event of
+every key and the paid invoices are indexed in memory (and rebuilt from the segments on
+start-up), so a retry can tell in O(1) whether an invoice has been paid already, and
+``Invoice.process_invoice`` asks every open ledger through ``is_paid(invoice_id)`` before
+it charges an invoice that is not closed yet.
+
+A payment is settled later: ``settle()`` closes all invoices paid since the last
+settlement in one transaction, instead of one write per payment. With ``interval`` set,
+a background thread flushes and settles every ``interval`` seconds. ``reconcile()``
+streams through the segments of a day without loading them.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Callable, Iterator, NamedTuple, Optional
+
+from library.persistence.storage import LibraryRepository
+
+if TYPE_CHECKING:
+    from library.payment.invoice import Invoice
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT = "attempt"
+PAID = "paid"
+DECLINED = "declined"
+# a request that failed or timed out; the next attempt may still find the invoice charged
+ERROR = "error"
+SETTLED = "settled"
+
+_SEGMENT_PREFIX = "payments-"
+
+# the ledgers not closed yet
+_open: weakref.WeakSet = weakref.WeakSet()
+
+
+class LedgerEntry(NamedTuple):
+    seq: int
+    key: str
+    event: str
+    amount: float
+    provider: Optional[str]
+    reading_credits: int
+    # seconds since the epoch
+    at: float
+
+    @property
+    def invoice_id(self) -> str:
+        return self.key.rsplit(":", 1)[0]
+
+    @property
+    def attempt(self) -> int:
+        return int(self.key.rsplit(":", 1)[1])
+
+
+class Reconciliation(NamedTuple):
+    attempts: int
+    paid: int
+    declined: int
+    errors: int
+    settled: int
+    amount_paid: float
+    # ids of the invoices paid but not settled
+    unsettled: list[str]
+
+
+def idempotency_key(invoice_id: str, attempt: int) -> str:
+    return f"{invoice_id}:{attempt}"
+
+
+def is_paid(invoice_id: str) -> bool:
+    """Whether an open ledger knows the invoice as paid, settled or not."""
+    return any(ledger.is_paid(invoice_id) for ledger in list(_open))
+
+
+def _day(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def _segments(directory: str, day: Optional[str] = None) -> list[str]:
+    prefix = _SEGMENT_PREFIX + (f"{day}-" if day is not None else "")
+    names = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".jsonl"))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _encode(entry: LedgerEntry) -> bytes:
+    record = {"seq": entry.seq, "key": entry.key, "event": entry.event, "at": entry.at}
+    # the results repeat the amount of their attempt, so that each line can be reconciled on its own
+    if entry.amount:
+        record["amount"] = entry.amount
+    if entry.provider is not None:
+        record["provider"] = entry.provider
+    if entry.reading_credits:
+        record["credits"] = entry.reading_credits
+    return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def _decode(record: dict) -> LedgerEntry:
+    return LedgerEntry(
+        record["seq"],
+        record["key"],
+        record["event"],
+        record.get("amount", 0.0),
+        record.get("provider"),
+        record.get("credits", 0),
+        record["at"],
+    )
+
+
+def read_entries(directory: str, day: Optional[str] = None) -> Iterator[LedgerEntry]:
+    """All events in ``directory``, or those of ``day`` ("YYYY-MM-DD", UTC), oldest first."""
+    for path in _segments(directory, day):
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a torn write at the end of the segment from a crash
+                    logger.warning("Skipping the torn tail of %s", path)
+                    break
+                yield _decode(record)
+
+
+def reconcile(directory: str, day: Optional[str] = None) -> Reconciliation:
+    """Counts the events of ``day`` (default: all days) in one pass over the segments."""
+    counts = {ATTEMPT: 0, PAID: 0, DECLINED: 0, ERROR: 0, SETTLED: 0}
+    amount_paid = 0.0
+    # invoice id -> settled, in the order they were paid
+    paid: dict[str, bool] = {}
+    for entry in read_entries(directory, day):
+        counts[entry.event] += 1
+        if entry.event == PAID:
+            amount_paid += entry.amount
+            paid.setdefault(entry.invoice_id, False)
+        elif entry.event == SETTLED:
+            paid[entry.invoice_id] = True
+    return Reconciliation(
+        counts[ATTEMPT],
+        counts[PAID],
+        counts[DECLINED],
+        counts[ERROR],
+        counts[SETTLED],
+        round(amount_paid, 2),
+        [invoice_id for invoice_id, settled in paid.items() if not settled],
+    )
+
+
+class PaymentLedger:
+    def __init__(
+        self,
+        directory: str,
+        interval: Optional[float] = None,
+        segment_records: int = 100000,
+        clock: Callable[[], float] = time.time,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._segment_records = segment_records
+        self._clock = clock
+        self._lock = threading.RLock()
+        # held while a batch is written, so flushes from several threads stay in order
+        self._io_lock = threading.Lock()
+        # (day, encoded event); every event goes to a segment of the day it happened
+        self._buffer: list[tuple[str, bytes]] = []
+        # key -> latest event
+        self._entries: dict[str, LedgerEntry] = {}
+        # invoice id -> number of attempts
+        self._attempts: dict[str, int] = {}
+        # invoice id -> key of the attempt that paid it
+        self._paid: dict[str, str] = {}
+        # invoice id -> (reading credits, the invoice if known), paid but not settled
+        self._unsettled: dict[str, tuple[int, Optional[Invoice]]] = {}
+        self._seq = 0
+        for entry in read_entries(directory):
+            self._index(entry)
+        self._file = None
+        self._file_day: Optional[str] = None
+        self._file_records = 0
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = None
+        _open.add(self)
+        if interval is not None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="payment-settler", daemon=True)
+            self._thread.start()
+
+    def _index(self, entry: LedgerEntry, invoice: Optional[Invoice] = None):
+        self._seq = max(self._seq, entry.seq)
+        self._entries[entry.key] = entry
+        invoice_id = entry.invoice_id
+        if entry.event == ATTEMPT:
+            self._attempts[invoice_id] = max(self._attempts.get(invoice_id, 0), entry.attempt)
+        elif entry.event == PAID:
+            self._paid[invoice_id] = entry.key
+            self._unsettled[invoice_id] = (entry.reading_credits, invoice)
+        elif entry.event == SETTLED:
+            self._unsettled.pop(invoice_id, None)
+
+    def _append(self, key: str, event: str, amount: float = 0.0, provider: Optional[str] = None,
+                reading_credits: int = 0, invoice: Optional[Invoice] = None) -> LedgerEntry:
+        with self._lock:
+            if self._closed:
+                raise ValueError("Payment ledger is closed")
+            self._seq += 1
+            entry = LedgerEntry(self._seq, key, event, amount, provider, reading_credits, self._clock())
+            self._index(entry, invoice)
+            self._buffer.append((_day(entry.at), _encode(entry)))
+            return entry
+
+    # lookups
+    def entry(self, key: str) -> Optional[LedgerEntry]:
+        """The latest event of ``key``."""
+        return self._entries.get(key)
+
+    def attempts(self, invoice_id: str) -> int:
+        return self._attempts.get(invoice_id, 0)
+
+    def paid_by(self, invoice_id: str) -> Optional[str]:
+        """Key of the attempt that paid the invoice, or None."""
+        return self._paid.get(invoice_id)
+
+    def is_paid(self, invoice_id: str) -> bool:
+        return invoice_id in self._paid
+
+    def unsettled(self) -> list[str]:
+        with self._lock:
+            return list(self._unsettled)
+
+    # events
+    def record_attempt(self, invoice_id: str, amount: float, provider: str) -> str:
+        """Starts the next attempt to pay the invoice and returns its key."""
+        with self._lock:
+            key = idempotency_key(invoice_id, self.attempts(invoice_id) + 1)
+            self._append(key, ATTEMPT, amount, provider)
+            return key
+
+    def record_result(self, key: str, event: str, reading_credits: int = 0, invoice: Optional[Invoice] = None):
+        """Records how attempt ``key`` ended; ``invoice`` saves settlement from reading a paid invoice again."""
+        if event not in (PAID, DECLINED, ERROR):
+            raise ValueError(f"Not a payment result: {event}")
+        with self._lock:
+            attempt = self._entries.get(key)
+            if attempt is None:
+                raise KeyError(key)
+            if attempt.event == PAID and event == ERROR:
+                # the answer to the charge was lost after it had been recorded
+                return
+            # a charge that went through after its request timed out is paid after all
+            if attempt.event != ATTEMPT and not (attempt.event == ERROR and event == PAID):
+                raise ValueError(f"Attempt {key} already ended with {attempt.event}")
+            self._append(key, event, attempt.amount, attempt.provider, reading_credits, invoice)
+
+    # settlement
+    def settle(self) -> int:
+        """Closes all invoices paid since the last settlement in one transaction and returns how many."""
+        with self._lock:
+            batch = list(self._unsettled.items())
+        if not batch:
+            return 0
+        invoices = []
+        for invoice_id, (reading_credits, invoice) in batch:
+            if invoice is None:
+                invoice = LibraryRepository.read_invoice(invoice_id)
+            if invoice is None:
+                logger.warning("Paid invoice %s does not exist, it is not settled", invoice_id)
+                continue
+            invoices.append((invoice, reading_credits))
+        keys = [key for invoice, _ in invoices for key in (invoice.id, invoice.customer.email)]
+        try:
+            with LibraryRepository.locked(*keys), LibraryRepository.transaction():
+                for invoice, reading_credits in invoices:
+                    if not invoice.is_closed:
+                        invoice._close(reading_credits)
+        except Exception:
+            # read the invoices again next time, in case they were changed concurrently
+            with self._lock:
+                for invoice, reading_credits in invoices:
+                    if invoice.id in self._unsettled:
+                        self._unsettled[invoice.id] = (reading_credits, None)
+            raise
+        with self._lock:
+            for invoice, _ in invoices:
+                paid = self._entries[self._paid[invoice.id]]
+                self._append(paid.key, SETTLED, paid.amount, paid.provider, paid.reading_credits)
+        self.flush()
+        return len(invoices)
+
+    # files
+    def _segment(self, day: str):
+        if self._file is None or day != self._file_day or self._file_records >= self._segment_records:
+            if self._file is not None:
+                self._file.close()
+            number = len(_segments(self._directory, day))
+            path = os.path.join(self._directory, f"{_SEGMENT_PREFIX}{day}-{number:06d}.jsonl")
+            self._file = open(path, "ab")
+            self._file_day = day
+            self._file_records = 0
+        return self._file
+
+    def flush(self):
+        """Writes the buffered events and waits until they are on disk."""
+        with self._io_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            start = 0
+            while start < len(batch):
+                day = batch[start][0]
+                file = self._segment(day)
+                end = start
+                limit = min(len(batch), start + self._segment_records - self._file_records)
+                while end < limit and batch[end][0] == day:
+                    end += 1
+                file.write(b"".join(line for _, line in batch[start:end]))
+                file.flush()
+                os.fsync(file.fileno())
+                self._file_records += end - start
+                start = end
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+                self.settle()
+            except Exception:
+                # the invoices stay unsettled and are tried again next time
+                logger.exception("Settling the payments failed")
+
+    def close(self):
+        """Settles the remaining payments, writes all events and stops the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.settle()
+        finally:
+            self.flush()
+            with self._lock:
+                self._closed = True
+            _open.discard(self)
+            if self._file is not None:
+                self._file.close()
@@ -0,0 +1,255 @@
+"""Concurrent payment of a stream of invoices through a payment gateway.
+
+    processor = PaymentProcessor(SimulatedGateway(), max_concurrency=64, rate_limits={"paypal": 50})
+    results = processor.run_sync((invoice, card) for invoice, card in jobs)
+
+At most ``max_concurrency`` payments are in flight and every provider is held to its
+rate limit in requests per second. A request that fails or takes longer than ``timeout``
+is retried with back-off under the same idempotency key, the invoice id, so the gateway
+never charges an invoice twice, not even when the answer to a successful charge was
+lost. The invoice is charged and closed under its charge lock, the one
+``Invoice.process_invoice`` takes, so neither that nor another processor can pay it again
+meanwhile; jobs and retries that come later find it paid. Declined payments are not retried.
+
+With a ``PaymentLedger`` every attempt is written to disk before it is charged and its
+result is recorded, an invoice an open ledger knows as paid is not charged again, and paid
+invoices are closed by the ledger's batched settlement instead of one by one; the rest is
+settled when ``process`` ends.
+
+``stats`` counts every result, but takes the latency quantiles from the last
+``latency_samples`` results only, so a long-running processor keeps no result it returned.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import statistics
+import time
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Iterable, NamedTuple, Optional, Union
+
+from library.payment.credit_card import CreditCard
+from library.payment.gateway import GatewayError, SimulatedGateway
+from library.payment import payment_ledger
+from library.payment.payment_ledger import PaymentLedger
+from library.payment.paypal import Paypal
+from library.persistence.async_storage import AsyncLibraryRepository
+from library.persistence.versioning import RetryPolicy
+
+if TYPE_CHECKING:
+    from library.payment.invoice import Invoice
+
+PAID = "paid"
+DECLINED = "declined"
+FAILED = "failed"
+ALREADY_PAID = "already paid"
+
+PaymentJob = tuple["Invoice", Union[CreditCard, Paypal]]
+
+
+class PaymentResult(NamedTuple):
+    invoice_id: str
+    status: str
+    attempts: int
+    seconds: float
+    error: Optional[str] = None
+
+
+class PaymentStats(NamedTuple):
+    paid: int
+    declined: int
+    failed: int
+    already_paid: int
+    retries: int
+    p50: float
+    p99: float
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` requests per second, up to ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate / 10))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def provider(pay_method) -> str:
+    if isinstance(pay_method, CreditCard):
+        return "credit_card"
+    if isinstance(pay_method, Paypal):
+        return "paypal"
+    raise ValueError("Payment information is not set or not valid")
+
+
+def _charge(invoice: Invoice, pay_method, fee: float, reading_credits: int, ledger: Optional[PaymentLedger],
+            key: Optional[str], charged: list[Optional[bool]]) -> bool:
+    """Pays the invoice and closes it, or records it as paid, under the charge lock ``Invoice.process_invoice``
+    takes, unless it was paid meanwhile; appends None for that to ``charged``, else whether it paid."""
+    with invoice._charging():
+        if invoice.is_closed or payment_ledger.is_paid(invoice.id):
+            charged.append(None)
+            return False
+        if not invoice._pay(pay_method, fee):
+            charged.append(False)
+            return False
+        if ledger is not None:
+            ledger.record_result(key, payment_ledger.PAID, reading_credits, invoice)
+        else:
+            invoice._close(reading_credits)
+        charged.append(True)
+        return True
+
+
+class PaymentProcessor:
+    def __init__(
+        self,
+        gateway: SimulatedGateway,
+        max_concurrency: int = 32,
+        rate_limits: Optional[dict[str, float]] = None,
+        timeout: float = 2.0,
+        retry: RetryPolicy = RetryPolicy(attempts=4, base_delay=0.05, max_delay=1.0),
+        ledger: Optional[PaymentLedger] = None,
+        latency_samples: int = 10000,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if latency_samples < 1:
+            raise ValueError("latency_samples must be at least 1")
+        self.gateway = gateway
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retry = retry
+        self.ledger = ledger
+        self._limiters = {name: RateLimiter(rate) for name, rate in (rate_limits or {}).items()}
+        # invoice id -> [lock, number of jobs holding or waiting for it]
+        self._invoice_locks: dict[str, list] = {}
+        # status -> number of results
+        self._counts = {status: 0 for status in (PAID, DECLINED, FAILED, ALREADY_PAID)}
+        self._retries = 0
+        self._latencies: deque[float] = deque(maxlen=latency_samples)
+
+    async def process(self, jobs: Union[Iterable[PaymentJob], AsyncIterable[PaymentJob]]) -> AsyncIterator[PaymentResult]:
+        """Yields the result of every job as soon as it is done; reads a job only when there is room for it."""
+        pending: set[asyncio.Task] = set()
+        async for invoice, pay_method in _aiter(jobs):
+            if len(pending) >= self.max_concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(self.pay(invoice, pay_method)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+        if self.ledger is not None:
+            await AsyncLibraryRepository.call(self.ledger.settle, write=True)
+
+    async def run(self, jobs: Union[Iterable[PaymentJob], AsyncIterable[PaymentJob]]) -> list[PaymentResult]:
+        return [result async for result in self.process(jobs)]
+
+    def run_sync(self, jobs: Iterable[PaymentJob]) -> list[PaymentResult]:
+        return asyncio.run(self.run(jobs))
+
+    async def pay(self, invoice: Invoice, pay_method) -> PaymentResult:
+        start = time.perf_counter()
+        entry = self._invoice_locks.setdefault(invoice.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                status, attempts, error = await self._pay(invoice, pay_method)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._invoice_locks[invoice.id]
+        result = PaymentResult(invoice.id, status, attempts, time.perf_counter() - start, error)
+        self._counts[status] += 1
+        self._retries += max(0, attempts - 1)
+        self._latencies.append(result.seconds)
+        return result
+
+    async def _pay(self, invoice: Invoice, pay_method) -> tuple[str, int, Optional[str]]:
+        ledger = self.ledger
+        if invoice.is_closed or payment_ledger.is_paid(invoice.id):
+            return ALREADY_PAID, 0, None
+        try:
+            name = provider(pay_method)
+        except ValueError as error:
+            return FAILED, 0, str(error)
+        fee, reading_credits = invoice.calculate_fee(invoice.customer)
+        limiter = self._limiters.get(name)
+        # the outcomes of _charge, which may still finish on its thread after the request timed out
+        charged: list[Optional[bool]] = []
+        attempt = 0
+        while True:
+            if attempt and (invoice.is_closed or payment_ledger.is_paid(invoice.id)):
+                return (PAID if True in charged else ALREADY_PAID), attempt, None
+            attempt += 1
+            if limiter is not None:
+                await limiter.acquire()
+            key = None
+            if ledger is not None:
+                key = ledger.record_attempt(invoice.id, fee, name)
+                # on disk before the money moves, so a crash cannot hide a charge
+                await AsyncLibraryRepository.call(ledger.flush, blocking=True)
+            settle = functools.partial(
+                AsyncLibraryRepository.call,
+                _charge, invoice, pay_method, fee, reading_credits, ledger, key, charged, write=True, blocking=True,
+            )
+            try:
+                paid = await asyncio.wait_for(self.gateway.charge(invoice.id, settle), self.timeout)
+            except (GatewayError, asyncio.TimeoutError) as error:
+                if ledger is not None:
+                    ledger.record_result(key, payment_ledger.ERROR)
+                if True in charged:
+                    # only the answer was lost
+                    return PAID, attempt, None
+                if attempt >= self.retry.attempts:
+                    return FAILED, attempt, str(error) or type(error).__name__
+                await asyncio.sleep(self.retry.delay(attempt - 1))
+                continue
+            if paid and True in charged:
+                return PAID, attempt, None
+            if ledger is not None:
+                # nothing was charged by this attempt
+                ledger.record_result(key, payment_ledger.DECLINED)
+            # paid means the gateway answered from the idempotency key of another processor's charge
+            return (ALREADY_PAID if paid or None in charged else DECLINED), attempt, None
+
+    def stats(self) -> PaymentStats:
+        counts = self._counts
+        latencies = list(self._latencies)
+        if len(latencies) > 1:
+            quantiles = statistics.quantiles(latencies, n=100)
+        else:
+            quantiles = (latencies or [0.0]) * 99
+        return PaymentStats(
+            counts[PAID],
+            counts[DECLINED],
+            counts[FAILED],
+            counts[ALREADY_PAID],
+            self._retries,
+            quantiles[49],
+            quantiles[98],
+        )
+
+
+async def _aiter(jobs: Union[Iterable[PaymentJob], AsyncIterable[PaymentJob]]) -> AsyncIterator[PaymentJob]:
+    if isinstance(jobs, AsyncIterable):
+        async for job in jobs:
+            yield job
+    else:
+        for job in jobs:
+            yield job
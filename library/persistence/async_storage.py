@@ -0,0 +1,253 @@
+"""asyncio front end of ``LibraryRepository``.
+
+Backends that never wait for I/O (``StorageBackend.blocking`` is false, like the in-memory
+backend) are called directly on the event loop, which is much cheaper than a thread hop.
+Blocking backends such as SQLite run on a thread pool, and so do the services (borrowing,
+returning, paying) with every backend: they wait for the repository's locks and sleep
+between retries, which would stall every coroutine of the loop. Either way at most ``max_concurrency``
+calls are in flight, and at most ``max_writers`` of them write, so a burst of clients queues
+on the event loop instead of piling up threads and database connections.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, NamedTuple, Optional, TypeVar
+from weakref import WeakKeyDictionary
+
+from library.persistence.storage import LibraryRepository
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.user import User
+    from library.model.author import Author
+    from library.model.publisher import Publisher
+    from library.model.loan import Loan
+    from library.payment.invoice import Invoice
+
+T = TypeVar("T")
+
+
+class AsyncLimits(NamedTuple):
+    max_concurrency: int = 64
+    max_writers: int = 8
+    # threads for blocking backends; more than the SQLite pool size only wait for a connection
+    threads: int = 8
+
+
+_limits = AsyncLimits()
+_executor: Optional[ThreadPoolExecutor] = None
+# asyncio primitives belong to one event loop, so every loop gets its own semaphores
+_semaphores: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(_limits.threads, thread_name_prefix="library")
+    return _executor
+
+
+def _get_semaphores() -> tuple[asyncio.Semaphore, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    semaphores = _semaphores.get(loop)
+    if semaphores is None:
+        semaphores = _semaphores[loop] = (
+            asyncio.Semaphore(_limits.max_concurrency),
+            asyncio.Semaphore(_limits.max_writers),
+        )
+    return semaphores
+
+
+@asynccontextmanager
+async def _slot(write: bool) -> AsyncIterator[None]:
+    concurrency, writers = _get_semaphores()
+    async with concurrency:
+        if write:
+            async with writers:
+                yield
+        else:
+            yield
+
+
+async def _call(function: Callable[..., T], *args, write: bool = False, blocking: Optional[bool] = None) -> T:
+    if blocking is None:
+        blocking = LibraryRepository.get_backend().blocking
+    async with _slot(write):
+        if not blocking:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), functools.partial(function, *args))
+
+
+class AsyncLibraryRepository:
+    @staticmethod
+    def use_limits(max_concurrency: int = 64, max_writers: int = 8, threads: int = 8):
+        """Sets the semaphore sizes and the thread pool size. Call it before the event loop starts."""
+        global _limits, _executor
+        if min(max_concurrency, max_writers, threads) < 1:
+            raise ValueError("Limits must be at least 1")
+        _limits = AsyncLimits(max_concurrency, max_writers, threads)
+        _semaphores.clear()
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+    @staticmethod
+    async def call(function: Callable[..., T], *args, write: bool = False, blocking: Optional[bool] = None) -> T:
+        """Runs the synchronous ``function(*args)`` within the limits, on a thread if the backend blocks
+        or if ``blocking`` is true, as for a function that waits for the repository's locks."""
+        return await _call(function, *args, write=write, blocking=blocking)
+
+    @staticmethod
+    async def sync():
+        # waits for the disk even with an otherwise non-blocking backend
+        await _call(LibraryRepository.sync, write=True, blocking=True)
+
+    # services
+    @staticmethod
+    async def borrow_book(user: User, book: Book) -> Optional[Loan]:
+        return await _call(user.borrow_book, book, write=True, blocking=True)
+
+    @staticmethod
+    async def return_books(user: User, books: list[Book]) -> Optional[Invoice]:
+        return await _call(user.return_books, books, write=True, blocking=True)
+
+    @staticmethod
+    async def process_invoice(invoice: Invoice, pay_method: Any) -> bool:
+        return await _call(invoice.process_invoice, pay_method, write=True, blocking=True)
+
+    @staticmethod
+    async def read_users() -> list[User]:
+        return await _call(LibraryRepository.read_users)
+
+    @staticmethod
+    async def read_books() -> list[Book]:
+        return await _call(LibraryRepository.read_books)
+
+    @staticmethod
+    async def read_authors() -> list[Author]:
+        return await _call(LibraryRepository.read_authors)
+
+    @staticmethod
+    async def read_publishers() -> list[Publisher]:
+        return await _call(LibraryRepository.read_publishers)
+
+    @staticmethod
+    async def read_invoices() -> list[Invoice]:
+        return await _call(LibraryRepository.read_invoices)
+
+    @staticmethod
+    async def read_loans() -> list[Loan]:
+        return await _call(LibraryRepository.read_loans)
+
+    # books
+    @staticmethod
+    async def create_book(book: Book):
+        await _call(LibraryRepository.create_book, book, write=True)
+
+    @staticmethod
+    async def read_book(isbn: str) -> Optional[Book]:
+        return await _call(LibraryRepository.read_book, isbn)
+
+    @staticmethod
+    async def update_book(book: Book):
+        await _call(LibraryRepository.update_book, book, write=True)
+
+    @staticmethod
+    async def delete_book(book: Book):
+        await _call(LibraryRepository.delete_book, book, write=True)
+
+    # users
+    @staticmethod
+    async def create_user(user: User):
+        await _call(LibraryRepository.create_user, user, write=True)
+
+    @staticmethod
+    async def read_user(email: str) -> Optional[User]:
+        return await _call(LibraryRepository.read_user, email)
+
+    @staticmethod
+    async def update_user(user: User):
+        await _call(LibraryRepository.update_user, user, write=True)
+
+    @staticmethod
+    async def delete_user(user: User):
+        await _call(LibraryRepository.delete_user, user, write=True)
+
+    # author
+    @staticmethod
+    async def create_author(author: Author):
+        await _call(LibraryRepository.create_author, author, write=True)
+
+    @staticmethod
+    async def read_author(firstname: str, lastname: str) -> Optional[Author]:
+        return await _call(LibraryRepository.read_author, firstname, lastname)
+
+    @staticmethod
+    async def update_author(author: Author):
+        await _call(LibraryRepository.update_author, author, write=True)
+
+    @staticmethod
+    async def delete_author(author: Author):
+        await _call(LibraryRepository.delete_author, author, write=True)
+
+    # publisher
+    @staticmethod
+    async def create_publisher(publisher: Publisher):
+        await _call(LibraryRepository.create_publisher, publisher, write=True)
+
+    @staticmethod
+    async def read_publisher(name: str) -> Optional[Publisher]:
+        return await _call(LibraryRepository.read_publisher, name)
+
+    @staticmethod
+    async def update_publisher(publisher: Publisher):
+        await _call(LibraryRepository.update_publisher, publisher, write=True)
+
+    @staticmethod
+    async def delete_publisher(publisher: Publisher):
+        await _call(LibraryRepository.delete_publisher, publisher, write=True)
+
+    # invoice
+    @staticmethod
+    async def create_invoice(invoice: Invoice):
+        await _call(LibraryRepository.create_invoice, invoice, write=True)
+
+    @staticmethod
+    async def read_invoice(id: str) -> Optional[Invoice]:
+        return await _call(LibraryRepository.read_invoice, id)
+
+    @staticmethod
+    async def update_invoice(invoice: Invoice):
+        await _call(LibraryRepository.update_invoice, invoice, write=True)
+
+    @staticmethod
+    async def delete_invoice(invoice: Invoice):
+        await _call(LibraryRepository.delete_invoice, invoice, write=True)
+
+    # loan
+    @staticmethod
+    async def create_loan(loan: Loan):
+        await _call(LibraryRepository.create_loan, loan, write=True)
+
+    @staticmethod
+    async def read_loan(id: str) -> Optional[Loan]:
+        return await _call(LibraryRepository.read_loan, id)
+
+    @staticmethod
+    async def update_loan(loan: Loan):
+        await _call(LibraryRepository.update_loan, loan, write=True)
+
+    @staticmethod
+    async def delete_loan(loan: Loan):
+        await _call(LibraryRepository.delete_loan, loan, write=True)
+
+    @staticmethod
+    async def loans_of_user(email: str) -> list[Loan]:
+        return await _call(LibraryRepository.loans_of_user, email)
+
+    @staticmethod
+    async def loans_of_book(isbn: str) -> list[Loan]:
+        return await _call(LibraryRepository.loans_of_book, isbn)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.user import User
+    from library.model.author import Author
+    from library.model.publisher import Publisher
+    from library.model.loan import Loan
+    from library.payment.invoice import Invoice
+    from library.persistence.index import BookQuery
+
+
+class StorageBackend(ABC):
+    """Storage behind ``LibraryRepository``.
+
+    ``update_*`` and ``delete_*`` raise ``ValueError`` if the entity does not exist.
+    ``update_book``, ``update_user`` and ``update_invoice`` raise ``ConflictError`` if the
+    stored version is not the entity's ``version``, and increment both otherwise.
+    """
+
+    # whether calls may wait for I/O; AsyncLibraryRepository runs blocking backends on threads
+    blocking = True
+
+    @abstractmethod
+    def read_users(self) -> list[User]:
+        ...
+
+    @abstractmethod
+    def read_books(self) -> list[Book]:
+        ...
+
+    @abstractmethod
+    def read_authors(self) -> list[Author]:
+        ...
+
+    @abstractmethod
+    def read_publishers(self) -> list[Publisher]:
+        ...
+
+    @abstractmethod
+    def read_invoices(self) -> list[Invoice]:
+        ...
+
+    @abstractmethod
+    def read_loans(self) -> list[Loan]:
+        ...
+
+    @abstractmethod
+    def query_books(self) -> BookQuery:
+        ...
+
+    # books
+    @abstractmethod
+    def create_book(self, book: Book):
+        ...
+
+    @abstractmethod
+    def read_book(self, isbn: str) -> Optional[Book]:
+        ...
+
+    @abstractmethod
+    def update_book(self, book: Book):
+        ...
+
+    @abstractmethod
+    def delete_book(self, book: Book):
+        ...
+
+    # users
+    @abstractmethod
+    def create_user(self, user: User):
+        ...
+
+    @abstractmethod
+    def read_user(self, email: str) -> Optional[User]:
+        ...
+
+    @abstractmethod
+    def update_user(self, user: User):
+        ...
+
+    @abstractmethod
+    def delete_user(self, user: User):
+        """Deletes the user together with their loans."""
+        ...
+
+    # author
+    @abstractmethod
+    def create_author(self, author: Author):
+        ...
+
+    @abstractmethod
+    def read_author(self, firstname: str, lastname: str) -> Optional[Author]:
+        ...
+
+    @abstractmethod
+    def update_author(self, author: Author):
+        ...
+
+    @abstractmethod
+    def delete_author(self, author: Author):
+        ...
+
+    # publisher
+    @abstractmethod
+    def create_publisher(self, publisher: Publisher):
+        ...
+
+    @abstractmethod
+    def read_publisher(self, name: str) -> Optional[Publisher]:
+        ...
+
+    @abstractmethod
+    def update_publisher(self, publisher: Publisher):
+        ...
+
+    @abstractmethod
+    def delete_publisher(self, publisher: Publisher):
+        ...
+
+    # invoice
+    @abstractmethod
+    def create_invoice(self, invoice: Invoice):
+        ...
+
+    @abstractmethod
+    def read_invoice(self, id: str) -> Optional[Invoice]:
+        ...
+
+    @abstractmethod
+    def update_invoice(self, invoice: Invoice):
+        ...
+
+    @abstractmethod
+    def delete_invoice(self, invoice: Invoice):
+        ...
+
+    # loan
+    @abstractmethod
+    def create_loan(self, loan: Loan):
+        ...
+
+    @abstractmethod
+    def read_loan(self, id: str) -> Optional[Loan]:
+        ...
+
+    @abstractmethod
+    def update_loan(self, loan: Loan):
+        ...
+
+    @abstractmethod
+    def delete_loan(self, loan: Loan):
+        ...
+
+    @abstractmethod
+    def loans_of_user(self, email: str) -> list[Loan]:
+        """The active loans of the user, oldest first."""
+
+    @abstractmethod
+    def loans_of_book(self, isbn: str) -> list[Loan]:
+        """The active loans of the book, oldest first."""
+
+    def write_batch(self, operations: list[tuple[str, object]]):
+        """Applies ``(operation, entity)`` pairs such as ``("update_book", book)`` in order.
+
+        Backends that can write several entities at once should override this.
+        """
+        for operation, entity in operations:
+            getattr(self, operation)(entity)
+
+    def refresh_book(self, book: Book):
+        """Updates ``book`` in place with the stored state, including its version."""
+
+    def refresh_user(self, user: User):
+        """Updates ``user`` in place with the stored state, including its version."""
+
+    def refresh_invoice(self, invoice: Invoice):
+        """Updates ``invoice`` in place with the stored state, including its version."""
+
+    def sync(self):
+        """Blocks until all previous writes are durable."""
+
+    def close(self):
+        pass
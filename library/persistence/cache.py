@@ -0,0 +1,279 @@
+"""Read-through cache in front of a slow backend.
+
+    LibraryRepository.use_backend(CachedBackend(SQLiteBackend("library.db"), max_size=10_000, ttl=60))
+
+``read_book``/``read_user``/``read_author``/``read_publisher``/``read_invoice``/``read_loan``
+are answered from a size-bounded LRU cache, including "not found" answers. Every write through the
+backend drops the entries it touches before it returns, so a borrow or return is never
+followed by a cached, outdated ``borrowed_items``. The TTL bounds how long changes made
+by other processes can go unseen.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Optional
+
+from library.persistence.backend import StorageBackend
+from library.persistence.unit_of_work import entity_key
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.user import User
+    from library.model.author import Author
+    from library.model.publisher import Publisher
+    from library.model.loan import Loan
+    from library.payment.invoice import Invoice
+    from library.persistence.index import BookQuery
+
+# cached for a key that does not exist
+_MISSING = object()
+# invalidations are counted per stripe of keys, see LRUCache.put()
+_GENERATION_STRIPES = 256
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+    """Thread-safe LRU map with an optional time to live per entry."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, negative_ttl: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError("The cache needs room for at least one entry")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = ttl if negative_ttl is None else negative_ttl
+        # key -> (value, expiry time or None); the least recently used entry comes first
+        self._entries: OrderedDict[Any, tuple[Any, Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = [0] * _GENERATION_STRIPES
+        self._hits = self._misses = self._evictions = self._expirations = self._invalidations = 0
+
+    def get(self, key) -> Any:
+        """The cached value, ``None`` for a key cached as missing, or ``_MISSING`` if not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return None if value is _MISSING else value
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+            return _MISSING
+
+    def generation(self, key) -> int:
+        return self._generations[hash(key) % _GENERATION_STRIPES]
+
+    def put(self, key, value, generation: int):
+        """Caches ``value`` unless ``key`` may have been invalidated since ``generation(key)`` returned ``generation``.
+
+        A reader that loaded the entity before a concurrent write would otherwise put the
+        old state back into the cache after the writer has invalidated it.
+        """
+        ttl = self._negative_ttl if value is None else self._ttl
+        with self._lock:
+            if generation != self.generation(key):
+                return
+            self._entries[key] = (_MISSING if value is None else value, None if ttl is None else time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[hash(key) % _GENERATION_STRIPES] += 1
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generations = [generation + 1 for generation in self._generations]
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self._hits, self._misses, self._evictions, self._expirations, self._invalidations, len(self._entries)
+            )
+
+
+class CachedBackend(StorageBackend):
+    """Wraps ``backend`` and caches its point reads. The ``read_*`` lists, queries and ``loans_of_*`` are not cached."""
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        max_size: int = 10_000,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+    ):
+        self.backend = backend
+        self.blocking = backend.blocking
+        self.cache = LRUCache(max_size, ttl, negative_ttl)
+
+    def stats(self) -> CacheStats:
+        return self.cache.stats()
+
+    def _read(self, key: tuple, read: Callable[[], Any]):
+        value = self.cache.get(key)
+        if value is not _MISSING:
+            return value
+        generation = self.cache.generation(key)
+        value = read()
+        self.cache.put(key, value, generation)
+        return value
+
+    def _written(self, kind: str, entity):
+        self.cache.invalidate((kind, entity_key(kind, entity)))
+
+    def write_batch(self, operations: list[tuple[str, object]]):
+        # deleting a user deletes their loans, which are not in the batch
+        loans = [loan for operation, user in operations if operation == "delete_user" for loan in self.backend.loans_of_user(user.email)]
+        try:
+            self.backend.write_batch(operations)
+        finally:
+            # also after a failed batch, which may have changed the entities before it failed
+            for operation, entity in operations:
+                self._written(operation.split("_", 1)[1], entity)
+            for loan in loans:
+                self._written("loan", loan)
+
+    def sync(self):
+        self.backend.sync()
+
+    def close(self):
+        self.cache.clear()
+        self.backend.close()
+
+    def read_users(self) -> list[User]:
+        return self.backend.read_users()
+
+    def read_books(self) -> list[Book]:
+        return self.backend.read_books()
+
+    def read_authors(self) -> list[Author]:
+        return self.backend.read_authors()
+
+    def read_publishers(self) -> list[Publisher]:
+        return self.backend.read_publishers()
+
+    def read_invoices(self) -> list[Invoice]:
+        return self.backend.read_invoices()
+
+    def read_loans(self) -> list[Loan]:
+        return self.backend.read_loans()
+
+    def query_books(self) -> BookQuery:
+        return self.backend.query_books()
+
+    # books
+    def create_book(self, book: Book):
+        self.write_batch([("create_book", book)])
+
+    def read_book(self, isbn: str) -> Optional[Book]:
+        return self._read(("book", isbn), lambda: self.backend.read_book(isbn))
+
+    def update_book(self, book: Book):
+        self.write_batch([("update_book", book)])
+
+    def refresh_book(self, book: Book):
+        self._written("book", book)
+        self.backend.refresh_book(book)
+
+    def delete_book(self, book: Book):
+        self.write_batch([("delete_book", book)])
+
+    # users
+    def create_user(self, user: User):
+        self.write_batch([("create_user", user)])
+
+    def read_user(self, email: str) -> Optional[User]:
+        return self._read(("user", email), lambda: self.backend.read_user(email))
+
+    def update_user(self, user: User):
+        self.write_batch([("update_user", user)])
+
+    def refresh_user(self, user: User):
+        self._written("user", user)
+        self.backend.refresh_user(user)
+
+    def delete_user(self, user: User):
+        self.write_batch([("delete_user", user)])
+
+    # author
+    def create_author(self, author: Author):
+        self.write_batch([("create_author", author)])
+
+    def read_author(self, firstname: str, lastname: str) -> Optional[Author]:
+        return self._read(("author", (firstname, lastname)), lambda: self.backend.read_author(firstname, lastname))
+
+    def update_author(self, author: Author):
+        self.write_batch([("update_author", author)])
+
+    def delete_author(self, author: Author):
+        self.write_batch([("delete_author", author)])
+
+    # publisher
+    def create_publisher(self, publisher: Publisher):
+        self.write_batch([("create_publisher", publisher)])
+
+    def read_publisher(self, name: str) -> Optional[Publisher]:
+        return self._read(("publisher", name), lambda: self.backend.read_publisher(name))
+
+    def update_publisher(self, publisher: Publisher):
+        self.write_batch([("update_publisher", publisher)])
+
+    def delete_publisher(self, publisher: Publisher):
+        self.write_batch([("delete_publisher", publisher)])
+
+    # invoice
+    def create_invoice(self, invoice: Invoice):
+        self.write_batch([("create_invoice", invoice)])
+
+    def read_invoice(self, id: str) -> Optional[Invoice]:
+        return self._read(("invoice", id), lambda: self.backend.read_invoice(id))
+
+    def update_invoice(self, invoice: Invoice):
+        self.write_batch([("update_invoice", invoice)])
+
+    def refresh_invoice(self, invoice: Invoice):
+        self._written("invoice", invoice)
+        self.backend.refresh_invoice(invoice)
+
+    def delete_invoice(self, invoice: Invoice):
+        self.write_batch([("delete_invoice", invoice)])
+
+    # loan
+    def create_loan(self, loan: Loan):
+        self.write_batch([("create_loan", loan)])
+
+    def read_loan(self, id: str) -> Optional[Loan]:
+        return self._read(("loan", id), lambda: self.backend.read_loan(id))
+
+    def update_loan(self, loan: Loan):
+        self.write_batch([("update_loan", loan)])
+
+    def delete_loan(self, loan: Loan):
+        self.write_batch([("delete_loan", loan)])
+
+    def loans_of_user(self, email: str) -> list[Loan]:
+        return self.backend.loans_of_user(email)
+
+    def loans_of_book(self, isbn: str) -> list[Loan]:
+        return self.backend.loans_of_book(isbn)
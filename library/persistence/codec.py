@@ -0,0 +1,233 @@
+"""Conversion of the model objects to and from plain JSON-compatible dicts.
+
+Books are referenced by ISBN, users by email and invoices by id, so an encoded
+user, loan or invoice has to be decoded against a backend that already holds them.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.publisher import Publisher
+from library.model.user import User
+
+if TYPE_CHECKING:
+    from library.payment.invoice import Invoice
+    from library.persistence.memory import InMemoryBackend
+
+
+def encode_datetime(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def decode_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def encode_author(author: Author) -> list:
+    return [author.firstname, author.lastname]
+
+
+def decode_author(data: list) -> Author:
+    return Author(data[0], data[1])
+
+
+def encode_publisher(publisher: Publisher) -> str:
+    return publisher.name
+
+
+def decode_publisher(data: str) -> Publisher:
+    return Publisher(data)
+
+
+def encode_book(book: Book) -> dict:
+    return {
+        "isbn": book.isbn,
+        "title": book.title,
+        "authors": [encode_author(author) for author in book.authors],
+        "publisher": book.publisher.name if book.publisher is not None else None,
+        "publication_date": encode_datetime(book.publication_date),
+        "genres": [genre.name for genre in book.genres],
+        "pages": book.pages,
+        "type": book._book_type,
+        "duration": book.duration,
+        "existing_items": book.existing_items,
+        "borrowed_items": book.borrowed_items,
+        "set_aside": encode_set_aside(book.set_aside),
+        "version": book.version,
+    }
+
+
+def decode_book(data: dict, backend: InMemoryBackend, book: Optional[Book] = None) -> Book:
+    """Decodes a book, or updates ``book`` in place so that users and invoices holding it see the change."""
+    authors = [backend.read_author(*names) or decode_author(names) for names in data["authors"]]
+    publisher = None
+    if data["publisher"] is not None:
+        publisher = backend.read_publisher(data["publisher"]) or decode_publisher(data["publisher"])
+    genres = [Genre[name] for name in data["genres"]]
+    if book is None:
+        book = Book(
+            data["title"],
+            authors,
+            publisher,
+            decode_datetime(data["publication_date"]),
+            genres,
+            data["pages"],
+            data["isbn"],
+            data["type"],
+            data["duration"],
+            data["existing_items"],
+            data["borrowed_items"],
+        )
+    else:
+        book.title = data["title"]
+        book.authors = authors
+        book.publisher = publisher
+        book.publication_date = decode_datetime(data["publication_date"])
+        book.genres = genres
+        book.pages = data["pages"]
+        book._book_type = data["type"]
+        book.duration = data["duration"]
+        book.existing_items = data["existing_items"]
+        book.borrowed_items = data["borrowed_items"]
+    book.set_aside = decode_set_aside(data["set_aside"])
+    book.version = data["version"]
+    return book
+
+
+def encode_set_aside(set_aside: tuple[tuple[str, float], ...]) -> list:
+    return [[email, deadline] for email, deadline in set_aside]
+
+
+def decode_set_aside(data: list) -> tuple[tuple[str, float], ...]:
+    return tuple((email, deadline) for email, deadline in data)
+
+
+def encode_user(user: User, read_books_from: int = 0, invoices_from: int = 0) -> dict:
+    """Encodes a user. With ``read_books_from``/``invoices_from`` only the read books and
+    invoices from those positions on are listed, as ``read_books_added``/``invoices_added``,
+    for an update that appended them."""
+    data = {
+        "email": user.email,
+        "firstname": user.firstname,
+        "lastname": user.lastname,
+        "mobile_number1": user.mobile_number1,
+        "mobile_number2": user.mobile_number2,
+        "area_code": user.area_code,
+        "landline_number": user.landline_number,
+        "country_calling_code": user.country_calling_code,
+        "reading_credits": user.reading_credits,
+        "version": user.version,
+    }
+    read_books = [book.isbn for book in user.read_books[read_books_from:]]
+    data["read_books_added" if read_books_from else "read_books"] = read_books
+    invoices = [invoice.id for invoice in user.invoices[invoices_from:]]
+    data["invoices_added" if invoices_from else "invoices"] = invoices
+    return data
+
+
+def decode_user(data: dict, backend: InMemoryBackend, user: Optional[User] = None) -> User:
+    """Decodes a user, or updates ``user`` in place. Its loans are those in ``backend``.
+
+    The books and invoices of a record with ``read_books_added``/``invoices_added`` are appended to those of ``user``.
+
+    Invoices that are not in ``backend`` yet are left out; ``link_invoices`` adds them later.
+    """
+    if user is None:
+        user = User(
+            data["email"],
+            data["firstname"],
+            data["lastname"],
+            data["mobile_number1"],
+            data["mobile_number2"],
+            data["area_code"],
+            data["landline_number"],
+            data["country_calling_code"],
+        )
+    else:
+        user.firstname = data["firstname"]
+        user.lastname = data["lastname"]
+        user.mobile_number1 = data["mobile_number1"]
+        user.mobile_number2 = data["mobile_number2"]
+        user.area_code = data["area_code"]
+        user.landline_number = data["landline_number"]
+        user.country_calling_code = data["country_calling_code"]
+    user.reading_credits = data["reading_credits"]
+    user.version = data["version"]
+    user.borrowed_books = backend.loans_of_user(data["email"])
+    if "read_books_added" in data:
+        user.read_books.extend(_books(data["read_books_added"], backend))
+    else:
+        user.read_books = _books(data["read_books"], backend)
+    if "invoices_added" in data:
+        user.invoices.extend(_invoices(data["invoices_added"], backend))
+    else:
+        link_invoices(user, data["invoices"], backend)
+    return user
+
+
+def _books(isbns: list[str], backend: InMemoryBackend) -> list[Book]:
+    return [book for book in (backend.read_book(isbn) for isbn in isbns) if book is not None]
+
+
+def _invoices(ids: list[str], backend: InMemoryBackend) -> list[Invoice]:
+    return [invoice for invoice in (backend.read_invoice(id) for id in ids) if invoice is not None]
+
+
+def link_invoices(user: User, ids: list[str], backend: InMemoryBackend):
+    user.invoices = _invoices(ids, backend)
+
+
+def encode_loan(loan: Loan) -> dict:
+    return {
+        "id": loan.id,
+        "isbn": loan.isbn,
+        "email": loan.email,
+        "due_date": encode_datetime(loan.due_date),
+        "current_fee": loan.current_fee,
+    }
+
+
+def decode_loan(data: dict, backend: InMemoryBackend, loan: Optional[Loan] = None) -> Optional[Loan]:
+    """Decodes a loan, or updates the due date and fee of ``loan`` in place; None if its book is not in ``backend``."""
+    if loan is None:
+        book = backend.read_book(data["isbn"])
+        if book is None:
+            return None
+        return Loan(book, data["email"], decode_datetime(data["due_date"]), data["current_fee"], data["id"])
+    loan.due_date = decode_datetime(data["due_date"])
+    loan.current_fee = data["current_fee"]
+    return loan
+
+
+def encode_invoice(invoice: Invoice) -> dict:
+    return {
+        "id": invoice.id,
+        "customer": invoice.customer.email,
+        "is_closed": invoice.is_closed,
+        # the returned loans, by book and fee
+        "books": [[loan.isbn, loan.current_fee] for loan in invoice.loans],
+        "version": invoice.version,
+    }
+
+
+def decode_invoice(data: dict, backend: InMemoryBackend, invoice: Optional[Invoice] = None) -> Invoice:
+    """Decodes an invoice, or updates ``invoice`` in place. The customer must already be in ``backend``."""
+    from library.payment.invoice import Invoice
+
+    customer = backend.read_user(data["customer"])
+    if invoice is None:
+        invoice = Invoice(customer)
+        invoice.id = data["id"]
+    invoice.customer = customer
+    invoice.is_closed = data["is_closed"]
+    invoice.version = data["version"]
+    invoice.loans = []
+    for isbn, current_fee in data["books"]:
+        book = backend.read_book(isbn)
+        if book is not None:
+            invoice.loans.append(Loan(book, data["customer"], None, current_fee))
+    return invoice
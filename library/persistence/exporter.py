@@ -0,0 +1,101 @@
+"""Streaming export of the catalogue as a JSON array, JSON Lines or one XML document.
+
+    with open("catalogue.jsonl", "wb") as file:
+        export_books(file, format="jsonl")
+
+Every book is written exactly as ``Book.serialize`` writes it: JSON Lines has one
+``serialize("JSON")`` per line, the JSON array is ``[`` + the books joined by ``", "`` + ``]``,
+and the XML document is a ``<books>`` element around the ``serialize("XML")`` elements.
+The books are formatted without the memoization of ``Book.serialize``, which would keep
+the text of the whole catalogue alive, and the output is written in chunks of about
+``chunk_size`` characters, so memory use does not depend on the size of the catalogue.
+"""
+from __future__ import annotations
+import io
+import time
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, NamedTuple, Optional, TextIO, Union
+
+from library.model.serialization import book_json, book_xml
+from library.persistence.storage import LibraryRepository
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+
+FORMATS = ("json", "jsonl", "xml")
+
+
+class ExportStats(NamedTuple):
+    books: int
+    characters: int
+    seconds: float
+
+    @property
+    def books_per_second(self) -> float:
+        return self.books / self.seconds if self.seconds else 0.0
+
+
+def iter_export(books: Iterable[Book], format: str = "jsonl", chunk_size: int = 65536) -> Iterator[str]:
+    """Yields the export of ``books`` in chunks of about ``chunk_size`` characters."""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format}")
+    if format == "xml":
+        head, separator, tail, serialize = "<books>", "", "</books>", book_xml
+    elif format == "json":
+        head, separator, tail, serialize = "[", ", ", "]", book_json
+    else:
+        head, separator, tail, serialize = "", "", "", book_json
+    parts = [head]
+    size = len(head)
+    first = True
+    for book in books:
+        part = serialize(book)
+        if format == "jsonl":
+            part += "\n"
+        elif not first:
+            part = separator + part
+        first = False
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    parts.append(tail)
+    chunk = "".join(parts)
+    if chunk:
+        yield chunk
+
+
+def export_books(
+    target: Union[str, TextIO, BinaryIO],
+    books: Optional[Iterable[Book]] = None,
+    format: str = "jsonl",
+    chunk_size: int = 65536,
+    encoding: str = "utf-8",
+) -> ExportStats:
+    """Writes ``books``, by default the whole catalogue, to a path or an open text or binary file.
+
+    A socket can be written to through ``socket.makefile("wb")``. ``books`` may be
+    any iterable, e.g. a filtered ``LibraryRepository.query_books()``; queries are read
+    page by page.
+    """
+    if books is None:
+        books = LibraryRepository.query_books()
+    if isinstance(target, str):
+        with open(target, "w", encoding=encoding, newline="") as file:
+            return export_books(file, books, format, chunk_size, encoding)
+    start = time.perf_counter()
+    count = characters = 0
+
+    def counted() -> Iterator[Book]:
+        nonlocal count
+        for book in books:
+            count += 1
+            yield book
+
+    binary = not isinstance(target, io.TextIOBase)
+    for chunk in iter_export(counted(), format, chunk_size):
+        characters += len(chunk)
+        target.write(chunk.encode(encoding) if binary else chunk)
+    target.flush()
+    return ExportStats(count, characters, time.perf_counter() - start)
@@ -0,0 +1,285 @@
+"""Streaming import of a book catalogue from CSV or JSON Lines.
+
+A JSONL record has the fields of ``codec.encode_book``. A CSV file has a header row with
+the same column names; its ``authors`` are separated by ``;`` as "Firstname Lastname" and
+its ``genres`` by ``;``. Genres may be given by name (``COMPUTER_SCIENCE``) or by value
+(``Computer Science``), in any case. Only ``isbn``, ``title`` and ``type`` are required.
+
+The file is read record by record and written in batches of one transaction each, so
+memory use does not depend on the file size. Authors and publishers are created once per
+name; books whose ISBN is already stored and records that do not parse are rejected.
+"""
+from __future__ import annotations
+import csv
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from library.model.author import Author
+from library.model.book import BOOK_TYPES, Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.storage import LibraryRepository
+
+logger = logging.getLogger(__name__)
+
+_GENRES = {
+    **{genre.name.lower(): genre for genre in Genre},
+    **{genre.value.lower(): genre for genre in Genre},
+}
+
+
+class ImportStats(NamedTuple):
+    rows: int
+    imported: int
+    rejected: int
+    seconds: float
+    # (row number, reason) of the first rejected rows
+    errors: list[tuple[int, str]]
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class _ParsedBook(NamedTuple):
+    isbn: str
+    title: str
+    authors: list[tuple[str, str]]
+    publisher: Optional[str]
+    publication_date: Optional[datetime]
+    genres: list[str]
+    pages: Optional[int]
+    type: str
+    duration: int
+    existing_items: int
+    borrowed_items: int
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(value, default: Optional[int]) -> Optional[int]:
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def _author(value) -> tuple[str, str]:
+    if isinstance(value, str):
+        # "Firstname Lastname"; everything before the last space is the first name
+        firstname, _, lastname = value.strip().rpartition(" ")
+        return firstname, lastname
+    firstname, lastname = value
+    return firstname, lastname
+
+
+def parse_record(record: dict) -> _ParsedBook:
+    """Validates one CSV row or JSON object; raises ``ValueError`` with the reason if it is invalid."""
+    isbn = _text(record.get("isbn"))
+    title = _text(record.get("title"))
+    book_type = _text(record.get("type"))
+    if isbn is None or title is None:
+        raise ValueError("isbn and title are required")
+    if book_type not in BOOK_TYPES:
+        raise ValueError(f"unknown book type {book_type!r}")
+    authors = record.get("authors") or []
+    if isinstance(authors, str):
+        authors = [name for name in authors.split(";") if name.strip()]
+    genres = record.get("genres") or []
+    if isinstance(genres, str):
+        genres = [name for name in genres.split(";") if name.strip()]
+    genre_names = []
+    for name in genres:
+        genre = _GENRES.get(name.strip().lower())
+        if genre is None:
+            raise ValueError(f"unknown genre {name!r}")
+        genre_names.append(genre.name)
+    publication_date = _text(record.get("publication_date"))
+    parsed = _ParsedBook(
+        isbn,
+        title,
+        [_author(author) for author in authors],
+        _text(record.get("publisher")),
+        datetime.fromisoformat(publication_date) if publication_date is not None else None,
+        genre_names,
+        _int(record.get("pages"), None),
+        book_type,
+        _int(record.get("duration"), 0),
+        _int(record.get("existing_items"), 1),
+        _int(record.get("borrowed_items"), 0),
+    )
+    if parsed.existing_items < 0 or not 0 <= parsed.borrowed_items <= parsed.existing_items:
+        raise ValueError("item counts out of range")
+    return parsed
+
+
+def _parse_chunk(format: str, header: Optional[list[str]], chunk: list[tuple[int, object]]) -> list:
+    """Parses ``(row number, raw record)`` pairs to ``_ParsedBook``s or ``(row number, reason)`` pairs."""
+    results = []
+    for row, raw in chunk:
+        try:
+            if format == "jsonl":
+                record = json.loads(raw)
+            elif format == "csv":
+                if len(raw) != len(header):
+                    raise ValueError(f"expected {len(header)} columns, got {len(raw)}")
+                record = dict(zip(header, raw))
+            else:
+                record = raw
+            if not isinstance(record, dict):
+                raise ValueError("not an object")
+            results.append(parse_record(record))
+        except (ValueError, TypeError, KeyError) as error:
+            results.append((row, str(error) or type(error).__name__))
+    return results
+
+
+class CatalogueImporter:
+    """Imports books; ``workers`` > 0 parses in that many processes while this one writes."""
+
+    def __init__(self, batch_size: int = 1000, workers: int = 0, chunk_size: int = 1000, max_errors: int = 100):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        # interned per import, so every author and publisher is looked up and created once
+        self._authors: dict[tuple[str, str], Author] = {}
+        self._publishers: dict[str, Publisher] = {}
+
+    def import_file(self, path: str, format: Optional[str] = None) -> ImportStats:
+        """Imports a ``.csv`` or ``.jsonl`` file; ``format`` ("csv" or "jsonl") overrides the extension."""
+        if format is None:
+            format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        if format not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown catalogue format {format}")
+        with open(path, newline="" if format == "csv" else None, encoding="utf-8") as file:
+            header = None
+            if format == "csv":
+                records: Iterable = csv.reader(file)
+                header = [name.strip() for name in next(records, [])]
+            else:
+                records = (line for line in file if line.strip())
+            return self._import(format, header, records)
+
+    def import_records(self, records: Iterable[dict]) -> ImportStats:
+        """Imports already decoded records, e.g. from another source; parsed in this process."""
+        return self._import("records", None, records)
+
+    def _chunks(self, records: Iterable) -> Iterator[list[tuple[int, object]]]:
+        chunk = []
+        for row, record in enumerate(records, 1):
+            chunk.append((row, record))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _parsed(self, format: str, header: Optional[list[str]], records: Iterable) -> Iterator[list]:
+        if self.workers <= 0 or format == "records":
+            for chunk in self._chunks(records):
+                yield _parse_chunk(format, header, chunk)
+            return
+        # Pool.imap would read the whole file ahead; only a few chunks per worker are in flight here
+        with multiprocessing.Pool(self.workers) as pool:
+            pending: deque = deque()
+            for chunk in self._chunks(records):
+                pending.append(pool.apply_async(_parse_chunk, (format, header, chunk)))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def _import(self, format: str, header: Optional[list[str]], records: Iterable) -> ImportStats:
+        start = time.perf_counter()
+        rows = imported = rejected = 0
+        errors: list[tuple[int, str]] = []
+        batch: list[tuple[int, _ParsedBook]] = []
+
+        def reject(row: int, reason: str):
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < self.max_errors:
+                errors.append((row, reason))
+
+        for results in self._parsed(format, header, records):
+            for result in results:
+                rows += 1
+                if isinstance(result, _ParsedBook):
+                    batch.append((rows, result))
+                else:
+                    reject(*result)
+            if len(batch) >= self.batch_size:
+                imported += self._write(batch, reject)
+                batch = []
+        if batch:
+            imported += self._write(batch, reject)
+        stats = ImportStats(rows, imported, rejected, time.perf_counter() - start, errors)
+        logger.info(
+            "Imported %d of %d rows (%d rejected) in %.1fs, %.0f rows/s",
+            imported,
+            rows,
+            rejected,
+            stats.seconds,
+            stats.rows_per_second,
+        )
+        return stats
+
+    def _author(self, names: tuple[str, str]) -> Author:
+        author = self._authors.get(names)
+        if author is None:
+            author = LibraryRepository.read_author(*names)
+            if author is None:
+                author = Author(*names)
+                LibraryRepository.create_author(author)
+            self._authors[names] = author
+        return author
+
+    def _publisher(self, name: str) -> Publisher:
+        publisher = self._publishers.get(name)
+        if publisher is None:
+            publisher = LibraryRepository.read_publisher(name)
+            if publisher is None:
+                publisher = Publisher(name)
+                LibraryRepository.create_publisher(publisher)
+            self._publishers[name] = publisher
+        return publisher
+
+    def _write(self, batch: list[tuple[int, _ParsedBook]], reject) -> int:
+        imported = 0
+        # one transaction, and so one write_batch, per batch
+        with LibraryRepository.transaction():
+            for row, parsed in batch:
+                if LibraryRepository.read_book(parsed.isbn) is not None:
+                    reject(row, f"duplicate ISBN {parsed.isbn}")
+                    continue
+                book = Book(
+                    parsed.title,
+                    [self._author(names) for names in parsed.authors],
+                    self._publisher(parsed.publisher) if parsed.publisher is not None else None,
+                    parsed.publication_date,
+                    [Genre[name] for name in parsed.genres],
+                    parsed.pages,
+                    parsed.isbn,
+                    parsed.type,
+                    parsed.duration,
+                    parsed.existing_items,
+                    parsed.borrowed_items,
+                )
+                LibraryRepository.create_book(book)
+                imported += 1
+        return imported
+
+
+def import_catalogue(path: str, format: Optional[str] = None, **options: int) -> ImportStats:
+    """Shorthand for ``CatalogueImporter(**options).import_file(path, format)``."""
+    return CatalogueImporter(**options).import_file(path, format)
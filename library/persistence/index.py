@@ -0,0 +1,177 @@
+from __future__ import annotations
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.genre import Genre
+
+
+class _IndexedValues(NamedTuple):
+    genres: frozenset[Genre]
+    authors: frozenset[tuple[str, str]]
+    publisher: Optional[str]
+    available: bool
+
+
+def is_available(book: Book) -> bool:
+    """Whether ``book`` can be borrowed; a book of an unknown type is stored, but never available."""
+    try:
+        return book.can_borrow()
+    except AttributeError:
+        return False
+
+
+def _indexed_values(book: Book) -> _IndexedValues:
+    return _IndexedValues(
+        frozenset(book.genres),
+        frozenset((author.firstname, author.lastname) for author in book.authors),
+        book.publisher.name if book.publisher is not None else None,
+        is_available(book),
+    )
+
+
+class BookIndex:
+    """Inverted indexes from genre, author and publisher to ISBNs, plus the set of borrowable ISBNs.
+
+    ``update`` is called after a book has been mutated in place, so the values a book
+    was indexed under are remembered per ISBN to remove its stale postings.
+    Books share postings, so changes to the index are made under a lock of its own.
+    """
+
+    def __init__(self):
+        self.by_genre: dict[Genre, set[str]] = defaultdict(set)
+        self.by_author: dict[tuple[str, str], set[str]] = defaultdict(set)
+        self.by_publisher: dict[str, set[str]] = defaultdict(set)
+        self.available: set[str] = set()
+        self._indexed: dict[str, _IndexedValues] = {}
+        self._lock = threading.RLock()
+
+    def add(self, book: Book):
+        with self._lock:
+            self._add(book)
+
+    def _add(self, book: Book):
+        if book.isbn in self._indexed:
+            self._remove(book)
+        values = _indexed_values(book)
+        for genre in values.genres:
+            self.by_genre[genre].add(book.isbn)
+        for author in values.authors:
+            self.by_author[author].add(book.isbn)
+        if values.publisher is not None:
+            self.by_publisher[values.publisher].add(book.isbn)
+        if values.available:
+            self.available.add(book.isbn)
+        self._indexed[book.isbn] = values
+
+    def update(self, book: Book):
+        new = _indexed_values(book)
+        with self._lock:
+            self._update(book, new)
+
+    def _update(self, book: Book, new: _IndexedValues):
+        old = self._indexed.get(book.isbn)
+        if old is None or old[:3] != new[:3]:
+            self._add(book)
+            return
+        # borrow/return only change availability, the other postings stay as they are
+        if new.available:
+            self.available.add(book.isbn)
+        else:
+            self.available.discard(book.isbn)
+        self._indexed[book.isbn] = new
+
+    def remove(self, book: Book):
+        with self._lock:
+            self._remove(book)
+
+    def _remove(self, book: Book):
+        values = self._indexed.pop(book.isbn, None)
+        if values is None:
+            return
+        for genre in values.genres:
+            _discard(self.by_genre, genre, book.isbn)
+        for author in values.authors:
+            _discard(self.by_author, author, book.isbn)
+        if values.publisher is not None:
+            _discard(self.by_publisher, values.publisher, book.isbn)
+        self.available.discard(book.isbn)
+
+    def intersection(self, postings: list[set[str]]) -> set[str]:
+        """ISBNs in all of ``postings``, starting with the smallest set."""
+        with self._lock:
+            smallest, *others = sorted(postings, key=len)
+            return smallest.intersection(*others)
+
+    def clear(self):
+        with self._lock:
+            self.by_genre.clear()
+            self.by_author.clear()
+            self.by_publisher.clear()
+            self.available.clear()
+            self._indexed.clear()
+
+
+def _discard(postings: dict, key, isbn: str):
+    isbns = postings.get(key)
+    if isbns is not None:
+        isbns.discard(isbn)
+        if not isbns:
+            del postings[key]
+
+
+class BookQuery:
+    """Composable catalogue filter, e.g.
+    ``LibraryRepository.query_books().by_genre(Genre.MEDICINE).by_publisher("Basic Books").available().page(0, 20)``.
+
+    All filters are combined with AND. Candidate sets are intersected smallest first,
+    so a query costs time proportional to its result, not to the catalogue.
+    """
+
+    def __init__(self, index: BookIndex, books: dict[str, Book]):
+        self._index = index
+        self._books = books
+        self._filters: list[set[str]] = []
+
+    def by_genre(self, genre: Genre) -> BookQuery:
+        self._filters.append(self._index.by_genre.get(genre, set()))
+        return self
+
+    def by_author(self, firstname: str, lastname: str) -> BookQuery:
+        self._filters.append(self._index.by_author.get((firstname, lastname), set()))
+        return self
+
+    def by_publisher(self, name: str) -> BookQuery:
+        self._filters.append(self._index.by_publisher.get(name, set()))
+        return self
+
+    def available(self) -> BookQuery:
+        self._filters.append(self._index.available)
+        return self
+
+    def isbns(self) -> set[str]:
+        if not self._filters:
+            return set(self._books)
+        return self._index.intersection(self._filters)
+
+    def count(self) -> int:
+        return len(self.isbns())
+
+    def all(self) -> list[Book]:
+        return self.page(0)
+
+    def page(self, offset: int, limit: Optional[int] = None) -> list[Book]:
+        """Matching books ordered by ISBN."""
+        isbns = sorted(self.isbns())
+        end = None if limit is None else offset + limit
+        return [self._books[isbn] for isbn in isbns[offset:end]]
+
+    def __iter__(self) -> Iterator[Book]:
+        # ordered by ISBN like page(), without building the list of books
+        isbns = self._index.intersection(self._filters) if self._filters else self._books
+        for isbn in sorted(isbns):
+            book = self._books.get(isbn)
+            if book is not None:
+                yield book
@@ -0,0 +1,584 @@
+"""Crash recovery for the in-memory backend: a write-ahead log plus periodic snapshots.
+
+Every write appends one JSON line ``{"lsn": ..., "op": ..., "data": ...}`` to the log
+buffer and returns without waiting for the disk. The writes of a transaction go into one
+``"batch"`` record of ``[op, data]`` pairs, so a crash loses all of them or none. A background thread writes the buffer
+and calls ``fsync`` once for the whole batch (group commit). ``sync()`` blocks until all
+writes up to that point are durable.
+
+A snapshot holds the full image up to some LSN. Taking one switches the log to a new
+segment first, so all older segments can be deleted once the snapshot is on disk. The
+image is made of the encodings in the log, not of the live objects, which a transaction
+changes before its writes reach the backend and restores if it is rolled back.
+On start-up the newest snapshot is loaded and the segments after it are replayed.
+"""
+from __future__ import annotations
+import gc
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, BinaryIO, Iterator, NamedTuple, Optional
+
+from library.persistence import codec
+from library.persistence.memory import InMemoryBackend
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.user import User
+    from library.model.author import Author
+    from library.model.publisher import Publisher
+    from library.model.loan import Loan
+    from library.payment.invoice import Invoice
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_PREFIX = "journal-"
+# the kinds in a snapshot, in the order they are loaded
+_IMAGE_KINDS = ("authors", "publishers", "books", "loans", "users", "invoices")
+_SNAPSHOT_PREFIX = "snapshot-"
+
+
+def _segment_name(first_lsn: int) -> str:
+    return f"{_SEGMENT_PREFIX}{first_lsn:020d}.log"
+
+
+def _snapshot_name(lsn: int) -> str:
+    return f"{_SNAPSHOT_PREFIX}{lsn:020d}.json"
+
+
+def _files(directory: str, prefix: str) -> list[tuple[int, str]]:
+    """(lsn, path) of all files with ``prefix``, oldest first."""
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and not name.endswith(".tmp"):
+            found.append((int(name[len(prefix):].split(".")[0]), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _fsync_directory(directory: str):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def gc_paused():
+    """Recovery, snapshots and other bulk loads allocate a lot and free nothing, so the cyclic GC would only rescan the heap."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+class WriteAheadLog:
+    def __init__(self, directory: str, first_lsn: int, commit_interval: float = 0.005):
+        self._directory = directory
+        self._commit_interval = commit_interval
+        self._cond = threading.Condition()
+        # held while writing and syncing segments, so that they are written in LSN order
+        self._io_lock = threading.Lock()
+        self._buffer: list[bytes] = []
+        # (file, records, last LSN) of the segments rotate() ended that are not durable yet
+        self._retired: list[tuple] = []
+        self._lsn = first_lsn - 1
+        self._durable_lsn = first_lsn - 1
+        self._sync_requested = False
+        self._closed = False
+        self._file = open(os.path.join(directory, _segment_name(first_lsn)), "ab")
+        self._flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    @property
+    def lsn(self) -> int:
+        return self._lsn
+
+    def append(self, op: str, data) -> int:
+        with self._cond:
+            if self._closed:
+                raise ValueError("Write-ahead log is closed")
+            self._lsn += 1
+            record = {"lsn": self._lsn, "op": op, "data": data}
+            self._buffer.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            return self._lsn
+
+    def sync(self, lsn: Optional[int] = None):
+        """Blocks until every record up to ``lsn`` (default: the latest) is on disk."""
+        with self._cond:
+            lsn = self._lsn if lsn is None else lsn
+            while self._durable_lsn < lsn:
+                if self._closed:
+                    raise ValueError("Write-ahead log is closed")
+                self._sync_requested = True
+                self._cond.notify_all()
+                self._cond.wait()
+
+    def _take_batch(self) -> tuple[list[bytes], int, BinaryIO]:
+        batch, self._buffer = self._buffer, []
+        self._sync_requested = False
+        return batch, self._lsn, self._file
+
+    @staticmethod
+    def _write(file: BinaryIO, batch: list[bytes]):
+        file.write(b"".join(batch))
+        file.flush()
+        os.fsync(file.fileno())
+
+    def _take_retired(self) -> list[tuple]:
+        retired, self._retired = self._retired, []
+        return retired
+
+    def _finish_retired(self, retired: list[tuple]):
+        """Writes, syncs and closes the segments ended by rotate(); called under the I/O lock."""
+        if not retired:
+            return
+        for file, batch, _ in retired:
+            if batch:
+                self._write(file, batch)
+            file.close()
+        _fsync_directory(self._directory)
+
+    def _mark_durable(self, lsn: int):
+        with self._cond:
+            self._durable_lsn = max(self._durable_lsn, lsn)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and not self._sync_requested:
+                    self._cond.wait(self._commit_interval)
+                if self._closed:
+                    return
+            with self._io_lock:
+                # taken together, so that a segment ended by rotate() is written before the records after it
+                with self._cond:
+                    retired = self._take_retired()
+                    batch, lsn, file = self._take_batch()
+                self._finish_retired(retired)
+                if batch:
+                    self._write(file, batch)
+            self._mark_durable(lsn)
+
+    def rotate(self) -> int:
+        """Starts a new segment and returns the last LSN of the old ones.
+
+        Only swaps the files: the buffered records are written to the old segment and synced
+        by ``finish_rotation()`` or the flusher, so appends never wait for an fsync here.
+        """
+        with self._cond:
+            batch, lsn, file = self._take_batch()
+            self._retired.append((file, batch, lsn))
+            self._file = open(os.path.join(self._directory, _segment_name(lsn + 1)), "ab")
+        return lsn
+
+    def finish_rotation(self):
+        """Blocks until the segments ended by ``rotate()`` are durable."""
+        with self._io_lock:
+            with self._cond:
+                retired = self._take_retired()
+            self._finish_retired(retired)
+            if retired:
+                self._mark_durable(retired[-1][2])
+
+    def close(self):
+        with self._io_lock:
+            with self._cond:
+                retired = self._take_retired()
+                batch, lsn, file = self._take_batch()
+                self._closed = True
+            self._finish_retired(retired)
+            if batch:
+                self._write(file, batch)
+            file.close()
+            with self._cond:
+                self._durable_lsn = max(self._durable_lsn, lsn)
+                self._cond.notify_all()
+        self._flusher.join()
+
+
+class RecoveryReport(NamedTuple):
+    snapshot_lsn: int
+    replayed_records: int
+    seconds: float
+
+
+class JournaledBackend(InMemoryBackend):
+    """``InMemoryBackend`` that logs every write and recovers its state from ``directory`` on start-up.
+
+    With ``snapshot_interval`` (seconds) or ``snapshot_every`` (records) set, a background
+    thread takes snapshots; ``snapshot()`` can also be called directly.
+    """
+
+    # writes only append to the log buffer, but they wait while a snapshot copies the whole
+    # image, which takes a while for a large library
+    blocking = True
+
+    def __init__(
+        self,
+        directory: str,
+        commit_interval: float = 0.005,
+        snapshot_interval: Optional[float] = None,
+        snapshot_every: Optional[int] = None,
+    ):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._lock = threading.RLock()
+        # the [op, data] pairs of the write_batch in progress, None outside of one
+        self._batch: Optional[list[list]] = None
+        # email -> (read books, last read book, invoices, last invoice) as last logged, so an
+        # update only logs what was appended since
+        self._logged_users: dict[str, tuple[int, Optional[Book], int, Optional[Invoice]]] = {}
+        # kind -> key -> encoding, as of the last record in the log; snapshots are taken from it
+        self._committed: dict[str, dict] = {kind: {} for kind in _IMAGE_KINDS}
+        with gc_paused():
+            self.recovery = self._recover()
+        logger.info(
+            "Recovered %s from snapshot %d and %d log records in %.3fs",
+            directory,
+            *self.recovery,
+        )
+        self._snapshot_lsn = self.recovery.snapshot_lsn
+        last_lsn = self.recovery.snapshot_lsn + self.recovery.replayed_records
+        # segments after a gap or a torn record were not replayed and would clash with the new records
+        for first_lsn, path in _files(directory, _SEGMENT_PREFIX):
+            if first_lsn > last_lsn:
+                os.remove(path)
+        self.log = WriteAheadLog(directory, last_lsn + 1, commit_interval)
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_every = snapshot_every
+        self._snapshot_interval = snapshot_interval
+        self._stop = threading.Event()
+        self._snapshotter = None
+        if snapshot_interval is not None or snapshot_every is not None:
+            self._snapshotter = threading.Thread(target=self._run_snapshotter, name="snapshotter", daemon=True)
+            self._snapshotter.start()
+
+    # recovery
+    def _recover(self) -> RecoveryReport:
+        start = time.perf_counter()
+        snapshot_lsn = 0
+        snapshots = _files(self._directory, _SNAPSHOT_PREFIX)
+        if snapshots:
+            snapshot_lsn, path = snapshots[-1]
+            with open(path, "rb") as file:
+                self._load_image(json.load(file))
+        replayed = 0
+        last_lsn = snapshot_lsn
+        for record in self._log_records():
+            if record["lsn"] <= snapshot_lsn:
+                continue
+            if record["lsn"] != last_lsn + 1:
+                logger.warning("Gap in the write-ahead log after LSN %d, ignoring the rest", last_lsn)
+                break
+            self._apply(record["op"], record["data"])
+            self._commit(record["op"], record["data"])
+            last_lsn = record["lsn"]
+            replayed += 1
+        return RecoveryReport(snapshot_lsn, replayed, time.perf_counter() - start)
+
+    def _log_records(self) -> Iterator[dict]:
+        for _, path in _files(self._directory, _SEGMENT_PREFIX):
+            with open(path, "rb") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # a torn write at the end of the segment from a crash
+                        logger.warning("Skipping the torn tail of %s", path)
+                        break
+
+    def _apply(self, op: str, data):
+        if op == "batch":
+            for batched_op, batched_data in data:
+                self._apply(batched_op, batched_data)
+        elif op == "create_author":
+            InMemoryBackend.create_author(self, codec.decode_author(data))
+        elif op == "delete_author":
+            InMemoryBackend.delete_author(self, codec.decode_author(data))
+        elif op == "create_publisher":
+            InMemoryBackend.create_publisher(self, codec.decode_publisher(data))
+        elif op == "delete_publisher":
+            InMemoryBackend.delete_publisher(self, codec.decode_publisher(data))
+        elif op in ("create_book", "update_book"):
+            book = self.books.get(data["isbn"])
+            if book is None:
+                InMemoryBackend.create_book(self, codec.decode_book(data, self))
+            else:
+                # decoded in place with the logged version, which ``update_book`` would increment again
+                self.book_index.update(codec.decode_book(data, self, book))
+        elif op == "delete_book":
+            InMemoryBackend.delete_book(self, self.books[data])
+        elif op in ("create_user", "update_user"):
+            InMemoryBackend.create_user(self, codec.decode_user(data, self, self.users.get(data["email"])))
+        elif op == "delete_user":
+            InMemoryBackend.delete_user(self, self.users[data])
+        elif op in ("create_invoice", "update_invoice"):
+            invoice = codec.decode_invoice(data, self, self.invoices.get(data["id"]))
+            InMemoryBackend.create_invoice(self, invoice)
+        elif op == "delete_invoice":
+            InMemoryBackend.delete_invoice(self, self.invoices[data])
+        elif op in ("create_loan", "update_loan"):
+            loan = codec.decode_loan(data, self, self.loans.get(data["id"]))
+            if loan is not None:
+                InMemoryBackend.create_loan(self, loan)
+        elif op == "delete_loan":
+            InMemoryBackend.delete_loan(self, self.loans[data])
+        else:
+            raise ValueError(f"Unknown log record {op}")
+
+    # snapshots
+    def _commit(self, op: str, data):
+        """Applies a record appended to the log to the committed image."""
+        if op == "batch":
+            for batched_op, batched_data in data:
+                self._commit(batched_op, batched_data)
+            return
+        action, kind = op.split("_", 1)
+        entries = self._committed[kind + "s"]
+        if action == "delete":
+            entries.pop(tuple(data) if kind == "author" else data, None)
+            if kind == "user":
+                # with their loans, as in InMemoryBackend.delete_user
+                loans = self._committed["loans"]
+                for id in [id for id, loan in loans.items() if loan["email"] == data]:
+                    del loans[id]
+        elif kind == "author":
+            entries[tuple(data)] = data
+        elif kind == "publisher":
+            entries[data] = data
+        elif kind == "book":
+            entries[data["isbn"]] = data
+        elif kind == "user":
+            previous = entries.get(data["email"])
+            if previous is not None and ("read_books_added" in data or "invoices_added" in data):
+                # new lists rather than appends, a snapshot being written may still hold the old ones
+                data = dict(data)
+                if "read_books_added" in data:
+                    data["read_books"] = previous["read_books"] + data.pop("read_books_added")
+                if "invoices_added" in data:
+                    data["invoices"] = previous["invoices"] + data.pop("invoices_added")
+            entries[data["email"]] = data
+        else:
+            entries[data["id"]] = data
+
+    def _image(self) -> dict:
+        return {kind: list(entries.values()) for kind, entries in self._committed.items()}
+
+    def _load_image(self, image: dict):
+        self._committed["authors"] = {tuple(data): data for data in image["authors"]}
+        self._committed["publishers"] = {data: data for data in image["publishers"]}
+        self._committed["books"] = {data["isbn"]: data for data in image["books"]}
+        self._committed["loans"] = {data["id"]: data for data in image["loans"]}
+        self._committed["users"] = {data["email"]: data for data in image["users"]}
+        self._committed["invoices"] = {data["id"]: data for data in image["invoices"]}
+        for data in image["authors"]:
+            InMemoryBackend.create_author(self, codec.decode_author(data))
+        for data in image["publishers"]:
+            InMemoryBackend.create_publisher(self, codec.decode_publisher(data))
+        for data in image["books"]:
+            InMemoryBackend.create_book(self, codec.decode_book(data, self))
+        # loans before the users, which take their loans from the backend
+        for data in image["loans"]:
+            loan = codec.decode_loan(data, self)
+            if loan is not None:
+                InMemoryBackend.create_loan(self, loan)
+        # users before invoices, which need their customer, then link the users' invoices
+        for data in image["users"]:
+            InMemoryBackend.create_user(self, codec.decode_user(data, self))
+        for data in image["invoices"]:
+            InMemoryBackend.create_invoice(self, codec.decode_invoice(data, self))
+        for data in image["users"]:
+            codec.link_invoices(self.users[data["email"]], data["invoices"], self)
+
+    def snapshot(self) -> int:
+        """Writes a full image, deletes the log segments it covers and returns its LSN."""
+        with self._snapshot_lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> int:
+        # writers wait while the image is copied, it is encoded and written without the lock
+        with self._lock, gc_paused():
+            lsn = self.log.rotate()
+            image = self._image()
+        # the old segments are written and synced after the writers are let go
+        self.log.finish_rotation()
+        path = os.path.join(self._directory, _snapshot_name(lsn))
+        with open(path + ".tmp", "wb") as file:
+            file.write(json.dumps(image, separators=(",", ":")).encode())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_directory(self._directory)
+        for first_lsn, old in _files(self._directory, _SEGMENT_PREFIX):
+            if first_lsn <= lsn:
+                os.remove(old)
+        for old_lsn, old in _files(self._directory, _SNAPSHOT_PREFIX):
+            if old_lsn < lsn:
+                os.remove(old)
+        self._snapshot_lsn = lsn
+        return lsn
+
+    def _run_snapshotter(self):
+        poll = min(self._snapshot_interval or 1.0, 1.0)
+        last = time.monotonic()
+        while not self._stop.wait(poll):
+            due = self._snapshot_interval is not None and time.monotonic() - last >= self._snapshot_interval
+            if self._snapshot_every is not None and self.log.lsn - self._snapshot_lsn >= self._snapshot_every:
+                due = True
+            if due and self.log.lsn > self._snapshot_lsn:
+                self.snapshot()
+                last = time.monotonic()
+
+    def sync(self):
+        self.log.sync()
+
+    def close(self):
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.log.close()
+
+    # logged writes
+    def _log(self, op: str, data):
+        if self._batch is not None:
+            self._batch.append([op, data])
+        else:
+            self._append(op, data)
+
+    def _append(self, op: str, data):
+        self.log.append(op, data)
+        self._commit(op, data)
+
+    def write_batch(self, operations: list[tuple[str, object]]):
+        # one lock for the whole batch, so a snapshot never contains half of it
+        with self._lock:
+            self._batch = []
+            try:
+                super().write_batch(operations)
+            finally:
+                batch, self._batch = self._batch, None
+                if batch:
+                    self._append("batch", batch)
+
+    def _logged_lengths(self, user: User) -> tuple[int, int]:
+        """How many of the user's read books and invoices are in the log as they are now; 0 if that list changed otherwise."""
+        read_books, invoices = user.read_books, user.invoices
+        read_count, last_read, invoice_count, last_invoice = self._logged_users.get(user.email, (0, None, 0, None))
+        if read_count > len(read_books) or (read_count and read_books[read_count - 1] is not last_read):
+            read_count = 0
+        if invoice_count > len(invoices) or (invoice_count and invoices[invoice_count - 1] is not last_invoice):
+            invoice_count = 0
+        return read_count, invoice_count
+
+    def _encode_user(self, user: User) -> dict:
+        # read books and invoices are only appended to, so an update logs just the new ones
+        read_count, invoice_count = self._logged_lengths(user)
+        read_books, invoices = user.read_books, user.invoices
+        self._logged_users[user.email] = (
+            len(read_books),
+            read_books[-1] if read_books else None,
+            len(invoices),
+            invoices[-1] if invoices else None,
+        )
+        return codec.encode_user(user, read_count, invoice_count)
+
+    def create_book(self, book: Book):
+        with self._lock:
+            super().create_book(book)
+            self._log("create_book", codec.encode_book(book))
+
+    def update_book(self, book: Book):
+        with self._lock:
+            super().update_book(book)
+            self._log("update_book", codec.encode_book(book))
+
+    def delete_book(self, book: Book):
+        with self._lock:
+            super().delete_book(book)
+            self._log("delete_book", book.isbn)
+
+    def create_user(self, user: User):
+        with self._lock:
+            super().create_user(user)
+            self._logged_users.pop(user.email, None)
+            self._log("create_user", self._encode_user(user))
+
+    def update_user(self, user: User):
+        with self._lock:
+            super().update_user(user)
+            self._log("update_user", self._encode_user(user))
+
+    def delete_user(self, user: User):
+        with self._lock:
+            super().delete_user(user)
+            self._logged_users.pop(user.email, None)
+            self._log("delete_user", user.email)
+
+    def create_author(self, author: Author):
+        with self._lock:
+            super().create_author(author)
+            self._log("create_author", codec.encode_author(author))
+
+    def update_author(self, author: Author):
+        # an author has no state besides its key, so there is nothing to log
+        with self._lock:
+            super().update_author(author)
+
+    def delete_author(self, author: Author):
+        with self._lock:
+            super().delete_author(author)
+            self._log("delete_author", codec.encode_author(author))
+
+    def create_publisher(self, publisher: Publisher):
+        with self._lock:
+            super().create_publisher(publisher)
+            self._log("create_publisher", codec.encode_publisher(publisher))
+
+    def update_publisher(self, publisher: Publisher):
+        with self._lock:
+            super().update_publisher(publisher)
+
+    def delete_publisher(self, publisher: Publisher):
+        with self._lock:
+            super().delete_publisher(publisher)
+            self._log("delete_publisher", codec.encode_publisher(publisher))
+
+    def create_invoice(self, invoice: Invoice):
+        with self._lock:
+            super().create_invoice(invoice)
+            self._log("create_invoice", codec.encode_invoice(invoice))
+
+    def update_invoice(self, invoice: Invoice):
+        with self._lock:
+            super().update_invoice(invoice)
+            self._log("update_invoice", codec.encode_invoice(invoice))
+
+    def delete_invoice(self, invoice: Invoice):
+        with self._lock:
+            super().delete_invoice(invoice)
+            self._log("delete_invoice", invoice.id)
+
+    def create_loan(self, loan: Loan):
+        with self._lock:
+            super().create_loan(loan)
+            self._log("create_loan", codec.encode_loan(loan))
+
+    def update_loan(self, loan: Loan):
+        with self._lock:
+            super().update_loan(loan)
+            self._log("update_loan", codec.encode_loan(loan))
+
+    def delete_loan(self, loan: Loan):
+        with self._lock:
+            super().delete_loan(loan)
+            self._log("delete_loan", loan.id)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator
+
+
+class LockStripes:
+    """A fixed array of re-entrant locks; a key (ISBN, email, ...) is guarded by the lock its hash maps to.
+
+    Threads working on different books or users mostly take different locks, and the
+    memory stays constant however many keys there are. ``locked`` takes all locks for
+    several keys in index order, so two threads can never wait for each other in a cycle.
+    """
+
+    def __init__(self, stripes: int = 64):
+        if stripes < 1:
+            raise ValueError("At least one lock stripe is needed")
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        self._held = _Held()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def _index(self, key: Hashable) -> int:
+        return hash(key) % len(self._locks)
+
+    def lock_for(self, key: Hashable) -> threading.RLock:
+        return self._locks[self._index(key)]
+
+    @contextmanager
+    def locked(self, *keys: Hashable) -> Iterator[None]:
+        locks = [self._locks[index] for index in sorted({self._index(key) for key in keys})]
+        held = self._held
+        held.depth += 1
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            held.depth -= 1
+            if held.depth == 0 and held.deferred:
+                deferred, held.deferred = held.deferred, []
+                for callback in deferred:
+                    callback()
+
+    def when_unlocked(self, callback: Callable[[], None]):
+        """Calls ``callback`` once this thread has left all ``locked`` blocks, right away if it is in none."""
+        held = self._held
+        if held.depth == 0:
+            callback()
+        else:
+            held.deferred.append(callback)
+
+
+class _Held(threading.local):
+    def __init__(self):
+        # the locked blocks this thread is in, and what waits for it to leave them
+        self.depth = 0
+        self.deferred: list[Callable[[], None]] = []
@@ -0,0 +1,234 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+
+from library.persistence.backend import StorageBackend
+from library.persistence.index import BookIndex, BookQuery
+from library.persistence.unit_of_work import entity_key
+from library.persistence.versioning import VERSIONED_KINDS, check_version
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+    from library.model.user import User
+    from library.model.author import Author
+    from library.model.publisher import Publisher
+    from library.model.loan import Loan
+    from library.payment.invoice import Invoice
+
+
+def _author_key(author: Author) -> tuple[str, str]:
+    return author.firstname, author.lastname
+
+
+class InMemoryBackend(StorageBackend):
+    blocking = False
+
+    def __init__(self):
+        # Primary-key indexes. Dicts keep insertion order, so the list-returning
+        # ``read_*`` methods still list entities in the order they were created.
+        self.users: dict[str, User] = {}
+        self.books: dict[str, Book] = {}
+        self.authors: dict[tuple[str, str], Author] = {}
+        self.publishers: dict[str, Publisher] = {}
+        self.invoices: dict[str, Invoice] = {}
+        self.loans: dict[str, Loan] = {}
+        # Secondary indexes for catalogue queries, maintained by create/update/delete_book.
+        self.book_index = BookIndex()
+        # email / ISBN -> {loan id: loan}, maintained by create/delete_loan
+        self.loans_by_user: dict[str, dict[str, Loan]] = {}
+        self.loans_by_book: dict[str, dict[str, Loan]] = {}
+
+    def write_batch(self, operations: list[tuple[str, object]]):
+        # check every update and delete first, so a batch is applied completely or not at all
+        created = set()
+        for operation, entity in operations:
+            action, kind = operation.split("_", 1)
+            key = entity_key(kind, entity)
+            if action == "create":
+                created.add((kind, key))
+            elif (kind, key) not in created:
+                stored = getattr(self, kind + "s").get(key)
+                if stored is None:
+                    raise ValueError(f"{kind.capitalize()} {key} does not exist")
+                if action == "update" and kind in VERSIONED_KINDS:
+                    check_version(kind, key, entity, stored.version)
+            if action == "delete":
+                created.discard((kind, key))
+        super().write_batch(operations)
+
+    def read_users(self) -> list[User]:
+        return list(self.users.values())
+
+    def read_books(self) -> list[Book]:
+        return list(self.books.values())
+
+    def read_authors(self) -> list[Author]:
+        return list(self.authors.values())
+
+    def read_publishers(self) -> list[Publisher]:
+        return list(self.publishers.values())
+
+    def read_invoices(self) -> list[Invoice]:
+        return list(self.invoices.values())
+
+    def read_loans(self) -> list[Loan]:
+        return list(self.loans.values())
+
+    def query_books(self) -> BookQuery:
+        return BookQuery(self.book_index, self.books)
+
+    # books
+    def create_book(self, book: Book):
+        self.books[book.isbn] = book
+        self.book_index.add(book)
+
+    def read_book(self, isbn: str) -> Optional[Book]:
+        return self.books.get(isbn)
+
+    def update_book(self, book: Book):
+        stored = self.books.get(book.isbn)
+        if stored is None:
+            raise ValueError(f"Book {book.isbn} does not exist")
+        check_version("book", book.isbn, book, stored.version)
+        book.version += 1
+        self.books[book.isbn] = book
+        self.book_index.update(book)
+
+    def refresh_book(self, book: Book):
+        # usually ``book`` is the stored object itself, only a copy can be out of date
+        stored = self.books.get(book.isbn)
+        if stored is not None and stored is not book:
+            from library.persistence import codec
+
+            codec.decode_book(codec.encode_book(stored), self, book)
+
+    def delete_book(self, book: Book):
+        if self.books.pop(book.isbn, None) is None:
+            raise ValueError(f"Book {book.isbn} does not exist")
+        self.book_index.remove(book)
+
+    # users
+    def create_user(self, user: User):
+        self.users[user.email] = user
+
+    def read_user(self, email: str) -> Optional[User]:
+        return self.users.get(email)
+
+    def update_user(self, user: User):
+        stored = self.users.get(user.email)
+        if stored is None:
+            raise ValueError(f"User {user.email} does not exist")
+        check_version("user", user.email, user, stored.version)
+        user.version += 1
+        self.users[user.email] = user
+
+    def refresh_user(self, user: User):
+        stored = self.users.get(user.email)
+        if stored is not None and stored is not user:
+            from library.persistence import codec
+
+            codec.decode_user(codec.encode_user(stored), self, user)
+
+    def delete_user(self, user: User):
+        """Deletes the user together with their loans."""
+        if self.users.pop(user.email, None) is None:
+            raise ValueError(f"User {user.email} does not exist")
+        for loan in self.loans_by_user.pop(user.email, {}).values():
+            del self.loans[loan.id]
+            _unindex(self.loans_by_book, loan.isbn, loan.id)
+
+    # author
+    def create_author(self, author: Author):
+        self.authors[_author_key(author)] = author
+
+    def read_author(self, firstname: str, lastname: str) -> Optional[Author]:
+        return self.authors.get((firstname, lastname))
+
+    def update_author(self, author: Author):
+        if _author_key(author) not in self.authors:
+            raise ValueError(f"Author {author.get_fullname()} does not exist")
+        self.authors[_author_key(author)] = author
+
+    def delete_author(self, author: Author):
+        if self.authors.pop(_author_key(author), None) is None:
+            raise ValueError(f"Author {author.get_fullname()} does not exist")
+
+    # publisher
+    def create_publisher(self, publisher: Publisher):
+        self.publishers[publisher.name] = publisher
+
+    def read_publisher(self, name: str) -> Optional[Publisher]:
+        return self.publishers.get(name)
+
+    def update_publisher(self, publisher: Publisher):
+        if publisher.name not in self.publishers:
+            raise ValueError(f"Publisher {publisher.name} does not exist")
+        self.publishers[publisher.name] = publisher
+
+    def delete_publisher(self, publisher: Publisher):
+        if self.publishers.pop(publisher.name, None) is None:
+            raise ValueError(f"Publisher {publisher.name} does not exist")
+
+    # invoice
+    def create_invoice(self, invoice: Invoice):
+        self.invoices[invoice.id] = invoice
+
+    def read_invoice(self, id: str) -> Optional[Invoice]:
+        return self.invoices.get(id)
+
+    def update_invoice(self, invoice: Invoice):
+        stored = self.invoices.get(invoice.id)
+        if stored is None:
+            raise ValueError(f"Invoice {invoice.id} does not exist")
+        check_version("invoice", invoice.id, invoice, stored.version)
+        invoice.version += 1
+        self.invoices[invoice.id] = invoice
+
+    def refresh_invoice(self, invoice: Invoice):
+        stored = self.invoices.get(invoice.id)
+        if stored is not None and stored is not invoice:
+            from library.persistence import codec
+
+            codec.decode_invoice(codec.encode_invoice(stored), self, invoice)
+
+    def delete_invoice(self, invoice: Invoice):
+        if self.invoices.pop(invoice.id, None) is None:
+            raise ValueError(f"Invoice {invoice.id} does not exist")
+
+    # loan
+    def create_loan(self, loan: Loan):
+        self._store_loan(loan)
+
+    def _store_loan(self, loan: Loan):
+        # the book and the user of a loan never change, so its index entries stay where they are
+        self.loans[loan.id] = loan
+        self.loans_by_user.setdefault(loan.email, {})[loan.id] = loan
+        self.loans_by_book.setdefault(loan.isbn, {})[loan.id] = loan
+
+    def read_loan(self, id: str) -> Optional[Loan]:
+        return self.loans.get(id)
+
+    def update_loan(self, loan: Loan):
+        if loan.id not in self.loans:
+            raise ValueError(f"Loan {loan.id} does not exist")
+        self._store_loan(loan)
+
+    def delete_loan(self, loan: Loan):
+        stored = self.loans.pop(loan.id, None)
+        if stored is None:
+            raise ValueError(f"Loan {loan.id} does not exist")
+        _unindex(self.loans_by_user, stored.email, stored.id)
+        _unindex(self.loans_by_book, stored.isbn, stored.id)
+
+    def loans_of_user(self, email: str) -> list[Loan]:
+        return list(self.loans_by_user.get(email, {}).values())
+
+    def loans_of_book(self, isbn: str) -> list[Loan]:
+        return list(self.loans_by_book.get(isbn, {}).values())
+
+
+def _unindex(index: dict[str, dict[str, Loan]], key: str, id: str):
+    loans = index.get(key)
+    if loans is not None:
+        loans.pop(id, None)
+        if not loans:
+            del index[key]
@@ -0,0 +1,407 @@
+"""Full-text search over the catalogue: titles, author names and publishers.
+
+    index = SearchIndex.from_repository("search.json")
+    index.search("deep medic")                 # type-ahead: the last word is a prefix
+    index.save("search.json")                  # at shutdown, for a fast start next time
+
+Text is split into words after case and diacritic folding, so "Émile" is found as "emile".
+Every word of the query must match. The hits are ranked with BM25, counting a word in the
+title three times and in an author's name twice as much as in the publisher's name. A prefix
+scores like the best of the words it stands for.
+
+The books of a word are kept in buckets of the same term frequency and length, which all
+score the same for that word. A query goes through the buckets of one of its words, best
+first, splits each up by intersecting it with the buckets of the other words of the same
+length, and stops once no book left can beat the ones found. No book is scored on its own,
+and the buckets of a frequent word that cannot reach the results are skipped.
+
+The index follows ``create_book``/``update_book``/``delete_book`` through the repository
+once attached. A saved index only knows the books as they were when it was saved:
+``from_repository`` compares it with the stored books and re-indexes those added, changed
+or deleted since, while ``load`` takes it as it is.
+"""
+from __future__ import annotations
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+from library.persistence.journal import gc_paused
+from library.persistence.storage import LibraryRepository
+
+if TYPE_CHECKING:
+    from library.model.book import Book
+
+_WORD = re.compile(r"\w+")
+# term frequency weights of the fields
+_TITLE, _AUTHOR, _PUBLISHER = 3, 2, 1
+# BM25 parameters
+_K1, _B = 1.2, 0.75
+# new words are merged into the sorted vocabulary by the first prefix query after there are this many
+_MERGE_AT = 1024
+_FORMAT = 1
+
+
+class SearchHit(NamedTuple):
+    isbn: str
+    score: float
+
+
+def words(text: str) -> list[str]:
+    """The words of ``text``, lower-cased and without diacritics."""
+    folded = unicodedata.normalize("NFKD", text.casefold())
+    return _WORD.findall("".join(char for char in folded if not unicodedata.combining(char)))
+
+
+def _fields(book: Book) -> tuple[str, str, str]:
+    authors = "\n".join(author.get_fullname() for author in book.authors)
+    return book.title or "", authors, book.publisher.name if book.publisher is not None else ""
+
+
+def _signature(fields: tuple[str, str, str]) -> int:
+    # stable across processes, unlike hash(), so it can be saved
+    return zlib.crc32("\x1f".join(fields).encode())
+
+
+def _idf(count: int, frequency: int) -> float:
+    return math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+
+def _saturation(frequency: int, length: int, average: float) -> float:
+    return frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * length / average))
+
+
+def _by_length(buckets: list[tuple[float, int, set[int]]]) -> dict[int, list[tuple[float, set[int]]]]:
+    by_length: dict[int, list[tuple[float, set[int]]]] = {}
+    for contribution, length, documents in buckets:
+        by_length.setdefault(length, []).append((contribution, documents))
+    return by_length
+
+
+def _bounded(buckets: list[tuple[float, int, set[int]]], others: list[dict[int, list[tuple[float, set[int]]]]]):
+    """The buckets with the best score their books can reach, the best first; a book shares its length with its buckets."""
+    bounded = []
+    for contribution, length, documents in buckets:
+        bound = contribution
+        for by_length in others:
+            same_length = by_length.get(length)
+            if same_length is None:
+                break
+            bound += same_length[0][0]
+        else:
+            bounded.append((bound, contribution, length, documents))
+    bounded.sort(key=lambda bucket: bucket[:2], reverse=True)
+    return bounded
+
+
+def _split(partitions: list[tuple[float, set[int]]], buckets) -> list[tuple[float, set[int]]]:
+    """Keeps the documents with a word of the buckets, each with the score of its best bucket added."""
+    split = []
+    for score, documents in partitions:
+        taken: set[int] = set()
+        for contribution, bucket in buckets:
+            matches = documents & bucket
+            if taken:
+                matches -= taken
+            if matches:
+                split.append((score + contribution, matches))
+                taken |= matches
+                if len(taken) == len(documents):
+                    break
+    return split
+
+
+class SearchIndex:
+    """Inverted index from word to the books with it, by weighted term frequency and length."""
+
+    def __init__(self, max_expansions: int = 64):
+        # words a prefix stands for, at most; the first ones in alphabetical order
+        self.max_expansions = max_expansions
+        self._lock = threading.RLock()
+        # word -> (weighted term frequency, length) -> documents
+        self._postings: dict[str, dict[tuple[int, int], set[int]]] = {}
+        # word -> number of documents with it
+        self._counts: dict[str, int] = {}
+        # per document, None once deleted: ISBN, weighted length, signature, term frequencies
+        self._isbns: list[Optional[str]] = []
+        self._lengths: list[int] = []
+        self._signatures: list[int] = []
+        self._terms: list[Optional[dict[str, int]]] = []
+        self._documents: dict[str, int] = {}
+        self._free: list[int] = []
+        self._total_length = 0
+        # sorted words for prefix queries, plus the words added since it was sorted
+        self._vocabulary: list[str] = []
+        self._new_words: set[str] = set()
+        self._attached = False
+
+    @classmethod
+    def from_repository(cls, path: Optional[str] = None, max_expansions: int = 64) -> SearchIndex:
+        """An index of the stored books that follows all later writes; loaded from ``path`` if it
+        exists and brought up to date with the books stored since it was saved."""
+        index = cls(max_expansions)
+        with index._lock, gc_paused():
+            # the writes seen from now on wait for the lock, and are applied to the books as read
+            index.attach()
+            if path is not None and os.path.exists(path):
+                index._load(path)
+            stored = set()
+            for book in LibraryRepository.read_books():
+                stored.add(book.isbn)
+                # a book whose text is as saved keeps its signature and is skipped
+                index._add(book)
+            for isbn in [isbn for isbn in index._documents if isbn not in stored]:
+                index._remove(isbn)
+            index._merge_vocabulary()
+        return index
+
+    def attach(self):
+        if not self._attached:
+            LibraryRepository.add_write_listener(self._written)
+            self._attached = True
+
+    def detach(self):
+        if self._attached:
+            LibraryRepository.remove_write_listener(self._written)
+            self._attached = False
+
+    def _written(self, operations: list[tuple[str, Any]]):
+        for operation, entity in operations:
+            if operation == "create_book" or operation == "update_book":
+                self.add(entity)
+            elif operation == "delete_book":
+                self.remove(entity.isbn)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, book: Book):
+        """Indexes ``book``, or re-indexes it if its title, authors or publisher changed."""
+        with self._lock:
+            self._add(book)
+
+    def _add(self, book: Book):
+        fields = _fields(book)
+        signature = _signature(fields)
+        document = self._documents.get(book.isbn)
+        if document is not None:
+            # borrowing and returning update the book but not its text
+            if self._signatures[document] == signature:
+                return
+            self._remove(book.isbn)
+        terms: dict[str, int] = {}
+        for text, weight in zip(fields, (_TITLE, _AUTHOR, _PUBLISHER)):
+            for word in words(text):
+                terms[word] = terms.get(word, 0) + weight
+        self._insert(book.isbn, signature, terms)
+
+    def _insert(self, isbn: str, signature: int, terms: dict[str, int]):
+        length = sum(terms.values())
+        if self._free:
+            document = self._free.pop()
+            self._isbns[document] = isbn
+            self._lengths[document] = length
+            self._signatures[document] = signature
+            self._terms[document] = terms
+        else:
+            document = len(self._isbns)
+            self._isbns.append(isbn)
+            self._lengths.append(length)
+            self._signatures.append(signature)
+            self._terms.append(terms)
+        self._documents[isbn] = document
+        self._total_length += length
+        for word, frequency in terms.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                self._counts[word] = 0
+                if not self._in_vocabulary(word):
+                    self._new_words.add(word)
+            bucket = postings.get((frequency, length))
+            if bucket is None:
+                bucket = postings[frequency, length] = set()
+            bucket.add(document)
+            self._counts[word] += 1
+
+    def _in_vocabulary(self, word: str) -> bool:
+        position = bisect_left(self._vocabulary, word)
+        return position < len(self._vocabulary) and self._vocabulary[position] == word
+
+    def remove(self, isbn: str):
+        with self._lock:
+            self._remove(isbn)
+
+    def _remove(self, isbn: str):
+        document = self._documents.pop(isbn, None)
+        if document is None:
+            return
+        length = self._lengths[document]
+        for word, frequency in self._terms[document].items():
+            postings = self._postings[word]
+            bucket = postings[frequency, length]
+            bucket.discard(document)
+            if not bucket:
+                del postings[frequency, length]
+            self._counts[word] -= 1
+            if not postings:
+                # left in the sorted vocabulary until its next merge
+                del self._postings[word]
+                del self._counts[word]
+                self._new_words.discard(word)
+        self._total_length -= self._lengths[document]
+        self._isbns[document] = None
+        self._terms[document] = None
+        self._free.append(document)
+
+    def _merge_vocabulary(self):
+        self._vocabulary = sorted(
+            [word for word in self._vocabulary if word in self._postings] + list(self._new_words)
+        )
+        self._new_words.clear()
+
+    def _expand(self, prefix: str) -> list[str]:
+        """The indexed words starting with ``prefix``, at most ``max_expansions`` of them."""
+        if len(self._new_words) >= _MERGE_AT:
+            self._merge_vocabulary()
+        expansions = []
+        vocabulary = self._vocabulary
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and len(expansions) < self.max_expansions:
+            word = vocabulary[position]
+            if not word.startswith(prefix):
+                break
+            if word in self._postings:
+                expansions.append(word)
+            position += 1
+        expansions.extend(sorted(word for word in self._new_words if word.startswith(prefix)))
+        return sorted(expansions)[:self.max_expansions]
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> list[SearchHit]:
+        """The best ``limit`` books with all words of ``query``, ties by ISBN; with ``prefix`` the last word may be incomplete."""
+        terms = words(query)
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            partial = terms.pop() if prefix else None
+            groups = [[word] for word in dict.fromkeys(terms)]
+            if partial is not None:
+                groups.append(self._expand(partial))
+            if any(not group or group[0] not in self._postings for group in groups):
+                return []
+            count = len(self._documents)
+            average = self._total_length / count
+            ranked = [
+                self._ranked({word: _idf(count, self._counts[word]) for word in group}, average) for group in groups
+            ]
+            by_length = [_by_length(buckets) for buckets in ranked]
+            sizes = [sum(self._counts[word] for word in group) for group in groups]
+            # the books of one word (or prefix) are split up by the buckets of the others with the
+            # same length; the cheapest has few books and the others few buckets per length
+            driver = min(
+                range(len(groups)),
+                key=lambda i: sizes[i] * sum(len(ranked[j]) / len(by_length[j]) for j in range(len(groups)) if j != i),
+            )
+            others = [lengths for i, lengths in enumerate(by_length) if i != driver]
+            # (score, documents with that score)
+            found: list[tuple[float, set[int]]] = []
+            # the best ``limit`` scores so far, the lowest first
+            kth: list[float] = []
+            seen: Optional[set[int]] = set() if len(groups[driver]) > 1 else None
+            for bound, contribution, length, documents in _bounded(ranked[driver], others):
+                if len(kth) == limit and kth[0] > bound * (1 + 1e-9):
+                    break
+                if seen is not None:
+                    # a book with several words of a prefix counts with the best one
+                    documents = documents - seen
+                    seen |= documents
+                partitions = [(contribution, documents)]
+                for by_length in others:
+                    partitions = _split(partitions, by_length.get(length, ()))
+                for score, matches in partitions:
+                    found.append((score, matches))
+                    for _ in range(min(len(matches), limit)):
+                        if len(kth) < limit:
+                            heapq.heappush(kth, score)
+                        elif score > kth[0]:
+                            heapq.heapreplace(kth, score)
+            return self._hits(found, limit)
+
+    def _ranked(self, idfs: dict[str, float], average: float) -> list[tuple[float, int, set[int]]]:
+        """The buckets of the words with their score for the word, the best first."""
+        buckets = [
+            (idf * _saturation(frequency, length, average), length, documents)
+            for word, idf in idfs.items()
+            for (frequency, length), documents in self._postings[word].items()
+        ]
+        buckets.sort(key=lambda bucket: bucket[0], reverse=True)
+        return buckets
+
+    def _hits(self, found: list[tuple[float, set[int]]], limit: int) -> list[SearchHit]:
+        found.sort(key=lambda partition: partition[0], reverse=True)
+        hits = []
+        position = 0
+        while position < len(found) and len(hits) < limit:
+            score = found[position][0]
+            tied = []
+            while position < len(found) and found[position][0] == score:
+                tied.extend(found[position][1])
+                position += 1
+            for document in heapq.nsmallest(limit - len(hits), tied, key=self._isbns.__getitem__):
+                hits.append(SearchHit(self._isbns[document], score))
+        return hits
+
+    def save(self, path: str):
+        """Writes the index to ``path`` atomically, as it is held in memory so that loading it is quick."""
+        with self._lock:
+            self._merge_vocabulary()
+            image = {
+                "format": _FORMAT,
+                "isbns": self._isbns,
+                "lengths": self._lengths,
+                "signatures": self._signatures,
+                "terms": self._terms,
+                # in the order of the sorted vocabulary
+                "postings": [
+                    [word, [[frequency, length, list(documents)] for (frequency, length), documents in buckets.items()]]
+                    for word, buckets in ((word, self._postings[word]) for word in self._vocabulary)
+                ],
+            }
+            data = json.dumps(image, separators=(",", ":")).encode()
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, max_expansions: int = 64) -> SearchIndex:
+        """An index read from ``path``, not attached to the repository."""
+        index = cls(max_expansions)
+        with index._lock, gc_paused():
+            index._load(path)
+        return index
+
+    def _load(self, path: str):
+        # into an empty index
+        with open(path, "rb") as file:
+            image = json.load(file)
+        if image.get("format") != _FORMAT:
+            raise ValueError(f"Unknown search index format {image.get('format')!r}")
+        self._isbns = image["isbns"]
+        self._lengths = image["lengths"]
+        self._signatures = image["signatures"]
+        self._terms = image["terms"]
+        self._documents = {isbn: document for document, isbn in enumerate(self._isbns) if isbn is not None}
+        self._free = [document for document, isbn in enumerate(self._isbns) if isbn is None]
+        self._total_length = sum(self._lengths[document] for document in self._documents.values())
+        for word, buckets in image["postings"]:
+            self._postings[word] = {(frequency, length): set(documents) for frequency, length, documents in buckets}
+            self._counts[word] = sum(len(documents) for _, _, documents in buckets)
+        self._vocabulary = [word for word, _ in image["postings"]]
@@ -0,0 +1,825 @@
+from __future__ import annotations
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional
+from weakref import WeakValueDictionary
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.publisher import Publisher
+from library.model.user import User
+from library.persistence.backend import StorageBackend
+from library.persistence.codec import decode_datetime, decode_set_aside, encode_datetime, encode_set_aside
+from library.persistence.index import is_available
+from library.persistence.versioning import VERSIONED_KINDS, ConflictError
+
+if TYPE_CHECKING:
+    from library.payment.invoice import Invoice
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS authors (
+    firstname TEXT NOT NULL,
+    lastname TEXT NOT NULL,
+    PRIMARY KEY (firstname, lastname)
+);
+CREATE TABLE IF NOT EXISTS publishers (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    publisher TEXT,
+    publication_date TEXT,
+    pages INTEGER,
+    type TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    existing_items INTEGER NOT NULL,
+    borrowed_items INTEGER NOT NULL,
+    -- JSON [[email, claim deadline], ...] of the copies set aside for holds
+    set_aside TEXT NOT NULL,
+    available INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_publisher ON books (publisher);
+CREATE INDEX IF NOT EXISTS books_available ON books (available);
+CREATE TABLE IF NOT EXISTS book_authors (
+    isbn TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    firstname TEXT NOT NULL,
+    lastname TEXT NOT NULL,
+    PRIMARY KEY (isbn, position)
+);
+CREATE INDEX IF NOT EXISTS book_authors_name ON book_authors (firstname, lastname);
+CREATE TABLE IF NOT EXISTS book_genres (
+    isbn TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    PRIMARY KEY (isbn, genre)
+);
+CREATE INDEX IF NOT EXISTS book_genres_genre ON book_genres (genre);
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    firstname TEXT,
+    lastname TEXT,
+    mobile_number1 TEXT,
+    mobile_number2 TEXT,
+    area_code TEXT,
+    landline_number TEXT,
+    country_calling_code TEXT,
+    reading_credits INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS loans (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    isbn TEXT NOT NULL,
+    due_date TEXT,
+    current_fee REAL
+);
+CREATE INDEX IF NOT EXISTS loans_email ON loans (email);
+CREATE INDEX IF NOT EXISTS loans_isbn ON loans (isbn);
+CREATE TABLE IF NOT EXISTS user_read_books (
+    email TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    isbn TEXT NOT NULL,
+    PRIMARY KEY (email, position)
+);
+CREATE TABLE IF NOT EXISTS invoices (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    is_closed INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS invoices_email ON invoices (email);
+CREATE TABLE IF NOT EXISTS invoice_books (
+    invoice_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    isbn TEXT NOT NULL,
+    current_fee REAL,
+    PRIMARY KEY (invoice_id, position)
+);
+"""
+# books loaded per query when a SQLiteBookQuery is iterated
+_ITER_PAGE_SIZE = 500
+
+# books
+_INSERT_BOOK = (
+    "INSERT OR REPLACE INTO books (isbn, title, publisher, publication_date, pages, type, duration, "
+    "existing_items, borrowed_items, set_aside, available, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPDATE_BOOK = (
+    "UPDATE books SET title = ?, publisher = ?, publication_date = ?, pages = ?, type = ?, duration = ?, "
+    "existing_items = ?, borrowed_items = ?, set_aside = ?, available = ?, version = version + 1 "
+    "WHERE isbn = ? AND version = ?"
+)
+_SELECT_BOOK = (
+    "SELECT title, publisher, publication_date, pages, type, duration, existing_items, borrowed_items, set_aside, "
+    "version FROM books WHERE isbn = ?"
+)
+_SELECT_BOOK_VERSION = "SELECT version FROM books WHERE isbn = ?"
+_SELECT_BOOK_AUTHORS = "SELECT firstname, lastname FROM book_authors WHERE isbn = ? ORDER BY position"
+_SELECT_BOOK_GENRES = "SELECT genre FROM book_genres WHERE isbn = ? ORDER BY rowid"
+_DELETE_BOOK = "DELETE FROM books WHERE isbn = ?"
+_DELETE_BOOK_AUTHORS = "DELETE FROM book_authors WHERE isbn = ?"
+_DELETE_BOOK_GENRES = "DELETE FROM book_genres WHERE isbn = ?"
+_INSERT_BOOK_AUTHOR = "INSERT INTO book_authors (isbn, position, firstname, lastname) VALUES (?, ?, ?, ?)"
+_INSERT_BOOK_GENRE = "INSERT OR IGNORE INTO book_genres (isbn, genre) VALUES (?, ?)"
+
+# users
+_INSERT_USER = (
+    "INSERT OR REPLACE INTO users (email, firstname, lastname, mobile_number1, mobile_number2, area_code, "
+    "landline_number, country_calling_code, reading_credits, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPDATE_USER = (
+    "UPDATE users SET firstname = ?, lastname = ?, mobile_number1 = ?, mobile_number2 = ?, area_code = ?, "
+    "landline_number = ?, country_calling_code = ?, reading_credits = ?, version = version + 1 "
+    "WHERE email = ? AND version = ?"
+)
+_SELECT_USER = (
+    "SELECT firstname, lastname, mobile_number1, mobile_number2, area_code, landline_number, "
+    "country_calling_code, reading_credits, version FROM users WHERE email = ?"
+)
+_SELECT_USER_VERSION = "SELECT version FROM users WHERE email = ?"
+_SELECT_USER_READ = "SELECT isbn FROM user_read_books WHERE email = ? ORDER BY position"
+_SELECT_USER_INVOICES = "SELECT id FROM invoices WHERE email = ? ORDER BY rowid"
+_DELETE_USER = "DELETE FROM users WHERE email = ?"
+_DELETE_USER_READ = "DELETE FROM user_read_books WHERE email = ?"
+_COUNT_USER_READ = "SELECT COUNT(*) FROM user_read_books WHERE email = ?"
+_INSERT_USER_READ = "INSERT INTO user_read_books (email, position, isbn) VALUES (?, ?, ?)"
+
+# loans
+_INSERT_LOAN = "INSERT OR REPLACE INTO loans (id, email, isbn, due_date, current_fee) VALUES (?, ?, ?, ?, ?)"
+_UPDATE_LOAN = "UPDATE loans SET due_date = ?, current_fee = ? WHERE id = ?"
+_SELECT_LOAN = "SELECT id, email, isbn, due_date, current_fee FROM loans WHERE id = ?"
+_SELECT_USER_LOANS = "SELECT id, email, isbn, due_date, current_fee FROM loans WHERE email = ? ORDER BY rowid"
+_SELECT_BOOK_LOANS = "SELECT id, email, isbn, due_date, current_fee FROM loans WHERE isbn = ? ORDER BY rowid"
+_DELETE_LOAN = "DELETE FROM loans WHERE id = ?"
+_DELETE_USER_LOANS = "DELETE FROM loans WHERE email = ?"
+
+# authors and publishers
+_INSERT_AUTHOR = "INSERT OR REPLACE INTO authors (firstname, lastname) VALUES (?, ?)"
+_SELECT_AUTHOR = "SELECT 1 FROM authors WHERE firstname = ? AND lastname = ?"
+_DELETE_AUTHOR = "DELETE FROM authors WHERE firstname = ? AND lastname = ?"
+_INSERT_PUBLISHER = "INSERT OR REPLACE INTO publishers (name) VALUES (?)"
+_SELECT_PUBLISHER = "SELECT 1 FROM publishers WHERE name = ?"
+_DELETE_PUBLISHER = "DELETE FROM publishers WHERE name = ?"
+
+# invoices
+_INSERT_INVOICE = "INSERT OR REPLACE INTO invoices (id, email, is_closed, version) VALUES (?, ?, ?, ?)"
+_UPDATE_INVOICE = (
+    "UPDATE invoices SET email = ?, is_closed = ?, version = version + 1 WHERE id = ? AND version = ?"
+)
+_SELECT_INVOICE = "SELECT email FROM invoices WHERE id = ?"
+_SELECT_INVOICE_ROW = "SELECT is_closed, version FROM invoices WHERE id = ?"
+_SELECT_INVOICE_VERSION = "SELECT version FROM invoices WHERE id = ?"
+_SELECT_INVOICE_BOOKS = "SELECT isbn, current_fee FROM invoice_books WHERE invoice_id = ? ORDER BY position"
+_DELETE_INVOICE = "DELETE FROM invoices WHERE id = ?"
+_DELETE_INVOICE_BOOKS = "DELETE FROM invoice_books WHERE invoice_id = ?"
+_INSERT_INVOICE_BOOK = "INSERT INTO invoice_books (invoice_id, position, isbn, current_fee) VALUES (?, ?, ?, ?)"
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections that can be shared by worker threads.
+
+    Every connection runs in WAL mode, so readers do not block the single writer.
+    The SQL above is kept in constants: ``sqlite3`` caches the prepared statement for
+    each distinct SQL string per connection, up to ``cached_statements`` of them.
+    """
+
+    def __init__(self, path: str, size: int = 8, cached_statements: int = 256, timeout: float = 30.0):
+        self._path = path
+        self._size = size
+        self._cached_statements = cached_statements
+        self._timeout = timeout
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self._path,
+            timeout=self._timeout,
+            check_same_thread=False,
+            cached_statements=self._cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self._size
+            if can_create:
+                self._created += 1
+        if not can_create:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a connection and runs the block in one transaction."""
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class SQLiteBookQuery:
+    """``BookQuery`` counterpart that translates the filters to indexed SQL."""
+
+    def __init__(self, backend: SQLiteBackend):
+        self._backend = backend
+        self._where: list[str] = []
+        self._params: list = []
+
+    def by_genre(self, genre: Genre) -> SQLiteBookQuery:
+        self._where.append("isbn IN (SELECT isbn FROM book_genres WHERE genre = ?)")
+        self._params.append(genre.name)
+        return self
+
+    def by_author(self, firstname: str, lastname: str) -> SQLiteBookQuery:
+        self._where.append("isbn IN (SELECT isbn FROM book_authors WHERE firstname = ? AND lastname = ?)")
+        self._params.extend((firstname, lastname))
+        return self
+
+    def by_publisher(self, name: str) -> SQLiteBookQuery:
+        self._where.append("publisher = ?")
+        self._params.append(name)
+        return self
+
+    def available(self) -> SQLiteBookQuery:
+        self._where.append("available = 1")
+        return self
+
+    def _sql(self, columns: str, *where: str) -> str:
+        conditions = [*self._where, *where]
+        sql = f"SELECT {columns} FROM books"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql
+
+    def isbns(self) -> set[str]:
+        with self._backend.pool.connection() as conn:
+            return {row[0] for row in conn.execute(self._sql("isbn"), self._params)}
+
+    def count(self) -> int:
+        with self._backend.pool.connection() as conn:
+            return conn.execute(self._sql("COUNT(*)"), self._params).fetchone()[0]
+
+    def all(self) -> list[Book]:
+        return self.page(0)
+
+    def page(self, offset: int, limit: Optional[int] = None) -> list[Book]:
+        """Matching books ordered by ISBN."""
+        sql = self._sql("isbn") + " ORDER BY isbn LIMIT ? OFFSET ?"
+        params = [*self._params, -1 if limit is None else limit, offset]
+        with self._backend.pool.connection() as conn:
+            isbns = [row[0] for row in conn.execute(sql, params)]
+            return [self._backend._load_book(conn, isbn) for isbn in isbns]
+
+    def __iter__(self) -> Iterator[Book]:
+        """Matching books ordered by ISBN, loaded a page at a time."""
+        sql = self._sql("isbn", "isbn > ?") + " ORDER BY isbn LIMIT ?"
+        last = ""
+        while True:
+            with self._backend.pool.connection() as conn:
+                isbns = [row[0] for row in conn.execute(sql, [*self._params, last, _ITER_PAGE_SIZE])]
+                books = [self._backend._load_book(conn, isbn) for isbn in isbns]
+            yield from books
+            if len(isbns) < _ITER_PAGE_SIZE:
+                return
+            last = isbns[-1]
+
+
+class SQLiteBackend(StorageBackend):
+    """Persists the library in a SQLite database.
+
+    Loaded entities are kept in a weak identity map, so within one process a
+    ``read_*`` returns the same object as long as somebody still holds it, just like
+    the in-memory backend does. Changes are written by the ``create_*``/``update_*`` calls.
+
+    Several processes can share one database file: updates of books, users and invoices
+    are conditional on their version, and ``refresh_*`` re-reads what another process changed.
+    """
+
+    def __init__(self, path: str, pool_size: int = 8):
+        self.pool = ConnectionPool(path, pool_size)
+        self._identity: WeakValueDictionary = WeakValueDictionary()
+        self._identity_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def close(self):
+        self.pool.close()
+
+    def write_batch(self, operations: list[tuple[str, object]]):
+        """Applies all writes in one SQLite transaction."""
+        updated = []
+        try:
+            with self.pool.connection() as conn:
+                for operation, entity in operations:
+                    getattr(self, "_" + operation)(conn, entity)
+                    action, kind = operation.split("_", 1)
+                    if action == "update" and kind in VERSIONED_KINDS:
+                        entity.version += 1
+                        updated.append(entity)
+        except BaseException:
+            # the transaction was rolled back, and so are the versions
+            for entity in updated:
+                entity.version -= 1
+            raise
+
+    def _check_updated(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor, kind: str, key, entity, sql: str):
+        """Raises if the conditional update in ``cursor`` matched no row."""
+        if cursor.rowcount == 0:
+            row = conn.execute(sql, (key,)).fetchone()
+            if row is None:
+                raise ValueError(f"{kind.capitalize()} {key} does not exist")
+            raise ConflictError(kind, key, entity.version, row[0])
+
+    def query_books(self) -> SQLiteBookQuery:
+        return SQLiteBookQuery(self)
+
+    def _cached(self, key: tuple):
+        with self._identity_lock:
+            return self._identity.get(key)
+
+    def _register(self, key: tuple, obj):
+        """Adds ``obj`` to the identity map unless another thread loaded it first."""
+        with self._identity_lock:
+            existing = self._identity.get(key)
+            if existing is not None:
+                return existing
+            self._identity[key] = obj
+            return obj
+
+    def _forget(self, key: tuple):
+        with self._identity_lock:
+            self._identity.pop(key, None)
+
+    def read_users(self) -> list[User]:
+        with self.pool.connection() as conn:
+            emails = [row[0] for row in conn.execute("SELECT email FROM users ORDER BY rowid")]
+            return [self._load_user(conn, email) for email in emails]
+
+    def read_books(self) -> list[Book]:
+        with self.pool.connection() as conn:
+            isbns = [row[0] for row in conn.execute("SELECT isbn FROM books ORDER BY rowid")]
+            return [self._load_book(conn, isbn) for isbn in isbns]
+
+    def read_authors(self) -> list[Author]:
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT firstname, lastname FROM authors ORDER BY rowid").fetchall()
+        return [self._register(("author", *row), Author(*row)) for row in rows]
+
+    def read_publishers(self) -> list[Publisher]:
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT name FROM publishers ORDER BY rowid").fetchall()
+        return [self._register(("publisher", row[0]), Publisher(row[0])) for row in rows]
+
+    def read_invoices(self) -> list[Invoice]:
+        with self.pool.connection() as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM invoices ORDER BY rowid")]
+            return [self._load_invoice(conn, id) for id in ids]
+
+    def read_loans(self) -> list[Loan]:
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT id, email, isbn, due_date, current_fee FROM loans ORDER BY rowid").fetchall()
+            loans = (self._loan_row(conn, row) for row in rows)
+            return [loan for loan in loans if loan is not None]
+
+    # books
+    def _book_row(self, book: Book) -> tuple:
+        return (
+            book.title,
+            book.publisher.name if book.publisher is not None else None,
+            encode_datetime(book.publication_date),
+            book.pages,
+            book._book_type,
+            book.duration,
+            book.existing_items,
+            book.borrowed_items,
+            json.dumps(encode_set_aside(book.set_aside)),
+            int(is_available(book)),
+        )
+
+    def _write_book_relations(self, conn: sqlite3.Connection, book: Book, check: bool = False):
+        authors = [(author.firstname, author.lastname) for author in book.authors]
+        genres = [genre.name for genre in book.genres]
+        if check:
+            # borrow/return rewrite the whole book, but its authors and genres rarely change
+            if [tuple(row) for row in conn.execute(_SELECT_BOOK_AUTHORS, (book.isbn,))] == authors and [
+                row[0] for row in conn.execute(_SELECT_BOOK_GENRES, (book.isbn,))
+            ] == genres:
+                return
+        conn.execute(_DELETE_BOOK_AUTHORS, (book.isbn,))
+        conn.execute(_DELETE_BOOK_GENRES, (book.isbn,))
+        conn.executemany(
+            _INSERT_BOOK_AUTHOR,
+            [(book.isbn, i, firstname, lastname) for i, (firstname, lastname) in enumerate(authors)],
+        )
+        conn.executemany(_INSERT_BOOK_GENRE, [(book.isbn, genre) for genre in genres])
+
+    def _select_book(self, conn: sqlite3.Connection, isbn: str, book: Optional[Book] = None) -> Optional[Book]:
+        """Reads a book, or updates ``book`` in place."""
+        row = conn.execute(_SELECT_BOOK, (isbn,)).fetchone()
+        if row is None:
+            return None
+        (title, publisher, publication_date, pages, book_type, duration, existing_items, borrowed_items, set_aside,
+         version) = row
+        authors = [
+            self._register(("author", *names), Author(*names))
+            for names in conn.execute(_SELECT_BOOK_AUTHORS, (isbn,))
+        ]
+        genres = [Genre[name] for (name,) in conn.execute(_SELECT_BOOK_GENRES, (isbn,))]
+        if publisher is not None:
+            publisher = self._register(("publisher", publisher), Publisher(publisher))
+        if book is None:
+            book = Book(
+                title,
+                authors,
+                publisher,
+                decode_datetime(publication_date),
+                genres,
+                pages,
+                isbn,
+                book_type,
+                duration,
+                existing_items,
+                borrowed_items,
+            )
+        else:
+            book.title = title
+            book.authors = authors
+            book.publisher = publisher
+            book.publication_date = decode_datetime(publication_date)
+            book.genres = genres
+            book.pages = pages
+            book._book_type = book_type
+            book.duration = duration
+            book.existing_items = existing_items
+            book.borrowed_items = borrowed_items
+        book.set_aside = decode_set_aside(json.loads(set_aside))
+        book.version = version
+        return book
+
+    def _load_book(self, conn: sqlite3.Connection, isbn: str) -> Optional[Book]:
+        book = self._cached(("book", isbn))
+        if book is not None:
+            return book
+        book = self._select_book(conn, isbn)
+        if book is None:
+            return None
+        return self._register(("book", isbn), book)
+
+    def create_book(self, book: Book):
+        self.write_batch([("create_book", book)])
+
+    def _create_book(self, conn: sqlite3.Connection, book: Book):
+        conn.execute(_INSERT_BOOK, (book.isbn, *self._book_row(book), book.version))
+        self._write_book_relations(conn, book)
+        self._forget(("book", book.isbn))
+        self._register(("book", book.isbn), book)
+
+    def read_book(self, isbn: str) -> Optional[Book]:
+        with self.pool.connection() as conn:
+            return self._load_book(conn, isbn)
+
+    def update_book(self, book: Book):
+        self.write_batch([("update_book", book)])
+
+    def _update_book(self, conn: sqlite3.Connection, book: Book):
+        cursor = conn.execute(_UPDATE_BOOK, (*self._book_row(book), book.isbn, book.version))
+        self._check_updated(conn, cursor, "book", book.isbn, book, _SELECT_BOOK_VERSION)
+        self._write_book_relations(conn, book, check=True)
+
+    def refresh_book(self, book: Book):
+        with self.pool.connection() as conn:
+            self._select_book(conn, book.isbn, book)
+
+    def delete_book(self, book: Book):
+        self.write_batch([("delete_book", book)])
+
+    def _delete_book(self, conn: sqlite3.Connection, book: Book):
+        if conn.execute(_DELETE_BOOK, (book.isbn,)).rowcount == 0:
+            raise ValueError(f"Book {book.isbn} does not exist")
+        conn.execute(_DELETE_BOOK_AUTHORS, (book.isbn,))
+        conn.execute(_DELETE_BOOK_GENRES, (book.isbn,))
+        self._forget(("book", book.isbn))
+
+    # users
+    def _user_row(self, user: User) -> tuple:
+        return (
+            user.firstname,
+            user.lastname,
+            user.mobile_number1,
+            user.mobile_number2,
+            user.area_code,
+            user.landline_number,
+            user.country_calling_code,
+            user.reading_credits,
+        )
+
+    def _write_user_relations(self, conn: sqlite3.Connection, user: User):
+        # the loans are not written here, they are rows of their own. The read history only
+        # ever grows, so only its new tail is written.
+        stored = conn.execute(_COUNT_USER_READ, (user.email,)).fetchone()[0]
+        if stored > len(user.read_books):
+            conn.execute(_DELETE_USER_READ, (user.email,))
+            stored = 0
+        conn.executemany(
+            _INSERT_USER_READ,
+            [(user.email, i, user.read_books[i].isbn) for i in range(stored, len(user.read_books))],
+        )
+
+    def _load_user(self, conn: sqlite3.Connection, email: str) -> Optional[User]:
+        user = self._cached(("user", email))
+        if user is not None:
+            return user
+        row = conn.execute(_SELECT_USER, (email,)).fetchone()
+        if row is None:
+            return None
+        # registered before the invoices are loaded, which refer back to their customer
+        user = self._register(("user", email), User(email, *row[:7]))
+        self._fill_user(conn, user, row)
+        return user
+
+    def _fill_user(self, conn: sqlite3.Connection, user: User, row: tuple):
+        (
+            user.firstname,
+            user.lastname,
+            user.mobile_number1,
+            user.mobile_number2,
+            user.area_code,
+            user.landline_number,
+            user.country_calling_code,
+            user.reading_credits,
+            user.version,
+        ) = row
+        user.borrowed_books = self._select_loans(conn, _SELECT_USER_LOANS, user.email)
+        user.read_books = []
+        for (isbn,) in conn.execute(_SELECT_USER_READ, (user.email,)).fetchall():
+            book = self._load_book(conn, isbn)
+            if book is not None:
+                user.read_books.append(book)
+        user.invoices = [
+            self._load_invoice(conn, id, user) for (id,) in conn.execute(_SELECT_USER_INVOICES, (user.email,)).fetchall()
+        ]
+
+    def create_user(self, user: User):
+        self.write_batch([("create_user", user)])
+
+    def _create_user(self, conn: sqlite3.Connection, user: User):
+        conn.execute(_INSERT_USER, (user.email, *self._user_row(user), user.version))
+        self._write_user_relations(conn, user)
+        self._forget(("user", user.email))
+        self._register(("user", user.email), user)
+
+    def read_user(self, email: str) -> Optional[User]:
+        with self.pool.connection() as conn:
+            return self._load_user(conn, email)
+
+    def update_user(self, user: User):
+        self.write_batch([("update_user", user)])
+
+    def _update_user(self, conn: sqlite3.Connection, user: User):
+        cursor = conn.execute(_UPDATE_USER, (*self._user_row(user), user.email, user.version))
+        self._check_updated(conn, cursor, "user", user.email, user, _SELECT_USER_VERSION)
+        self._write_user_relations(conn, user)
+
+    def refresh_user(self, user: User):
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_USER, (user.email,)).fetchone()
+            if row is not None:
+                self._fill_user(conn, user, row)
+
+    def delete_user(self, user: User):
+        self.write_batch([("delete_user", user)])
+
+    def _delete_user(self, conn: sqlite3.Connection, user: User):
+        if conn.execute(_DELETE_USER, (user.email,)).rowcount == 0:
+            raise ValueError(f"User {user.email} does not exist")
+        conn.execute(_DELETE_USER_LOANS, (user.email,))
+        conn.execute(_DELETE_USER_READ, (user.email,))
+        self._forget(("user", user.email))
+
+    # author
+    def create_author(self, author: Author):
+        self.write_batch([("create_author", author)])
+
+    def _create_author(self, conn: sqlite3.Connection, author: Author):
+        conn.execute(_INSERT_AUTHOR, (author.firstname, author.lastname))
+        self._forget(("author", author.firstname, author.lastname))
+        self._register(("author", author.firstname, author.lastname), author)
+
+    def read_author(self, firstname: str, lastname: str) -> Optional[Author]:
+        author = self._cached(("author", firstname, lastname))
+        if author is not None:
+            return author
+        with self.pool.connection() as conn:
+            if conn.execute(_SELECT_AUTHOR, (firstname, lastname)).fetchone() is None:
+                return None
+        return self._register(("author", firstname, lastname), Author(firstname, lastname))
+
+    def update_author(self, author: Author):
+        self.write_batch([("update_author", author)])
+
+    def _update_author(self, conn: sqlite3.Connection, author: Author):
+        if conn.execute(_SELECT_AUTHOR, (author.firstname, author.lastname)).fetchone() is None:
+            raise ValueError(f"Author {author.get_fullname()} does not exist")
+
+    def delete_author(self, author: Author):
+        self.write_batch([("delete_author", author)])
+
+    def _delete_author(self, conn: sqlite3.Connection, author: Author):
+        if conn.execute(_DELETE_AUTHOR, (author.firstname, author.lastname)).rowcount == 0:
+            raise ValueError(f"Author {author.get_fullname()} does not exist")
+        self._forget(("author", author.firstname, author.lastname))
+
+    # publisher
+    def create_publisher(self, publisher: Publisher):
+        self.write_batch([("create_publisher", publisher)])
+
+    def _create_publisher(self, conn: sqlite3.Connection, publisher: Publisher):
+        conn.execute(_INSERT_PUBLISHER, (publisher.name,))
+        self._forget(("publisher", publisher.name))
+        self._register(("publisher", publisher.name), publisher)
+
+    def read_publisher(self, name: str) -> Optional[Publisher]:
+        publisher = self._cached(("publisher", name))
+        if publisher is not None:
+            return publisher
+        with self.pool.connection() as conn:
+            if conn.execute(_SELECT_PUBLISHER, (name,)).fetchone() is None:
+                return None
+        return self._register(("publisher", name), Publisher(name))
+
+    def update_publisher(self, publisher: Publisher):
+        self.write_batch([("update_publisher", publisher)])
+
+    def _update_publisher(self, conn: sqlite3.Connection, publisher: Publisher):
+        if conn.execute(_SELECT_PUBLISHER, (publisher.name,)).fetchone() is None:
+            raise ValueError(f"Publisher {publisher.name} does not exist")
+
+    def delete_publisher(self, publisher: Publisher):
+        self.write_batch([("delete_publisher", publisher)])
+
+    def _delete_publisher(self, conn: sqlite3.Connection, publisher: Publisher):
+        if conn.execute(_DELETE_PUBLISHER, (publisher.name,)).rowcount == 0:
+            raise ValueError(f"Publisher {publisher.name} does not exist")
+        self._forget(("publisher", publisher.name))
+
+    # invoice
+    def _write_invoice_books(self, conn: sqlite3.Connection, invoice: Invoice):
+        conn.execute(_DELETE_INVOICE_BOOKS, (invoice.id,))
+        conn.executemany(
+            _INSERT_INVOICE_BOOK,
+            [(invoice.id, i, loan.isbn, loan.current_fee) for i, loan in enumerate(invoice.loans)],
+        )
+
+    def _load_invoice(self, conn: sqlite3.Connection, id: str, customer: Optional[User] = None) -> Optional[Invoice]:
+        from library.payment.invoice import Invoice
+
+        invoice = self._cached(("invoice", id))
+        if invoice is not None:
+            return invoice
+        if customer is None:
+            row = conn.execute(_SELECT_INVOICE, (id,)).fetchone()
+            if row is None:
+                return None
+            # loading a customer loads all of their invoices, including this one, but a
+            # customer already in the identity map is returned without them
+            customer = self._load_user(conn, row[0])
+            invoice = self._cached(("invoice", id))
+            if invoice is not None:
+                return invoice
+        row = conn.execute(_SELECT_INVOICE_ROW, (id,)).fetchone()
+        if row is None:
+            return None
+        invoice = Invoice(customer)
+        invoice.id = id
+        self._fill_invoice(conn, invoice, row)
+        return self._register(("invoice", id), invoice)
+
+    def _fill_invoice(self, conn: sqlite3.Connection, invoice: Invoice, row: tuple):
+        invoice.is_closed = bool(row[0])
+        invoice.version = row[1]
+        invoice.loans = []
+        for isbn, current_fee in conn.execute(_SELECT_INVOICE_BOOKS, (invoice.id,)).fetchall():
+            book = self._load_book(conn, isbn)
+            if book is not None:
+                invoice.loans.append(Loan(book, invoice.customer.email, None, current_fee))
+
+    def create_invoice(self, invoice: Invoice):
+        self.write_batch([("create_invoice", invoice)])
+
+    def _create_invoice(self, conn: sqlite3.Connection, invoice: Invoice):
+        conn.execute(_INSERT_INVOICE, (invoice.id, invoice.customer.email, int(invoice.is_closed), invoice.version))
+        self._write_invoice_books(conn, invoice)
+        self._forget(("invoice", invoice.id))
+        self._register(("invoice", invoice.id), invoice)
+
+    def read_invoice(self, id: str) -> Optional[Invoice]:
+        with self.pool.connection() as conn:
+            return self._load_invoice(conn, id)
+
+    def update_invoice(self, invoice: Invoice):
+        self.write_batch([("update_invoice", invoice)])
+
+    def _update_invoice(self, conn: sqlite3.Connection, invoice: Invoice):
+        cursor = conn.execute(_UPDATE_INVOICE, (invoice.customer.email, int(invoice.is_closed), invoice.id, invoice.version))
+        self._check_updated(conn, cursor, "invoice", invoice.id, invoice, _SELECT_INVOICE_VERSION)
+        self._write_invoice_books(conn, invoice)
+
+    def refresh_invoice(self, invoice: Invoice):
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_INVOICE_ROW, (invoice.id,)).fetchone()
+            if row is not None:
+                self._fill_invoice(conn, invoice, row)
+
+    def delete_invoice(self, invoice: Invoice):
+        self.write_batch([("delete_invoice", invoice)])
+
+    def _delete_invoice(self, conn: sqlite3.Connection, invoice: Invoice):
+        if conn.execute(_DELETE_INVOICE, (invoice.id,)).rowcount == 0:
+            raise ValueError(f"Invoice {invoice.id} does not exist")
+        conn.execute(_DELETE_INVOICE_BOOKS, (invoice.id,))
+        self._forget(("invoice", invoice.id))
+
+    # loan
+    def _loan_row(self, conn: sqlite3.Connection, row: tuple) -> Optional[Loan]:
+        id, email, isbn, due_date, current_fee = row
+        loan = self._cached(("loan", id))
+        if loan is not None:
+            # another process may have renewed it
+            loan.due_date = decode_datetime(due_date)
+            loan.current_fee = current_fee
+            return loan
+        book = self._load_book(conn, isbn)
+        if book is None:
+            return None
+        return self._register(("loan", id), Loan(book, email, decode_datetime(due_date), current_fee, id))
+
+    def _select_loans(self, conn: sqlite3.Connection, sql: str, key: str) -> list[Loan]:
+        loans = (self._loan_row(conn, row) for row in conn.execute(sql, (key,)).fetchall())
+        return [loan for loan in loans if loan is not None]
+
+    def create_loan(self, loan: Loan):
+        self.write_batch([("create_loan", loan)])
+
+    def _create_loan(self, conn: sqlite3.Connection, loan: Loan):
+        conn.execute(_INSERT_LOAN, (loan.id, loan.email, loan.isbn, encode_datetime(loan.due_date), loan.current_fee))
+        self._forget(("loan", loan.id))
+        self._register(("loan", loan.id), loan)
+
+    def read_loan(self, id: str) -> Optional[Loan]:
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_LOAN, (id,)).fetchone()
+            return self._loan_row(conn, row) if row is not None else None
+
+    def update_loan(self, loan: Loan):
+        self.write_batch([("update_loan", loan)])
+
+    def _update_loan(self, conn: sqlite3.Connection, loan: Loan):
+        if conn.execute(_UPDATE_LOAN, (encode_datetime(loan.due_date), loan.current_fee, loan.id)).rowcount == 0:
+            raise ValueError(f"Loan {loan.id} does not exist")
+
+    def delete_loan(self, loan: Loan):
+        self.write_batch([("delete_loan", loan)])
+
+    def _delete_loan(self, conn: sqlite3.Connection, loan: Loan):
+        if conn.execute(_DELETE_LOAN, (loan.id,)).rowcount == 0:
+            raise ValueError(f"Loan {loan.id} does not exist")
+        self._forget(("loan", loan.id))
+
+    def loans_of_user(self, email: str) -> list[Loan]:
+        with self.pool.connection() as conn:
+            return self._select_loans(conn, _SELECT_USER_LOANS, email)
+
+    def loans_of_book(self, isbn: str) -> list[Loan]:
+        with self.pool.connection() as conn:
+            return self._select_loans(conn, _SELECT_BOOK_LOANS, isbn)
@@ -1,157 +1,290 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Hashable, Optional, TypeVar
+
+from library.persistence.backend import StorageBackend
+from library.persistence.locking import LockStripes
+from library.persistence.memory import InMemoryBackend
+from library.persistence.unit_of_work import Transaction, current_unit_of_work
+from library.persistence.versioning import ConflictCounters, ConflictStats, RetryPolicy, retry_on_conflict
 
 if TYPE_CHECKING:
     from library.model.book import Book
     from library.model.user import User
     from library.model.author import Author
     from library.model.publisher import Publisher
+    from library.model.loan import Loan
     from library.payment.invoice import Invoice
+    from library.persistence.index import BookQuery
+
+T = TypeVar("T")
+
+_backend: StorageBackend = InMemoryBackend()
+_locks = LockStripes()
+_retry_policy = RetryPolicy()
+_conflicts = ConflictCounters()
+# called with the (operation, entity) pairs of every write once the backend has it
+_listeners: list[Callable[[list[tuple[str, Any]]], None]] = []
+
+
+def _get_backend() -> StorageBackend:
+    return _backend
+
+
+def _written(operations: list[tuple[str, Any]]):
+    for listener in list(_listeners):
+        listener(operations)
+
 
-users: list[User] = []
-books: list[Book] = []
-authors: list[Author] = []
-publishers: list[Publisher] = []
-invoices: list[Invoice] = []
+def _write(operation: str, entity):
+    unit_of_work = current_unit_of_work()
+    if unit_of_work is not None:
+        unit_of_work.register(operation, entity)
+    else:
+        getattr(_backend, operation)(entity)
+        if _listeners:
+            _written([(operation, entity)])
+
+
+def _read(kind: str, key, read: Callable[[], Any]):
+    unit_of_work = current_unit_of_work()
+    if unit_of_work is not None:
+        pending, entity = unit_of_work.pending(kind, key)
+        if pending:
+            return entity
+    return read()
 
 
 class LibraryRepository:
+    @staticmethod
+    def use_backend(backend: StorageBackend) -> StorageBackend:
+        """Replaces the active backend and returns the previous one."""
+        global _backend
+        previous, _backend = _backend, backend
+        return previous
+
+    @staticmethod
+    def get_backend() -> StorageBackend:
+        return _backend
+
+    @staticmethod
+    def use_lock_stripes(stripes: int):
+        """Sets the number of locks that ``locked`` spreads the keys over."""
+        global _locks
+        _locks = LockStripes(stripes)
+
+    @staticmethod
+    def locked(*keys: Hashable) -> ContextManager[None]:
+        """Serialises the block with all other blocks that lock one of ``keys`` (ISBNs, emails, invoice ids)."""
+        return _locks.locked(*keys)
+
+    @staticmethod
+    def when_unlocked(callback: Callable[[], None]):
+        """Calls ``callback`` once this thread has left all ``locked`` blocks, e.g. to notify listeners
+        that may lock and write themselves."""
+        _locks.when_unlocked(callback)
+
+    @staticmethod
+    def use_retry_policy(attempts: int = 5, base_delay: float = 0.001, max_delay: float = 0.05):
+        """Sets how often and how patiently ``retry_on_conflict`` retries."""
+        global _retry_policy
+        if attempts < 1:
+            raise ValueError("At least one attempt is needed")
+        _retry_policy = RetryPolicy(attempts, base_delay, max_delay)
+
+    @staticmethod
+    def retry_on_conflict(operation: Callable[[], T], refresh: Callable[[], None]) -> T:
+        """Runs ``operation`` again, after ``refresh``, whenever it fails with a ``ConflictError``.
+
+        Inside a transaction the writes are only checked at its end, so the operation runs
+        once and the outermost retry takes care of the conflict.
+        """
+        if current_unit_of_work() is not None:
+            return operation()
+        return retry_on_conflict(operation, refresh, _retry_policy, _conflicts)
+
+    @staticmethod
+    def conflict_stats() -> ConflictStats:
+        return _conflicts.snapshot()
+
+    @staticmethod
+    def reset_conflict_stats():
+        _conflicts.reset()
+
+    @staticmethod
+    def transaction() -> Transaction:
+        """Collects the writes of the block and flushes each entity once, as one batch, at its end.
+
+        ``with LibraryRepository.transaction() as unit_of_work: unit_of_work.track(user, "borrowed_books")``
+        also restores the tracked entities if the block raises.
+        """
+        return Transaction(_get_backend, _written)
+
+    @staticmethod
+    def add_write_listener(listener: Callable[[list[tuple[str, Any]]], None]):
+        """Calls ``listener(operations)`` with the ``(operation, entity)`` pairs of every write
+        through the repository, after the backend has them: once per transaction, never for
+        a rolled back one. It runs on the writing thread, so it should be quick.
+        """
+        _listeners.append(listener)
+
+    @staticmethod
+    def remove_write_listener(listener: Callable[[list[tuple[str, Any]]], None]):
+        _listeners.remove(listener)
+
+    @staticmethod
+    def sync():
+        """Durable commit: blocks until all previous writes survive a crash."""
+        _backend.sync()
+
     @staticmethod
     def read_users() -> list[User]:
-        return users
+        return _backend.read_users()
 
     @staticmethod
     def read_books() -> list[Book]:
-        return books
+        return _backend.read_books()
 
     @staticmethod
     def read_authors() -> list[Author]:
-        return authors
+        return _backend.read_authors()
 
     @staticmethod
     def read_publishers() -> list[Publisher]:
-        return publishers
+        return _backend.read_publishers()
 
     @staticmethod
     def read_invoices() -> list[Invoice]:
-        return invoices
+        return _backend.read_invoices()
+
+    @staticmethod
+    def read_loans() -> list[Loan]:
+        return _backend.read_loans()
+
+    @staticmethod
+    def query_books() -> BookQuery:
+        return _backend.query_books()
 
     # books
     @staticmethod
     def create_book(book: Book):
-        books.append(book)
+        _write("create_book", book)
 
     @staticmethod
     def read_book(isbn: str) -> Optional[Book]:
-        found_books = [x for x in books if x.isbn == isbn]
-        if len(found_books) > 0:
-            return found_books[0]
-        return None
+        return _read("book", isbn, lambda: _backend.read_book(isbn))
+
+    @staticmethod
+    def refresh_book(book: Book):
+        """Re-reads ``book`` from the backend after another worker changed it."""
+        _backend.refresh_book(book)
 
     @staticmethod
     def update_book(book: Book):
-        index = books.index(book)
-        if index >= 0:
-            books[index] = book
+        _write("update_book", book)
 
     @staticmethod
     def delete_book(book: Book):
-        index = books.index(book)
-        if index >= 0:
-            books.remove(book)
+        _write("delete_book", book)
 
     # users
     @staticmethod
     def create_user(user: User):
-        users.append(user)
+        _write("create_user", user)
 
     @staticmethod
     def read_user(email: str) -> Optional[User]:
-        found_users = [x for x in users if x.email == email]
-        if len(found_users) > 0:
-            return found_users[0]
-        return None
+        return _read("user", email, lambda: _backend.read_user(email))
+
+    @staticmethod
+    def refresh_user(user: User):
+        _backend.refresh_user(user)
 
     @staticmethod
     def update_user(user: User):
-        index = users.index(user)
-        if index >= 0:
-            users[index] = user
+        _write("update_user", user)
 
     @staticmethod
     def delete_user(user: User):
-        index = users.index(user)
-        if index >= 0:
-            users.remove(user)
+        _write("delete_user", user)
 
     # author
     @staticmethod
     def create_author(author: Author):
-        authors.append(author)
+        _write("create_author", author)
 
     @staticmethod
     def read_author(firstname: str, lastname: str) -> Optional[Author]:
-        found_authors = [x for x in authors if x.firstname == firstname and x.lastname == lastname]
-        if len(found_authors) > 0:
-            return found_authors[0]
-        return None
+        return _read("author", (firstname, lastname), lambda: _backend.read_author(firstname, lastname))
 
     @staticmethod
     def update_author(author: Author):
-        index = authors.index(author)
-        if index >= 0:
-            authors[index] = author
+        _write("update_author", author)
 
     @staticmethod
     def delete_author(author: Author):
-        index = authors.index(author)
-        if index >= 0:
-            authors.remove(author)
+        _write("delete_author", author)
 
     # publisher
     @staticmethod
     def create_publisher(publisher: Publisher):
-        publishers.append(publisher)
+        _write("create_publisher", publisher)
 
     @staticmethod
     def read_publisher(name: str) -> Optional[Publisher]:
-        found_publishers = [x for x in publishers if x.name == name]
-        if len(found_publishers) > 0:
-            return found_publishers[0]
-        return None
+        return _read("publisher", name, lambda: _backend.read_publisher(name))
 
     @staticmethod
     def update_publisher(publisher: Publisher):
-        index = publishers.index(publisher)
-        if index >= 0:
-            publishers[index] = publisher
+        _write("update_publisher", publisher)
 
     @staticmethod
     def delete_publisher(publisher: Publisher):
-        index = publishers.index(publisher)
-        if index >= 0:
-            publishers.remove(publisher)
+        _write("delete_publisher", publisher)
 
     # invoice
     @staticmethod
     def create_invoice(invoice: Invoice):
-        invoices.append(invoice)
+        _write("create_invoice", invoice)
 
     @staticmethod
     def read_invoice(id: str) -> Optional[Invoice]:
-        found_invoices = [x for x in invoices if x.id == id]
-        if len(found_invoices) > 0:
-            return found_invoices[0]
-        return None
+        return _read("invoice", id, lambda: _backend.read_invoice(id))
+
+    @staticmethod
+    def refresh_invoice(invoice: Invoice):
+        _backend.refresh_invoice(invoice)
 
     @staticmethod
     def update_invoice(invoice: Invoice):
-        index = invoices.index(invoice)
-        if index >= 0:
-            invoices[index] = invoice
+        _write("update_invoice", invoice)
 
     @staticmethod
     def delete_invoice(invoice: Invoice):
-        index = invoices.index(invoice)
-        if index >= 0:
-            invoices.remove(invoice)
+        _write("delete_invoice", invoice)
+
+    # loan
+    @staticmethod
+    def create_loan(loan: Loan):
+        _write("create_loan", loan)
+
+    @staticmethod
+    def read_loan(id: str) -> Optional[Loan]:
+        return _read("loan", id, lambda: _backend.read_loan(id))
+
+    @staticmethod
+    def update_loan(loan: Loan):
+        _write("update_loan", loan)
+
+    @staticmethod
+    def delete_loan(loan: Loan):
+        _write("delete_loan", loan)
+
+    @staticmethod
+    def loans_of_user(email: str) -> list[Loan]:
+        """The user's stored loans; those created or deleted by the current transaction only after it."""
+        return _backend.loans_of_user(email)
+
+    @staticmethod
+    def loans_of_book(isbn: str) -> list[Loan]:
+        """Who has the book, e.g. all current readers of an e-book."""
+        return _backend.loans_of_book(isbn)
@@ -0,0 +1,182 @@
+"""Transactions for ``LibraryRepository``.
+
+While a unit of work is active on the current thread, ``create_*``/``update_*``/``delete_*``
+only mark the entity as dirty. On commit every dirty entity is written once, and all of
+them go to the backend as a single batch. If the block fails, the tracked entities get
+their state from the start of the transaction back and nothing is written.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Optional
+
+_local = threading.local()
+
+_KEYS: dict[str, Callable[[Any], Any]] = {
+    "book": lambda book: book.isbn,
+    "user": lambda user: user.email,
+    "author": lambda author: (author.firstname, author.lastname),
+    "publisher": lambda publisher: publisher.name,
+    "invoice": lambda invoice: invoice.id,
+    "loan": lambda loan: loan.id,
+}
+
+
+def entity_key(kind: str, entity):
+    """Primary key of ``entity``, where ``kind`` is "book", "user", "author", "publisher", "invoice" or "loan"."""
+    return _KEYS[kind](entity)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return getattr(_local, "unit_of_work", None)
+
+
+_MISSING = object()
+
+
+def _attribute_names(entity) -> list[str]:
+    # the models keep their attributes in __slots__, other entities may have a __dict__
+    slots = [name for cls in type(entity).__mro__ for name in getattr(cls, "__slots__", ()) if name != "__weakref__"]
+    return slots + list(getattr(entity, "__dict__", ()))
+
+
+def _snapshot_state(entity, attributes: tuple[str, ...]) -> dict:
+    # lists and other collections with a __copy__ (``BorrowedBooks``) are copied, so appends
+    # and removes on e.g. ``borrowed_books`` can be undone
+    state = {}
+    for name in attributes or _attribute_names(entity):
+        value = getattr(entity, name, _MISSING)
+        if isinstance(value, list):
+            value = list(value)
+        elif hasattr(type(value), "__copy__"):
+            value = value.__copy__()
+        state[name] = value
+    return state
+
+
+def _restore_state(entity, state: dict):
+    for name, value in state.items():
+        if value is _MISSING:
+            if hasattr(entity, name):
+                delattr(entity, name)
+        else:
+            setattr(entity, name, value)
+
+
+class UnitOfWork:
+    def __init__(self):
+        # (kind, key) -> [operation, entity]; dicts keep the order in which entities became dirty
+        self._dirty: dict[tuple[str, Any], list] = {}
+        self._tracked: dict[int, tuple[Any, dict]] = {}
+        self._undo: list[Callable[[], None]] = []
+        self._after_commit: list[Callable[[], None]] = []
+
+    def track(self, entity, *attributes: str):
+        """Remembers ``attributes`` of ``entity`` (default: all of them) to restore them on rollback.
+
+        Only the first call per entity counts, later ones are ignored.
+        """
+        if id(entity) not in self._tracked:
+            self._tracked[id(entity)] = (entity, _snapshot_state(entity, attributes))
+
+    def on_rollback(self, undo: Callable[[], None]):
+        """Calls ``undo`` on rollback, before the tracked entities are restored.
+
+        For changes that are cheaper to undo than to copy, like appends to a long list.
+        """
+        self._undo.append(undo)
+
+    def on_commit(self, callback: Callable[[], None]):
+        """Calls ``callback`` once the transaction has been written, e.g. to notify others of it."""
+        self._after_commit.append(callback)
+
+    def register(self, operation: str, entity):
+        kind = operation.split("_", 1)[1]
+        key = (kind, entity_key(kind, entity))
+        pending = self._dirty.get(key)
+        if pending is None:
+            self._dirty[key] = [operation, entity]
+        elif operation.startswith("delete"):
+            if pending[0].startswith("create"):
+                # created and deleted in the same transaction, the backend never sees it
+                del self._dirty[key]
+            else:
+                self._dirty[key] = [operation, entity]
+        elif operation.startswith("create") or not pending[0].startswith("create"):
+            self._dirty[key] = [operation, entity]
+        else:
+            # an update after a create is still a create
+            pending[1] = entity
+
+    def pending(self, kind: str, key) -> tuple[bool, Any]:
+        """Whether the entity has an unflushed write and, if so, the entity or None if it was deleted."""
+        pending = self._dirty.get((kind, key))
+        if pending is None:
+            return False, None
+        return True, None if pending[0].startswith("delete") else pending[1]
+
+    def operations(self) -> list[tuple[str, Any]]:
+        return [(operation, entity) for operation, entity in self._dirty.values()]
+
+    def rollback(self):
+        for undo in reversed(self._undo):
+            undo()
+        for entity, state in self._tracked.values():
+            _restore_state(entity, state)
+        self._dirty.clear()
+        self._tracked.clear()
+        self._undo.clear()
+        self._after_commit.clear()
+
+    def commit(self, backend) -> list[tuple[str, Any]]:
+        """Writes the dirty entities and returns the operations written."""
+        operations = self.operations()
+        if operations:
+            backend.write_batch(operations)
+        self._dirty.clear()
+        self._tracked.clear()
+        self._undo.clear()
+        return operations
+
+    def run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+
+class Transaction:
+    """Context manager returned by ``LibraryRepository.transaction()``.
+
+    A nested transaction joins the outer one, which alone commits or rolls back.
+    """
+
+    def __init__(self, backend_getter: Callable[[], Any], on_commit: Optional[Callable[[list], None]] = None):
+        self._backend_getter = backend_getter
+        # called with the written operations after a successful commit
+        self._on_commit = on_commit
+        self._unit_of_work: Optional[UnitOfWork] = None
+        self._outermost = False
+
+    def __enter__(self) -> UnitOfWork:
+        self._unit_of_work = current_unit_of_work()
+        if self._unit_of_work is None:
+            self._unit_of_work = UnitOfWork()
+            self._outermost = True
+            _local.unit_of_work = self._unit_of_work
+        return self._unit_of_work
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._outermost:
+            return False
+        _local.unit_of_work = None
+        if exc_type is not None:
+            self._unit_of_work.rollback()
+            return False
+        try:
+            operations = self._unit_of_work.commit(self._backend_getter())
+        except BaseException:
+            self._unit_of_work.rollback()
+            raise
+        if operations and self._on_commit is not None:
+            self._on_commit(operations)
+        self._unit_of_work.run_after_commit()
+        return False
@@ -0,0 +1,113 @@
+"""Optimistic concurrency control for books, users and invoices.
+
+Every versioned entity carries a ``version``. ``update_*`` only writes if the stored
+version is still the one the entity was read with, and then moves both on by one;
+otherwise it raises ``ConflictError``, because another worker wrote the entity in the
+meantime. ``retry_on_conflict`` re-reads the entity and runs the operation again.
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from typing import Callable, NamedTuple, TypeVar
+
+T = TypeVar("T")
+
+VERSIONED_KINDS = frozenset(("book", "user", "invoice"))
+
+
+class ConflictError(Exception):
+    def __init__(self, kind: str, key, version: int, stored_version: int):
+        super().__init__(
+            f"{kind.capitalize()} {key} was changed concurrently (version {version}, stored version {stored_version})"
+        )
+        self.kind = kind
+        self.key = key
+        self.version = version
+        self.stored_version = stored_version
+
+    def __reduce__(self):
+        # picklable, so that it can be sent back from a worker process
+        return type(self), (self.kind, self.key, self.version, self.stored_version)
+
+
+def check_version(kind: str, key, entity, stored_version: int):
+    if entity.version != stored_version:
+        raise ConflictError(kind, key, entity.version, stored_version)
+
+
+class RetryPolicy(NamedTuple):
+    attempts: int = 5
+    # seconds; the wait doubles after every conflict up to max_delay
+    base_delay: float = 0.001
+    max_delay: float = 0.05
+
+    def delay(self, attempt: int) -> float:
+        # full jitter, so that workers that collided once do not collide again
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class ConflictStats(NamedTuple):
+    operations: int
+    conflicts: int
+    failures: int
+    conflicts_by_kind: dict[str, int]
+
+    @property
+    def conflict_rate(self) -> float:
+        """Conflicts per operation; above ~0.1 the workers mostly wait for each other."""
+        return self.conflicts / self.operations if self.operations else 0.0
+
+
+class ConflictCounters:
+    """Thread-safe counters of the operations run by ``retry_on_conflict``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._operations = 0
+            self._conflicts = 0
+            self._failures = 0
+            self._by_kind: dict[str, int] = {}
+
+    def record_operation(self):
+        with self._lock:
+            self._operations += 1
+
+    def record_conflict(self, kind: str):
+        with self._lock:
+            self._conflicts += 1
+            self._by_kind[kind] = self._by_kind.get(kind, 0) + 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+    def snapshot(self) -> ConflictStats:
+        with self._lock:
+            return ConflictStats(self._operations, self._conflicts, self._failures, dict(self._by_kind))
+
+
+def retry_on_conflict(
+    operation: Callable[[], T],
+    refresh: Callable[[], None],
+    policy: RetryPolicy,
+    counters: ConflictCounters,
+) -> T:
+    """Runs ``operation``; after a ``ConflictError`` waits, calls ``refresh`` to re-read the stale
+    entities and runs it again. Gives up after ``policy.attempts`` and re-raises the last conflict.
+    """
+    counters.record_operation()
+    for attempt in range(policy.attempts):
+        try:
+            return operation()
+        except ConflictError as error:
+            counters.record_conflict(error.kind)
+            if attempt == policy.attempts - 1:
+                counters.record_failure()
+                raise
+        time.sleep(policy.delay(attempt))
+        refresh()
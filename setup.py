@@ -12,6 +12,9 @@ with open('CHANGELOG.rst') as history_file:
 
 requirements = []
 
+# numpy prices invoices in batches (library.payment.pricing), plain loops are used without it
+extras_requirements = {'fast': ['numpy>=1.21']}
+
 test_requirements = ['pytest>=3', ]
 
 setup(
@@ -33,6 +36,7 @@ setup(
         'console_scripts': [],
     },
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="Apache Software License 2.0",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
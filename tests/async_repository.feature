@@ -0,0 +1,28 @@
+Feature: Async repository
+    An asyncio server borrows, returns and pays without blocking its event loop.
+
+    Background:
+        Given I know a book
+        And I'm an user
+
+    Scenario: Borrowing, returning and paying through the async API
+        When I borrow, return and pay the book asynchronously
+
+        Then the invoice should be paid
+        And the book should be available again
+
+    Scenario: Calls to a blocking backend are bounded
+        Given at most 4 calls may run at once
+        And the backend blocks
+
+        When 20 slow calls are made at the same time
+
+        Then at most 4 calls should have run at once
+
+    Scenario: A borrow waiting for a lock does not stall the event loop
+        Given another worker holds the lock of the book
+
+        When I borrow the book asynchronously while the event loop keeps ticking
+
+        Then the event loop should have ticked while the borrow waited
+        And the borrow should have succeeded once the lock was released
@@ -0,0 +1,35 @@
+Feature: Balance ledger
+    Accounts debited from many threads at once are never overdrawn.
+
+    Scenario: Many threads debit one account at the same time
+        Given an account with a balance of 1000
+        When 16 threads try to debit 1 from it 100 times each
+        Then 1000 debits should have succeeded
+        And the balance should be 0
+
+    Scenario: Many threads move money between accounts at the same time
+        Given 10 accounts with a balance of 100 each
+        When 16 threads make 200 random transfers of 7 each
+        Then the accounts should hold 1000 together
+        And no account should be overdrawn
+
+    Scenario: Paying with PayPal fails if the balance is too low
+        Given a user has returned 1 books one by one
+        And the PayPal account has a balance of 0
+        When the invoices are paid with PayPal
+        Then 0 invoices should be closed
+        And the PayPal balance should be 0
+
+    Scenario: Many invoices are paid from one PayPal account at the same time
+        Given a user has returned 16 books one by one
+        And the PayPal account has a balance for 5 invoices
+        When the invoices are paid with PayPal at the same time
+        Then 5 invoices should be closed
+        And the PayPal balance should be 0
+
+    Scenario: Many users pay with one credit card at the same time
+        Given 16 users have each returned a book
+        And the credit card has a limit for 3 invoices
+        When the invoices are paid with the credit card at the same time
+        Then 3 invoices should be closed
+        And the card limit should be 0
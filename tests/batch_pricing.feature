@@ -0,0 +1,22 @@
+Feature: Batch pricing
+    The invoices of a billing run are priced as one batch, with the results of calculate_fee.
+
+    Scenario Outline: Pricing invoices as one batch with <engine>
+        Given 6 customers with reading credits who returned between 0 and 5 books of several genres
+
+        When I price their invoices as one batch with <engine>
+
+        Then every invoice should cost what calculate_fee says
+        And every invoice should gain the reading credits calculate_fee says
+
+        Examples:
+            | engine |
+            | loops  |
+            | numpy  |
+
+    Scenario: Totals are rounded like round() and never negative
+        Given invoices whose totals lie next to a rounding half or below zero
+
+        When I price the columns with numpy and with loops
+
+        Then both should have the totals round() gives
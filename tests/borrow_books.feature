@@ -0,0 +1,32 @@
+Feature: Borrowing several books at once
+    A checkout of many books is one transaction that writes every book and the user once.
+
+    Background:
+        Given I'm an user
+        And the library has 3 paper books with 2 copies each
+
+    Scenario: Borrowing books that are all available
+        Given the storage counts its writes
+
+        When I borrow all 3 books and the first one twice
+
+        Then I should have 4 loans
+        And the first book should have no copy left
+        And every book and the user should have been written once, in one batch
+
+    Scenario: Borrowing books of which one is unavailable
+        Given all copies of the last book are lent
+
+        When I borrow all 3 books
+
+        Then no book should have been lent
+        And only the last book should be reported as unavailable
+        And the availability of the other books should not change
+
+    Scenario: Borrowing the available books only
+        Given all copies of the last book are lent
+
+        When I borrow all 3 books, accepting a partial checkout
+
+        Then I should have 2 loans
+        And only the last book should be reported as unavailable
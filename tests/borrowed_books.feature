@@ -0,0 +1,44 @@
+Feature: Borrowed books
+    A user's borrowed books are kept by ISBN, so returning one never scans the others.
+
+    Scenario: Returning some of many borrowed books
+        Given a user has borrowed 500 different books
+
+        When the user returns 20 of them
+
+        Then the user should still have 480 books borrowed
+        And the returned books should not be borrowed by the user
+        And the stored user should have the same borrowed books
+
+    Scenario: Borrowing two copies of the same title
+        Given a book with 2 paper copies
+        And a user has borrowed both copies
+
+        When the user returns one copy
+
+        Then the user should still have 1 copy of the book borrowed
+        And the book should have 1 copy borrowed
+
+    Scenario: Returning both copies at once
+        Given a book with 2 paper copies
+        And a user has borrowed both copies
+
+        When the user returns both copies at once
+
+        Then the user should still have 0 copies of the book borrowed
+        And the book should have 0 copies borrowed
+        And the invoice should list the book twice
+
+    Scenario: A failed return keeps every copy
+        Given a book with 2 paper copies
+        And a user has borrowed both copies
+
+        When returning both copies fails while storing the invoice
+
+        Then the user should still have 2 copies of the book borrowed
+        And the user should have no read books and no invoices
+
+    Scenario: Models can be kept in sets and as dict keys
+        Given a user has borrowed 3 different books
+
+        Then equal books, users, authors and publishers should hash alike
@@ -0,0 +1,45 @@
+Feature: Read cache
+    Books read again and again come from the cache, but never with an outdated inventory.
+
+    Background:
+        Given I know a book
+        And the storage is cached with room for 2 entries
+
+    Scenario: A book read twice is served from the cache
+        When I read the book 2 times
+
+        Then there should have been 1 cache miss and 1 cache hit
+
+    Scenario: Borrowing invalidates the cached book
+        Given I'm an user
+        And I have read the book
+
+        When I borrow the book
+        And I read the book 1 times
+
+        Then the read book should have 1 borrowed item
+        And there should have been 2 cache misses and 0 cache hits
+
+    Scenario: A missing ISBN is cached until the book is created
+        When I read an unknown ISBN 2 times
+
+        Then the unknown ISBN should not be found
+        And there should have been 1 cache miss and 1 cache hit
+        And the unknown ISBN should be found once its book is created
+
+    Scenario: The least recently used entry is evicted
+        Given I know 2 more books
+
+        When I read all books
+
+        Then 1 entry should have been evicted
+        And reading the book again should miss the cache
+
+    Scenario: Entries expire after their time to live
+        Given the storage is cached for 0.05 seconds
+
+        When I read the book 1 times
+        And 0.1 seconds pass
+        And I read the book 1 times
+
+        Then 1 entry should have expired
@@ -0,0 +1,25 @@
+Feature: Catalogue export
+    The catalogue is exported as one document that is written while the books are read.
+
+    Scenario Outline: Exporting the catalogue as <format>
+        Given a catalogue of 7 books with special characters in their titles
+
+        When I export the catalogue as <format> in chunks of 100 characters
+
+        Then every book should be exported as Book.serialize writes it
+        And 7 books should have been exported
+
+        Examples:
+            | format |
+            | json   |
+            | jsonl  |
+            | xml    |
+
+    Scenario: Exporting the books of a query
+        Given a catalogue of 7 books with special characters in their titles
+        And one of the books has been borrowed
+
+        When I export the available books as jsonl in chunks of 100 characters
+
+        Then every book should be exported as Book.serialize writes it
+        And 6 books should have been exported
@@ -0,0 +1,27 @@
+Feature: Catalogue import
+    Large catalogues are imported from CSV or JSON Lines files in batches.
+
+    Scenario Outline: Importing a <format> catalogue
+        Given a <format> catalogue with 5 books by 2 authors of 1 publisher and 2 broken rows
+
+        When I import the catalogue with <workers> parsing processes
+
+        Then 5 books should have been imported
+        And 2 rows should have been rejected
+        And every author and publisher should be stored once
+        And the imported books should have their genres
+
+        Examples:
+            | format | workers |
+            | csv    | 0       |
+            | jsonl  | 0       |
+            | csv    | 2       |
+
+    Scenario: Books that are already stored are rejected
+        Given a csv catalogue with 5 books by 2 authors of 1 publisher and 0 broken rows
+        And I have imported the catalogue
+
+        When I import the catalogue with 0 parsing processes
+
+        Then 0 books should have been imported
+        And 5 rows should have been rejected
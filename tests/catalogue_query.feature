@@ -0,0 +1,27 @@
+Feature: Catalogue
+    The catalogue can be browsed by genre, author, publisher and availability.
+
+    Background:
+        Given I'm an user
+        And I know a book
+
+    Scenario: Querying available books of a genre and publisher
+        When I query available Medicine books by Basic Books
+
+        Then the book should be in the result
+
+    Scenario: Borrowing the last copy removes the book from the available books
+        Given I have borrowed that book
+
+        When I query available Medicine books by Basic Books
+
+        Then the book should not be in the result
+        And the book should still be listed for its author
+
+    Scenario: A book of an unknown type is stored but never available
+        Given a book of an unknown type by the same author
+
+        When I query available Medicine books by Basic Books
+
+        Then the other book should not be in the result
+        And the other book should be listed for its author
@@ -0,0 +1,32 @@
+Feature: Compact models
+    Books, users and invoices keep their attributes in slots, books their genres in a bitmask.
+
+    Scenario: A book keeps its genres as flags and its type as a small int
+        Given I know a book
+
+        Then its genres should be stored as "MEDICINE|COMPUTER_SCIENCE"
+        And its type should be stored as 0 and read as "Paper"
+        And the book, the user and the invoice should have no __dict__
+
+    Scenario: Changing the genres of a book
+        Given I know a book
+
+        When I change the genres of the book to Medicine and History
+
+        Then the book should have the genres Medicine and History
+        And the stored book should have the genres Medicine and History
+
+    Scenario: A book returns its genres in the order they were given
+        Given I know a book
+
+        When I change the genres of the book to Poetry, Fiction and Poetry
+
+        Then the book should have the genres Poetry, Fiction and Poetry
+
+    Scenario: A rolled back borrow restores the slotted attributes
+        Given I know a book
+
+        When a transaction that borrows the book fails
+
+        Then the book should have no due date
+        And the book should still be available
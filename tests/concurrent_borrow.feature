@@ -0,0 +1,20 @@
+Feature: Concurrent borrowing
+    Many users borrowing and returning at the same time keep the inventory consistent.
+
+    Background:
+        Given there are 16 users
+
+    Scenario: Many users borrow the last paper copy at the same time
+        When all users borrow the last copy of a new book at the same time, 100 times
+
+        Then every book should have been borrowed by exactly one user
+        And every book should be borrowed once
+
+    Scenario: Many users borrow and return the last paper copy over and over
+        Given I know a book
+
+        When all users borrow and return the book 50 times at the same time
+
+        Then no user should have the book borrowed
+        And the book should not be borrowed
+        And every return should have created an invoice
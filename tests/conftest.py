@@ -0,0 +1,38 @@
+import pytest
+
+from library.persistence.memory import InMemoryBackend
+from library.persistence.storage import LibraryRepository
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--backend",
+        default="memory",
+        choices=("memory", "sqlite", "journal", "cached"),
+        help="storage backend the scenarios run against",
+    )
+
+
+@pytest.fixture(autouse=True)
+def storage_backend(request, tmp_path):
+    option = request.config.getoption("--backend")
+    if option == "memory":
+        # every scenario starts with an empty library
+        backend = InMemoryBackend()
+    elif option == "sqlite":
+        from library.persistence.sqlite_backend import SQLiteBackend
+
+        backend = SQLiteBackend(str(tmp_path / "library.db"))
+    elif option == "cached":
+        from library.persistence.cache import CachedBackend
+        from library.persistence.sqlite_backend import SQLiteBackend
+
+        backend = CachedBackend(SQLiteBackend(str(tmp_path / "library.db")), max_size=100)
+    else:
+        from library.persistence.journal import JournaledBackend
+
+        backend = JournaledBackend(str(tmp_path / "journal"))
+    previous = LibraryRepository.use_backend(backend)
+    yield backend
+    LibraryRepository.use_backend(previous)
+    backend.close()
@@ -0,0 +1,50 @@
+Feature: Due dates
+    The due date scheduler follows borrowing, renewing and returning, and finds the loans
+    that are overdue or due soon without looking at the others.
+
+    Scenario: A loan becomes overdue
+        Given a due date scheduler
+        And 3 users have each borrowed a book
+
+        When 8 days have passed
+
+        Then all 3 loans should be overdue
+        And none should be due within the next day
+
+    Scenario: A returned loan is no longer scheduled
+        Given a due date scheduler
+        And 3 users have each borrowed a book
+
+        When the first user returns the book
+
+        Then the scheduler should hold the 2 other loans
+        And after 8 days only those 2 loans should be overdue
+
+    Scenario: Loans due soon are renewed
+        Given a due date scheduler
+        And 3 users have each borrowed a book
+        And the first user has renewed the rental
+
+        When the loans due within a day are renewed after 6 and a half days
+
+        Then the 2 other loans should have been renewed
+        And no loan should be overdue after 8 days
+        And the first loan should be due first
+
+    Scenario: The scheduler is rebuilt from the stored loans
+        Given 3 users have each borrowed a book
+        And the first user has renewed the rental
+
+        When a due date scheduler is built from the repository
+
+        Then the scheduler should hold all 3 loans
+        And after 8 days only the 2 other loans should be overdue
+
+    Scenario: Renewals do not grow the heap without bound
+        Given a due date scheduler
+        And 3 users have each borrowed a book
+
+        When the first loan is rescheduled 5000 times
+
+        Then the scheduler should hold all 3 loans
+        And its heap should hold no more stale entries than the compaction allows
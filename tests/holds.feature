@@ -0,0 +1,84 @@
+Feature: Hold queues
+    Users wait in line for a paper book without a free copy instead of asking again and again.
+
+    Background:
+        Given a paper book with 1 copy
+        And the copy has been borrowed
+        And 3 users have placed a hold on the book
+
+    Scenario: Holds are served first come first served
+        When the second user cancels the hold
+
+        Then the first user should be at position 1
+        And the third user should be at position 2
+
+    Scenario: A returned copy goes to the head of the queue
+        When the copy is returned
+
+        Then the first user should have been notified
+        And the first user should be at position 0
+        And the third user should be at position 2
+        And the second user should not be able to borrow the book
+        And the first user should be able to borrow the book
+
+    Scenario: A copy not collected in time goes to the next in line
+        Given the copy has been returned
+
+        When the claim period passes
+        And the first user tries to borrow the book
+
+        Then the second user should have been notified
+        And the first user should not be waiting
+        And the second user should be at position 0
+        And the second user should be able to borrow the book
+
+    Scenario: A copy set aside is collected with other books at once
+        Given the copy has been returned
+
+        When the first user borrows the book together with another book
+
+        Then the first user should have borrowed both books
+        And the first user should not be waiting
+        And the book should have no free copy
+
+    Scenario: A copy not collected in time is passed on when borrowing books at once
+        Given the copy has been returned
+
+        When the claim period passes
+        And the first user tries to borrow the book together with another book
+
+        Then the second user should have been notified
+        And the second user should be at position 0
+        And the book should have no free copy
+
+    Scenario: Expired holds are released for every book at once
+        Given the copy has been returned
+
+        When the claim period passes
+        And the expired holds are released
+
+        Then the second user should have been notified
+        And the second user should be at position 0
+
+    Scenario: A listener is notified once the return has released its locks
+        Given the first user borrows the book on another thread when notified
+
+        When the copy is returned
+
+        Then the first user should have borrowed the book on the other thread
+
+    Scenario: A copy set aside is passed on when the hold is cancelled
+        Given the copy has been returned
+
+        When the first user cancels the hold
+
+        Then the second user should have been notified
+        And the second user should be at position 0
+        And the third user should be at position 1
+
+    Scenario: A hold on a book that can be borrowed is refused
+        When the copy is returned
+        And the 3 users cancel their holds
+
+        Then nobody should be able to place a hold on the book
+        And the book should have a free copy
@@ -0,0 +1,35 @@
+Feature: Invoice totals
+    An invoice computes its totals once per state and keeps them once it is paid.
+
+    Background:
+        Given there is a user
+        And the user has returned 2 books
+
+    Scenario: Rendering an invoice computes its totals once
+        When I render the invoice 3 times and calculate its fee
+
+        Then the totals should have been computed 1 time
+
+    Scenario: Adding a book computes the totals again
+        When I calculate the fee of the invoice
+        And a book is added to the invoice
+        And I calculate the fee of the invoice
+
+        Then the totals should have been computed 2 times
+        And the fee should include 3 books
+
+    Scenario: A change of the reading credits computes the totals again
+        When I calculate the fee of the invoice
+        And the user gains 4 reading credits
+        And I calculate the fee of the invoice
+
+        Then the totals should have been computed 2 times
+        And the fee should have a discount of 2.0 for the reading credits
+
+    Scenario: A paid invoice keeps the totals it was paid with
+        When the user pays the invoice with a valid credit card
+        And I calculate the fee of the invoice
+
+        Then the user should have gained reading credits
+        And the fee should be what was charged
+        And the totals should have been computed 1 time
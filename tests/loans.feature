@@ -0,0 +1,33 @@
+Feature: Loans
+    Every loan keeps its own due date and fee, so many users can borrow one e-book at once.
+
+    Scenario: Two users borrow the same e-book
+        Given an e-book
+        And 2 users have borrowed the e-book
+
+        When the first user renews the rental
+
+        Then the first loan should be due a week later than the second
+        And only the first loan should have a higher fee
+        And the stored loans of the e-book should be those of both users
+        And the e-book should not have been written
+
+    Scenario: Returning a loan deletes it and invoices its fee
+        Given an e-book
+        And 2 users have borrowed the e-book
+        And the first user has renewed the rental
+
+        When the first user returns the e-book
+
+        Then the first user should have no stored loans
+        And the stored loans of the e-book should be that of the second user
+        And the invoice should price the renewed fee
+
+    Scenario: Deleting a user deletes their loans
+        Given an e-book
+        And 2 users have borrowed the e-book
+
+        When the first user is deleted
+
+        Then the first loan should no longer be stored
+        And the stored loans of the e-book should be that of the second user
@@ -0,0 +1,31 @@
+Feature: Optimistic concurrency
+    Workers sharing one store never overwrite each other's changes of a book.
+
+    Background:
+        Given I know a book with 2 copies
+        And another worker has read the book
+        And the conflict counters are reset
+
+    Scenario: A stale copy of a book cannot be stored
+        When I borrow the book
+
+        Then storing the other worker's copy should fail with a conflict
+
+    Scenario: Borrowing is retried after another worker lent a copy
+        Given the other worker lends a copy
+
+        When I borrow the book
+
+        Then the book should be borrowed twice
+        And 1 conflict should have been counted
+
+    Scenario: Borrowing gives up after too many conflicts
+        Given the other worker lends a copy
+        And the book cannot be re-read
+        And borrowing is tried 3 times
+
+        When I try to borrow the book
+
+        Then the borrowing should fail with a conflict
+        And 3 conflicts should have been counted
+        And my copy of the book should be unchanged
@@ -29,6 +29,7 @@ Feature: Payment
 
         Then the invoice should not be closed
         And the card limit should not change
+        And "Card limit reached" should be logged
 
     Scenario: Paying an invoice with credit card should succeed if all info is correct
         When the user has a valid credit card
@@ -38,6 +39,7 @@ Feature: Payment
         Then the invoice should be closed
         And the card limit should be updated
         And the invoice should be updated in storage
+        And "using credit card" should be logged
    
     Scenario: Paying an invoice with PayPal should fail if the account information is false
         When the user has a non valid PayPal account
@@ -53,3 +55,15 @@ Feature: Payment
         Then the invoice should be closed
         And the account balance should be updated
         And the invoice should be updated in storage
+        And "using PayPal" should be logged
+
+    Scenario: Reading an invoice no longer referenced while its customer is loaded
+        When another invoice of the user is stored and no longer referenced
+
+        Then the other invoice should be read from storage
+
+    Scenario: The customer can borrow a book while a payment is being charged
+        When the user pays with a card whose charge is slow
+
+        Then the user should be able to borrow another book meanwhile
+        And the invoice should be closed
@@ -0,0 +1,63 @@
+Feature: Payment ledger
+    Every payment attempt is recorded, and paid invoices are settled in batches.
+
+    Background:
+        Given 12 users have each returned a book
+
+    Scenario: Paying through the processor records every attempt
+        Given a payment ledger
+        And a gateway that fails 30% of the requests and loses 30% of the answers
+
+        When the invoices are paid through the processor with the ledger
+
+        Then the ledger should know every invoice as paid
+        And every invoice should be closed
+        And the reconciliation should count 12 paid and 12 settled invoices
+        And the reconciliation should count one attempt per result
+        And the reconciliation should add up the fees
+
+    Scenario: Every attempt is on disk before the gateway charges it
+        Given a payment ledger
+        And a gateway that reads the ledger before it charges
+
+        When the invoices are paid through the processor with the ledger
+
+        Then the gateway should have found every attempt on disk
+
+    Scenario: An invoice paid but not settled is not paid again by the invoice itself
+        Given a payment ledger
+        And every invoice is recorded as paid
+
+        When every invoice is processed with a credit card
+
+        Then no card should have been charged
+        And no invoice should be closed
+
+    Scenario: Paid invoices are settled in one batch
+        Given a payment ledger
+
+        When every invoice is recorded as paid
+
+        Then no invoice should be closed
+        And 12 invoices should be settled with a single write
+
+    Scenario: A reopened ledger settles what was paid before a crash
+        Given a payment ledger
+        And every invoice is recorded as paid
+
+        When the ledger is reopened without being closed
+
+        Then the ledger should know every invoice as paid
+        And 12 invoices should be settled with a single write
+        And the reconciliation should count 12 paid and 12 settled invoices
+
+    Scenario: The payments of a day are reconciled from its own segments
+        Given a payment ledger whose clock starts on 2024-05-01 at 23:00
+        And every invoice is recorded as paid
+
+        When 2 hours pass
+        And every invoice is recorded as paid again
+
+        Then the segments should be named after 2024-05-01 and 2024-05-02
+        And reconciling 2024-05-01 should count 12 paid invoices
+        And reconciling 2024-05-02 should count 12 paid invoices
@@ -0,0 +1,81 @@
+Feature: Payment processor
+    Streams of invoices are paid concurrently through a payment gateway, each at most once.
+
+    Scenario: Paying many invoices concurrently
+        Given 20 users with an open invoice and a valid credit card
+        And a gateway with 10 ms latency
+
+        When the invoices are paid with at most 8 payments in flight
+
+        Then 20 invoices should have been paid
+        And every invoice should be closed
+        And every card should have been charged exactly once
+        And at most 8 charges should have been in flight at once
+
+    Scenario: Failed requests and lost answers are retried without charging twice
+        Given 20 users with an open invoice and a valid credit card
+        And a gateway with 10 ms latency that fails 30% of the requests and loses 30% of the answers
+
+        When the invoices are paid with at most 8 payments in flight and 10 attempts each
+
+        Then 20 invoices should have been paid
+        And every card should have been charged exactly once
+        And no lost answer should have been retried
+
+    Scenario: A gateway that does not answer in time
+        Given 3 users with an open invoice and a valid credit card
+        And a gateway with 100 ms latency
+
+        When the invoices are paid with a timeout of 20 ms and 2 attempts each
+
+        Then 3 payments should have failed
+        And no card should have been charged
+        And no invoice should be closed
+
+    Scenario: The statistics do not keep every result
+        Given 20 users with an open invoice and a valid credit card
+        And a gateway with 1 ms latency
+
+        When the invoices are paid by a processor that keeps 5 latencies
+
+        Then its statistics should count 20 paid invoices
+        And it should keep at most 5 latencies
+
+    Scenario: The same invoice is submitted several times
+        Given 1 users with an open invoice and a valid credit card
+        And a gateway with 10 ms latency
+
+        When the first invoice is submitted 3 times
+
+        Then 1 invoices should have been paid
+        And 2 jobs should have found the invoice already paid
+        And every card should have been charged exactly once
+
+    Scenario: An invoice paid by two processors and by the invoice itself at the same time
+        Given 1 users with an open invoice and a valid credit card
+        And a gateway with 10 ms latency
+
+        When the first invoice is paid by two processors with their own gateways and by process_invoice at once
+
+        Then at most one processor should have paid it and the others found it paid
+        And every invoice should be closed
+        And every card should have been charged exactly once
+
+    Scenario: A declined card is not retried
+        Given 1 users with an open invoice and a valid credit card
+        And the cards have a limit below the fee
+        And a gateway with 10 ms latency
+
+        When the invoices are paid with at most 8 payments in flight
+
+        Then 1 payments should have been declined after 1 attempt
+        And no invoice should be closed
+
+    Scenario: Payments are held to the rate limit of their provider
+        Given 10 users with an open invoice and a valid credit card
+        And a gateway with 1 ms latency
+
+        When the invoices are paid with a rate limit of 20 credit card payments per second
+
+        Then 10 invoices should have been paid
+        And paying should have taken at least 0.3 seconds
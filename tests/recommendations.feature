@@ -0,0 +1,47 @@
+Feature: Readers also read
+    Books that were read by the same users are recommended together, and the recommendations
+    follow the returns as they happen.
+
+    Background:
+        Given the catalogue has these books
+            | isbn       | genre   |
+            | 0000000001 | Fiction |
+            | 0000000002 | Fiction |
+            | 0000000003 | History |
+            | 0000000004 | Fiction |
+        And a recommender of the repository
+        And these books have been returned
+            | reader          | isbns                             |
+            | anna@test.org   | 0000000001, 0000000002            |
+            | ben@test.org    | 0000000001, 0000000002, 0000000003 |
+            | clara@test.org  | 0000000001, 0000000004            |
+
+    Scenario: The books read most often together come first
+        Then the readers of 0000000001 should also have read 0000000002, 0000000004, 0000000003
+
+    Scenario: Users are recommended the books they have not read
+        Then clara@test.org should be recommended 0000000002, 0000000003
+
+    Scenario: The recommender is rebuilt from the reading histories
+        When a recommender is built from the repository
+
+        Then the readers of 0000000001 should also have read 0000000002, 0000000004, 0000000003
+        And clara@test.org should be recommended 0000000002, 0000000003
+
+    Scenario: A deleted book is not recommended
+        When the book 0000000002 is deleted
+
+        Then the readers of 0000000001 should also have read 0000000004, 0000000003
+        And clara@test.org should be recommended 0000000003
+
+    Scenario: A loan deleted without a return is not a read
+        When a loan of 0000000003 by clara@test.org is deleted
+
+        Then 0000000003 should have been read 1 time
+        And clara@test.org should be recommended 0000000002, 0000000003
+
+    Scenario: Rows stay bounded
+        Given a recommender that keeps 2 books per row
+        When dora@test.org has read 10 books
+
+        Then no book should have more than 4 books read with it
@@ -0,0 +1,61 @@
+Feature: Recovery
+    The library state survives a restart of the journaled in-memory storage.
+
+    Background:
+        Given the library keeps a journal
+        And I'm an user
+        And I know a book
+        And I have borrowed that book
+
+    Scenario: Restarting replays the journal
+        When the library restarts
+
+        Then I should still have the book borrowed
+        And the book availability should be restored
+
+    Scenario: Restarting after a snapshot loads the snapshot
+        Given the library has taken a snapshot
+
+        When the library restarts
+
+        Then I should still have the book borrowed
+        And the book availability should be restored
+
+    Scenario: Writes go on while a snapshot syncs the log
+        When another book is written while a snapshot syncs the log
+        And the library restarts
+
+        Then the other book should have been recovered
+        And I should still have the book borrowed
+
+    Scenario: A snapshot taken during a transaction leaves out its changes
+        Given the library has taken a snapshot while I returned that book in a transaction that was rolled back
+
+        When the library restarts
+
+        Then I should still have the book borrowed
+        And the book availability should be restored
+
+    Scenario: A copy set aside for a hold survives a restart
+        Given another user has placed a hold on the book
+        And I have returned that book
+
+        When the library restarts
+
+        Then the copy should still be set aside for the other user
+        And the other user should be able to borrow the book
+
+    Scenario: A borrow cut short by a crash is lost as a whole
+        When the library crashes while the last borrow is written
+
+        Then I should not have the book borrowed
+        And the book should be available again
+
+    Scenario: Returns log only the books read since
+        Given I have returned that book
+        And I have borrowed and returned that book again
+
+        When the library restarts
+
+        Then I should have read the book twice
+        And the last logged update of my user should only list the last read book
@@ -0,0 +1,53 @@
+Feature: Full-text search
+    Books are found by the words of their title, authors and publisher, ranked by relevance.
+
+    Background:
+        Given the catalogue has these books
+            | isbn       | title                        | author        | publisher   |
+            | 1541644638 | Deep Medicine                | Éric Topol    | Basic Books |
+            | 0262033844 | Introduction to Algorithms   | Thomas Cormen | MIT Press   |
+            | 0141439518 | Pride and Prejudice          | Jane Austen   | Penguin     |
+            | 0465050654 | The Design of Everyday Books | Don Norman    | Basic Books |
+        And a search index of the repository
+
+    Scenario: Searching ignores case and diacritics
+        When I search for "ERIC topol"
+
+        Then the results should be 1541644638
+
+    Scenario: The last word of a query is a prefix
+        When I search for "introduction algo"
+
+        Then the results should be 0262033844
+
+    Scenario: Books with the word in their title rank first
+        When I search for "books"
+
+        Then the results should be 0465050654, 1541644638
+
+    Scenario: The index follows the catalogue
+        When the book 0141439518 is renamed to "Sense and Sensibility"
+        And the book 1541644638 is deleted
+
+        Then searching for "pride" should find nothing
+        And searching for "sensibility" should find the book 0141439518
+        And searching for "deep" should find nothing
+
+    Scenario: A saved index is loaded for a fast start
+        When the index is saved and loaded again
+
+        Then searching for "design everyday" should find the book 0465050654
+        And searching for "penguin" should find the book 0141439518
+
+    Scenario: A saved index catches up with the catalogue when it is loaded
+        When the index is saved and stops following the catalogue
+        And the book 0141439518 is renamed to "Sense and Sensibility"
+        And the book 1541644638 is deleted
+        And the book 0735211299 "Atomic Habits" by James Clear is added
+        And the saved index is loaded for the repository
+
+        Then searching for "pride" should find nothing
+        And searching for "sensibility" should find the book 0141439518
+        And searching for "deep" should find nothing
+        And searching for "habits" should find the book 0735211299
+        And searching for "design everyday" should find the book 0465050654
@@ -0,0 +1,52 @@
+Feature: Book serialization
+    Books remember their serialized forms until a serialized field changes.
+
+    Scenario: Rendering a user does not encode unchanged books again
+        Given a user who has read 3 books
+        And books are encoded by a counting encoder
+
+        When I render the user 2 times
+
+        Then every book should have been encoded once
+
+    Scenario: A book serialized before is returned without reading its fields
+        Given a user who has read 3 books
+        And I have rendered the user
+        And the names of the authors are counted
+
+        When I render the user 2 times
+
+        Then no author name should have been read
+
+    Scenario: A change that is rolled back encodes the book again
+        Given a user who has read 3 books
+        And books are encoded by a counting encoder
+
+        When the first book is serialized while its title is changed in a transaction that is rolled back
+        And its borrowed items change
+
+        Then its JSON should show the original title and 1 borrowed item
+
+    Scenario: Borrowing a book encodes it again
+        Given a user who has read 3 books
+        And books are encoded by a counting encoder
+        And I have rendered the user
+
+        When the user borrows the first book again
+
+        Then the first book should have been encoded 2 times
+        And its JSON should show 1 borrowed item
+
+    Scenario: Renaming an author encodes the book again
+        Given a user who has read 3 books
+
+        When I render the user
+        And the author of the first book is renamed to "Erica Topol"
+
+        Then the first book should be serialized with "Erica Topol" in JSON and XML
+
+    Scenario: Serialized books are what json and ElementTree write
+        Given books with special characters in their titles and authors
+
+        Then their JSON should be what json.dumps writes
+        And their XML should be what ElementTree writes
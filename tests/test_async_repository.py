@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.user import User
+from library.payment.invoice import Invoice
+from library.persistence.async_storage import AsyncLibraryRepository
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_credit_card_info, create_test_user
+
+
+@scenario("async_repository.feature", "Borrowing, returning and paying through the async API")
+def test_async_borrow_return_pay():
+    pass
+
+
+@scenario("async_repository.feature", "Calls to a blocking backend are bounded")
+def test_async_bounded():
+    pass
+
+
+@scenario("async_repository.feature", "A borrow waiting for a lock does not stall the event loop")
+def test_async_borrow_waits_off_loop():
+    pass
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@given("I'm an user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given(parsers.parse("at most {limit:d} calls may run at once"))
+def limits(limit: int):
+    AsyncLibraryRepository.use_limits(max_concurrency=limit, threads=limit * 2)
+    yield
+    AsyncLibraryRepository.use_limits()
+
+
+@given("the backend blocks")
+def blocking_backend(monkeypatch):
+    monkeypatch.setattr(LibraryRepository.get_backend(), "blocking", True)
+
+
+@given("another worker holds the lock of the book", target_fixture="release")
+def held_lock(book: Book):
+    locked, release = threading.Event(), threading.Event()
+
+    def hold():
+        with LibraryRepository.locked(book.isbn):
+            locked.set()
+            # gives up after a while, so a borrow that blocks the loop fails the scenario instead of hanging it
+            release.wait(1)
+
+    worker = threading.Thread(target=hold)
+    worker.start()
+    locked.wait()
+    yield release
+    release.set()
+    worker.join()
+
+
+@when("I borrow the book asynchronously while the event loop keeps ticking", target_fixture="outcome")
+def borrow_while_ticking(user: User, book: Book, release: threading.Event) -> dict:
+    async def scenario():
+        ticks = 0
+        borrow = asyncio.ensure_future(AsyncLibraryRepository.borrow_book(user, book))
+        while ticks < 5:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        waited = not borrow.done()
+        release.set()
+        return {"ticks": ticks, "waited": waited, "loan": await borrow}
+
+    return asyncio.run(scenario())
+
+
+@when("I borrow, return and pay the book asynchronously", target_fixture="invoice")
+def borrow_return_pay(user: User, book: Book):
+    async def scenario():
+        borrowed = await AsyncLibraryRepository.borrow_book(user, book)
+        assert borrowed is not None
+        invoice = await AsyncLibraryRepository.return_books(user, [borrowed])
+        assert await AsyncLibraryRepository.process_invoice(invoice, create_test_credit_card_info())
+        return invoice
+
+    return asyncio.run(scenario())
+
+
+@when(parsers.parse("{calls:d} slow calls are made at the same time"), target_fixture="peak")
+def slow_calls(calls: int):
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def slow():
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(AsyncLibraryRepository.call(slow) for _ in range(calls)))
+
+    asyncio.run(scenario())
+    return running[1]
+
+
+@then("the invoice should be paid")
+def invoice_paid(invoice: Invoice):
+    assert invoice.is_closed
+    stored = asyncio.run(AsyncLibraryRepository.read_invoice(invoice.id))
+    assert stored.is_closed
+
+
+@then("the book should be available again")
+def book_available(book: Book):
+    stored = asyncio.run(AsyncLibraryRepository.read_book(book.isbn))
+    assert stored.borrowed_items == 0
+    assert stored.can_borrow()
+
+
+@then("the event loop should have ticked while the borrow waited")
+def ticked(outcome: dict):
+    assert outcome["ticks"] == 5 and outcome["waited"]
+
+
+@then("the borrow should have succeeded once the lock was released")
+def borrowed_after_release(outcome: dict):
+    assert outcome["loan"] is not None
+
+
+@then(parsers.parse("at most {limit:d} calls should have run at once"))
+def bounded(peak: int, limit: int):
+    assert 1 < peak <= limit
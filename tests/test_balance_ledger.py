@@ -0,0 +1,187 @@
+import random
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.payment.invoice import Invoice
+from library.payment.ledger import BalanceLedger
+from library.payment.paypal import PAYPAL_ACCOUNT_BALANCE
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_credit_card_info, create_test_paypal_info, create_test_user, run_concurrently
+
+
+@scenario("balance_ledger.feature", "Many threads debit one account at the same time")
+def test_debit_one_account():
+    pass
+
+
+@scenario("balance_ledger.feature", "Many threads move money between accounts at the same time")
+def test_transfers():
+    pass
+
+
+@scenario("balance_ledger.feature", "Paying with PayPal fails if the balance is too low")
+def test_paypal_balance_too_low():
+    pass
+
+
+@scenario("balance_ledger.feature", "Many invoices are paid from one PayPal account at the same time")
+def test_paypal_concurrent():
+    pass
+
+
+@scenario("balance_ledger.feature", "Many users pay with one credit card at the same time")
+def test_credit_card_concurrent():
+    pass
+
+
+@pytest.fixture
+def paypal():
+    email, password = create_test_paypal_info()
+    balance = PAYPAL_ACCOUNT_BALANCE[email]
+    yield email, password
+    PAYPAL_ACCOUNT_BALANCE[email] = balance
+
+
+@given(parsers.parse("an account with a balance of {balance:d}"), target_fixture="ledger")
+def account(balance: int):
+    return BalanceLedger({"account": float(balance)})
+
+
+@given(parsers.parse("{count:d} accounts with a balance of {balance:d} each"), target_fixture="ledger")
+def accounts(count: int, balance: int):
+    ledger = BalanceLedger()
+    for i in range(count):
+        ledger.open(i, float(balance))
+    return ledger
+
+
+@when(parsers.parse("{threads:d} threads try to debit {amount:d} from it {times:d} times each"), target_fixture="debits")
+def debit(ledger: BalanceLedger, threads: int, amount: int, times: int):
+    debits = []
+
+    def work(_):
+        for _ in range(times):
+            if ledger.debit("account", amount):
+                debits.append(amount)
+
+    run_concurrently(list(range(threads)), work)
+    return debits
+
+
+@when(parsers.parse("{threads:d} threads make {times:d} random transfers of {amount:d} each"))
+def transfer(ledger: BalanceLedger, threads: int, times: int, amount: int):
+    accounts = [i for i in range(100) if i in ledger]
+
+    def work(seed: int):
+        rng = random.Random(seed)
+        for _ in range(times):
+            source, target = rng.sample(accounts, 2)
+            ledger.transfer(source, target, amount)
+
+    run_concurrently(list(range(threads)), work)
+
+
+@then(parsers.parse("{count:d} debits should have succeeded"))
+def debits_succeeded(debits: list, count: int):
+    assert len(debits) == count
+
+
+@then(parsers.parse("the balance should be {balance:d}"))
+def balance(ledger: BalanceLedger, balance: int):
+    assert ledger.balance("account") == balance
+
+
+@then(parsers.parse("the accounts should hold {total:d} together"))
+def total(ledger: BalanceLedger, total: int):
+    assert sum(ledger.balance(i) for i in range(10)) == total
+
+
+@then("no account should be overdrawn")
+def not_overdrawn(ledger: BalanceLedger):
+    assert all(ledger.balance(i) >= 0 for i in range(10))
+
+
+@given(parsers.parse("a user has returned {count:d} books one by one"), target_fixture="invoices")
+def invoices(count: int) -> list[Invoice]:
+    # no reading credits are gained, so every invoice costs the same
+    user: User = create_test_user()
+    user.reading_credits = 0
+    invoices = []
+    for i in range(count):
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, f"ledger-{i}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        invoices.append(user.return_books([book]))
+    return invoices
+
+
+@given(parsers.parse("{count:d} users have each returned a book"), target_fixture="invoices")
+def invoices_of_users(count: int) -> list[Invoice]:
+    invoices = []
+    for i in range(count):
+        user = User(f"user{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, f"ledger-{i}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        invoices.append(user.return_books([book]))
+    return invoices
+
+
+def fee(invoice: Invoice) -> float:
+    return invoice.calculate_fee(invoice.customer)[0]
+
+
+@given(parsers.parse("the PayPal account has a balance of {balance:d}"))
+def paypal_balance(paypal: tuple[str, str], balance: int):
+    PAYPAL_ACCOUNT_BALANCE[paypal[0]] = float(balance)
+
+
+@given(parsers.parse("the PayPal account has a balance for {count:d} invoices"))
+def paypal_balance_for(paypal: tuple[str, str], invoices: list[Invoice], count: int):
+    PAYPAL_ACCOUNT_BALANCE[paypal[0]] = fee(invoices[0]) * count
+
+
+@given(parsers.parse("the credit card has a limit for {count:d} invoices"), target_fixture="card")
+def card_limit(invoices: list[Invoice], count: int) -> CreditCard:
+    card = create_test_credit_card_info()
+    card.amount = fee(invoices[0]) * count
+    return card
+
+
+@when("the invoices are paid with PayPal")
+def pay_paypal(paypal: tuple[str, str], invoices: list[Invoice]):
+    for invoice in invoices:
+        assert not invoice.process_invoice_with_paypal(*paypal)
+
+
+@when("the invoices are paid with PayPal at the same time")
+def pay_paypal_concurrently(paypal: tuple[str, str], invoices: list[Invoice]):
+    run_concurrently(invoices, lambda invoice: invoice.process_invoice_with_paypal(*paypal))
+
+
+@when("the invoices are paid with the credit card at the same time")
+def pay_card_concurrently(card: CreditCard, invoices: list[Invoice]):
+    run_concurrently(invoices, lambda invoice: invoice.process_invoice(card))
+
+
+@then(parsers.parse("{count:d} invoices should be closed"))
+def closed(invoices: list[Invoice], count: int):
+    assert sum(invoice.is_closed for invoice in invoices) == count
+    assert sum(LibraryRepository.read_invoice(invoice.id).is_closed for invoice in invoices) == count
+
+
+@then(parsers.parse("the PayPal balance should be {balance:d}"))
+def paypal_balance_left(paypal: tuple[str, str], balance: int):
+    assert PAYPAL_ACCOUNT_BALANCE[paypal[0]] == pytest.approx(balance)
+
+
+@then(parsers.parse("the card limit should be {limit:d}"))
+def card_limit_left(card: CreditCard, limit: int):
+    assert card.amount == pytest.approx(limit)
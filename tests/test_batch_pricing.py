@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.invoice import Invoice
+from library.payment.pricing import InvoiceColumns, PricedInvoices, price_batch, price_invoices
+from library.persistence.storage import LibraryRepository
+
+GENRES = [
+    [Genre.HISTORY],
+    [Genre.MEDICINE, Genre.SOCIOLOGY],
+    [Genre.COMPUTER_SCIENCE],
+    [Genre.HISTORY, Genre.MEDICINE, Genre.POETRY],
+    [],
+]
+
+
+@scenario("batch_pricing.feature", "Pricing invoices as one batch with <engine>")
+def test_price_batch():
+    pass
+
+
+@scenario("batch_pricing.feature", "Totals are rounded like round() and never negative")
+def test_rounding():
+    pass
+
+
+@given(
+    parsers.parse("{customers:d} customers with reading credits who returned between 0 and 5 books of several genres"),
+    target_fixture="invoices",
+)
+def invoices(customers: int) -> list[Invoice]:
+    author = Author("Eric", "Topol")
+    LibraryRepository.create_author(author)
+    invoices = []
+    for c in range(customers):
+        user = User(f"user{c}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        user.reading_credits = c * 3
+        LibraryRepository.create_user(user)
+        books = []
+        for b in range(c % 6):
+            book = Book(f"Title {c}/{b}", [author], None, datetime(2019, 3, 12), GENRES[b % len(GENRES)], 400, f"{c:04d}{b:04d}", "Paper")
+            LibraryRepository.create_book(book)
+            loan = user.borrow_book(book)
+            if b % 2:
+                loan.renew_rental()
+            books.append(book)
+        invoice = user.return_books(books) if books else Invoice(user)
+        invoices.append(invoice)
+    return invoices
+
+
+@when(parsers.parse("I price their invoices as one batch with {engine}"), target_fixture="priced")
+def price(invoices: list[Invoice], engine: str) -> list[tuple[float, int]]:
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    return price_invoices(invoices, use_numpy=engine == "numpy")
+
+
+@then("every invoice should cost what calculate_fee says")
+def totals(invoices: list[Invoice], priced: list[tuple[float, int]]):
+    assert [total for total, _ in priced] == [invoice.calculate_fee(invoice.customer)[0] for invoice in invoices]
+
+
+@then("every invoice should gain the reading credits calculate_fee says")
+def credits(invoices: list[Invoice], priced: list[tuple[float, int]]):
+    assert [credits for _, credits in priced] == [invoice.calculate_fee(invoice.customer)[1] for invoice in invoices]
+
+
+@given("invoices whose totals lie next to a rounding half or below zero", target_fixture="columns")
+def rounding_columns() -> InvoiceColumns:
+    # one book each: 3.55 + fee - 0.5 * credits; np.round() alone gets 0.355 and 0.645 wrong
+    fees = [0.355 - 3.55, 0.645 - 3.55, 0.125 - 3.55, 1.0, 0.0, 2.675 - 3.55]
+    credits = [0, 0, 0, 20, 0, 0]
+    return InvoiceColumns(list(range(len(fees) + 1)), fees, [0] * len(fees), credits)
+
+
+@when("I price the columns with numpy and with loops", target_fixture="results")
+def price_columns(columns: InvoiceColumns) -> list[PricedInvoices]:
+    pytest.importorskip("numpy")
+    return [price_batch(columns, use_numpy=True), price_batch(columns, use_numpy=False)]
+
+
+@then("both should have the totals round() gives")
+def rounded(columns: InvoiceColumns, results: list[PricedInvoices]):
+    expected = []
+    for fee, credits in zip(columns.fees, columns.reading_credits):
+        total = 3.55 + fee - credits * 0.5
+        expected.append(round(total if total > 0.0 else 0.0, 2))
+    for result in results:
+        assert [float(total) for total in result.totals] == expected
+    assert expected[3] == 0.0
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import BorrowOutcome, User
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_user
+
+
+@scenario("borrow_books.feature", "Borrowing books that are all available")
+def test_borrow_all():
+    pass
+
+
+@scenario("borrow_books.feature", "Borrowing books of which one is unavailable")
+def test_borrow_none():
+    pass
+
+
+@scenario("borrow_books.feature", "Borrowing the available books only")
+def test_borrow_partial():
+    pass
+
+
+@given("I'm an user", target_fixture="user")
+def user() -> User:
+    return create_test_user()
+
+
+@given(parsers.parse("the library has {count:d} paper books with {copies:d} copies each"), target_fixture="books")
+def paper_books(count: int, copies: int) -> list[Book]:
+    books = []
+    for i in range(count):
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.HISTORY], 400, f"{i:010d}", "Paper", 0, copies)
+        LibraryRepository.create_book(book)
+        books.append(book)
+    return books
+
+
+@given("all copies of the last book are lent")
+def last_lent(books: list[Book]):
+    books[-1].borrowed_items = books[-1].existing_items
+    LibraryRepository.update_book(books[-1])
+
+
+@given("the storage counts its writes", target_fixture="batches")
+def counting_storage(monkeypatch):
+    backend = LibraryRepository.get_backend()
+    batches = []
+    write_batch = backend.write_batch
+
+    def counting_write_batch(operations):
+        batches.append(operations)
+        write_batch(operations)
+
+    monkeypatch.setattr(backend, "write_batch", counting_write_batch)
+    return batches
+
+
+@when("I borrow all 3 books and the first one twice", target_fixture="outcomes")
+def borrow_twice(user: User, books: list[Book]) -> list[BorrowOutcome]:
+    return user.borrow_books(books + books[:1])
+
+
+@when("I borrow all 3 books", target_fixture="outcomes")
+def borrow_all(user: User, books: list[Book]) -> list[BorrowOutcome]:
+    return user.borrow_books(books)
+
+
+@when("I borrow all 3 books, accepting a partial checkout", target_fixture="outcomes")
+def borrow_partial(user: User, books: list[Book]) -> list[BorrowOutcome]:
+    return user.borrow_books(books, partial=True)
+
+
+@then(parsers.parse("I should have {count:d} loans"))
+def loans(user: User, outcomes: list[BorrowOutcome], count: int):
+    lent = [outcome.loan for outcome in outcomes if outcome.loan is not None]
+    assert len(lent) == count
+    # the borrowed books are grouped by title
+    assert sorted(loan.id for loan in user.borrowed_books) == sorted(loan.id for loan in lent)
+    assert sorted(loan.id for loan in LibraryRepository.loans_of_user(user.email)) == sorted(loan.id for loan in lent)
+    assert len(LibraryRepository.read_user(user.email).borrowed_books) == count
+
+
+@then("the first book should have no copy left")
+def first_taken(books: list[Book]):
+    assert books[0].borrowed_items == 2
+    assert LibraryRepository.read_book(books[0].isbn).borrowed_items == 2
+
+
+@then("every book and the user should have been written once, in one batch")
+def written_once(batches: list):
+    assert len(batches) == 1
+    operations = [operation for operation, _ in batches[0]]
+    assert operations.count("update_book") == 3
+    assert operations.count("update_user") == 1
+    assert operations.count("create_loan") == 4
+
+
+@then("no book should have been lent")
+def none_lent(user: User, outcomes: list[BorrowOutcome]):
+    assert all(outcome.loan is None for outcome in outcomes)
+    assert len(user.borrowed_books) == 0
+    assert LibraryRepository.loans_of_user(user.email) == []
+
+
+@then("only the last book should be reported as unavailable")
+def last_unavailable(books: list[Book], outcomes: list[BorrowOutcome]):
+    assert [outcome.book for outcome in outcomes] == books
+    assert [outcome.available for outcome in outcomes] == [True, True, False]
+    assert outcomes[-1].loan is None
+
+
+@then("the availability of the other books should not change")
+def unchanged(books: list[Book]):
+    for book in books[:-1]:
+        assert book.borrowed_items == 0
+        assert LibraryRepository.read_book(book.isbn).borrowed_items == 0
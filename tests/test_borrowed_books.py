@@ -0,0 +1,157 @@
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.borrowed_books import BorrowedBooks
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.model.user import User
+from library.payment.invoice import Invoice
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_user
+
+
+@scenario("borrowed_books.feature", "Returning some of many borrowed books")
+def test_return_some():
+    pass
+
+
+@scenario("borrowed_books.feature", "Borrowing two copies of the same title")
+def test_two_copies():
+    pass
+
+
+@scenario("borrowed_books.feature", "Returning both copies at once")
+def test_return_both_copies():
+    pass
+
+
+@scenario("borrowed_books.feature", "A failed return keeps every copy")
+def test_failed_return():
+    pass
+
+
+@scenario("borrowed_books.feature", "Models can be kept in sets and as dict keys")
+def test_hashing():
+    pass
+
+
+def new_book(isbn: str, existing_items: int = 1) -> Book:
+    book = Book("Deep Medicine", [Author("Eric", "Topol")], Publisher("Basic Books"), datetime(2019, 3, 12),
+                [Genre.MEDICINE], 400, isbn, "Paper", existing_items=existing_items)
+    LibraryRepository.create_book(book)
+    return book
+
+
+@pytest.fixture
+def context():
+    return {}
+
+
+@given(parsers.parse("a user has borrowed {count:d} different books"), target_fixture="user")
+def user_with_books(context, count: int) -> User:
+    user = create_test_user()
+    context["books"] = [new_book(f"{i:010d}") for i in range(count)]
+    for book in context["books"]:
+        assert user.borrow_book(book) is not None
+    return user
+
+
+@given(parsers.parse("a book with {copies:d} paper copies"), target_fixture="book")
+def book_with_copies(copies: int) -> Book:
+    return new_book("1234567890", copies)
+
+
+@given("a user has borrowed both copies", target_fixture="user")
+def user_with_copies(book: Book) -> User:
+    user = create_test_user()
+    assert user.borrow_book(book) is not None
+    assert user.borrow_book(book) is not None
+    return user
+
+
+@when(parsers.parse("the user returns {count:d} of them"))
+def return_some(context, user: User, count: int):
+    context["returned"] = context["books"][:count]
+    assert user.return_books(context["returned"]) is not None
+
+
+@when("the user returns one copy")
+def return_one(user: User, book: Book):
+    assert user.return_books([book]) is not None
+
+
+@when("the user returns both copies at once", target_fixture="invoice")
+def return_both(user: User, book: Book) -> Invoice:
+    return user.return_books([book, book])
+
+
+@when("returning both copies fails while storing the invoice")
+def return_fails(user: User, book: Book, monkeypatch):
+    def fail(invoice):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(LibraryRepository.get_backend(), "write_batch", fail)
+    with pytest.raises(RuntimeError):
+        user.return_books([book, book])
+
+
+@then(parsers.parse("the user should still have {count:d} books borrowed"))
+def borrowed_count(user: User, count: int):
+    assert isinstance(user.borrowed_books, BorrowedBooks)
+    assert len(user.borrowed_books) == count
+    assert len(list(user.borrowed_books)) == count
+
+
+@then("the returned books should not be borrowed by the user")
+def returned_not_borrowed(context, user: User):
+    for book in context["returned"]:
+        assert book not in user.borrowed_books
+    for book in context["books"][len(context["returned"]):]:
+        assert book in user.borrowed_books
+
+
+@then("the stored user should have the same borrowed books")
+def stored_user(user: User):
+    stored = LibraryRepository.read_user(user.email)
+    assert sorted(book.isbn for book in stored.borrowed_books) == sorted(book.isbn for book in user.borrowed_books)
+
+
+@then(parsers.parse("the user should still have {count:d} copy of the book borrowed"))
+@then(parsers.parse("the user should still have {count:d} copies of the book borrowed"))
+def copies_borrowed(user: User, book: Book, count: int):
+    assert user.borrowed_books.count(book) == count
+    assert len(user.borrowed_books.copies(book.isbn)) == count
+    assert (book in user.borrowed_books) == (count > 0)
+    assert LibraryRepository.read_user(user.email).borrowed_books.count(book) == count
+
+
+@then("the user should have no read books and no invoices")
+def nothing_read(user: User):
+    assert user.read_books == []
+    assert user.invoices == []
+
+
+@then(parsers.parse("the book should have {count:d} copy borrowed"))
+@then(parsers.parse("the book should have {count:d} copies borrowed"))
+def book_borrowed_items(book: Book, count: int):
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == count
+
+
+@then("the invoice should list the book twice")
+def invoice_lists_twice(invoice: Invoice, book: Book):
+    assert invoice.books == (book, book)
+
+
+@then("equal books, users, authors and publishers should hash alike")
+def hashing(user: User):
+    books = [loan.book for loan in user.borrowed_books]
+    copy = Book(books[0].title, [], None, None, [], 0, books[0].isbn, "Paper")
+    assert copy in set(books)
+    assert {book: book.isbn for book in books}[copy] == books[0].isbn
+    assert User(user.email, "", "", "", "", "", "", "") in {user}
+    assert Author("Eric", "Topol") in {Author("Eric", "Topol")}
+    assert Publisher("Basic Books") in {Publisher("Basic Books")}
@@ -0,0 +1,155 @@
+import time
+from copy import copy
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.user import User
+from library.persistence.cache import CachedBackend
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_user
+
+
+@scenario("cache.feature", "A book read twice is served from the cache")
+def test_cache_hit():
+    pass
+
+
+@scenario("cache.feature", "Borrowing invalidates the cached book")
+def test_cache_invalidated():
+    pass
+
+
+@scenario("cache.feature", "A missing ISBN is cached until the book is created")
+def test_cache_missing():
+    pass
+
+
+@scenario("cache.feature", "The least recently used entry is evicted")
+def test_cache_eviction():
+    pass
+
+
+@scenario("cache.feature", "Entries expire after their time to live")
+def test_cache_expiry():
+    pass
+
+
+def cached_backend(max_size: int = 2, ttl: float = None):
+    backend = LibraryRepository.get_backend()
+    if isinstance(backend, CachedBackend):
+        backend = backend.backend
+    previous = LibraryRepository.use_backend(CachedBackend(backend, max_size=max_size, ttl=ttl))
+    yield LibraryRepository.get_backend()
+    LibraryRepository.use_backend(previous)
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@given("I'm an user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given(parsers.parse("the storage is cached with room for {size:d} entries"), target_fixture="cached")
+def cached(size: int):
+    yield from cached_backend(size)
+
+
+@given(parsers.parse("the storage is cached for {ttl:f} seconds"), target_fixture="cached")
+def cached_with_ttl(ttl: float):
+    yield from cached_backend(ttl=ttl)
+
+
+@given(parsers.parse("I know {count:d} more books"), target_fixture="books")
+def more_books(book: Book, count: int):
+    books = [book]
+    for i in range(count):
+        other = copy(book)
+        other.isbn = f"{book.isbn}-{i}"
+        LibraryRepository.create_book(other)
+        books.append(other)
+    return books
+
+
+@given("I have read the book")
+def read_once(book: Book):
+    LibraryRepository.read_book(book.isbn)
+
+
+@when(parsers.parse("I read the book {times:d} times"), target_fixture="read_book")
+def read_book(book: Book, times: int):
+    for _ in range(times):
+        read = LibraryRepository.read_book(book.isbn)
+    return read
+
+
+@when("I borrow the book")
+def borrow_book(user: User, book: Book):
+    assert user.borrow_book(book) is not None
+
+
+@when(parsers.parse("I read an unknown ISBN {times:d} times"), target_fixture="read_book")
+def read_unknown(times: int):
+    for _ in range(times):
+        read = LibraryRepository.read_book("unknown")
+    return read
+
+
+@when("I read all books")
+def read_all(books: list[Book]):
+    for book in books:
+        LibraryRepository.read_book(book.isbn)
+
+
+@when(parsers.parse("{seconds:f} seconds pass"))
+def wait(seconds: float):
+    time.sleep(seconds)
+
+
+@then(parsers.parse("there should have been {misses:d} cache miss and {hits:d} cache hit"))
+@then(parsers.parse("there should have been {misses:d} cache misses and {hits:d} cache hits"))
+def hits_and_misses(cached: CachedBackend, misses: int, hits: int):
+    stats = cached.stats()
+    assert (stats.misses, stats.hits) == (misses, hits)
+
+
+@then(parsers.parse("the read book should have {borrowed:d} borrowed item"))
+def read_book_borrowed(read_book: Book, borrowed: int):
+    assert read_book.borrowed_items == borrowed
+
+
+@then("the unknown ISBN should not be found")
+def unknown_not_found(read_book: Book):
+    assert read_book is None
+
+
+@then("the unknown ISBN should be found once its book is created")
+def unknown_found(book: Book):
+    other = copy(book)
+    other.isbn = "unknown"
+    LibraryRepository.create_book(other)
+    assert LibraryRepository.read_book("unknown") is other
+
+
+@then(parsers.parse("{evicted:d} entry should have been evicted"))
+def evicted(cached: CachedBackend, evicted: int):
+    assert cached.stats().evictions == evicted
+    assert cached.stats().size == 2
+
+
+@then("reading the book again should miss the cache")
+def miss_after_eviction(cached: CachedBackend, book: Book):
+    misses = cached.stats().misses
+    assert LibraryRepository.read_book(book.isbn) == book
+    assert cached.stats().misses == misses + 1
+
+
+@then(parsers.parse("{expired:d} entry should have expired"))
+def expired(cached: CachedBackend, expired: int):
+    stats = cached.stats()
+    assert stats.expirations == expired
+    assert stats.misses == 2
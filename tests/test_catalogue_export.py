@@ -0,0 +1,98 @@
+import io
+import json
+import xml.etree.ElementTree as et
+from datetime import datetime
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.exporter import ExportStats, export_books
+from library.persistence.storage import LibraryRepository
+
+TITLES = [
+    "Deep Medicine",
+    'The "Quoted" <Title> & More',
+    "Ünïcödé – ☃",
+    "Tabs\tand\nnewlines",
+    "",
+    "O'Reilly",
+    "100% > 99%",
+]
+
+
+@scenario("catalogue_export.feature", "Exporting the catalogue as <format>")
+def test_export():
+    pass
+
+
+@scenario("catalogue_export.feature", "Exporting the books of a query")
+def test_export_query():
+    pass
+
+
+@given(parsers.parse("a catalogue of {count:d} books with special characters in their titles"), target_fixture="books")
+def catalogue(count: int):
+    authors = [Author("Eric", "Topol"), Author("Anne & Bob", "<Smith>")]
+    publisher = Publisher("Basic Books")
+    for author in authors:
+        LibraryRepository.create_author(author)
+    LibraryRepository.create_publisher(publisher)
+    books = []
+    for i in range(count):
+        book = Book(
+            TITLES[i % len(TITLES)],
+            authors[: i % 3],
+            publisher,
+            datetime(2019, 3, 12),
+            [Genre.MEDICINE],
+            400,
+            f"isbn-{i}&\"{i}\"",
+            "Paper",
+            existing_items=2,
+        )
+        LibraryRepository.create_book(book)
+        books.append(book)
+    return books
+
+
+@given("one of the books has been borrowed")
+def borrowed(books: list[Book]):
+    books[0].borrowed_items = 2
+    LibraryRepository.update_book(books[0])
+
+
+@when(parsers.parse("I export the catalogue as {format} in chunks of {chunk_size:d} characters"), target_fixture="export")
+def export_catalogue(format: str, chunk_size: int):
+    target = io.BytesIO()
+    stats = export_books(target, format=format, chunk_size=chunk_size)
+    return format, target.getvalue().decode("utf-8"), stats
+
+
+@when(parsers.parse("I export the available books as {format} in chunks of {chunk_size:d} characters"), target_fixture="export")
+def export_query(format: str, chunk_size: int):
+    target = io.StringIO()
+    stats = export_books(target, LibraryRepository.query_books().available(), format=format, chunk_size=chunk_size)
+    return format, target.getvalue(), stats
+
+
+@then("every book should be exported as Book.serialize writes it")
+def serialized(export: tuple[str, str, ExportStats]):
+    format, output, stats = export
+    books = list(LibraryRepository.query_books().available()) if stats.books < 7 else list(LibraryRepository.query_books())
+    if format == "json":
+        assert output == "[" + ", ".join(book.serialize("JSON") for book in books) + "]"
+        assert len(json.loads(output)) == len(books)
+    elif format == "jsonl":
+        assert output == "".join(book.serialize("JSON") + "\n" for book in books)
+    else:
+        assert output == "<books>" + "".join(book.serialize("XML") for book in books) + "</books>"
+        assert len(et.fromstring(output)) == len(books)
+    assert stats.characters == len(output)
+
+
+@then(parsers.parse("{count:d} books should have been exported"))
+def exported(export: tuple[str, str, ExportStats], count: int):
+    assert export[2].books == count
@@ -0,0 +1,105 @@
+import csv
+import json
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.genre import Genre
+from library.persistence.importer import CatalogueImporter, ImportStats
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("catalogue_import.feature", "Importing a <format> catalogue")
+def test_import():
+    pass
+
+
+@scenario("catalogue_import.feature", "Books that are already stored are rejected")
+def test_import_duplicates():
+    pass
+
+
+def catalogue_rows(books: int, authors: int) -> list[dict]:
+    return [
+        {
+            "isbn": f"978-{i:09d}",
+            "title": f"Title {i}",
+            "authors": [[f"First{i % authors}", f"Last{i % authors}"]],
+            "publisher": "Basic Books",
+            "publication_date": "2019-03-12",
+            "genres": ["MEDICINE", "Computer Science"],
+            "pages": 400,
+            "type": "Paper",
+            "existing_items": 2,
+        }
+        for i in range(books)
+    ]
+
+
+@given(
+    parsers.parse("a {format} catalogue with {books:d} books by {authors:d} authors of 1 publisher and {broken:d} broken rows"),
+    target_fixture="catalogue",
+)
+def catalogue(tmp_path, format: str, books: int, authors: int, broken: int):
+    rows = catalogue_rows(books, authors)
+    path = tmp_path / f"catalogue.{format}"
+    if format == "csv":
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, rows[0].keys())
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(
+                    {
+                        **row,
+                        "authors": ";".join(" ".join(names) for names in row["authors"]),
+                        "genres": ";".join(row["genres"]),
+                    }
+                )
+            for i in range(broken):
+                writer.writerow({**rows[0], "isbn": f"broken-{i}", "authors": "", "genres": "", "type": "Scroll"})
+    else:
+        with open(path, "w") as file:
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+            for i in range(broken):
+                file.write("{not json\n")
+    return str(path)
+
+
+@given("I have imported the catalogue")
+def imported(catalogue: str):
+    CatalogueImporter().import_file(catalogue)
+
+
+@when(parsers.parse("I import the catalogue with {workers:d} parsing processes"), target_fixture="stats")
+def import_catalogue(catalogue: str, workers: int):
+    return CatalogueImporter(batch_size=2, workers=workers, chunk_size=3).import_file(catalogue)
+
+
+@then(parsers.parse("{books:d} books should have been imported"))
+def books_imported(stats: ImportStats, books: int):
+    assert stats.imported == books
+    for i in range(books):
+        assert LibraryRepository.read_book(f"978-{i:09d}") is not None
+
+
+@then(parsers.parse("{rows:d} rows should have been rejected"))
+def rows_rejected(stats: ImportStats, rows: int):
+    assert stats.rejected == rows
+    assert len(stats.errors) == rows
+    assert stats.rows == stats.imported + stats.rejected
+
+
+@then("every author and publisher should be stored once")
+def interned():
+    authors = LibraryRepository.read_authors()
+    assert len(authors) == len({(author.firstname, author.lastname) for author in authors}) == 2
+    assert [publisher.name for publisher in LibraryRepository.read_publishers()] == ["Basic Books"]
+    books = LibraryRepository.read_books()
+    assert books[0].authors[0] is books[2].authors[0]
+    assert books[0].publisher is books[1].publisher
+
+
+@then("the imported books should have their genres")
+def genres():
+    for book in LibraryRepository.read_books():
+        assert set(book.genres) == {Genre.MEDICINE, Genre.COMPUTER_SCIENCE}
@@ -0,0 +1,75 @@
+from pytest_bdd import scenario, given, when, then
+from library.model.book import Book
+from library.model.genre import Genre
+
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_user
+
+
+@scenario("catalogue_query.feature", "Querying available books of a genre and publisher")
+def test_query_available():
+    pass
+
+
+@scenario("catalogue_query.feature", "Borrowing the last copy removes the book from the available books")
+def test_query_borrowed():
+    pass
+
+
+@scenario("catalogue_query.feature", "A book of an unknown type is stored but never available")
+def test_query_unknown_type():
+    pass
+
+
+@given("I'm an user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@given("I have borrowed that book")
+def book_borrowed(user: User, book: Book):
+    assert user.borrow_book(book) is not None
+
+
+@given("a book of an unknown type by the same author", target_fixture="other")
+def other_book(book: Book) -> Book:
+    other = Book("Deep Medicine", book.authors, book.publisher, book.publication_date, [Genre.MEDICINE], 400,
+                 "0465050654", "Hologram")
+    LibraryRepository.create_book(other)
+    return other
+
+
+@when("I query available Medicine books by Basic Books", target_fixture="result")
+def query_books():
+    return LibraryRepository.query_books().by_genre(Genre.MEDICINE).by_publisher("Basic Books").available().all()
+
+
+@then("the book should be in the result")
+def book_found(result: list[Book], book: Book):
+    assert book in result
+
+
+@then("the book should not be in the result")
+def book_not_found(result: list[Book], book: Book):
+    assert book not in result
+
+
+@then("the book should still be listed for its author")
+def book_found_by_author(book: Book):
+    assert book in LibraryRepository.query_books().by_author("Eric", "Topol").all()
+
+
+@then("the other book should not be in the result")
+def other_not_found(result: list[Book], other: Book):
+    assert other not in result
+
+
+@then("the other book should be listed for its author")
+def other_found_by_author(other: Book):
+    assert other in LibraryRepository.query_books().by_author("Eric", "Topol").all()
@@ -0,0 +1,113 @@
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import PAPER, Book
+from library.model.genre import Genre, GenreFlag
+from library.payment.invoice import Invoice
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_user
+
+
+@scenario("compact_models.feature", "A book keeps its genres as flags and its type as a small int")
+def test_compact_book():
+    pass
+
+
+@scenario("compact_models.feature", "Changing the genres of a book")
+def test_change_genres():
+    pass
+
+
+@scenario("compact_models.feature", "A book returns its genres in the order they were given")
+def test_genre_order():
+    pass
+
+
+@scenario("compact_models.feature", "A rolled back borrow restores the slotted attributes")
+def test_rollback():
+    pass
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@then(parsers.parse('its genres should be stored as "{flags}"'))
+def genre_flags(book: Book, flags: str):
+    expected = GenreFlag(0)
+    for name in flags.split("|"):
+        expected |= GenreFlag[name]
+    assert book.genre_flags == expected
+    assert set(book.genres) == {Genre[name] for name in flags.split("|")}
+
+
+@then(parsers.parse('its type should be stored as {code:d} and read as "{name}"'))
+def book_type(book: Book, code: int, name: str):
+    assert book._type == code == PAPER
+    assert book._book_type == name
+
+
+@then("the book, the user and the invoice should have no __dict__")
+def no_dict(book: Book):
+    for entity in (book, create_test_user(), Invoice(create_test_user())):
+        assert not hasattr(entity, "__dict__")
+        with pytest.raises(AttributeError):
+            entity.no_such_attribute = 1
+
+
+@when("I change the genres of the book to Medicine and History")
+def change_genres(book: Book):
+    book.genres = [Genre.MEDICINE, Genre.HISTORY]
+    LibraryRepository.update_book(book)
+
+
+@when("I change the genres of the book to Poetry, Fiction and Poetry")
+def change_genres_repeated(book: Book):
+    book.genres = [Genre.POETRY, Genre.FICTION, Genre.POETRY]
+
+
+@then("the book should have the genres Medicine and History")
+def book_genres(book: Book):
+    assert book.genres == [Genre.MEDICINE, Genre.HISTORY]
+    assert book.genre_flags == GenreFlag.MEDICINE | GenreFlag.HISTORY
+    # shared with the books of the same genres, so it cannot be changed in place
+    with pytest.raises(AttributeError):
+        book.genres.append(Genre.POETRY)
+
+
+@then("the book should have the genres Poetry, Fiction and Poetry")
+def book_genres_repeated(book: Book):
+    assert book.genres == [Genre.POETRY, Genre.FICTION, Genre.POETRY]
+    assert book.genres == (Genre.POETRY, Genre.FICTION, Genre.POETRY)
+    assert book.genres != [Genre.POETRY, Genre.FICTION]
+    assert list(book.genres) == [Genre.POETRY, Genre.FICTION, Genre.POETRY]
+    assert book.genre_flags == GenreFlag.POETRY | GenreFlag.FICTION
+
+
+@then("the stored book should have the genres Medicine and History")
+def stored_genres(book: Book):
+    assert LibraryRepository.read_book(book.isbn).genres == [Genre.MEDICINE, Genre.HISTORY]
+    assert LibraryRepository.query_books().by_genre(Genre.HISTORY).isbns() == {book.isbn}
+    assert LibraryRepository.query_books().by_genre(Genre.COMPUTER_SCIENCE).isbns() == set()
+
+
+@when("a transaction that borrows the book fails")
+def failed_borrow(book: Book):
+    with pytest.raises(RuntimeError):
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(book)
+            book.borrow_book()
+            raise RuntimeError("payment service unavailable")
+
+
+@then("the book should have no due date")
+def no_due_date(book: Book):
+    assert not hasattr(book, "due_date")
+    assert not hasattr(book, "current_fee")
+
+
+@then("the book should still be available")
+def available(book: Book):
+    assert book.borrowed_items == 0
+    assert book.can_borrow()
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+from pytest_bdd import scenario, given, when, then, parsers
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, run_concurrently
+
+
+@scenario("concurrent_borrow.feature", "Many users borrow the last paper copy at the same time")
+def test_borrow_last_copy():
+    pass
+
+
+@scenario("concurrent_borrow.feature", "Many users borrow and return the last paper copy over and over")
+def test_borrow_and_return():
+    pass
+
+
+@given(parsers.parse("there are {count:d} users"), target_fixture="users")
+def users(count: int):
+    users = []
+    for i in range(count):
+        user = User(f"user{i}@test.org", "Max", f"Mustermann {i}", "", "", "", "", "")
+        LibraryRepository.create_user(user)
+        users.append(user)
+    return users
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@when(
+    parsers.parse("all users borrow the last copy of a new book at the same time, {times:d} times"),
+    target_fixture="books",
+)
+def borrow_at_once(users: list[User], times: int):
+    books = []
+    for i in range(times):
+        book = Book("Title", [Author("Eric", "Topol")], Publisher("Basic Books"), datetime(2019, 3, 12),
+                    [Genre.MEDICINE], 400, f"concurrent-{i}", "Paper")
+        LibraryRepository.create_book(book)
+        run_concurrently(users, lambda user: user.borrow_book(book))
+        books.append(book)
+    return books
+
+
+@when(parsers.parse("all users borrow and return the book {times:d} times at the same time"), target_fixture="invoices")
+def borrow_and_return(users: list[User], book: Book, times: int):
+    invoices = []
+
+    def work(user: User):
+        for _ in range(times):
+            if user.borrow_book(book) is not None:
+                invoices.append(user.return_books([book]))
+
+    run_concurrently(users, work)
+    return invoices
+
+
+@then("every book should have been borrowed by exactly one user")
+def one_borrower(users: list[User], books: list[Book]):
+    for book in books:
+        assert sum(book in user.borrowed_books for user in users) == 1
+
+
+@then("no user should have the book borrowed")
+def no_borrower(users: list[User]):
+    assert all(len(user.borrowed_books) == 0 for user in users)
+
+
+@then("every book should be borrowed once")
+def borrowed_once(books: list[Book]):
+    available = LibraryRepository.query_books().available().isbns()
+    for book in books:
+        assert book.borrowed_items == 1
+        assert LibraryRepository.read_book(book.isbn).borrowed_items == 1
+        assert book.isbn not in available
+
+
+@then("the book should not be borrowed")
+def not_borrowed(book: Book):
+    assert book.borrowed_items == 0
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 0
+    assert book in LibraryRepository.query_books().available().all()
+
+
+@then("every return should have created an invoice")
+def invoice_per_return(users: list[User], invoices: list):
+    assert len(invoices) > 0 and None not in invoices
+    assert sum(len(user.invoices) for user in users) == len(invoices)
+    assert sum(len(user.read_books) for user in users) == len(invoices)
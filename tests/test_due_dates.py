@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.due_dates import _COMPACT_MIN, DueDateScheduler
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("due_dates.feature", "A loan becomes overdue")
+def test_overdue():
+    pass
+
+
+@scenario("due_dates.feature", "A returned loan is no longer scheduled")
+def test_returned():
+    pass
+
+
+@scenario("due_dates.feature", "Loans due soon are renewed")
+def test_renew_due():
+    pass
+
+
+@scenario("due_dates.feature", "The scheduler is rebuilt from the stored loans")
+def test_rebuild():
+    pass
+
+
+@scenario("due_dates.feature", "Renewals do not grow the heap without bound")
+def test_rescheduled():
+    pass
+
+
+@pytest.fixture
+def holder() -> dict:
+    # the scheduler must stop listening when the scenario ends
+    schedulers = {}
+    yield schedulers
+    for scheduler in schedulers.values():
+        scheduler.detach()
+
+
+def later(days: float) -> datetime:
+    return datetime.now() + timedelta(days=days)
+
+
+@given("a due date scheduler", target_fixture="scheduler")
+def scheduler(holder: dict) -> DueDateScheduler:
+    holder["scheduler"] = DueDateScheduler()
+    holder["scheduler"].attach()
+    return holder["scheduler"]
+
+
+@given(parsers.parse("{count:d} users have each borrowed a book"), target_fixture="loans")
+def borrowed(count: int) -> list[Loan]:
+    loans = []
+    for i in range(count):
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, f"{i:010d}", "Paper", 0, 1, 0)
+        LibraryRepository.create_book(book)
+        user = User(f"reader{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        loans.append(user.borrow_book(book))
+    assert all(isinstance(loan, Loan) for loan in loans)
+    return loans
+
+
+@given("the first user has renewed the rental")
+def renewed(loans: list[Loan]):
+    loans[0].renew_rental()
+
+
+@when(parsers.parse("the first loan is rescheduled {times:d} times"))
+def rescheduled(scheduler: DueDateScheduler, loans: list[Loan], times: int):
+    for i in range(times):
+        loans[0].due_date = later(1 + i / times)
+        scheduler.schedule(loans[0])
+
+
+@when(parsers.parse("{days:d} days have passed"), target_fixture="now")
+def passed(days: int) -> datetime:
+    return later(days)
+
+
+@when("the first user returns the book")
+def return_book(loans: list[Loan]):
+    user = LibraryRepository.read_user(loans[0].email)
+    assert user.return_books([loans[0]]) is not None
+
+
+@when("the loans due within a day are renewed after 6 and a half days", target_fixture="renewed_loans")
+def renew_due(scheduler: DueDateScheduler) -> list[Loan]:
+    return scheduler.renew_due(timedelta(days=1), later(6.5))
+
+
+@when("a due date scheduler is built from the repository", target_fixture="scheduler")
+def rebuilt(holder: dict) -> DueDateScheduler:
+    holder["scheduler"] = DueDateScheduler.from_repository()
+    return holder["scheduler"]
+
+
+@then(parsers.parse("all {count:d} loans should be overdue"))
+def all_overdue(scheduler: DueDateScheduler, loans: list[Loan], now: datetime, count: int):
+    assert [loan.id for loan in scheduler.overdue(now)] == [loan.id for loan in loans]
+    assert len(loans) == count
+
+
+@then("none should be due within the next day")
+def none_due(scheduler: DueDateScheduler, now: datetime):
+    assert scheduler.due_within(timedelta(days=1), now) == []
+    assert scheduler.overdue() == []
+
+
+@then(parsers.parse("the scheduler should hold the {count:d} other loans"))
+def other_loans(scheduler: DueDateScheduler, loans: list[Loan], count: int):
+    assert len(scheduler) == count
+    assert loans[0] not in scheduler
+    assert all(loan in scheduler for loan in loans[1:])
+
+
+@then(parsers.parse("after 8 days only those {count:d} loans should be overdue"))
+@then(parsers.parse("after 8 days only the {count:d} other loans should be overdue"))
+def others_overdue(scheduler: DueDateScheduler, loans: list[Loan], count: int):
+    assert [loan.id for loan in scheduler.overdue(later(8))] == [loan.id for loan in loans[1:]]
+    assert scheduler.next_due().id == loans[1].id
+
+
+@then(parsers.parse("the {count:d} other loans should have been renewed"))
+def others_renewed(renewed_loans: list[Loan], loans: list[Loan], count: int):
+    assert [loan.id for loan in renewed_loans] == [loan.id for loan in loans[1:]]
+    for loan in loans[1:]:
+        assert LibraryRepository.read_loan(loan.id).due_date > later(13)
+
+
+@then("no loan should be overdue after 8 days")
+def none_overdue(scheduler: DueDateScheduler):
+    assert scheduler.overdue(later(8)) == []
+
+
+@then("the first loan should be due first")
+def first_due(scheduler: DueDateScheduler, loans: list[Loan]):
+    assert scheduler.next_due().id == loans[0].id
+
+
+@then(parsers.parse("the scheduler should hold all {count:d} loans"))
+def all_held(scheduler: DueDateScheduler, loans: list[Loan], count: int):
+    assert len(scheduler) == count
+    assert all(loan in scheduler for loan in loans)
+
+
+@then("its heap should hold no more stale entries than the compaction allows")
+def heap_bounded(scheduler: DueDateScheduler, loans: list[Loan]):
+    assert len(scheduler._heap) <= max(_COMPACT_MIN, 2 * len(scheduler)) + 1
+    assert scheduler.next_due() is loans[0]
+    assert scheduler.due_by(later(1.5)) == []
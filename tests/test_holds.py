@@ -0,0 +1,244 @@
+import threading
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book, release_expired_holds
+from library.model.genre import Genre
+from library.model.holds import hold_queues
+from library.model.loan import Loan
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("holds.feature", "Holds are served first come first served")
+def test_fifo():
+    pass
+
+
+@scenario("holds.feature", "A returned copy goes to the head of the queue")
+def test_hand_over():
+    pass
+
+
+@scenario("holds.feature", "A copy not collected in time goes to the next in line")
+def test_claim_period():
+    pass
+
+
+@scenario("holds.feature", "A copy set aside is collected with other books at once")
+def test_collect_batch():
+    pass
+
+
+@scenario("holds.feature", "A copy not collected in time is passed on when borrowing books at once")
+def test_claim_period_batch():
+    pass
+
+
+@scenario("holds.feature", "Expired holds are released for every book at once")
+def test_release_expired():
+    pass
+
+
+@scenario("holds.feature", "A listener is notified once the return has released its locks")
+def test_listener_borrows():
+    pass
+
+
+@scenario("holds.feature", "A copy set aside is passed on when the hold is cancelled")
+def test_pass_on():
+    pass
+
+
+@scenario("holds.feature", "A hold on a book that can be borrowed is refused")
+def test_refused():
+    pass
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def notified() -> list:
+    # the queues outlive the scenario's backend
+    notifications = []
+    listener = lambda book, email: notifications.append((book.isbn, email))  # noqa: E731
+    hold_queues.add_listener(listener)
+    clock = hold_queues.clock
+    hold_queues.clock = Clock(1e9)
+    yield notifications
+    hold_queues.clock = clock
+    hold_queues.remove_listener(listener)
+    hold_queues.clear()
+
+
+def user_at(users: list[User], ordinal: str) -> User:
+    return users[["first", "second", "third"].index(ordinal)]
+
+
+def new_user(email: str) -> User:
+    user = User(email, "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+    LibraryRepository.create_user(user)
+    return user
+
+
+@given(parsers.parse("a paper book with {copies:d} copy"), target_fixture="book")
+def paper_book(copies: int) -> Book:
+    book = Book("Deep Medicine", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, "1541644638", "Paper", 0, copies)
+    LibraryRepository.create_book(book)
+    return book
+
+
+@given("the copy has been borrowed", target_fixture="borrower")
+def borrowed(book: Book) -> User:
+    borrower = new_user("borrower@test.org")
+    assert borrower.borrow_book(book) is not None
+    return borrower
+
+
+@given(parsers.parse("{count:d} users have placed a hold on the book"), target_fixture="users")
+def holds_placed(book: Book, count: int, notified: list) -> list[User]:
+    users = [new_user(f"reader{i}@test.org") for i in range(count)]
+    assert [user.place_hold(book) for user in users] == list(range(1, count + 1))
+    # a second hold keeps the place
+    assert users[0].place_hold(book) == 1
+    return users
+
+
+@given("the copy has been returned")
+@when("the copy is returned")
+def returned(book: Book, borrower: User):
+    assert borrower.return_books([book]) is not None
+
+
+@given("the first user borrows the book on another thread when notified", target_fixture="loans")
+def borrow_when_notified(book: Book, users: list[User]) -> list:
+    loans = []
+
+    def borrow(notified_book: Book, email: str):
+        # waits for the borrow, as a listener handing it to a worker would
+        thread = threading.Thread(target=lambda: loans.append(users[0].borrow_book(notified_book)))
+        thread.start()
+        thread.join(1)
+
+    hold_queues.add_listener(borrow)
+    yield loans
+    hold_queues.remove_listener(borrow)
+
+
+@when("the claim period passes")
+def claim_period_passes():
+    hold_queues.clock.now += hold_queues.claim_period + 1
+
+
+@when("the first user tries to borrow the book")
+def first_tries(book: Book, users: list[User]):
+    assert users[0].borrow_book(book) is None
+
+
+@when("the first user borrows the book together with another book", target_fixture="outcomes")
+def first_borrows_batch(book: Book, users: list[User]) -> list:
+    other = Book("The Code Breaker", [], None, datetime(2021, 3, 9), [Genre.MEDICINE], 560, "1982115858", "Paper", 0, 1)
+    LibraryRepository.create_book(other)
+    return users[0].borrow_books([book, other])
+
+
+@when("the first user tries to borrow the book together with another book")
+def first_tries_batch(book: Book, users: list[User]):
+    outcomes = first_borrows_batch(book, users)
+    assert [outcome.loan for outcome in outcomes] == [None, None]
+    assert [outcome.available for outcome in outcomes] == [False, True]
+
+
+@when("the expired holds are released")
+def release_expired(book: Book):
+    assert release_expired_holds() == 1
+    assert release_expired_holds() == 0
+
+
+@when("the second user cancels the hold")
+def second_cancels(book: Book, users: list[User]):
+    assert users[1].cancel_hold(book)
+
+
+@when("the first user cancels the hold")
+def first_cancels(book: Book, users: list[User]):
+    assert users[0].cancel_hold(book)
+    assert not users[0].cancel_hold(book)
+
+
+@when(parsers.parse("the {count:d} users cancel their holds"))
+def all_cancel(book: Book, users: list[User], count: int):
+    for user in users[:count]:
+        assert user.cancel_hold(book)
+
+
+@then(parsers.parse("the {ordinal} user should be at position {position:d}"))
+def at_position(book: Book, users: list[User], ordinal: str, position: int):
+    assert user_at(users, ordinal).hold_position(book) == position
+
+
+@then(parsers.parse("the {ordinal} user should not be waiting"))
+def not_waiting(book: Book, users: list[User], ordinal: str):
+    assert user_at(users, ordinal).hold_position(book) is None
+
+
+@then(parsers.parse("the {ordinal} user should have been notified"))
+def was_notified(book: Book, users: list[User], notified: list, ordinal: str):
+    assert notified[-1] == (book.isbn, user_at(users, ordinal).email)
+
+
+@then(parsers.parse("the {ordinal} user should not be able to borrow the book"))
+def cannot_borrow(book: Book, users: list[User], ordinal: str):
+    assert user_at(users, ordinal).borrow_book(book) is None
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 1
+
+
+@then(parsers.parse("the {ordinal} user should be able to borrow the book"))
+def can_borrow(book: Book, users: list[User], ordinal: str):
+    user = user_at(users, ordinal)
+    loan = user.borrow_book(book)
+    assert isinstance(loan, Loan)
+    assert user.hold_position(book) is None
+    stored = LibraryRepository.read_book(book.isbn)
+    assert stored.borrowed_items == 1 and stored.set_aside == ()
+    assert [stored.id for stored in LibraryRepository.loans_of_book(book.isbn)] == [loan.id]
+
+
+@then("the first user should have borrowed both books")
+def borrowed_both(book: Book, users: list[User], outcomes: list):
+    assert all(isinstance(outcome.loan, Loan) for outcome in outcomes)
+    assert users[0].borrowed_books.loan_of(book) is outcomes[0].loan
+    assert [stored.id for stored in LibraryRepository.loans_of_book(book.isbn)] == [outcomes[0].loan.id]
+    assert LibraryRepository.read_book("1982115858").borrowed_items == 1
+
+
+@then("the book should have no free copy")
+def no_free_copy(book: Book):
+    stored = LibraryRepository.read_book(book.isbn)
+    assert stored.borrowed_items == 1 and stored.existing_items == 1
+
+
+@then("the first user should have borrowed the book on the other thread")
+def borrowed_on_other_thread(book: Book, users: list[User], loans: list):
+    assert len(loans) == 1 and isinstance(loans[0], Loan)
+    assert users[0].borrowed_books.loan_of(book) is loans[0]
+
+
+@then("nobody should be able to place a hold on the book")
+def hold_refused(book: Book, users: list[User]):
+    with pytest.raises(ValueError):
+        users[0].place_hold(book)
+    assert users[0].hold_position(book) is None
+
+
+@then("the book should have a free copy")
+def free_copy(book: Book):
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 0
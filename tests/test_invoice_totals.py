@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.user import User
+from library.payment.invoice import PRICE_PER_BOOK, Invoice
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_credit_card_info, create_test_user
+
+
+@scenario("invoice_totals.feature", "Rendering an invoice computes its totals once")
+def test_render():
+    pass
+
+
+@scenario("invoice_totals.feature", "Adding a book computes the totals again")
+def test_add_book():
+    pass
+
+
+@scenario("invoice_totals.feature", "A change of the reading credits computes the totals again")
+def test_reading_credits():
+    pass
+
+
+@scenario("invoice_totals.feature", "A paid invoice keeps the totals it was paid with")
+def test_paid():
+    pass
+
+
+@pytest.fixture
+def computed(monkeypatch) -> list[Invoice]:
+    computed = []
+    calculate_totals = Invoice._calculate_totals
+
+    def counting_calculate_totals(self, user):
+        computed.append(self)
+        return calculate_totals(self, user)
+
+    monkeypatch.setattr(Invoice, "_calculate_totals", counting_calculate_totals)
+    return computed
+
+
+def create_book(isbn: str) -> Book:
+    book = Book("Deep Medicine", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, isbn, "Paper")
+    LibraryRepository.create_book(book)
+    return book
+
+
+@given("there is a user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given(parsers.parse("the user has returned {count:d} books"), target_fixture="invoice")
+def returned(user: User, count: int):
+    books = [create_test_book()] + [create_book(f"00000000{i}") for i in range(1, count)]
+    for book in books:
+        user.borrow_book(book)
+    return user.return_books(books)
+
+
+@when(parsers.parse("I render the invoice {times:d} times and calculate its fee"))
+def render(invoice: Invoice, computed: list[Invoice], times: int):
+    for _ in range(times):
+        str(invoice)
+    invoice.calculate_fee(invoice.customer)
+
+
+@when("I calculate the fee of the invoice", target_fixture="fee")
+def calculate(invoice: Invoice, computed: list[Invoice]):
+    return invoice.calculate_fee(invoice.customer)
+
+
+@when("a book is added to the invoice")
+def add_book(invoice: Invoice):
+    book = create_book("0000000099")
+    invoice.add_loan(Loan(book, invoice.customer.email, None, 5))
+
+
+@when(parsers.parse("the user gains {credits:d} reading credits"))
+def gain_credits(user: User, credits: int):
+    user.reading_credits += credits
+
+
+@when("the user pays the invoice with a valid credit card", target_fixture="charged")
+def pay(invoice: Invoice, computed: list[Invoice]):
+    card = create_test_credit_card_info()
+    amount = card.amount
+    assert invoice.process_invoice(card)
+    return amount, card.amount
+
+
+@then(parsers.parse("the totals should have been computed {times:d} time"))
+@then(parsers.parse("the totals should have been computed {times:d} times"))
+def computed_times(computed: list[Invoice], times: int):
+    assert len(computed) == times
+
+
+@then(parsers.parse("the fee should include {count:d} books"))
+def fee_books(invoice: Invoice, fee: tuple[float, int], count: int):
+    assert len(invoice.loans) == count
+    assert invoice.totals().price == count * PRICE_PER_BOOK + sum(loan.current_fee for loan in invoice.loans)
+
+
+@then(parsers.parse("the fee should have a discount of {discount:f} for the reading credits"))
+def fee_discount(invoice: Invoice, discount: float):
+    assert invoice.totals().discount == discount
+
+
+@then("the user should have gained reading credits")
+def gained(user: User):
+    assert user.reading_credits > 0
+
+
+@then("the fee should be what was charged")
+def fee_charged(fee: tuple[float, int], charged: tuple[float, float]):
+    amount, remaining = charged
+    assert remaining == amount - fee[0]
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
+from library.model.user import User
+from library.payment.invoice import PRICE_PER_BOOK, Invoice
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("loans.feature", "Two users borrow the same e-book")
+def test_shared_ebook():
+    pass
+
+
+@scenario("loans.feature", "Returning a loan deletes it and invoices its fee")
+def test_return_loan():
+    pass
+
+
+@scenario("loans.feature", "Deleting a user deletes their loans")
+def test_delete_user():
+    pass
+
+
+@given("an e-book", target_fixture="book")
+def ebook() -> Book:
+    book = Book("Deep Medicine", [Author("Eric", "Topol")], None, datetime(2019, 3, 12), [Genre.FICTION], 400,
+                "1541644638", "Electronic")
+    LibraryRepository.create_book(book)
+    return book
+
+
+@given(parsers.parse("{count:d} users have borrowed the e-book"), target_fixture="loans")
+def borrowed(book: Book, count: int) -> list[Loan]:
+    loans = []
+    for i in range(count):
+        user = User(f"reader{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        loan = user.borrow_book(book)
+        assert isinstance(loan, Loan) and loan.email == user.email
+        loans.append(loan)
+    return loans
+
+
+@given("the first user has renewed the rental")
+@when("the first user renews the rental")
+def renew(loans: list[Loan]):
+    assert loans[0].renew_rental() is loans[0]
+
+
+@when("the first user returns the e-book", target_fixture="invoice")
+def return_ebook(book: Book, loans: list[Loan]) -> Invoice:
+    user = LibraryRepository.read_user(loans[0].email)
+    invoice = user.return_books([book])
+    assert invoice is not None
+    return invoice
+
+
+@when("the first user is deleted")
+def delete_user(loans: list[Loan]):
+    # read first, so that a cache holds the loan
+    assert LibraryRepository.read_loan(loans[0].id) is not None
+    LibraryRepository.delete_user(LibraryRepository.read_user(loans[0].email))
+
+
+@then("the first loan should be due a week later than the second")
+def due_later(loans: list[Loan]):
+    assert loans[0].due_date - loans[1].due_date > timedelta(days=6)
+    assert LibraryRepository.read_loan(loans[0].id).due_date == loans[0].due_date
+
+
+@then("only the first loan should have a higher fee")
+def fees(book: Book, loans: list[Loan]):
+    assert loans[0].current_fee == 2 * book.get_weekly_fee()
+    assert loans[1].current_fee == book.get_weekly_fee()
+    assert not hasattr(book, "current_fee")
+
+
+@then("the stored loans of the e-book should be those of both users")
+def both_loans(book: Book, loans: list[Loan]):
+    assert sorted(loan.email for loan in LibraryRepository.loans_of_book(book.isbn)) == sorted(
+        loan.email for loan in loans
+    )
+    for loan in loans:
+        assert [stored.id for stored in LibraryRepository.loans_of_user(loan.email)] == [loan.id]
+
+
+@then("the e-book should not have been written")
+def ebook_unchanged(book: Book):
+    assert LibraryRepository.read_book(book.isbn).version == 0
+
+
+@then("the first user should have no stored loans")
+def no_loans(loans: list[Loan]):
+    assert LibraryRepository.loans_of_user(loans[0].email) == []
+    assert LibraryRepository.read_loan(loans[0].id) is None
+    assert len(LibraryRepository.read_user(loans[0].email).borrowed_books) == 0
+
+
+@then("the first loan should no longer be stored")
+def loan_deleted(loans: list[Loan]):
+    assert LibraryRepository.read_user(loans[0].email) is None
+    assert LibraryRepository.loans_of_user(loans[0].email) == []
+    assert LibraryRepository.read_loan(loans[0].id) is None
+    assert loans[0].id not in [loan.id for loan in LibraryRepository.read_loans()]
+
+
+@then("the stored loans of the e-book should be that of the second user")
+def second_loan(book: Book, loans: list[Loan]):
+    assert [loan.id for loan in LibraryRepository.loans_of_book(book.isbn)] == [loans[1].id]
+
+
+@then("the invoice should price the renewed fee")
+def priced(invoice: Invoice, book: Book):
+    assert [loan.current_fee for loan in invoice.loans] == [2 * book.get_weekly_fee()]
+    stored = LibraryRepository.read_invoice(invoice.id)
+    assert stored.totals().price == PRICE_PER_BOOK + 2 * book.get_weekly_fee()
@@ -0,0 +1,107 @@
+import copy
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.persistence.storage import LibraryRepository
+from library.persistence.versioning import ConflictError
+from tests.utils import create_test_book
+
+
+@scenario("optimistic_concurrency.feature", "A stale copy of a book cannot be stored")
+def test_stale_copy():
+    pass
+
+
+@scenario("optimistic_concurrency.feature", "Borrowing is retried after another worker lent a copy")
+def test_borrow_retried():
+    pass
+
+
+@scenario("optimistic_concurrency.feature", "Borrowing gives up after too many conflicts")
+def test_borrow_gives_up():
+    pass
+
+
+@given(parsers.parse("I know a book with {copies:d} copies"), target_fixture="book")
+def book(copies: int):
+    book = create_test_book()
+    book.existing_items = copies
+    LibraryRepository.update_book(book)
+    return book
+
+
+@given("another worker has read the book", target_fixture="other_copy")
+def other_copy(book: Book):
+    # what another process sharing the store would hold: the same book in a separate object
+    return copy.copy(book)
+
+
+@given("the conflict counters are reset")
+def reset_counters():
+    LibraryRepository.reset_conflict_stats()
+
+
+@given("the other worker lends a copy")
+def other_worker_lends(other_copy: Book):
+    other_copy.borrowed_items += 1
+    LibraryRepository.update_book(other_copy)
+
+
+@given("the book cannot be re-read")
+def no_refresh(monkeypatch):
+    monkeypatch.setattr(LibraryRepository.get_backend(), "refresh_book", lambda book: None)
+
+
+@given(parsers.parse("borrowing is tried {attempts:d} times"))
+def retry_policy(attempts: int):
+    LibraryRepository.use_retry_policy(attempts=attempts, base_delay=0.0001)
+    yield
+    LibraryRepository.use_retry_policy()
+
+
+@when("I borrow the book")
+def borrow_book(book: Book):
+    assert book.borrow_book() is book
+
+
+@when("I try to borrow the book", target_fixture="error")
+def try_borrow_book(book: Book):
+    with pytest.raises(ConflictError) as error:
+        book.borrow_book()
+    return error.value
+
+
+@then("storing the other worker's copy should fail with a conflict")
+def stale_copy_conflict(book: Book, other_copy: Book):
+    other_copy.borrowed_items = 0
+    with pytest.raises(ConflictError):
+        LibraryRepository.update_book(other_copy)
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 1
+
+
+@then("the book should be borrowed twice")
+def borrowed_twice(book: Book):
+    assert book.borrowed_items == 2
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 2
+
+
+@then("my copy of the book should be unchanged")
+def book_unchanged(book: Book):
+    assert book.borrowed_items == 0
+
+
+@then("the borrowing should fail with a conflict")
+def borrow_failed(error: ConflictError, book: Book):
+    assert error.kind == "book"
+    assert error.key == book.isbn
+
+
+@then(parsers.parse("{conflicts:d} conflict should have been counted"))
+@then(parsers.parse("{conflicts:d} conflicts should have been counted"))
+def conflicts_counted(conflicts: int):
+    stats = LibraryRepository.conflict_stats()
+    assert stats.operations == 1
+    assert stats.conflicts == conflicts
+    assert stats.conflicts_by_kind == {"book": conflicts}
@@ -1,7 +1,13 @@
+import gc
+import logging
+import threading
+from datetime import datetime
 from typing import Optional
 import pytest
-from pytest_bdd import scenario, given, when, then
-from library.model.book import Book, BorrowedBook
+from pytest_bdd import parsers, scenario, given, when, then
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.loan import Loan
 
 from library.model.user import User
 from library.payment.credit_card import CreditCard
@@ -21,6 +27,12 @@ def context():
     return {"exception": None}
 
 
+@pytest.fixture(autouse=True)
+def payment_log(caplog):
+    caplog.set_level(logging.INFO, logger="library.payment.invoice")
+    return caplog
+
+
 @scenario("payment.feature", "Receiving an invoice the invoice should be valid")
 def test_return_avaiable():
     pass
@@ -66,6 +78,36 @@ def test_pay_paypal_success():
     pass
 
 
+@scenario(
+    "payment.feature",
+    "Reading an invoice no longer referenced while its customer is loaded",
+)
+def test_read_invoice_customer_loaded():
+    pass
+
+
+@scenario(
+    "payment.feature",
+    "The customer can borrow a book while a payment is being charged",
+)
+def test_borrow_while_charging():
+    pass
+
+
+class SlowCard(CreditCard):
+    """Waits in ``debit`` until it is released."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.charging = threading.Event()
+        self.release = threading.Event()
+
+    def debit(self, amount: float) -> bool:
+        self.charging.set()
+        self.release.wait(5)
+        return super().debit(amount)
+
+
 @given("there is a user", target_fixture="user")
 def user():
     return create_test_user()
@@ -79,7 +121,7 @@ def book_borrowed(user: User):
 
 
 @given("the user returns the book", target_fixture="invoice")
-def return_book(user: User, borrowed: BorrowedBook):
+def return_book(user: User, borrowed: Loan):
     invoice: Optional[Invoice] = user.return_books([borrowed])
     return invoice
 
@@ -101,9 +143,10 @@ def invoice_customer_correct(invoice: Invoice, user: User):
 
 
 @then("the items on the invoice should be correct")
-def invoice_items_correct(invoice: Invoice, borrowed: BorrowedBook):
-    assert len(invoice.books) == 1
-    assert invoice.books[0] == borrowed
+def invoice_items_correct(invoice: Invoice, borrowed: Loan):
+    assert len(invoice.loans) == 1
+    assert invoice.loans[0] is borrowed
+    assert invoice.books[0] == borrowed.book
 
 
 @then("the invoice should not be closed")
@@ -188,3 +231,51 @@ def account_balance_changed(paypal, invoice: Invoice, user: User):
 def credit_card_updated(invoice: Invoice):
     updated_invoice = LibraryRepository.read_invoice(invoice.id)
     assert updated_invoice is not None and updated_invoice.is_closed
+
+
+@when("another invoice of the user is stored and no longer referenced", target_fixture="other_id")
+def other_invoice_stored(user: User):
+    other = Invoice(user)
+    LibraryRepository.create_invoice(other)
+    other_id = other.id
+    del other
+    gc.collect()
+    return other_id
+
+
+@then("the other invoice should be read from storage")
+def other_invoice_read(other_id: str, user: User):
+    other = LibraryRepository.read_invoice(other_id)
+    assert other is not None and other.customer is user
+
+
+@when("the user pays with a card whose charge is slow", target_fixture="payment")
+def user_pays_slow_card(invoice: Invoice):
+    valid = create_test_credit_card_info(valid=True)
+    card = SlowCard(valid._number, valid._valid_date, valid._cvv)
+    payment = threading.Thread(target=invoice.process_invoice_with_credit_card, args=(card,))
+    payment.start()
+    assert card.charging.wait(5)
+    yield card, payment
+    card.release.set()
+    payment.join()
+
+
+@then("the user should be able to borrow another book meanwhile")
+def borrow_while_charging(user: User, payment: tuple[SlowCard, threading.Thread]):
+    card, charging = payment
+    book = Book("Another book", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, "0000000001", "Paper")
+    LibraryRepository.create_book(book)
+    borrowing = threading.Thread(target=user.borrow_book, args=(book,))
+    borrowing.start()
+    borrowing.join(2)
+    assert not borrowing.is_alive()
+    assert charging.is_alive()
+    assert book.isbn in [loan.isbn for loan in user.borrowed_books]
+    card.release.set()
+    charging.join()
+
+
+@then(parsers.parse('"{message}" should be logged'))
+def payment_logged(payment_log, message: str):
+    assert any(message in record.getMessage() for record in payment_log.records)
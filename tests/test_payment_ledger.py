@@ -0,0 +1,246 @@
+from datetime import datetime, timezone
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.payment.gateway import SimulatedGateway
+from library.payment.invoice import Invoice
+from library.payment.payment_ledger import ATTEMPT, PAID, PaymentLedger, read_entries, reconcile
+from library.payment.processor import PaymentProcessor
+from library.persistence.storage import LibraryRepository
+from library.persistence.versioning import RetryPolicy
+from tests.utils import create_test_credit_card_info
+
+
+@scenario("payment_ledger.feature", "Paying through the processor records every attempt")
+def test_processor_ledger():
+    pass
+
+
+@scenario("payment_ledger.feature", "Every attempt is on disk before the gateway charges it")
+def test_write_ahead():
+    pass
+
+
+@scenario("payment_ledger.feature", "An invoice paid but not settled is not paid again by the invoice itself")
+def test_process_paid_invoice():
+    pass
+
+
+@scenario("payment_ledger.feature", "Paid invoices are settled in one batch")
+def test_batched_settlement():
+    pass
+
+
+@scenario("payment_ledger.feature", "A reopened ledger settles what was paid before a crash")
+def test_reopen():
+    pass
+
+
+@scenario("payment_ledger.feature", "The payments of a day are reconciled from its own segments")
+def test_reconcile_day():
+    pass
+
+
+class WitnessGateway(SimulatedGateway):
+    """Looks for the attempt in the ledger's segments before every charge."""
+
+    def __init__(self, directory: str):
+        super().__init__(0.001)
+        self.directory = directory
+        self.found: list[bool] = []
+
+    async def charge(self, idempotency_key, settle):
+        keys = {entry.key for entry in read_entries(self.directory) if entry.event == ATTEMPT}
+        self.found.append(f"{idempotency_key}:1" in keys)
+        return await super().charge(idempotency_key, settle)
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def ledgers():
+    ledgers = []
+    yield ledgers
+    for ledger in ledgers:
+        ledger.close()
+
+
+@given(parsers.parse("{count:d} users have each returned a book"), target_fixture="invoices")
+def invoices(count: int) -> list[Invoice]:
+    invoices = []
+    for i in range(count):
+        user = User(f"user{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"ledger-{i}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        invoices.append(user.return_books([book]))
+    return invoices
+
+
+@given("a payment ledger", target_fixture="ledger")
+def ledger(tmp_path, ledgers: list) -> PaymentLedger:
+    ledger = PaymentLedger(str(tmp_path / "payments"))
+    ledgers.append(ledger)
+    return ledger
+
+
+@given(parsers.parse("a payment ledger whose clock starts on {day} at {hour:d}:00"), target_fixture="ledger")
+def ledger_with_clock(tmp_path, ledgers: list, day: str, hour: int) -> PaymentLedger:
+    start = datetime.fromisoformat(day).replace(hour=hour, tzinfo=timezone.utc).timestamp()
+    ledger = PaymentLedger(str(tmp_path / "payments"), clock=Clock(start))
+    ledgers.append(ledger)
+    return ledger
+
+
+@given(
+    parsers.parse("a gateway that fails {errors:d}% of the requests and loses {lost:d}% of the answers"),
+    target_fixture="gateway",
+)
+def gateway(errors: int, lost: int) -> SimulatedGateway:
+    return SimulatedGateway(0.001, error_rate=errors / 100, lost_response_rate=lost / 100, seed=7)
+
+
+@given("a gateway that reads the ledger before it charges", target_fixture="gateway")
+def witness_gateway(tmp_path) -> WitnessGateway:
+    return WitnessGateway(str(tmp_path / "payments"))
+
+
+@when("the invoices are paid through the processor with the ledger")
+def pay(invoices: list[Invoice], ledger: PaymentLedger, gateway: SimulatedGateway):
+    retry = RetryPolicy(attempts=10, base_delay=0.001, max_delay=0.01)
+    processor = PaymentProcessor(gateway, retry=retry, ledger=ledger)
+    processor.run_sync([(invoice, create_test_credit_card_info()) for invoice in invoices])
+    ledger.flush()
+
+
+def fee(invoice: Invoice) -> tuple[float, int]:
+    return invoice.calculate_fee(invoice.customer)
+
+
+@given("every invoice is recorded as paid")
+@when("every invoice is recorded as paid")
+@when("every invoice is recorded as paid again")
+def record_paid(invoices: list[Invoice], ledger: PaymentLedger):
+    for invoice in invoices:
+        amount, reading_credits = fee(invoice)
+        key = ledger.record_attempt(invoice.id, amount, "credit_card")
+        ledger.record_result(key, PAID, reading_credits, invoice)
+    ledger.flush()
+
+
+@when("every invoice is processed with a credit card", target_fixture="cards")
+def process(invoices: list[Invoice]) -> list[CreditCard]:
+    cards = []
+    for invoice in invoices:
+        card = create_test_credit_card_info()
+        assert invoice.process_invoice(card)
+        cards.append(card)
+    return cards
+
+
+@when("the ledger is reopened without being closed", target_fixture="ledger")
+def reopen(tmp_path, ledgers: list, ledger: PaymentLedger) -> PaymentLedger:
+    # as after a crash: the events are on disk, the invoices were never settled
+    ledgers.remove(ledger)
+    reopened = PaymentLedger(str(tmp_path / "payments"))
+    ledgers.append(reopened)
+    return reopened
+
+
+@when(parsers.parse("{hours:d} hours pass"))
+def time_passes(ledger: PaymentLedger, hours: int):
+    ledger._clock.now += hours * 3600
+
+
+@then("the ledger should know every invoice as paid")
+def known_as_paid(invoices: list[Invoice], ledger: PaymentLedger):
+    for invoice in invoices:
+        assert ledger.is_paid(invoice.id)
+        key = ledger.paid_by(invoice.id)
+        assert key == f"{invoice.id}:{ledger.attempts(invoice.id)}"
+        assert ledger.entry(key).amount == pytest.approx(fee(invoice)[0])
+
+
+@then("the gateway should have found every attempt on disk")
+def written_ahead(gateway: WitnessGateway, invoices: list[Invoice]):
+    assert gateway.found == [True] * len(invoices)
+
+
+@then("no card should have been charged")
+def not_charged(cards: list[CreditCard]):
+    limit = create_test_credit_card_info().amount
+    assert all(card.amount == limit for card in cards)
+
+
+@then("every invoice should be closed")
+def closed(invoices: list[Invoice]):
+    for invoice in invoices:
+        assert invoice.is_closed
+        assert LibraryRepository.read_invoice(invoice.id).is_closed
+
+
+@then("no invoice should be closed")
+def not_closed(invoices: list[Invoice]):
+    assert not any(invoice.is_closed for invoice in invoices)
+
+
+@then(parsers.parse("{count:d} invoices should be settled with a single write"))
+def settled_in_one_batch(invoices: list[Invoice], ledger: PaymentLedger, monkeypatch, count: int):
+    backend = LibraryRepository.get_backend()
+    batches = []
+    write_batch = backend.write_batch
+    monkeypatch.setattr(backend, "write_batch", lambda operations: (batches.append(operations), write_batch(operations)))
+    assert ledger.settle() == count
+    assert len(batches) == 1
+    assert ledger.unsettled() == []
+    for invoice in invoices:
+        stored = LibraryRepository.read_invoice(invoice.id)
+        assert stored.is_closed
+        assert LibraryRepository.read_user(stored.customer.email).reading_credits == fee(stored)[1]
+
+
+@then(parsers.parse("the reconciliation should count {paid:d} paid and {settled:d} settled invoices"))
+def reconciled(tmp_path, paid: int, settled: int):
+    report = reconcile(str(tmp_path / "payments"))
+    assert report.paid == paid
+    assert report.settled == settled
+    assert report.unsettled == []
+
+
+@then("the reconciliation should count one attempt per result")
+def attempts(tmp_path, gateway: SimulatedGateway):
+    report = reconcile(str(tmp_path / "payments"))
+    assert report.errors > 0
+    assert report.attempts == report.paid + report.declined + report.errors
+    # every lost answer was retried and found paid by the gateway, without a second charge
+    assert gateway.stats().charges == report.paid
+
+
+@then("the reconciliation should add up the fees")
+def amount(tmp_path, invoices: list[Invoice]):
+    assert reconcile(str(tmp_path / "payments")).amount_paid == round(sum(fee(invoice)[0] for invoice in invoices), 2)
+
+
+@then(parsers.parse("the segments should be named after {first} and {second}"))
+def segments(tmp_path, first: str, second: str):
+    names = sorted(path.name for path in (tmp_path / "payments").iterdir())
+    assert names == [f"payments-{first}-000000.jsonl", f"payments-{second}-000000.jsonl"]
+
+
+@then(parsers.parse("reconciling {day} should count {count:d} paid invoices"))
+def reconciled_day(tmp_path, day: str, count: int):
+    report = reconcile(str(tmp_path / "payments"), day)
+    assert report.attempts == report.paid == count
+    assert len(report.unsettled) == count
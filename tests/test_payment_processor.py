@@ -0,0 +1,260 @@
+import asyncio
+import time
+from datetime import datetime
+
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.user import User
+from library.payment.credit_card import CreditCard
+from library.payment.gateway import SimulatedGateway
+from library.payment.invoice import Invoice
+from library.payment.processor import ALREADY_PAID, DECLINED, FAILED, PAID, PaymentProcessor, PaymentResult
+from library.persistence.async_storage import AsyncLibraryRepository
+from library.persistence.storage import LibraryRepository
+from library.persistence.versioning import RetryPolicy
+from tests.utils import create_test_credit_card_info
+
+CARD_LIMIT = 100000.0
+
+
+@scenario("payment_processor.feature", "Paying many invoices concurrently")
+def test_concurrent_payments():
+    pass
+
+
+@scenario("payment_processor.feature", "Failed requests and lost answers are retried without charging twice")
+def test_retries():
+    pass
+
+
+@scenario("payment_processor.feature", "A gateway that does not answer in time")
+def test_timeout():
+    pass
+
+
+@scenario("payment_processor.feature", "The statistics do not keep every result")
+def test_stats_bounded():
+    pass
+
+
+@scenario("payment_processor.feature", "The same invoice is submitted several times")
+def test_duplicate_jobs():
+    pass
+
+
+@scenario("payment_processor.feature", "An invoice paid by two processors and by the invoice itself at the same time")
+def test_concurrent_payers():
+    pass
+
+
+@scenario("payment_processor.feature", "A declined card is not retried")
+def test_declined():
+    pass
+
+
+@scenario("payment_processor.feature", "Payments are held to the rate limit of their provider")
+def test_rate_limit():
+    pass
+
+
+class CountingGateway(SimulatedGateway):
+    """Counts the charges in flight."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = self.max_in_flight = 0
+
+    async def charge(self, idempotency_key, settle):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await super().charge(idempotency_key, settle)
+        finally:
+            self.in_flight -= 1
+
+
+@given(parsers.parse("{count:d} users with an open invoice and a valid credit card"), target_fixture="jobs")
+def jobs(count: int) -> list[tuple[Invoice, CreditCard]]:
+    jobs = []
+    for i in range(count):
+        user = User(f"user{i}@test.org", "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"{i:010d}", "Paper")
+        LibraryRepository.create_book(book)
+        user.borrow_book(book)
+        jobs.append((user.return_books([book]), create_test_credit_card_info()))
+    return jobs
+
+
+@given("the cards have a limit below the fee")
+def low_limit(jobs: list[tuple[Invoice, CreditCard]]):
+    for _, card in jobs:
+        card.amount = 1.0
+
+
+@given(
+    parsers.parse("a gateway with {latency:d} ms latency that fails {errors:d}% of the requests and loses {lost:d}% of the answers"),
+    target_fixture="gateway",
+)
+def unreliable_gateway(latency: int, errors: int, lost: int):
+    return CountingGateway(latency / 1000, error_rate=errors / 100, lost_response_rate=lost / 100, seed=42)
+
+
+@given(parsers.parse("a gateway with {latency:d} ms latency"), target_fixture="gateway")
+def gateway(latency: int):
+    return CountingGateway(latency / 1000)
+
+
+def run(processor: PaymentProcessor, jobs) -> tuple[list[PaymentResult], float]:
+    start = time.perf_counter()
+    results = processor.run_sync(jobs)
+    return results, time.perf_counter() - start
+
+
+@when(parsers.parse("the invoices are paid with at most {concurrency:d} payments in flight"), target_fixture="results")
+def pay(jobs, gateway: SimulatedGateway, concurrency: int):
+    return run(PaymentProcessor(gateway, max_concurrency=concurrency), jobs)
+
+
+@when(
+    parsers.parse("the invoices are paid with at most {concurrency:d} payments in flight and {attempts:d} attempts each"),
+    target_fixture="results",
+)
+def pay_with_retries(jobs, gateway: SimulatedGateway, concurrency: int, attempts: int):
+    retry = RetryPolicy(attempts=attempts, base_delay=0.001, max_delay=0.01)
+    return run(PaymentProcessor(gateway, max_concurrency=concurrency, retry=retry), jobs)
+
+
+@when(parsers.parse("the invoices are paid with a timeout of {timeout:d} ms and {attempts:d} attempts each"), target_fixture="results")
+def pay_with_timeout(jobs, gateway: SimulatedGateway, timeout: int, attempts: int):
+    retry = RetryPolicy(attempts=attempts, base_delay=0.001, max_delay=0.01)
+    return run(PaymentProcessor(gateway, timeout=timeout / 1000, retry=retry), jobs)
+
+
+@when(parsers.parse("the invoices are paid by a processor that keeps {samples:d} latencies"), target_fixture="processor")
+def pay_with_samples(jobs, gateway: SimulatedGateway, samples: int) -> PaymentProcessor:
+    processor = PaymentProcessor(gateway, latency_samples=samples)
+    processor.run_sync(jobs)
+    return processor
+
+
+@when(parsers.parse("the first invoice is submitted {times:d} times"), target_fixture="results")
+def pay_duplicates(jobs, gateway: SimulatedGateway, times: int):
+    return run(PaymentProcessor(gateway), [jobs[0]] * times)
+
+
+@when(
+    "the first invoice is paid by two processors with their own gateways and by process_invoice at once",
+    target_fixture="results",
+)
+def pay_concurrently(jobs, gateway: SimulatedGateway):
+    invoice, card = jobs[0]
+    processors = [PaymentProcessor(gateway), PaymentProcessor(CountingGateway(gateway.latency))]
+
+    async def pay_all():
+        return await asyncio.gather(
+            *(processor.pay(invoice, card) for processor in processors),
+            AsyncLibraryRepository.process_invoice(invoice, card),
+        )
+
+    *results, processed = asyncio.run(pay_all())
+    return results, processed
+
+
+@when(
+    parsers.parse("the invoices are paid with a rate limit of {rate:d} credit card payments per second"),
+    target_fixture="results",
+)
+def pay_rate_limited(jobs, gateway: SimulatedGateway, rate: int):
+    return run(PaymentProcessor(gateway, rate_limits={"credit_card": rate}), jobs)
+
+
+def statuses(results) -> list[str]:
+    return [result.status for result in results[0]]
+
+
+@then(parsers.parse("{count:d} invoices should have been paid"))
+def paid(results, count: int):
+    assert statuses(results).count(PAID) == count
+
+
+@then(parsers.parse("its statistics should count {count:d} paid invoices"))
+def stats_paid(processor: PaymentProcessor, count: int):
+    stats = processor.stats()
+    assert (stats.paid, stats.declined, stats.failed, stats.already_paid, stats.retries) == (count, 0, 0, 0, 0)
+    assert 0 < stats.p50 <= stats.p99
+
+
+@then(parsers.parse("it should keep at most {samples:d} latencies"))
+def latencies_bounded(processor: PaymentProcessor, samples: int):
+    assert len(processor._latencies) == samples
+
+
+@then("every invoice should be closed")
+def closed(jobs):
+    for invoice, _ in jobs:
+        assert invoice.is_closed
+        assert LibraryRepository.read_invoice(invoice.id).is_closed
+
+
+@then("no invoice should be closed")
+def not_closed(jobs):
+    assert not any(invoice.is_closed for invoice, _ in jobs)
+
+
+@then("every card should have been charged exactly once")
+def charged_once(jobs):
+    for invoice, card in jobs:
+        assert card.amount == CARD_LIMIT - invoice.calculate_fee(invoice.customer)[0]
+
+
+@then("no card should have been charged")
+def not_charged(jobs):
+    assert all(card.amount == CARD_LIMIT for _, card in jobs)
+
+
+@then(parsers.parse("at most {concurrency:d} charges should have been in flight at once"))
+def bounded(gateway: CountingGateway, concurrency: int):
+    assert 1 < gateway.max_in_flight <= concurrency
+
+
+@then("no lost answer should have been retried")
+def not_retried(gateway: SimulatedGateway):
+    # the charge closed the invoice, so the retry found it paid
+    stats = gateway.stats()
+    assert stats.errors > 0 and stats.lost_responses > 0
+    assert stats.replays == 0
+    assert stats.charges == 20
+
+
+@then("at most one processor should have paid it and the others found it paid")
+def paid_once(results):
+    results, processed = results
+    assert processed
+    statuses = [result.status for result in results]
+    assert statuses.count(PAID) <= 1
+    assert set(statuses) <= {PAID, ALREADY_PAID}
+
+
+@then(parsers.parse("{count:d} payments should have failed"))
+def failed(results, count: int):
+    assert statuses(results).count(FAILED) == count
+    assert all(result.attempts == 2 and result.error == "TimeoutError" for result in results[0])
+
+
+@then(parsers.parse("{count:d} jobs should have found the invoice already paid"))
+def already_paid(results, count: int):
+    assert statuses(results).count(ALREADY_PAID) == count
+
+
+@then(parsers.parse("{count:d} payments should have been declined after 1 attempt"))
+def declined(results, count: int):
+    assert statuses(results) == [DECLINED] * count
+    assert all(result.attempts == 1 for result in results[0])
+
+
+@then(parsers.parse("paying should have taken at least {seconds:f} seconds"))
+def rate_limited(results, seconds: float):
+    assert results[1] >= seconds
@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.recommendations import Recommendation, Recommender
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("recommendations.feature", "The books read most often together come first")
+def test_also_read():
+    pass
+
+
+@scenario("recommendations.feature", "Users are recommended the books they have not read")
+def test_recommend():
+    pass
+
+
+@scenario("recommendations.feature", "The recommender is rebuilt from the reading histories")
+def test_rebuild():
+    pass
+
+
+@scenario("recommendations.feature", "A deleted book is not recommended")
+def test_deleted():
+    pass
+
+
+@scenario("recommendations.feature", "A loan deleted without a return is not a read")
+def test_deleted_loan():
+    pass
+
+
+@scenario("recommendations.feature", "Rows stay bounded")
+def test_bounded():
+    pass
+
+
+@pytest.fixture
+def recommenders() -> list:
+    # the recommenders must stop listening when the scenario ends
+    created = []
+    yield created
+    for recommender in created:
+        recommender.detach()
+
+
+def isbns(recommendations: list[Recommendation]) -> str:
+    return ", ".join(recommendation.isbn for recommendation in recommendations)
+
+
+def read(email: str, books: list[Book]):
+    user = LibraryRepository.read_user(email)
+    if user is None:
+        user = User(email, "Max", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+        LibraryRepository.create_user(user)
+    for book in books:
+        assert user.borrow_book(book) is not None
+        assert user.return_books([book]) is not None
+
+
+@given("the catalogue has these books", target_fixture="books")
+def catalogue(datatable: list[list[str]]) -> dict[str, Book]:
+    books = {}
+    for isbn, genre in datatable[1:]:
+        book = Book(f"Title {isbn}", [], None, datetime(2019, 3, 12), [Genre(genre)], 400, isbn, "Paper")
+        LibraryRepository.create_book(book)
+        books[isbn] = book
+    return books
+
+
+@given("a recommender of the repository", target_fixture="recommender")
+def recommender(recommenders: list) -> Recommender:
+    recommenders.append(Recommender.from_repository())
+    return recommenders[-1]
+
+
+@given(parsers.parse("a recommender that keeps {neighbours:d} books per row"), target_fixture="recommender")
+def small_recommender(recommenders: list, neighbours: int) -> Recommender:
+    recommenders.append(Recommender.from_repository(neighbours=neighbours))
+    return recommenders[-1]
+
+
+@given("these books have been returned")
+def returned(books: dict[str, Book], datatable: list[list[str]]):
+    for email, read_isbns in datatable[1:]:
+        read(email, [books[isbn] for isbn in read_isbns.split(", ")])
+
+
+@when("a recommender is built from the repository", target_fixture="recommender")
+def rebuilt(recommenders: list) -> Recommender:
+    recommenders.append(Recommender.from_repository())
+    return recommenders[-1]
+
+
+@when(parsers.parse("the book {isbn} is deleted"))
+def delete_book(books: dict[str, Book], isbn: str):
+    LibraryRepository.delete_book(books[isbn])
+
+
+@when(parsers.parse("a loan of {isbn} by {email} is deleted"))
+def delete_loan(books: dict[str, Book], isbn: str, email: str):
+    user = LibraryRepository.read_user(email)
+    loan = user.borrow_book(books[isbn])
+    assert loan is not None
+    LibraryRepository.delete_loan(loan)
+
+
+@when(parsers.parse("{email} has read {count:d} books"), target_fixture="books")
+def read_many(books: dict[str, Book], email: str, count: int) -> dict[str, Book]:
+    for i in range(count):
+        book = Book(f"Title {i}", [], None, datetime(2019, 3, 12), [Genre.FICTION], 400, f"1{i:09d}", "Paper")
+        LibraryRepository.create_book(book)
+        books[book.isbn] = book
+    read(email, [book for isbn, book in books.items() if isbn.startswith("1")])
+    return books
+
+
+@then(parsers.parse("the readers of {isbn} should also have read {expected}"))
+def also_read(recommender: Recommender, isbn: str, expected: str):
+    assert isbns(recommender.also_read(isbn)) == expected
+
+
+@then(parsers.parse("{email} should be recommended {expected}"))
+def recommended(recommender: Recommender, email: str, expected: str):
+    assert isbns(recommender.recommend(email)) == expected
+
+
+@then(parsers.parse("{isbn} should have been read {count:d} time"))
+def read_times(recommender: Recommender, isbn: str, count: int):
+    assert recommender.readers(isbn) == count
+
+
+@then(parsers.parse("no book should have more than {count:d} books read with it"))
+def bounded(recommender: Recommender, books: dict[str, Book], count: int):
+    assert recommender.readers("1000000009") == 1
+    assert all(len(recommender.also_read(isbn, k=100)) <= count for isbn in books)
+    assert len(recommender.also_read("1000000000", k=100)) > 0
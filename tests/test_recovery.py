@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from pytest_bdd import scenario, given, when, then
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.holds import hold_queues
+
+from library.model.user import User
+from library.persistence.journal import JournaledBackend
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_user
+
+
+@scenario("recovery.feature", "Restarting replays the journal")
+def test_replay_journal():
+    pass
+
+
+@scenario("recovery.feature", "Restarting after a snapshot loads the snapshot")
+def test_load_snapshot():
+    pass
+
+
+@scenario("recovery.feature", "Writes go on while a snapshot syncs the log")
+def test_write_during_snapshot():
+    pass
+
+
+@scenario("recovery.feature", "A snapshot taken during a transaction leaves out its changes")
+def test_snapshot_during_transaction():
+    pass
+
+
+@scenario("recovery.feature", "A copy set aside for a hold survives a restart")
+def test_set_aside_copy():
+    pass
+
+
+@scenario("recovery.feature", "A borrow cut short by a crash is lost as a whole")
+def test_torn_batch():
+    pass
+
+
+@scenario("recovery.feature", "Returns log only the books read since")
+def test_compact_user_records():
+    pass
+
+
+def last_segment(journal: str) -> str:
+    return os.path.join(journal, sorted(name for name in os.listdir(journal) if name.startswith("journal-"))[-1])
+
+
+@given("the library keeps a journal", target_fixture="journal")
+def journal(tmp_path):
+    backend = JournaledBackend(str(tmp_path / "journal"))
+    previous = LibraryRepository.use_backend(backend)
+    yield str(tmp_path / "journal")
+    LibraryRepository.get_backend().close()
+    LibraryRepository.use_backend(previous)
+
+
+@given("I'm an user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@given("I have borrowed that book")
+def book_borrowed(user: User, book: Book):
+    assert user.borrow_book(book) is not None
+
+
+@given("another user has placed a hold on the book", target_fixture="other")
+def hold_placed(book: Book):
+    other = User("other@test.org", "Erika", "Mustermann", "78234892", "2374823442342", "89", "3284923495", "49")
+    LibraryRepository.create_user(other)
+    assert other.place_hold(book) == 1
+    yield other
+    hold_queues.clear()
+
+
+@given("I have returned that book")
+def book_returned(user: User, book: Book):
+    assert user.return_books([book]) is not None
+
+
+@given("I have borrowed and returned that book again")
+def book_borrowed_again(user: User, book: Book):
+    book_borrowed(user, book)
+    book_returned(user, book)
+
+
+@given("the library has taken a snapshot")
+def snapshot():
+    LibraryRepository.get_backend().snapshot()
+
+
+@given("the library has taken a snapshot while I returned that book in a transaction that was rolled back")
+def snapshot_during_transaction(user: User, book: Book):
+    try:
+        with LibraryRepository.transaction():
+            assert user.return_books([book]) is not None
+            assert book.borrowed_items == 0
+            LibraryRepository.get_backend().snapshot()
+            raise RuntimeError("rolled back")
+    except RuntimeError:
+        pass
+    assert book.borrowed_items == 1
+
+
+@when("the library restarts")
+def restart(journal: str):
+    LibraryRepository.sync()
+    LibraryRepository.get_backend().close()
+    LibraryRepository.use_backend(JournaledBackend(journal))
+
+
+@when("another book is written while a snapshot syncs the log", target_fixture="other_book")
+def write_during_snapshot(monkeypatch):
+    syncing, release = threading.Event(), threading.Event()
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        if threading.current_thread().name == "snapshot":
+            syncing.set()
+            release.wait(5)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    snapshot = threading.Thread(target=LibraryRepository.get_backend().snapshot, name="snapshot")
+    snapshot.start()
+    assert syncing.wait(5)
+    other = Book("Another book", [], None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, "0000000001", "Paper")
+    writer = threading.Thread(target=LibraryRepository.create_book, args=(other,))
+    writer.start()
+    writer.join(2)
+    still_writing = writer.is_alive()
+    release.set()
+    snapshot.join()
+    writer.join()
+    assert not still_writing
+    return other
+
+
+@then("the other book should have been recovered")
+def other_book_recovered(other_book: Book):
+    recovered = LibraryRepository.read_book(other_book.isbn)
+    assert recovered is not None and recovered is not other_book
+
+
+@when("the library crashes while the last borrow is written")
+def crash(journal: str):
+    LibraryRepository.sync()
+    LibraryRepository.get_backend().close()
+    # the borrow is the last record; a crash tears it in the middle
+    with open(last_segment(journal), "rb+") as file:
+        records = file.read().splitlines(keepends=True)
+        assert json.loads(records[-1])["op"] == "batch"
+        file.truncate(sum(len(record) for record in records[:-1]) + len(records[-1]) // 2)
+    LibraryRepository.use_backend(JournaledBackend(journal))
+
+
+@then("I should still have the book borrowed")
+def book_still_borrowed(user: User, book: Book):
+    recovered = LibraryRepository.read_user(user.email)
+    assert recovered is not None and recovered is not user
+    assert [borrowed.isbn for borrowed in recovered.borrowed_books] == [book.isbn]
+    assert recovered.borrowed_books[0].book is LibraryRepository.read_book(book.isbn)
+
+
+@then("the copy should still be set aside for the other user")
+def still_set_aside(book: Book, other: User):
+    recovered = LibraryRepository.read_book(book.isbn)
+    assert recovered is not book
+    assert recovered.borrowed_items == 1
+    assert [email for email, _ in recovered.set_aside] == [other.email]
+
+
+@then("the other user should be able to borrow the book")
+def other_borrows(book: Book, other: User):
+    recovered = LibraryRepository.read_user(other.email)
+    assert recovered.hold_position(LibraryRepository.read_book(book.isbn)) == 0
+    assert recovered.borrow_book(LibraryRepository.read_book(book.isbn)) is not None
+    assert LibraryRepository.read_book(book.isbn).set_aside == ()
+
+
+@then("the book availability should be restored")
+def availability_restored(book: Book):
+    recovered = LibraryRepository.read_book(book.isbn)
+    assert recovered is not None and recovered.borrowed_items == 1
+    assert recovered not in LibraryRepository.query_books().available().all()
+
+
+@then("I should not have the book borrowed")
+def book_not_borrowed(user: User):
+    recovered = LibraryRepository.read_user(user.email)
+    assert recovered is not None and len(recovered.borrowed_books) == 0
+    assert LibraryRepository.loans_of_user(user.email) == []
+
+
+@then("the book should be available again")
+def available_again(book: Book):
+    recovered = LibraryRepository.read_book(book.isbn)
+    assert recovered is not None and recovered.borrowed_items == 0
+    assert recovered in LibraryRepository.query_books().available().all()
+
+
+@then("I should have read the book twice")
+def read_twice(user: User, book: Book):
+    recovered = LibraryRepository.read_user(user.email)
+    assert [read.isbn for read in recovered.read_books] == [book.isbn, book.isbn]
+    assert len(recovered.invoices) == 2
+
+
+@then("the last logged update of my user should only list the last read book")
+def compact_update(journal: str, book: Book):
+    records = []
+    for name in sorted(name for name in os.listdir(journal) if name.startswith("journal-")):
+        with open(os.path.join(journal, name), "rb") as file:
+            records += [json.loads(line) for line in file]
+    updates = [data for record in records if record["op"] == "batch" for op, data in record["data"] if op == "update_user"]
+    assert updates[-1]["read_books_added"] == [book.isbn]
+    assert len(updates[-1]["invoices_added"]) == 1
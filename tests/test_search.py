@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.publisher import Publisher
+from library.persistence.search import SearchHit, SearchIndex
+from library.persistence.storage import LibraryRepository
+
+
+@scenario("search.feature", "Searching ignores case and diacritics")
+def test_folding():
+    pass
+
+
+@scenario("search.feature", "The last word of a query is a prefix")
+def test_prefix():
+    pass
+
+
+@scenario("search.feature", "Books with the word in their title rank first")
+def test_ranking():
+    pass
+
+
+@scenario("search.feature", "The index follows the catalogue")
+def test_incremental():
+    pass
+
+
+@scenario("search.feature", "A saved index is loaded for a fast start")
+def test_saved():
+    pass
+
+
+@scenario("search.feature", "A saved index catches up with the catalogue when it is loaded")
+def test_saved_catches_up():
+    pass
+
+
+@pytest.fixture
+def indexes() -> list:
+    # the indexes must stop listening when the scenario ends
+    created = []
+    yield created
+    for index in created:
+        index.detach()
+
+
+def isbns(hits: list[SearchHit]) -> str:
+    return ", ".join(hit.isbn for hit in hits)
+
+
+@given("the catalogue has these books", target_fixture="books")
+def catalogue(datatable: list[list[str]]) -> dict[str, Book]:
+    books = {}
+    publishers = {}
+    for isbn, title, author, publisher in datatable[1:]:
+        if publisher not in publishers:
+            publishers[publisher] = Publisher(publisher)
+            LibraryRepository.create_publisher(publishers[publisher])
+        firstname, lastname = author.split(" ")
+        writer = Author(firstname, lastname)
+        LibraryRepository.create_author(writer)
+        book = Book(title, [writer], publishers[publisher], datetime(2019, 3, 12), [Genre.FICTION], 400, isbn, "Paper")
+        LibraryRepository.create_book(book)
+        books[isbn] = book
+    return books
+
+
+@given("a search index of the repository", target_fixture="index")
+def search_index(indexes: list) -> SearchIndex:
+    indexes.append(SearchIndex.from_repository())
+    return indexes[-1]
+
+
+@when(parsers.parse('I search for "{query}"'), target_fixture="hits")
+def search(index: SearchIndex, query: str) -> list[SearchHit]:
+    return index.search(query)
+
+
+@when(parsers.parse('the book {isbn} is renamed to "{title}"'))
+def rename(books: dict[str, Book], isbn: str, title: str):
+    books[isbn].title = title
+    LibraryRepository.update_book(books[isbn])
+
+
+@when(parsers.parse("the book {isbn} is deleted"))
+def delete(books: dict[str, Book], isbn: str):
+    LibraryRepository.delete_book(books[isbn])
+
+
+@when("the index is saved and loaded again", target_fixture="index")
+def saved(index: SearchIndex, tmp_path) -> SearchIndex:
+    path = str(tmp_path / "search.json")
+    index.save(path)
+    loaded = SearchIndex.load(path)
+    assert len(loaded) == len(index)
+    return loaded
+
+
+@when("the index is saved and stops following the catalogue", target_fixture="path")
+def saved_detached(index: SearchIndex, tmp_path) -> str:
+    path = str(tmp_path / "search.json")
+    index.save(path)
+    index.detach()
+    return path
+
+
+@when(parsers.parse('the book {isbn} "{title}" by {firstname} {lastname} is added'))
+def added(isbn: str, title: str, firstname: str, lastname: str):
+    writer = Author(firstname, lastname)
+    LibraryRepository.create_author(writer)
+    LibraryRepository.create_book(Book(title, [writer], None, datetime(2018, 10, 16), [Genre.FICTION], 320, isbn, "Paper"))
+
+
+@when("the saved index is loaded for the repository", target_fixture="index")
+def loaded_for_repository(indexes: list, path: str) -> SearchIndex:
+    indexes.append(SearchIndex.from_repository(path))
+    return indexes[-1]
+
+
+@then(parsers.parse("the results should be {expected}"))
+def results(hits: list[SearchHit], expected: str):
+    assert isbns(hits) == expected
+    assert all(hit.score > 0 for hit in hits)
+
+
+@then(parsers.parse('searching for "{query}" should find nothing'))
+def nothing_found(index: SearchIndex, query: str):
+    assert index.search(query) == []
+
+
+@then(parsers.parse('searching for "{query}" should find the book {expected}'))
+def found(index: SearchIndex, query: str, expected: str):
+    assert isbns(index.search(query)) == expected
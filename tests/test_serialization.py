@@ -0,0 +1,211 @@
+import json
+import xml.etree.ElementTree as et
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from pytest_bdd import parsers, scenario, given, when, then
+
+from library.model.author import Author
+from library.model.book import Book
+from library.model.genre import Genre
+from library.model.serialization import use_json_encoder
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_user
+
+
+@scenario("serialization.feature", "Rendering a user does not encode unchanged books again")
+def test_render_user():
+    pass
+
+
+@scenario("serialization.feature", "A book serialized before is returned without reading its fields")
+def test_memo_hit():
+    pass
+
+
+@scenario("serialization.feature", "A change that is rolled back encodes the book again")
+def test_rollback_invalidates():
+    pass
+
+
+@scenario("serialization.feature", "Borrowing a book encodes it again")
+def test_borrow_invalidates():
+    pass
+
+
+@scenario("serialization.feature", "Renaming an author encodes the book again")
+def test_rename_invalidates():
+    pass
+
+
+@scenario("serialization.feature", "Serialized books are what json and ElementTree write")
+def test_reference_output():
+    pass
+
+
+@pytest.fixture(autouse=True)
+def builtin_encoder():
+    yield
+    use_json_encoder(None)
+
+
+def reference_json(book: Book) -> str:
+    return json.dumps(
+        {
+            "id": book.isbn,
+            "title": book.title,
+            "authors": [author.get_fullname() for author in book.authors],
+            "available_items": book.existing_items - book.borrowed_items,
+            "borrowed_items": book.borrowed_items,
+        }
+    )
+
+
+def reference_xml(book: Book) -> str:
+    book_info = et.Element("book", attrib={"id": book.isbn})
+    et.SubElement(book_info, "title").text = book.title
+    et.SubElement(book_info, "authors").text = ", ".join([author.get_fullname() for author in book.authors])
+    et.SubElement(book_info, "available").text = str(book.existing_items - book.borrowed_items)
+    et.SubElement(book_info, "borrowed").text = str(book.borrowed_items)
+    return et.tostring(book_info, encoding="unicode")
+
+
+def create_book(i: int, title: str, authors: list[Author]) -> Book:
+    book = Book(title, authors, None, datetime(2019, 3, 12), [Genre.MEDICINE], 400, f"15416446{i:02d}", "Paper")
+    LibraryRepository.create_book(book)
+    return book
+
+
+@given(parsers.parse("a user who has read {count:d} books"), target_fixture="user")
+def reader(count: int):
+    author = Author("Eric", "Topol")
+    LibraryRepository.create_author(author)
+    user = create_test_user()
+    for i in range(count):
+        book = create_book(i, f"Deep Medicine {i}", [author])
+        user.borrow_book(book)
+        user.return_books([book])
+    return user
+
+
+@given("books are encoded by a counting encoder", target_fixture="encoded")
+def counting_encoder():
+    encoded = Counter()
+
+    def encode(book_info: dict) -> str:
+        encoded[book_info["id"]] += 1
+        return json.dumps(book_info)
+
+    use_json_encoder(encode)
+    return encoded
+
+
+@given("the names of the authors are counted", target_fixture="names_read")
+def count_names(monkeypatch):
+    names_read = []
+    get_fullname = Author.get_fullname
+
+    def counted(author: Author) -> str:
+        names_read.append(author)
+        return get_fullname(author)
+
+    monkeypatch.setattr(Author, "get_fullname", counted)
+    return names_read
+
+
+@given("I have rendered the user")
+@when("I render the user")
+def render(user: User):
+    str(user)
+
+
+@when(parsers.parse("I render the user {times:d} times"))
+def render_times(user: User, times: int):
+    for _ in range(times):
+        str(user)
+
+
+@when("the user borrows the first book again")
+def borrow_again(user: User):
+    assert user.borrow_book(user.read_books[0]) is not None
+    str(user)
+
+
+@when(parsers.parse('the author of the first book is renamed to "{firstname} {lastname}"'))
+def rename(user: User, firstname: str, lastname: str):
+    author = user.read_books[0].authors[0]
+    author.firstname = firstname
+    author.lastname = lastname
+
+
+@when("the first book is serialized while its title is changed in a transaction that is rolled back")
+def serialize_rolled_back(user: User):
+    book = user.read_books[0]
+    with pytest.raises(RuntimeError):
+        with LibraryRepository.transaction() as unit_of_work:
+            unit_of_work.track(book)
+            book.title = "Changed"
+            assert json.loads(book.serialize("JSON"))["title"] == "Changed"
+            raise RuntimeError("rolled back")
+
+
+@when("its borrowed items change")
+def change_borrowed(user: User):
+    user.read_books[0].borrowed_items += 1
+
+
+@then("its JSON should show the original title and 1 borrowed item")
+def original_title(user: User):
+    book = user.read_books[0]
+    assert json.loads(book.serialize("JSON")) == json.loads(reference_json(book))
+    assert json.loads(book.serialize("JSON"))["title"] == "Deep Medicine 0"
+    assert json.loads(book.serialize("JSON"))["borrowed_items"] == 1
+
+
+@then("no author name should have been read")
+def no_names_read(names_read: list[Author]):
+    assert names_read == []
+
+
+@then("every book should have been encoded once")
+def encoded_once(user: User, encoded: Counter):
+    assert encoded == Counter({book.isbn: 1 for book in user.read_books})
+
+
+@then(parsers.parse("the first book should have been encoded {times:d} times"))
+def encoded_times(user: User, encoded: Counter, times: int):
+    assert encoded[user.read_books[0].isbn] == times
+    assert all(encoded[book.isbn] == 1 for book in user.read_books[1:])
+
+
+@then(parsers.parse("its JSON should show {count:d} borrowed item"))
+def borrowed_items(user: User, count: int):
+    assert json.loads(str(user.read_books[0]))["borrowed_items"] == count
+
+
+@then(parsers.parse('the first book should be serialized with "{name}" in JSON and XML'))
+def renamed(user: User, name: str):
+    book = user.read_books[0]
+    assert json.loads(book.serialize("JSON"))["authors"] == [name]
+    assert et.fromstring(book.serialize("XML")).find("authors").text == name
+
+
+@given("books with special characters in their titles and authors", target_fixture="books")
+def special_books():
+    titles = ['The "Quoted" <Title> & More', "Ünïcödé – ☃", "Tabs\tand\nnewlines", "", "100% > 99%"]
+    authors = [Author("Anne & Bob", "<Smith>"), Author("Zoë", "O'Brien")]
+    return [create_book(i, title, authors[: i % 3]) for i, title in enumerate(titles)]
+
+
+@then("their JSON should be what json.dumps writes")
+def json_reference(books: list[Book]):
+    for book in books:
+        assert book.serialize("JSON") == reference_json(book)
+
+
+@then("their XML should be what ElementTree writes")
+def xml_reference(books: list[Book]):
+    for book in books:
+        assert book.serialize("XML") == reference_xml(book)
@@ -0,0 +1,101 @@
+import pytest
+from pytest_bdd import scenario, given, when, then
+from library.model.book import Book
+
+from library.model.user import User
+from library.persistence.storage import LibraryRepository
+from tests.utils import create_test_book, create_test_user
+
+
+@scenario("transaction.feature", "Returning a book writes every entity once")
+def test_return_writes_once():
+    pass
+
+
+@scenario("transaction.feature", "Borrowing is rolled back if the user cannot be stored")
+def test_borrow_rolled_back():
+    pass
+
+
+@scenario("transaction.feature", "Borrowing in a batch is rolled back if the user cannot be stored")
+def test_borrow_books_rolled_back():
+    pass
+
+
+@given("I know a book", target_fixture="book")
+def book():
+    return create_test_book()
+
+
+@given("I'm an user", target_fixture="user")
+def user():
+    return create_test_user()
+
+
+@given("I'm an user that is not stored", target_fixture="user")
+def user_not_stored():
+    return User("nobody@test.org", "No", "Body", "", "", "", "", "")
+
+
+@given("I have borrowed that book")
+def book_borrowed(user: User, book: Book):
+    assert user.borrow_book(book) is not None
+
+
+@given("the storage counts its writes", target_fixture="batches")
+def counting_storage(monkeypatch):
+    backend = LibraryRepository.get_backend()
+    batches = []
+    write_batch = backend.write_batch
+
+    def counting_write_batch(operations):
+        batches.append(operations)
+        write_batch(operations)
+
+    monkeypatch.setattr(backend, "write_batch", counting_write_batch)
+    return batches
+
+
+@when("I return the book")
+def return_book(user: User, book: Book):
+    assert user.return_books([book]) is not None
+
+
+@when("I borrow the book", target_fixture="borrowed")
+def borrow_book(user: User, book: Book):
+    return user.borrow_book(book)
+
+
+@when("I borrow the book in a batch", target_fixture="failure")
+def borrow_books(user: User, book: Book):
+    with pytest.raises(ValueError) as failure:
+        user.borrow_books([book], partial=True)
+    return failure
+
+
+@then("the loan, the book, the invoice and the user should each be written once")
+def written_once(batches: list):
+    assert len(batches) == 1
+    assert [operation for operation, _ in batches[0]] == ["delete_loan", "update_book", "create_invoice", "update_user"]
+
+
+@then("I should not receive/borrow book")
+def not_borrowed(borrowed: Book):
+    assert borrowed is None
+
+
+@then("the borrowing should fail")
+def borrowing_failed(failure):
+    assert "does not exist" in str(failure.value)
+
+
+@then("I should have no borrowed books")
+def no_borrowed_books(user: User):
+    assert user.borrowed_books == []
+
+
+@then("the book availability should not change")
+def availability_not_updated(book: Book):
+    assert book.borrowed_items == 0
+    assert LibraryRepository.read_book(book.isbn).borrowed_items == 0
+    assert book in LibraryRepository.query_books().available().all()
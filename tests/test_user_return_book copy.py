@@ -1,6 +1,7 @@
 from typing import Optional
 from pytest_bdd import scenario, given, when, then
-from library.model.book import Book, BorrowedBook
+from library.model.book import Book
+from library.model.loan import Loan
 
 from library.model.user import User
 from library.payment.invoice import Invoice
@@ -40,7 +41,7 @@ def book_not_borrowed():
 
 
 @when("I return the book", target_fixture="invoice")
-def return_book(user: User, borrowed: BorrowedBook):
+def return_book(user: User, borrowed: Loan):
     invoice: Optional[Invoice] = user.return_books([borrowed])
     return invoice
 
@@ -51,9 +52,10 @@ def receive_invoice(invoice: Invoice):
 
 
 @then("the invoice should be valid")
-def invoice_correct(invoice: Invoice, borrowed: BorrowedBook):
-    assert len(invoice.books) == 1
-    assert invoice.books[0] == borrowed
+def invoice_correct(invoice: Invoice, borrowed: Loan):
+    assert len(invoice.loans) == 1
+    assert invoice.loans[0] is borrowed
+    assert invoice.books[0] == borrowed.book
 
 
 @then("an invoice should be created in the storage")
@@ -62,8 +64,8 @@ def invoice_exists(invoice: Invoice):
 
 
 @then("the book availability should be updated")
-def availability_updated(borrowed: BorrowedBook, book: Book):
-    assert borrowed.existing_items - borrowed.borrowed_items == 1
+def availability_updated(borrowed: Loan, book: Book):
+    assert borrowed.book.existing_items - borrowed.book.borrowed_items == 1
     updated_book = LibraryRepository.read_book(book.isbn)
     assert updated_book is not None
     assert updated_book.borrowed_items == 0
@@ -76,7 +78,7 @@ def error_message(invoice: Invoice):
 
 
 @then("the book availability should not change")
-def availability_not_updated(borrowed: BorrowedBook, book: Book):
+def availability_not_updated(borrowed: Loan, book: Book):
     assert borrowed is None
     updated_book = LibraryRepository.read_book(book.isbn)
     assert updated_book is not None and updated_book.borrowed_items == 0
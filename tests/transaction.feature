@@ -0,0 +1,32 @@
+Feature: Transactions
+    Borrowing and returning write every changed entity once and all or nothing.
+
+    Background:
+        Given I know a book
+
+    Scenario: Returning a book writes every entity once
+        Given I'm an user
+        And I have borrowed that book
+        And the storage counts its writes
+
+        When I return the book
+
+        Then the loan, the book, the invoice and the user should each be written once
+
+    Scenario: Borrowing is rolled back if the user cannot be stored
+        Given I'm an user that is not stored
+
+        When I borrow the book
+
+        Then I should not receive/borrow book
+        And I should have no borrowed books
+        And the book availability should not change
+
+    Scenario: Borrowing in a batch is rolled back if the user cannot be stored
+        Given I'm an user that is not stored
+
+        When I borrow the book in a batch
+
+        Then the borrowing should fail
+        And I should have no borrowed books
+        And the book availability should not change
@@ -1,3 +1,5 @@
+import sys
+import threading
 from datetime import datetime, timedelta
 
 from library.model.author import Author
@@ -56,3 +58,27 @@ def create_test_paypal_info(valid=True):
     if valid:
         return "amanda1985", "PaSsW0rD"
     return "Hugo", "123"
+
+
+def run_concurrently(items: list, work):
+    """Runs ``work(item)`` for every item in its own thread, all starting at once."""
+    barrier = threading.Barrier(len(items))
+    errors = []
+    # switch threads as often as possible to provoke races
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def run(item):
+        try:
+            barrier.wait()
+            work(item)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(switch_interval)
+    assert errors == []